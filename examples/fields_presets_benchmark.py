@@ -0,0 +1,41 @@
+# Compares the payload size and parse time of the listings under each of the Fields presets
+# Fill in the connection details and run against a site with a reasonable amount of content
+
+import time
+import xml.etree.ElementTree as ET
+
+from tableau_tools import *
+
+server = 'http://'
+username = ''
+password = ''
+site_content_url = ''
+
+t = TableauServerRest33(server=server, username=username, password=password, site_content_url=site_content_url)
+t.signin()
+
+listings = {
+    'users': ['minimal', 'usage', 'full'],
+    'workbooks': ['minimal', 'ownership', 'full'],
+    'views': ['minimal', 'ownership', 'usage', 'full'],
+    'datasources': ['minimal', 'ownership', 'full']
+}
+
+print('{:<12} {:<10} {:>8} {:>12} {:>12} {:>10}'.format('endpoint', 'preset', 'items', 'bytes', 'request ms',
+                                                        'parse ms'))
+for endpoint in listings:
+    for preset in listings[endpoint]:
+        start = time.perf_counter()
+        elements = t.query_resource(endpoint, fields=preset, additional_url_ending='pageSize=1000')
+        request_ms = (time.perf_counter() - start) * 1000
+
+        # Serialize the combined result and parse it again, to isolate the parse cost from the network
+        payload = ET.tostring(elements, encoding='utf-8')
+        start = time.perf_counter()
+        ET.fromstring(payload)
+        parse_ms = (time.perf_counter() - start) * 1000
+
+        print('{:<12} {:<10} {:>8} {:>12} {:>12.1f} {:>10.1f}'.format(endpoint, preset, len(elements), len(payload),
+                                                                    request_ms, parse_ms))
+
+t.signout()
@@ -192,18 +192,20 @@ time.sleep(4)
 
 # Set Permissions for all the Projects to Match when usernames and group names perfectly match between the systems
 print('Starting project permissions')
+# If you are transferring where the usernames may vary (say to Online where all usernames are e-mail addresses
+# must come up with a mechanism for mapping the username.
+users_mapping = None
+# Create a username_map dict to pass like {'original_username', : 'new_username'}.
+# Uncomment the following if necessary:
+# users_mapping = { 'username' : 'username@domain.net', 'admin' : 'admin@domain.net' }
+
+# Lists the users and groups on both sites once, rather than looking up each one for every project
+principal_map = PrincipalMap(o, n, username_map=users_mapping, logger_obj=logger)
 for proj_name in proj_dict:
     orig_proj = o.projects.query_project(proj_name)
     new_proj = n.projects.query_project(proj_name)
 
-    # If you are transferring where the usernames may vary (say to Online where all usernames are e-mail addresses
-    # must come up with a mechanism for mapping the username.
-    users_mapping = None
-    # Create a username_map dict to pass like {'original_username', : 'new_username'}.
-    # Uncomment the following if necessary:
-    # users_mapping = { 'username' : 'username@domain.net', 'admin' : 'admin@domain.net' }
-
-    new_proj.replicate_permissions_direct_xml(orig_proj, username_map=users_mapping)
+    new_proj.replicate_permissions_direct_xml(orig_proj, principal_map=principal_map)
 
 print('Finished project permissions')
 
@@ -8,6 +8,7 @@ import psycopg2.extensions
 import psycopg2
 
 from  tableau_tools import *
+from tableau_tools.tableau_rest_api import GroupMembershipSync
 
 psycopg2.extensions.register_type(psycopg2.extensions.UNICODE)
 psycopg2.extensions.register_type(psycopg2.extensions.UNICODEARRAY)
@@ -78,32 +79,22 @@ groups_and_users = {}
 
 # List of usernames who should be in the system
 usernames = {}
-# Add users who are missing from a group
+# Build the full membership that each group should have
 for row in cur:
-    user_luid = users_dict.get(row[0])
-    group_luid = groups_dict.get(row[2])
-
     usernames[row[0]] = None
-
-    # Make a data structure where we can check each group that exists on server
-    if groups_and_users.get(group_luid) is None:
-        groups_and_users[group_luid] = []
-    groups_and_users[group_luid].append(user_luid)
-
-    print('Adding user {} to group {}'.format(row[0].encode('utf8'), row[2].encode('utf8')))
-    t.groups.add_users_to_group(username_or_luid_s=user_luid, group_name_or_luid=group_luid)
-
-# Determine if any users are in a group who do not belong, then remove them
-for group_luid in groups_and_users:
-    if group_luid == groups_dict['All Users']:
+    if row[2] == 'All Users':
         continue
-    users_in_group_on_server = t.groups.query_users_in_group(group_luid)
-    users_in_group_on_server_dict = t.xml_list_to_dict(users_in_group_on_server)
-    # values() are the LUIDs in these dicts
-    for user_luid in list(users_in_group_on_server_dict.values()):
-        if user_luid not in groups_and_users[group_luid]:
-            print('Removing user {} from group {}'.format(user_luid, group_luid))
-            t.groups.remove_users_from_group(username_or_luid_s=user_luid, group_name_or_luid=group_luid)
+    if groups_and_users.get(row[2]) is None:
+        groups_and_users[row[2]] = []
+    groups_and_users[row[2]].append(row[0])
+
+# Each group's current members are listed once, all at the same time, then only the missing users are added and
+# the users who don't belong are removed, concurrently
+group_sync = GroupMembershipSync(t, logger_obj=logger, max_workers=8)
+results = group_sync.sync_groups(groups_and_users)
+for result in results.values():
+    print(result)
+print(group_sync.timings)
 
 # Determine if there are any users who are in the system and not in the database, set them to unlicsened
 users_on_server = t.users.query_users()
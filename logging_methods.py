@@ -4,6 +4,9 @@ import xml.etree.ElementTree as ET
 from .logger import Logger
 
 class LoggingMethods:
+    # Lets subclasses use __slots__ (see Permissions)
+    __slots__ = ()
+
     # Logging Methods
     def enable_logging(self, logger_obj: Logger):
         self.logger = logger_obj
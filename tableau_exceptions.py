@@ -47,3 +47,10 @@ class MultipleMatchesFoundException(TableauException):
 class NoResultsException(TableauException):
     def __init__(self, msg):
         self.msg = msg
+
+
+# Raised when the Metadata API answers a GraphQL query with errors (a bad query, or one that hit a node or time limit)
+class MetadataQueryException(TableauException):
+    def __init__(self, msg, errors):
+        self.msg = msg
+        self.errors = errors
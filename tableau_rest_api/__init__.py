@@ -14,6 +14,22 @@ from .methods.subscription import *
 from .methods.user import *
 from .methods.webhooks import *
 from .methods.workbook import *
+from .records import *
+from .site_snapshot import *
+from .columnar import *
+from .permissions_audit import *
+from .principal_map import *
+from .group_sync import *
+from .user_provisioning import *
+from .effective_permissions import *
+from .job_tracker import *
+from .refresh_orchestrator import *
+from .extract_task_catalog import *
+from .view_export import *
+from .export_cache import *
+from .view_data_stream import *
+from .metadata_pager import *
+from .lineage_graph import *
 
 #from .published_content import *
 #from .sort import *
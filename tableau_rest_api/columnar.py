@@ -0,0 +1,204 @@
+from typing import Union, Any, Optional, List, Dict, Tuple
+import xml.etree.ElementTree as ET
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from tableau_tools.tableau_rest_xml import TableauRestXml
+from .url_filter import UrlFilter
+from .sort import Sort
+
+# numpy and pyarrow are optional, only needed for the methods that return them
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import pyarrow
+    import pyarrow.compute
+except ImportError:
+    pyarrow = None
+
+
+# Turns the paginated listings into columns (a dict of NumPy arrays, or an Arrow table) for loading into dataframes.
+# Each page is read one column at a time as it arrives, converted to typed arrays and then dropped, so there is never
+# an XML tree of the whole listing or a dict or record per row
+class ColumnarListing(LoggingMethods):
+    # content_type : (endpoint, fields)
+    endpoint_definitions = {
+        'user': ('users', ['_all_']),
+        'group': ('groups', None),
+        'project': ('projects', None),
+        'workbook': ('workbooks', None),
+        'view': ('views', None),
+        'datasource': ('datasources', None)
+    }
+
+    # content_type : [ (column name, child element or None, attribute, column type) ]
+    # Column types are 'str', 'int', 'bool' and 'timestamp'
+    column_definitions = {
+        'user': [('luid', None, 'id', 'str'), ('name', None, 'name', 'str'), ('full_name', None, 'fullName', 'str'),
+                 ('email', None, 'email', 'str'), ('site_role', None, 'siteRole', 'str'),
+                 ('auth_setting', None, 'authSetting', 'str'), ('last_login', None, 'lastLogin', 'timestamp'),
+                 ('domain_name', 'domain', 'name', 'str')],
+        'group': [('luid', None, 'id', 'str'), ('name', None, 'name', 'str'), ('domain_name', 'domain', 'name', 'str'),
+                  ('minimum_site_role', 'import', 'siteRole', 'str')],
+        'project': [('luid', None, 'id', 'str'), ('name', None, 'name', 'str'),
+                    ('description', None, 'description', 'str'),
+                    ('parent_project_luid', None, 'parentProjectId', 'str'), ('owner_luid', 'owner', 'id', 'str'),
+                    ('content_permissions', None, 'contentPermissions', 'str'),
+                    ('created_at', None, 'createdAt', 'timestamp'), ('updated_at', None, 'updatedAt', 'timestamp')],
+        'workbook': [('luid', None, 'id', 'str'), ('name', None, 'name', 'str'),
+                     ('content_url', None, 'contentUrl', 'str'), ('project_luid', 'project', 'id', 'str'),
+                     ('project_name', 'project', 'name', 'str'), ('owner_luid', 'owner', 'id', 'str'),
+                     ('show_tabs', None, 'showTabs', 'bool'), ('size', None, 'size', 'int'),
+                     ('created_at', None, 'createdAt', 'timestamp'), ('updated_at', None, 'updatedAt', 'timestamp')],
+        'view': [('luid', None, 'id', 'str'), ('name', None, 'name', 'str'), ('content_url', None, 'contentUrl', 'str'),
+                 ('workbook_luid', 'workbook', 'id', 'str'), ('project_luid', 'project', 'id', 'str'),
+                 ('owner_luid', 'owner', 'id', 'str'), ('total_view_count', 'usage', 'totalViewCount', 'int'),
+                 ('created_at', None, 'createdAt', 'timestamp'), ('updated_at', None, 'updatedAt', 'timestamp')],
+        'datasource': [('luid', None, 'id', 'str'), ('name', None, 'name', 'str'),
+                       ('content_url', None, 'contentUrl', 'str'), ('datasource_type', None, 'type', 'str'),
+                       ('project_luid', 'project', 'id', 'str'), ('owner_luid', 'owner', 'id', 'str'),
+                       ('is_certified', None, 'isCertified', 'bool'), ('has_extracts', None, 'hasExtracts', 'bool'),
+                       ('created_at', None, 'createdAt', 'timestamp'), ('updated_at', None, 'updatedAt', 'timestamp')]
+    }
+
+    def __init__(self, t_rest_api, logger_obj: Optional[Logger] = None):
+        self.t_rest_api = t_rest_api
+        self.logger = logger_obj
+
+    # Just the string values of every column for one page. The nested elements are looked up once per element, not
+    # once per column
+    def _read_page_columns(self, content_type: str, page: ET.Element) -> Dict[str, List[Optional[str]]]:
+        elements = list(page)
+        children = {}
+        columns = {}
+        for column_name, child_tag, attribute, column_type in self.column_definitions[content_type]:
+            if child_tag is None:
+                columns[column_name] = [element.get(attribute) for element in elements]
+            else:
+                if child_tag not in children:
+                    children[child_tag] = [element.find('t:{}'.format(child_tag), TableauRestXml.ns_map)
+                                           for element in elements]
+                columns[column_name] = [None if child is None else child.get(attribute)
+                                        for child in children[child_tag]]
+        return columns
+
+    def _check_content_type(self, content_type: str):
+        if content_type not in self.column_definitions:
+            raise InvalidOptionException("content_type must be one of {}".format(
+                ", ".join(self.column_definitions.keys())))
+
+    def _query_pages(self, content_type: str, filters: Optional[List[UrlFilter]], sorts: Optional[List[Sort]],
+                     usage: bool, page_size: int, max_workers: int):
+        endpoint, fields = self.endpoint_definitions[content_type]
+        additional_url_ending = None
+        if content_type == 'view':
+            additional_url_ending = "includeUsageStatistics={}".format(str(usage).lower())
+        return self.t_rest_api.query_resource_pages(endpoint, filters=filters, sorts=sorts, fields=fields,
+                                                    additional_url_ending=additional_url_ending,
+                                                    page_size=page_size, max_workers=max_workers)
+
+    #
+    # NumPy
+    #
+
+    # Missing counts and booleans are masked rather than given a made-up value; missing timestamps are NaT
+    @staticmethod
+    def _to_numpy_array(values: List[Optional[str]], column_type: str):
+        if column_type == 'timestamp':
+            # numpy wants the time without the trailing Z (all REST API times are UTC)
+            return numpy.array(['NaT' if v is None else v.rstrip('Z') for v in values], dtype='datetime64[s]')
+        elif column_type in ['int', 'bool']:
+            if column_type == 'int':
+                data = numpy.array([0 if v is None else int(v) for v in values], dtype=numpy.int64)
+            else:
+                data = numpy.array([v == 'true' for v in values], dtype=numpy.bool_)
+            mask = numpy.array([v is None for v in values], dtype=numpy.bool_)
+            if mask.any():
+                return numpy.ma.MaskedArray(data, mask=mask)
+            return data
+        else:
+            return numpy.array(values, dtype=object)
+
+    def query_numpy_arrays(self, content_type: str, filters: Optional[List[UrlFilter]] = None,
+                           sorts: Optional[List[Sort]] = None, usage: bool = False, page_size: int = 1000,
+                           max_workers: int = 4) -> Dict[str, Any]:
+        if numpy is None:
+            raise ImportError('numpy must be installed to use query_numpy_arrays()')
+        self._check_content_type(content_type)
+        self.start_log_block()
+        column_definitions = self.column_definitions[content_type]
+        chunks = {}
+        for column_name, child_tag, attribute, column_type in column_definitions:
+            chunks[column_name] = []
+        for page in self._query_pages(content_type, filters, sorts, usage, page_size, max_workers):
+            page_columns = self._read_page_columns(content_type, page)
+            for column_name, child_tag, attribute, column_type in column_definitions:
+                chunks[column_name].append(self._to_numpy_array(page_columns[column_name], column_type))
+
+        arrays = {}
+        for column_name in chunks:
+            if any([isinstance(chunk, numpy.ma.MaskedArray) for chunk in chunks[column_name]]):
+                arrays[column_name] = numpy.ma.concatenate(chunks[column_name])
+            else:
+                arrays[column_name] = numpy.concatenate(chunks[column_name])
+        self.log('{} rows of {} in {} columns'.format(len(arrays['luid']), content_type, len(arrays)))
+        self.end_log_block()
+        return arrays
+
+    #
+    # Arrow
+    #
+
+    @staticmethod
+    def _arrow_type(column_type: str):
+        if column_type == 'timestamp':
+            return pyarrow.timestamp('s', tz='UTC')
+        elif column_type == 'int':
+            return pyarrow.int64()
+        elif column_type == 'bool':
+            return pyarrow.bool_()
+        else:
+            return pyarrow.string()
+
+    @staticmethod
+    def _to_arrow_array(values: List[Optional[str]], column_type: str):
+        if column_type == 'timestamp':
+            strings = pyarrow.array(values, type=pyarrow.string())
+            timestamps = pyarrow.compute.strptime(strings, format='%Y-%m-%dT%H:%M:%SZ', unit='s')
+            return timestamps.cast(pyarrow.timestamp('s', tz='UTC'))
+        elif column_type == 'int':
+            return pyarrow.array([None if v is None else int(v) for v in values], type=pyarrow.int64())
+        elif column_type == 'bool':
+            return pyarrow.array([None if v is None else v == 'true' for v in values], type=pyarrow.bool_())
+        else:
+            return pyarrow.array(values, type=pyarrow.string())
+
+    def get_arrow_schema(self, content_type: str):
+        if pyarrow is None:
+            raise ImportError('pyarrow must be installed to use get_arrow_schema()')
+        self._check_content_type(content_type)
+        return pyarrow.schema([(column_name, self._arrow_type(column_type)) for column_name, child_tag, attribute,
+                               column_type in self.column_definitions[content_type]])
+
+    # Each page becomes one record batch of the table
+    def query_arrow_table(self, content_type: str, filters: Optional[List[UrlFilter]] = None,
+                          sorts: Optional[List[Sort]] = None, usage: bool = False, page_size: int = 1000,
+                          max_workers: int = 4):
+        if pyarrow is None:
+            raise ImportError('pyarrow must be installed to use query_arrow_table()')
+        self.start_log_block()
+        schema = self.get_arrow_schema(content_type)
+        column_definitions = self.column_definitions[content_type]
+        batches = []
+        for page in self._query_pages(content_type, filters, sorts, usage, page_size, max_workers):
+            page_columns = self._read_page_columns(content_type, page)
+            arrays = [self._to_arrow_array(page_columns[column_name], column_type)
+                      for column_name, child_tag, attribute, column_type in column_definitions]
+            batches.append(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+        table = pyarrow.Table.from_batches(batches, schema=schema)
+        self.log('{} rows of {} in {} columns'.format(table.num_rows, content_type, table.num_columns))
+        self.end_log_block()
+        return table
@@ -0,0 +1,389 @@
+from typing import Union, Any, Optional, List, Dict, Tuple, Iterator, Iterable, Set
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from .permissions import Permissions
+
+
+# Works out what users can actually do, without making any requests, from data loaded in bulk: the users and their
+# site roles, group memberships, the project tree with each project's locking, content ownership, and the explicit
+# permissions (including project defaults). Use a SiteSnapshot for the first four and the rows of a PermissionsAudit
+# for the permissions. Capabilities are handled as Permissions bitmasks throughout.
+#
+# The rules applied, in order:
+#   - Site and server administrators can do everything
+#   - The owner of an item, or a project leader of its project (or any project above it), can do everything
+#   - Otherwise the permissions come from the item itself, or if its project is locked, from the locking project's
+#     default permissions for that content type
+#   - A user's own Allow / Deny wins. Otherwise any group Deny wins over any group Allow. Unspecified is not allowed
+#   - Finally, the site role can cap what is possible (site_role_maximum_capabilities)
+#
+# Users with exactly the same groups and site role always get the same result, unless something applies to them
+# individually (an explicit user permission, ownership, administrator), so whole matrices are worked out once per
+# distinct combination of groups rather than once per user
+class EffectivePermissions(LoggingMethods):
+    content_types = ('project', 'workbook', 'datasource', 'flow')
+
+    admin_site_roles = ('SiteAdministrator', 'SiteAdministratorExplorer', 'SiteAdministratorCreator',
+                        'ServerAdministrator')
+
+    # The most that a site role can ever be allowed, whatever the permissions say. An Explorer can interact with and
+    # web edit content, connect to data sources and lead a project, but can't save, download, move, delete or set
+    # permissions. Site roles not listed (Creator, ExplorerCanPublish and so on) are not capped, so for them the
+    # result is an upper bound: the site's own settings can still take something away
+    site_role_maximum_capabilities = {
+        'Unlicensed': (),
+        'Viewer': ('Read', 'Filter', 'ViewComments', 'AddComment', 'ExportImage', 'ExportData'),
+        'Explorer': ('Read', 'Filter', 'ViewComments', 'AddComment', 'ExportImage', 'ExportData',
+                     'ViewUnderlyingData', 'ShareView', 'WebAuthoring', 'Connect', 'ProjectLeader')
+    }
+
+    # contentPermissions values that lock a project, and whether the lock carries down to nested projects
+    locking_modes = {'LockedToProject': True, 'LockedToProjectWithoutNested': False}
+
+    def __init__(self, api_version: str = '3.6', logger_obj: Optional[Logger] = None):
+        self.logger = logger_obj
+        capabilities = Permissions.available_capabilities[api_version]
+        # content_type : every capability that can be set on that content type
+        self.full_masks: Dict[str, int] = {}
+        for content_type in self.content_types:
+            names = capabilities.get(content_type, ())
+            self.full_masks[content_type] = Permissions.get_capabilities_mask(names) & ~Permissions.read_only_mask
+        self.site_role_masks: Dict[str, int] = {}
+        for site_role in self.site_role_maximum_capabilities:
+            self.site_role_masks[site_role] = Permissions.get_capabilities_mask(
+                self.site_role_maximum_capabilities[site_role])
+
+        # user luid : site role
+        self.users: Dict[str, Optional[str]] = {}
+        # user luid : set of group luids
+        self.user_groups: Dict[str, Set[str]] = {}
+        # project luid : (parent project luid, contentPermissions)
+        self.projects: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        # content_type : { luid : (project luid, owner luid) }. Projects are in here too, under their parent
+        self.content: Dict[str, Dict[str, Tuple[Optional[str], Optional[str]]]] = {}
+        for content_type in self.content_types:
+            self.content[content_type] = {}
+        # (permissions type, luid) : { ('user' / 'group', grantee luid) : [allow mask, deny mask] }
+        # The permissions types are the content types plus 'default_workbook', 'default_datasource', 'default_flow'
+        self.grants: Dict[Tuple[str, str], Dict[Tuple[str, str], List[int]]] = {}
+
+        # (frozenset of group luids, site role) : [ user luids ]
+        self._signatures: Optional[Dict[Tuple[frozenset, Optional[str]], List[str]]] = None
+        self._user_signatures: Dict[str, Tuple[frozenset, Optional[str]]] = {}
+        # group luid : [ signatures that include it ]
+        self._group_signatures: Dict[str, List[Tuple[frozenset, Optional[str]]]] = {}
+        self._admin_signatures: List[Tuple[frozenset, Optional[str]]] = []
+        self._leader_cache: Dict[str, Tuple[Set, Set, Set]] = {}
+        # Items with the same group permissions (e.g. everything under one locked project) share a result per signature
+        self._signature_masks_cache: Dict[Tuple, Dict[Tuple[frozenset, Optional[str]], int]] = {}
+
+    def _reset_caches(self, signatures: bool = False):
+        if signatures is True:
+            self._signatures = None
+        self._leader_cache = {}
+        self._signature_masks_cache = {}
+
+    #
+    # Loading
+    #
+
+    def add_user(self, user_luid: str, site_role: Optional[str] = None):
+        self.users[user_luid] = site_role
+        if user_luid not in self.user_groups:
+            self.user_groups[user_luid] = set()
+        self._reset_caches(signatures=True)
+
+    def add_group_members(self, group_luid: str, user_luids: Iterable[str]):
+        for user_luid in user_luids:
+            if user_luid not in self.users:
+                self.users[user_luid] = None
+            self.user_groups.setdefault(user_luid, set()).add(group_luid)
+        self._reset_caches(signatures=True)
+
+    def add_project(self, project_luid: str, parent_project_luid: Optional[str] = None,
+                    content_permissions: Optional[str] = None, owner_luid: Optional[str] = None):
+        self.projects[project_luid] = (parent_project_luid, content_permissions)
+        self.content['project'][project_luid] = (parent_project_luid, owner_luid)
+        self._reset_caches()
+
+    def add_content(self, content_type: str, content_luid: str, project_luid: Optional[str],
+                    owner_luid: Optional[str] = None):
+        if content_type not in self.content_types or content_type == 'project':
+            raise InvalidOptionException('content_type must be workbook, datasource or flow (use add_project)')
+        self.content[content_type][content_luid] = (project_luid, owner_luid)
+
+    # permissions_type is a content type, or 'default_workbook' etc. for a project's default permissions
+    def add_grant(self, permissions_type: str, luid: str, grantee_type: str, grantee_luid: str, capability: str,
+                  mode: str):
+        if grantee_type not in ['user', 'group']:
+            raise InvalidOptionException('grantee_type must be "user" or "group"')
+        bit = Permissions.capability_bits.get(capability)
+        # InheritedProjectLeader is worked out here rather than trusted
+        if bit is None or bit & Permissions.read_only_mask:
+            return
+        masks = self.grants.setdefault((permissions_type, luid), {}).setdefault((grantee_type, grantee_luid), [0, 0])
+        if mode == 'Allow':
+            masks[0] |= bit
+            masks[1] &= ~bit
+        elif mode == 'Deny':
+            masks[1] |= bit
+            masks[0] &= ~bit
+        else:
+            raise InvalidOptionException('mode must be "Allow" or "Deny"')
+        self._reset_caches()
+
+    # Users (with site roles), group memberships, projects, workbooks and data sources
+    def load_site_snapshot(self, site_snapshot: 'SiteSnapshot'):
+        self.start_log_block()
+        for user in site_snapshot.get_all('user'):
+            self.add_user(user.luid, user.site_role)
+        for group_luid in site_snapshot.group_members:
+            self.add_group_members(group_luid, site_snapshot.group_members[group_luid])
+        for project in site_snapshot.get_all('project'):
+            self.add_project(project.luid, project.parent_project_luid, project.content_permissions,
+                             project.owner_luid)
+        for content_type in ['workbook', 'datasource']:
+            for record in site_snapshot.get_all(content_type):
+                self.add_content(content_type, record.luid, record.project_luid, record.owner_luid)
+        self.log('Loaded {} users, {} projects'.format(len(self.users), len(self.projects)))
+        self.end_log_block()
+
+    # The row dicts from PermissionsAudit.iterate_rows(), or read back from its CSV / NDJSON output
+    def load_audit_rows(self, rows: Iterable[Dict]):
+        self.start_log_block()
+        count = 0
+        for row in rows:
+            self.add_grant(row['content_type'], row['content_luid'], row['grantee_type'], row['grantee_luid'],
+                           row['capability'], row['mode'])
+            count += 1
+        self.log('Loaded {} permissions'.format(count))
+        self.end_log_block()
+
+    #
+    # Resolving
+    #
+
+    def _get_project_chain(self, project_luid: Optional[str]) -> List[str]:
+        chain = []
+        while project_luid is not None and project_luid not in chain:
+            chain.append(project_luid)
+            project_luid = self.projects.get(project_luid, (None, None))[0]
+        return chain
+
+    # The project whose default permissions apply to content in project_luid, or None if it isn't locked. A lock
+    # that includes nested projects applies all the way down, and the highest one wins
+    def get_locking_project(self, project_luid: Optional[str]) -> Optional[str]:
+        locking_project = None
+        for i, luid in enumerate(self._get_project_chain(project_luid)):
+            content_permissions = self.projects[luid][1] if luid in self.projects else None
+            if content_permissions in self.locking_modes:
+                if i == 0 or self.locking_modes[content_permissions] is True:
+                    locking_project = luid
+        return locking_project
+
+    # The grants that decide the permissions for an item: { ('user' / 'group', luid) : [allow, deny] }
+    def get_controlling_grants(self, content_type: str, content_luid: str) -> Dict[Tuple[str, str], List[int]]:
+        if content_type not in self.content_types:
+            raise InvalidOptionException('content_type must be one of {}'.format(", ".join(self.content_types)))
+        project_luid = self.content[content_type].get(content_luid, (None, None))[0]
+        if content_type == 'project':
+            # A project's own permissions are set by the lock above it, if there is one
+            locking_project = self.get_locking_project(project_luid)
+            if locking_project is not None:
+                return self.grants.get(('project', locking_project), {})
+            return self.grants.get(('project', content_luid), {})
+        locking_project = self.get_locking_project(project_luid)
+        if locking_project is not None:
+            return self.grants.get(('default_{}'.format(content_type), locking_project), {})
+        return self.grants.get((content_type, content_luid), {})
+
+    @staticmethod
+    def _combine(user_masks: Optional[List[int]], group_allow: int, group_deny: int) -> int:
+        user_allow, user_deny = user_masks if user_masks is not None else (0, 0)
+        return user_allow | (group_allow & ~group_deny & ~user_deny)
+
+    def _get_signatures(self) -> Dict[Tuple[frozenset, Optional[str]], List[str]]:
+        if self._signatures is None:
+            self._signatures = {}
+            self._user_signatures = {}
+            self._group_signatures = {}
+            self._admin_signatures = []
+            for user_luid in self.users:
+                signature = (frozenset(self.user_groups.get(user_luid, ())), self.users[user_luid])
+                if signature not in self._signatures:
+                    self._signatures[signature] = []
+                    for group_luid in signature[0]:
+                        self._group_signatures.setdefault(group_luid, []).append(signature)
+                    if signature[1] in self.admin_site_roles:
+                        self._admin_signatures.append(signature)
+                self._signatures[signature].append(user_luid)
+                self._user_signatures[user_luid] = signature
+            self.log('{} users fall into {} distinct group / site role combinations'.format(
+                len(self.users), len(self._signatures)))
+        return self._signatures
+
+    # signature : [allow, deny] from the group permissions, for just the signatures that include one of the groups
+    def _get_group_masks_by_signature(self, grants: Dict[Tuple[str, str], List[int]]) -> Dict[Tuple, List[int]]:
+        self._get_signatures()
+        signature_masks = {}
+        for (grantee_type, grantee_luid), masks in grants.items():
+            if grantee_type != 'group':
+                continue
+            for signature in self._group_signatures.get(grantee_luid, ()):
+                if signature in signature_masks:
+                    signature_masks[signature][0] |= masks[0]
+                    signature_masks[signature][1] |= masks[1]
+                else:
+                    signature_masks[signature] = [masks[0], masks[1]]
+        return signature_masks
+
+    # (signatures that are project leaders, users who are leaders, users who are explicitly not) for a project
+    # and everything above it
+    def _get_project_leaders(self, project_luid: Optional[str]) -> Tuple[Set, Set, Set]:
+        if project_luid is None:
+            return set(), set(), set()
+        if project_luid in self._leader_cache:
+            return self._leader_cache[project_luid]
+        # Stops a parent loop in bad data from recursing forever
+        self._leader_cache[project_luid] = (set(), set(), set())
+        parent_luid = self.projects.get(project_luid, (None, None))[0]
+        parent_signatures, parent_users, parent_not_users = self._get_project_leaders(parent_luid)
+        leader_signatures = set(parent_signatures)
+        leader_users = set(parent_users)
+        not_leader_users = set(parent_not_users)
+
+        leader_bit = Permissions.capability_bits['ProjectLeader']
+        grants = self.get_controlling_grants('project', project_luid)
+        signature_masks = self._get_group_masks_by_signature(grants)
+        for signature in signature_masks:
+            if signature_masks[signature][0] & ~signature_masks[signature][1] & leader_bit:
+                leader_signatures.add(signature)
+        for (grantee_type, grantee_luid), masks in grants.items():
+            if grantee_type == 'user':
+                if masks[0] & leader_bit:
+                    leader_users.add(grantee_luid)
+                elif masks[1] & leader_bit:
+                    not_leader_users.add(grantee_luid)
+        self._leader_cache[project_luid] = (leader_signatures, leader_users, not_leader_users)
+        return self._leader_cache[project_luid]
+
+    def _cap_by_site_role(self, site_role: Optional[str], mask: int) -> int:
+        if site_role in self.site_role_masks:
+            return mask & self.site_role_masks[site_role]
+        return mask
+
+    def _get_user_mask(self, user_luid: str, content_type: str, content_luid: str,
+                       grants: Dict[Tuple[str, str], List[int]], project_luid: Optional[str],
+                       owner_luid: Optional[str]) -> int:
+        site_role = self.users.get(user_luid)
+        full_mask = self.full_masks[content_type]
+        if site_role in self.admin_site_roles:
+            return full_mask
+        if owner_luid is not None and owner_luid == user_luid:
+            return self._cap_by_site_role(site_role, full_mask)
+        leader_signatures, leader_users, not_leader_users = self._get_project_leaders(project_luid)
+        signature = self._user_signatures.get(user_luid)
+        if user_luid in leader_users or (signature in leader_signatures and user_luid not in not_leader_users):
+            return self._cap_by_site_role(site_role, full_mask)
+        group_allow = 0
+        group_deny = 0
+        for group_luid in self.user_groups.get(user_luid, ()):
+            masks = grants.get(('group', group_luid))
+            if masks is not None:
+                group_allow |= masks[0]
+                group_deny |= masks[1]
+        mask = self._combine(grants.get(('user', user_luid)), group_allow, group_deny)
+        return self._cap_by_site_role(site_role, mask & full_mask)
+
+    # The leader checks for a project item start from the project itself; for anything else, from its project
+    def _get_leader_project(self, content_type: str, content_luid: str, project_luid: Optional[str]) -> Optional[str]:
+        return content_luid if content_type == 'project' else project_luid
+
+    def get_effective_mask(self, user_luid: str, content_type: str, content_luid: str) -> int:
+        self._get_signatures()
+        project_luid, owner_luid = self.content[content_type].get(content_luid, (None, None))
+        grants = self.get_controlling_grants(content_type, content_luid)
+        return self._get_user_mask(user_luid, content_type, content_luid, grants,
+                                   self._get_leader_project(content_type, content_luid, project_luid), owner_luid)
+
+    # The capabilities the user is allowed on the item
+    def get_effective_capabilities(self, user_luid: str, content_type: str, content_luid: str) -> List[str]:
+        return Permissions.get_capability_names_from_mask(self.get_effective_mask(user_luid, content_type,
+                                                                                   content_luid))
+
+    #
+    # Matrices
+    #
+
+    # { user luid : mask } for every user with at least one capability on the item. The groups with permissions on the
+    # item are looked up in an index of which distinct combinations of groups and site role include them, so the work
+    # is per combination affected rather than per user, and items with the same group permissions share the result.
+    # Only the users with something individual (their own permissions, ownership, project leader) are done one by one
+    def get_item_masks(self, content_type: str, content_luid: str) -> Dict[str, int]:
+        signatures = self._get_signatures()
+        project_luid, owner_luid = self.content[content_type].get(content_luid, (None, None))
+        leader_project = self._get_leader_project(content_type, content_luid, project_luid)
+        grants = self.get_controlling_grants(content_type, content_luid)
+        leader_signatures, leader_users, not_leader_users = self._get_project_leaders(leader_project)
+
+        group_key = tuple(sorted([(g[1], masks[0], masks[1]) for g, masks in grants.items() if g[0] == 'group']))
+        cache_key = (content_type, leader_project, group_key)
+        if cache_key not in self._signature_masks_cache:
+            full_mask = self.full_masks[content_type]
+            signature_results = {}
+            for signature, masks in self._get_group_masks_by_signature(grants).items():
+                mask = self._cap_by_site_role(signature[1], masks[0] & ~masks[1] & full_mask)
+                if mask != 0:
+                    signature_results[signature] = mask
+            for signature in leader_signatures:
+                signature_results[signature] = self._cap_by_site_role(signature[1], full_mask)
+            for signature in self._admin_signatures:
+                signature_results[signature] = full_mask
+            self._signature_masks_cache[cache_key] = signature_results
+        signature_results = self._signature_masks_cache[cache_key]
+
+        individual_users = leader_users | not_leader_users
+        individual_users.update([g[1] for g in grants if g[0] == 'user'])
+        if owner_luid is not None:
+            individual_users.add(owner_luid)
+
+        results = {}
+        for signature, mask in signature_results.items():
+            for user_luid in signatures[signature]:
+                results[user_luid] = mask
+        for user_luid in individual_users:
+            if user_luid not in self.users:
+                continue
+            user_mask = self._get_user_mask(user_luid, content_type, content_luid, grants, leader_project, owner_luid)
+            if user_mask != 0:
+                results[user_luid] = user_mask
+            elif user_luid in results:
+                del results[user_luid]
+        return results
+
+    # (user luid, content luid, mask) for every user and item where the user has at least one capability. Pass
+    # content_luids to limit it to some items, and user_luids to limit the output to some users
+    def iterate_matrix(self, content_type: str, content_luids: Optional[Iterable[str]] = None,
+                       user_luids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str, int]]:
+        if content_luids is None:
+            content_luids = list(self.content[content_type].keys())
+        user_filter = set(user_luids) if user_luids is not None else None
+        for content_luid in content_luids:
+            item_masks = self.get_item_masks(content_type, content_luid)
+            for user_luid in item_masks:
+                if user_filter is None or user_luid in user_filter:
+                    yield user_luid, content_luid, item_masks[user_luid]
+
+    # The users allowed one capability (REST API or Server name) on an item
+    def who_can(self, capability: str, content_type: str, content_luid: str) -> Set[str]:
+        bit = Permissions.capability_bits[Permissions._get_rest_capability_name(capability)]
+        item_masks = self.get_item_masks(content_type, content_luid)
+        return set([user_luid for user_luid in item_masks if item_masks[user_luid] & bit])
+
+    # The items of one content type where a user is allowed a capability
+    def what_can(self, user_luid: str, capability: str, content_type: str) -> List[str]:
+        bit = Permissions.capability_bits[Permissions._get_rest_capability_name(capability)]
+        return [content_luid for content_luid in self.content[content_type]
+                if self.get_effective_mask(user_luid, content_type, content_luid) & bit]
@@ -0,0 +1,162 @@
+from typing import Union, Any, Optional, List, Dict, Tuple
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+
+
+# Rendered view images, PDFs and CSVs kept on disk, so the same render asked for again within its max age is read
+# from the file rather than the Server. Entries are keyed on the request itself: the view or workbook LUID, the
+# download type and every parameter (filters, resolution, page type and orientation), with the filters in a fixed
+# order. The site and signed-in user LUIDs are part of the key too, since row level security and user filters can
+# make the same request render differently for someone else. Each entry is a data file plus a small JSON file holding when it was stored and, optionally, the workbook's
+# updatedAt at the time, so an entry can be thrown out as soon as the workbook is republished.
+# When the files add up to more than max_size_mb, the least recently used entries are deleted
+class ExportCache(LoggingMethods):
+    def __init__(self, cache_directory: str, max_size_mb: float = 1024, default_max_age_minutes: float = 60,
+                 logger_obj: Optional[Logger] = None):
+        self.cache_directory = cache_directory
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        # Used when a request doesn't give its own max_age_minutes
+        self.default_max_age_minutes = default_max_age_minutes
+        self.logger = logger_obj
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if not os.path.isdir(cache_directory):
+            os.makedirs(cache_directory)
+        # key : (size, last used time), read from the directory so the cache can be shared between runs
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        for filename in os.listdir(cache_directory):
+            if filename.endswith('.data'):
+                stat = os.stat(os.path.join(cache_directory, filename))
+                self._entries[filename[:-5]] = (stat.st_size, stat.st_mtime)
+        self._total_size = sum([size for size, used in self._entries.values()])
+
+    # The site and user LUIDs plus the url ending (e.g. views/{luid}/image?vf_Region=East) with the parameters sorted
+    # and maxAge taken out, since two requests that only differ in how old a render they accept still want the same
+    # image
+    @staticmethod
+    def get_key(url_ending: str, site_luid: Optional[str] = None, user_luid: Optional[str] = None) -> str:
+        parts = urlsplit(url_ending)
+        params = sorted([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'maxAge'])
+        normalized = "{}/{}/{}?{}".format(site_luid, user_luid, parts.path.strip('/'), urlencode(params))
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def _get_paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_directory, key)
+        return "{}.data".format(base), "{}.json".format(base)
+
+    # Returns the filename of the cached render, or None if there isn't a usable one. version is the workbook's
+    # current updatedAt, when checking it
+    def get_filename(self, url_ending: str, max_age_minutes: Optional[float] = None, version: Optional[str] = None,
+                     site_luid: Optional[str] = None, user_luid: Optional[str] = None) -> Optional[str]:
+        key = self.get_key(url_ending, site_luid, user_luid)
+        data_filename, meta_filename = self._get_paths(key)
+        if max_age_minutes is None:
+            max_age_minutes = self.default_max_age_minutes
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with open(meta_filename, 'r', encoding='utf-8') as meta_file:
+                    meta = json.load(meta_file)
+            except (IOError, ValueError):
+                self._remove(key)
+                self.misses += 1
+                return None
+            expired = time.time() - meta['stored_at'] > max_age_minutes * 60
+            outdated = version is not None and meta.get('version') != version
+            if expired or outdated:
+                self._remove(key)
+                self.misses += 1
+                return None
+            # Marks it as recently used for the eviction
+            now = time.time()
+            os.utime(data_filename, (now, now))
+            self._entries[key] = (self._entries[key][0], now)
+            self.hits += 1
+            return data_filename
+
+    def get_bytes(self, url_ending: str, max_age_minutes: Optional[float] = None, version: Optional[str] = None,
+                  site_luid: Optional[str] = None, user_luid: Optional[str] = None) -> Optional[bytes]:
+        filename = self.get_filename(url_ending, max_age_minutes=max_age_minutes, version=version,
+                                     site_luid=site_luid, user_luid=user_luid)
+        if filename is None:
+            return None
+        try:
+            with open(filename, 'rb') as data_file:
+                return data_file.read()
+        except IOError:
+            # Evicted by another thread between the lookup and the read
+            return None
+
+    # Copies a downloaded file into the cache
+    def put_file(self, url_ending: str, filename: str, version: Optional[str] = None,
+                 site_luid: Optional[str] = None, user_luid: Optional[str] = None):
+        key = self.get_key(url_ending, site_luid, user_luid)
+        data_filename, meta_filename = self._get_paths(key)
+        part_filename = "{}.{}.part".format(data_filename, threading.get_ident())
+        shutil.copyfile(filename, part_filename)
+        self._store(key, url_ending, part_filename, version)
+
+    def put_bytes(self, url_ending: str, data: bytes, version: Optional[str] = None,
+                  site_luid: Optional[str] = None, user_luid: Optional[str] = None):
+        key = self.get_key(url_ending, site_luid, user_luid)
+        data_filename, meta_filename = self._get_paths(key)
+        part_filename = "{}.{}.part".format(data_filename, threading.get_ident())
+        with open(part_filename, 'wb') as part_file:
+            part_file.write(data)
+        self._store(key, url_ending, part_filename, version)
+
+    def _store(self, key: str, url_ending: str, part_filename: str, version: Optional[str]):
+        data_filename, meta_filename = self._get_paths(key)
+        size = os.path.getsize(part_filename)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            with open(meta_filename, 'w', encoding='utf-8') as meta_file:
+                json.dump({'url_ending': url_ending, 'stored_at': time.time(), 'size': size, 'version': version},
+                          meta_file)
+            os.replace(part_filename, data_filename)
+            self._entries[key] = (size, time.time())
+            self._total_size += size
+            self._evict()
+
+    def _remove(self, key: str):
+        size, used = self._entries.pop(key)
+        self._total_size -= size
+        for filename in self._get_paths(key):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _evict(self):
+        if self._total_size <= self.max_size_bytes:
+            return
+        evicted = 0
+        for key, (size, used) in sorted(self._entries.items(), key=lambda e: e[1][1]):
+            if self._total_size <= self.max_size_bytes:
+                break
+            self._remove(key)
+            evicted += 1
+        self.log('Evicted {} cached exports to stay under {} bytes'.format(evicted, self.max_size_bytes))
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries.keys()):
+                self._remove(key)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._total_size
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,143 @@
+from typing import Union, Any, Optional, List, Dict
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from tableau_tools.tableau_rest_xml import TableauRestXml
+from .records import *
+
+
+# Every extract refresh task on the site, listed once and indexed by task, workbook, datasource and schedule LUID.
+# The tasks listing has no filters, so without this each lookup for a single workbook downloads the whole thing.
+# The catalog is only listed again when refresh() is called, or on the next lookup once it is older than
+# max_age_seconds. Methods that create or remove tasks through tableau_tools keep it current themselves
+class ExtractRefreshTaskCatalog(LoggingMethods):
+    def __init__(self, t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'],
+                 max_age_seconds: Optional[float] = None, logger_obj: Optional[Logger] = None):
+        self.t_rest_api = t_rest_api
+        self.logger = logger_obj
+        self.max_age_seconds = max_age_seconds
+        # task luid : ExtractRefreshTaskRecord
+        self.tasks: Dict[str, ExtractRefreshTaskRecord] = {}
+        # task luid : the <extractRefresh> element, for the methods that have always returned XML
+        self.task_elements: Dict[str, ET.Element] = {}
+        # workbook / datasource / schedule luid : [ task luids ]
+        self._by_workbook: Dict[str, List[str]] = {}
+        self._by_datasource: Dict[str, List[str]] = {}
+        self._by_schedule: Dict[str, List[str]] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        with self._lock:
+            self.start_log_block()
+            response = self.t_rest_api.query_resource('tasks/extractRefreshes')
+            self.tasks = {}
+            self.task_elements = {}
+            self._by_workbook = {}
+            self._by_datasource = {}
+            self._by_schedule = {}
+            for element in response.findall('.//t:extractRefresh', TableauRestXml.ns_map):
+                self._index(element)
+            self._fetched_at = time.monotonic()
+            self.log('Indexed {} extract refresh tasks'.format(len(self.tasks)))
+            self.end_log_block()
+
+    def _index(self, element: ET.Element, schedule_luid: Optional[str] = None) -> ExtractRefreshTaskRecord:
+        record = ExtractRefreshTaskRecord.from_element(element)
+        if record.schedule_luid is None and schedule_luid is not None:
+            record = record._replace(schedule_luid=schedule_luid)
+        if record.luid in self.tasks:
+            self._unindex(record.luid)
+        self.tasks[record.luid] = record
+        self.task_elements[record.luid] = element
+        for index, luid in ((self._by_workbook, record.workbook_luid), (self._by_datasource, record.datasource_luid),
+                            (self._by_schedule, record.schedule_luid)):
+            if luid is not None:
+                index.setdefault(luid, []).append(record.luid)
+        return record
+
+    def _unindex(self, task_luid: str):
+        record = self.tasks.pop(task_luid)
+        del self.task_elements[task_luid]
+        for index, luid in ((self._by_workbook, record.workbook_luid), (self._by_datasource, record.datasource_luid),
+                            (self._by_schedule, record.schedule_luid)):
+            if luid is not None and luid in index:
+                index[luid].remove(task_luid)
+                if len(index[luid]) == 0:
+                    del index[luid]
+
+    def _ensure_fresh(self):
+        with self._lock:
+            if self._fetched_at is None:
+                self.refresh()
+            elif self.max_age_seconds is not None and time.monotonic() - self._fetched_at > self.max_age_seconds:
+                self.refresh()
+
+    # Records a task that was just created, from the <extractRefresh> (or a response containing it). The schedule
+    # LUID is needed when the element doesn't say which schedule it is on. If there is no task in it, the whole
+    # catalog is listed again on the next lookup instead
+    def add_task_element(self, element: ET.Element,
+                         schedule_luid: Optional[str] = None) -> Optional[ExtractRefreshTaskRecord]:
+        if not element.tag.endswith('extractRefresh'):
+            element = element.find('.//t:extractRefresh', TableauRestXml.ns_map)
+        with self._lock:
+            if element is None:
+                self._fetched_at = None
+                return None
+            self._ensure_fresh()
+            return self._index(element, schedule_luid)
+
+    def remove_task(self, task_luid: str):
+        with self._lock:
+            if task_luid in self.tasks:
+                self._unindex(task_luid)
+
+    # Deleting a workbook, datasource or schedule deletes its tasks along with it. Nothing is listed for this, since
+    # a catalog that hasn't been listed yet has nothing to forget
+    def _remove_tasks(self, index_name: str, luid: str):
+        with self._lock:
+            for task_luid in list(getattr(self, index_name).get(luid, [])):
+                self._unindex(task_luid)
+
+    def remove_tasks_for_workbook(self, wb_luid: str):
+        self._remove_tasks('_by_workbook', wb_luid)
+
+    def remove_tasks_for_datasource(self, ds_luid: str):
+        self._remove_tasks('_by_datasource', ds_luid)
+
+    def remove_tasks_for_schedule(self, schedule_luid: str):
+        self._remove_tasks('_by_schedule', schedule_luid)
+
+    def get_task(self, task_luid: str) -> ExtractRefreshTaskRecord:
+        with self._lock:
+            self._ensure_fresh()
+            if task_luid not in self.tasks:
+                raise NoMatchFoundException('No extract refresh task found with LUID {}'.format(task_luid))
+            return self.tasks[task_luid]
+
+    # index_name is the attribute, since refresh() replaces the dicts themselves
+    def _get_tasks(self, index_name: str, luid: str) -> List[ExtractRefreshTaskRecord]:
+        with self._lock:
+            self._ensure_fresh()
+            return [self.tasks[task_luid] for task_luid in getattr(self, index_name).get(luid, [])]
+
+    def get_tasks_for_workbook(self, wb_luid: str) -> List[ExtractRefreshTaskRecord]:
+        return self._get_tasks('_by_workbook', wb_luid)
+
+    def get_tasks_for_datasource(self, ds_luid: str) -> List[ExtractRefreshTaskRecord]:
+        return self._get_tasks('_by_datasource', ds_luid)
+
+    def get_tasks_for_schedule(self, schedule_luid: str) -> List[ExtractRefreshTaskRecord]:
+        return self._get_tasks('_by_schedule', schedule_luid)
+
+    def get_task_elements(self, tasks: List[ExtractRefreshTaskRecord]) -> List[ET.Element]:
+        with self._lock:
+            return [self.task_elements[task.luid] for task in tasks]
+
+    def __len__(self):
+        self._ensure_fresh()
+        return len(self.tasks)
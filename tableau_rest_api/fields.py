@@ -0,0 +1,68 @@
+from ..tableau_exceptions import *
+from ..tableau_rest_xml import TableauRestXml
+from typing import Union, Optional, List, Dict, Tuple
+
+# Named sets of fields to request, so that listings only bring back what is needed. Any method with a fields
+# parameter takes either a list of field names (as before) or one of the preset names:
+#   'minimal'   : id and name only. Used internally by the LUID lookups
+#   'ownership' : who owns the content and where it lives
+#   'usage'     : view counts and login information
+#   'full'      : everything, the same as ['_all_']
+# A preset that has nothing for a content type (and no '_default') leaves the fields parameter off, so the
+# server's default fields come back
+# https://onlinehelp.tableau.com/current/api/rest_api/en-us/help.htm#REST/rest_api_concepts_fields.htm
+class Fields:
+    # preset : { content_type : [fields] }. The '_default' key applies to any content type not listed
+    presets = {
+        'minimal': {
+            '_default': ['id', 'name']
+        },
+        'ownership': {
+            'workbook': ['id', 'name', 'contentUrl', 'project.id', 'project.name', 'owner.id', 'owner.name'],
+            'datasource': ['id', 'name', 'contentUrl', 'project.id', 'project.name', 'owner.id', 'owner.name'],
+            'view': ['id', 'name', 'contentUrl', 'workbook.id', 'project.id', 'project.name', 'owner.id',
+                     'owner.name'],
+            'flow': ['id', 'name', 'project.id', 'project.name', 'owner.id', 'owner.name'],
+            'project': ['id', 'name', 'parentProjectId', 'owner.id', 'owner.name']
+        },
+        'usage': {
+            'view': ['id', 'name', 'workbook.id', 'usage.totalViewCount'],
+            'user': ['id', 'name', 'siteRole', 'lastLogin']
+        },
+        'full': {
+            '_default': ['_all_']
+        }
+    }
+
+    @staticmethod
+    def get_preset_fields(preset: str, content_type: str) -> Optional[List[str]]:
+        if preset not in Fields.presets:
+            raise InvalidOptionException("'{}' is not a fields preset. Use one of {}".format(
+                preset, ", ".join(Fields.presets.keys())))
+        preset_fields = Fields.presets[preset]
+        if content_type in preset_fields:
+            return list(preset_fields[content_type])
+        elif '_default' in preset_fields:
+            return list(preset_fields['_default'])
+        else:
+            return None
+
+    # The last resource segment, skipping LUIDs: 'users' -> 'user', 'groups/{luid}/users?...' -> 'user',
+    # 'workbooks/{luid}/views' -> 'view', 'workbooks/{luid}' -> 'workbook'
+    @staticmethod
+    def content_type_from_url_ending(url_ending: str) -> str:
+        segments = [segment for segment in url_ending.split('?')[0].strip('/').split('/')
+                    if segment != '' and not TableauRestXml.is_luid(segment)]
+        if len(segments) == 0:
+            return ''
+        endpoint = segments[-1]
+        if endpoint.endswith('s'):
+            endpoint = endpoint[:-1]
+        return endpoint
+
+    # Lets every method pass its fields argument straight through, whether it is a list or a preset name
+    @staticmethod
+    def resolve(url_ending: str, fields: Optional[Union[List[str], str]]) -> Optional[List[str]]:
+        if isinstance(fields, str):
+            return Fields.get_preset_fields(fields, Fields.content_type_from_url_ending(url_ending))
+        return fields
@@ -0,0 +1,206 @@
+from typing import Union, Any, Optional, List, Dict, Tuple, Iterable
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from tableau_tools.tableau_rest_xml import TableauRestXml
+from .records import *
+
+
+# What GroupMembershipSync did (or with a dry run, would do) to one group
+#   added / removed : [ user luids ]
+#   unresolved      : the desired users that don't exist on the site
+#   failed          : [ (user luid, 'add' / 'remove', http_code) ], http_code is None when a remove failed, since
+#                     the delete only reports that it didn't go through
+class GroupSyncResult:
+    def __init__(self, group_luid: str, group_name: Optional[str], dry_run: bool = False):
+        self.group_luid = group_luid
+        self.group_name = group_name
+        self.dry_run = dry_run
+        self.added: List[str] = []
+        self.removed: List[str] = []
+        self.unchanged = 0
+        self.unresolved: List[str] = []
+        self.failed: List[Tuple[str, str, Optional[int]]] = []
+        self.elapsed_seconds = 0.0
+
+    def describe(self) -> List[str]:
+        lines = ['Group {} ({}): {} added, {} removed, {} unchanged, {} not found, {} failed{}'.format(
+            self.group_name, self.group_luid, len(self.added), len(self.removed), self.unchanged,
+            len(self.unresolved), len(self.failed), ' (dry run)' if self.dry_run else '')]
+        for name in self.unresolved:
+            lines.append('NOT FOUND {}'.format(name))
+        for user_luid, action, http_code in self.failed:
+            if http_code is None:
+                lines.append('FAILED {} {}'.format(action, user_luid))
+            else:
+                lines.append('FAILED {} {}: HTTP {}'.format(action, user_luid, http_code))
+        return lines
+
+    def __str__(self):
+        return "\n".join(self.describe())
+
+
+# Makes group memberships match a desired list of users, sending only the differences. The site's users and groups
+# are listed once (so names are looked up in memory), the current members of every group in the job are listed at
+# the same time, and then all of the adds and removes, for every group, go through one pool of max_workers threads.
+# Build one per job and reuse it for as many groups as needed
+class GroupMembershipSync(LoggingMethods):
+    def __init__(self, t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'],
+                 logger_obj: Optional[Logger] = None, max_workers: int = 8, page_size: int = 1000):
+        self.t_rest_api = t_rest_api
+        self.logger = logger_obj
+        self.max_workers = max_workers
+        self.page_size = page_size
+        # name : luid
+        self.user_luids: Dict[str, str] = {}
+        self.group_luids: Dict[str, str] = {}
+        # luid : name
+        self.group_names: Dict[str, str] = {}
+        # Seconds spent on each part of the last job: 'prefetch', 'members', 'changes'
+        self.timings: Dict[str, float] = {}
+        self._prefetched = False
+        self._lock = threading.Lock()
+
+    def prefetch(self):
+        with self._lock:
+            if self._prefetched is True:
+                return
+            self.start_log_block()
+            start_time = time.time()
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                users = executor.submit(self.t_rest_api.query_resource_records, 'users', UserRecord,
+                                        page_size=self.page_size, max_workers=2)
+                groups = executor.submit(self.t_rest_api.query_resource_records, 'groups', GroupRecord,
+                                         page_size=self.page_size, max_workers=2)
+                for user in users.result():
+                    self.user_luids[user.name] = user.luid
+                for group in groups.result():
+                    self.group_luids[group.name] = group.luid
+                    self.group_names[group.luid] = group.name
+            self.timings['prefetch'] = time.time() - start_time
+            self.log('Listed {} users and {} groups'.format(len(self.user_luids), len(self.group_luids)))
+            self._prefetched = True
+            self.end_log_block()
+
+    def _resolve_group(self, group_name_or_luid: str) -> str:
+        if TableauRestXml.is_luid(group_name_or_luid):
+            return group_name_or_luid
+        if group_name_or_luid not in self.group_luids:
+            raise NoMatchFoundException('No group found with name {}'.format(group_name_or_luid))
+        return self.group_luids[group_name_or_luid]
+
+    def _fetch_member_luids(self, group_luid: str) -> List[str]:
+        member_luids = []
+        for page in self.t_rest_api.query_resource_pages("groups/{}/users".format(group_luid), fields=['id'],
+                                                         page_size=self.page_size, max_workers=1):
+            for element in page:
+                member_luids.append(element.get('id'))
+        return member_luids
+
+    # Both return whether the change went through
+    def _add_member(self, group_luid: str, user_luid: str) -> bool:
+        tsr = ET.Element("tsRequest")
+        u = ET.Element("user")
+        u.set("id", user_luid)
+        tsr.append(u)
+        url = self.t_rest_api.build_api_url("groups/{}/users".format(group_luid))
+        try:
+            self.t_rest_api.send_add_request_in_thread(url, tsr)
+        except RecoverableHTTPException as e:
+            # 409 means they were already in the group, which is where they should be
+            if e.http_code != 409:
+                raise
+        return True
+
+    def _remove_member(self, group_luid: str, user_luid: str) -> bool:
+        url = self.t_rest_api.build_api_url("groups/{}/users/{}".format(group_luid, user_luid))
+        # Not found (0) means they are already out of the group; a refused DELETE raises
+        self.t_rest_api.send_delete_request_in_thread(url)
+        return True
+
+    # desired_memberships is { group name or luid : [ usernames or user luids ] }. With remove_others=False, members
+    # who aren't in the desired list are left in the group. Returns { group luid : GroupSyncResult }
+    def sync_groups(self, desired_memberships: Dict[str, Iterable[str]], remove_others: bool = True,
+                    dry_run: bool = False) -> Dict[str, GroupSyncResult]:
+        self.start_log_block()
+        job_start_time = time.time()
+        self.prefetch()
+
+        desired = {}
+        results: Dict[str, GroupSyncResult] = {}
+        for group_name_or_luid in desired_memberships:
+            group_luid = self._resolve_group(group_name_or_luid)
+            group_name = self.group_names.get(group_luid)
+            if group_name == 'All Users':
+                raise InvalidOptionException('Membership of the All Users group cannot be synced')
+            result = GroupSyncResult(group_luid, group_name, dry_run=dry_run)
+            user_luids = set()
+            for user in desired_memberships[group_name_or_luid]:
+                if TableauRestXml.is_luid(user):
+                    user_luids.add(user)
+                elif user in self.user_luids:
+                    user_luids.add(self.user_luids[user])
+                else:
+                    result.unresolved.append(user)
+            desired[group_luid] = user_luids
+            results[group_luid] = result
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            members = {}
+            for group_luid in desired:
+                members[group_luid] = executor.submit(self._fetch_member_luids, group_luid)
+            changes = []
+            for group_luid in desired:
+                current = set(members[group_luid].result())
+                result = results[group_luid]
+                result.added = sorted(desired[group_luid] - current)
+                if remove_others is True:
+                    result.removed = sorted(current - desired[group_luid])
+                result.unchanged = len(current & desired[group_luid])
+                for user_luid in result.added:
+                    changes.append((group_luid, user_luid, 'add'))
+                for user_luid in result.removed:
+                    changes.append((group_luid, user_luid, 'remove'))
+            self.timings['members'] = time.time() - start_time
+            self.log('{} groups need {} changes'.format(len(desired), len(changes)))
+
+            start_time = time.time()
+            if dry_run is False:
+                futures = []
+                for group_luid, user_luid, action in changes:
+                    method = self._add_member if action == 'add' else self._remove_member
+                    futures.append((group_luid, user_luid, action, executor.submit(method, group_luid, user_luid)))
+                for group_luid, user_luid, action, future in futures:
+                    http_code = None
+                    try:
+                        succeeded = future.result()
+                    except RecoverableHTTPException as e:
+                        succeeded = False
+                        http_code = e.http_code
+                    if succeeded is False:
+                        result = results[group_luid]
+                        result.failed.append((user_luid, action, http_code))
+                        if action == 'add':
+                            result.added.remove(user_luid)
+                        else:
+                            result.removed.remove(user_luid)
+            self.timings['changes'] = time.time() - start_time
+
+        for result in results.values():
+            result.elapsed_seconds = time.time() - job_start_time
+            for line in result.describe():
+                self.log(line)
+        self.end_log_block()
+        return results
+
+    def sync_group_membership(self, group_name_or_luid: str, desired_users: Iterable[str],
+                              remove_others: bool = True, dry_run: bool = False) -> GroupSyncResult:
+        results = self.sync_groups({group_name_or_luid: desired_users}, remove_others=remove_others,
+                                   dry_run=dry_run)
+        return results[self._resolve_group(group_name_or_luid)]
@@ -0,0 +1,279 @@
+from typing import Union, Any, Optional, List, Dict, Tuple, Iterable, Iterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import datetime
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from tableau_tools.tableau_rest_xml import TableauRestXml
+from .records import *
+from .url_filter import UrlFilter
+
+
+# The last known state of one job registered with a JobTracker
+class TrackedJob:
+    # The jobs/{id} response has a finishCode rather than a status
+    finish_codes = {'0': 'Success', '1': 'Failed', '2': 'Cancelled'}
+    complete_statuses = ('Success', 'Failed', 'Cancelled')
+
+    def __init__(self, luid: str, label: Optional[str] = None, created_at: Optional[str] = None):
+        self.luid = luid
+        # Anything that identifies the job to the caller, e.g. the workbook being refreshed
+        self.label = label
+        self.job_type: Optional[str] = None
+        # 'Pending', 'InProgress', 'Success', 'Failed' or 'Cancelled'
+        self.status = 'Pending'
+        self.progress: Optional[str] = None
+        self.created_at = created_at
+        self.started_at: Optional[str] = None
+        self.ended_at: Optional[str] = None
+        self.callbacks: List[Callable[['TrackedJob'], Any]] = []
+
+    @property
+    def is_complete(self) -> bool:
+        return self.status in self.complete_statuses
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status == 'Success'
+
+    # Seconds from starting to finishing, once both are known
+    @property
+    def duration_seconds(self) -> Optional[float]:
+        if self.started_at is None or self.ended_at is None:
+            return None
+        started = datetime.datetime.strptime(self.started_at[:19], '%Y-%m-%dT%H:%M:%S')
+        ended = datetime.datetime.strptime(self.ended_at[:19], '%Y-%m-%dT%H:%M:%S')
+        return (ended - started).total_seconds()
+
+    # Returns True if anything changed
+    def _update_from_record(self, record: JobRecord) -> bool:
+        before = (self.status, self.progress)
+        if record.status is not None:
+            self.status = record.status
+        self.job_type = record.job_type if record.job_type is not None else self.job_type
+        self.progress = record.progress
+        self.created_at = record.created_at if record.created_at is not None else self.created_at
+        self.started_at = record.started_at if record.started_at is not None else self.started_at
+        self.ended_at = record.ended_at if record.ended_at is not None else self.ended_at
+        return before != (self.status, self.progress)
+
+    def _update_from_job_element(self, job: ET.Element) -> bool:
+        before = (self.status, self.progress)
+        self.job_type = job.get('type', self.job_type)
+        self.progress = job.get('progress', self.progress)
+        self.created_at = job.get('createdAt', self.created_at)
+        self.started_at = job.get('startedAt', self.started_at)
+        if job.get('finishCode') is not None and job.get('completedAt') is not None:
+            self.status = self.finish_codes.get(job.get('finishCode'), 'Failed')
+            self.ended_at = job.get('completedAt')
+        elif self.started_at is not None:
+            self.status = 'InProgress'
+        return before != (self.status, self.progress)
+
+    def __repr__(self):
+        return 'TrackedJob({}, {}, {}, progress={})'.format(self.luid, self.label, self.status, self.progress)
+
+
+# Watches any number of background jobs (extract refreshes, AD group syncs, etc.) with as few requests as possible.
+# Each poll is a single listing of the jobs endpoint, filtered to those created since the earliest job being tracked,
+# and any job the listing doesn't cover (or every job, before API 3.1) is requested on its own, a few at a time.
+# The time between polls starts at min_interval, grows by backoff_factor each time nothing changes, up to
+# max_interval, and drops back to min_interval whenever a job moves on
+class JobTracker(LoggingMethods):
+    clock_skew_seconds = 300
+
+    def __init__(self, t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'],
+                 logger_obj: Optional[Logger] = None, min_interval: float = 2.0, max_interval: float = 60.0,
+                 backoff_factor: float = 1.5, max_workers: int = 4):
+        self.t_rest_api = t_rest_api
+        self.logger = logger_obj
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.max_workers = max_workers
+        self.interval = min_interval
+        # job luid : TrackedJob
+        self.jobs: Dict[str, TrackedJob] = {}
+        # Requests made by poll(), to see how much the batching saves
+        self.request_count = 0
+        self._lock = threading.RLock()
+
+    #
+    # Registering
+    #
+
+    # job can be a job LUID or the response from a method that starts a job (e.g. update_workbook_now())
+    def register(self, job: Union[str, ET.Element], label: Optional[str] = None,
+                 callback: Optional[Callable[[TrackedJob], Any]] = None) -> TrackedJob:
+        created_at = None
+        if isinstance(job, ET.Element):
+            job_elements = job.findall('.//t:job', TableauRestXml.ns_map)
+            if job.tag.endswith('job'):
+                job_elements.insert(0, job)
+            if len(job_elements) == 0:
+                raise InvalidOptionException('No job found in the response')
+            created_at = job_elements[0].get('createdAt')
+            job = job_elements[0].get('id')
+        with self._lock:
+            if job not in self.jobs:
+                if created_at is None:
+                    # Only the LUID is known, so allow for the Server's clock being a little ahead of this one
+                    created_at = (datetime.datetime.utcnow() - datetime.timedelta(seconds=self.clock_skew_seconds)
+                                  ).strftime('%Y-%m-%dT%H:%M:%SZ')
+                self.jobs[job] = TrackedJob(job, label, created_at)
+            tracked_job = self.jobs[job]
+            if callback is not None:
+                tracked_job.callbacks.append(callback)
+        # Already finished, so the callback won't be called by a poll
+        if callback is not None and tracked_job.is_complete:
+            callback(tracked_job)
+        return tracked_job
+
+    def register_many(self, jobs: Iterable[Union[str, ET.Element]],
+                      callback: Optional[Callable[[TrackedJob], Any]] = None) -> List[TrackedJob]:
+        return [self.register(job, callback=callback) for job in jobs]
+
+    def get_pending(self) -> List[TrackedJob]:
+        with self._lock:
+            return [job for job in self.jobs.values() if not job.is_complete]
+
+    #
+    # Polling
+    #
+
+    def _supports_job_listing(self) -> bool:
+        # The jobs listing arrived in API 3.1
+        return tuple([int(p) for p in self.t_rest_api.api_version.split('.')]) >= (3, 1)
+
+    def _query_single_job(self, job_luid: str) -> Optional[ET.Element]:
+        try:
+            response = self.t_rest_api.query_resource_in_thread("jobs/{}".format(job_luid))
+        except RecoverableHTTPException as e:
+            self.log('Could not read job {}, HTTP {}'.format(job_luid, e.http_code))
+            return None
+        jobs = response.findall('.//t:job', TableauRestXml.ns_map)
+        return jobs[0] if len(jobs) > 0 else None
+
+    # Checks every pending job once and returns the ones that completed. Callbacks are called from here
+    def poll(self) -> List[TrackedJob]:
+        pending = self.get_pending()
+        if len(pending) == 0:
+            return []
+        changed = False
+        unseen = pending
+        if self._supports_job_listing():
+            # Every job created at or after the earliest pending one, in one listing
+            earliest = min([job.created_at for job in pending])
+            records = self.t_rest_api.query_resource_records(
+                'jobs', JobRecord, filters=[UrlFilter.get_created_at_filter('gte', earliest)], max_workers=2)
+            self.request_count += 1
+            listed = {}
+            for record in records:
+                listed[record.luid] = record
+            unseen = []
+            for job in pending:
+                if job.luid in listed:
+                    changed = job._update_from_record(listed[job.luid]) or changed
+                else:
+                    unseen.append(job)
+
+        if len(unseen) > 0:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                responses = list(executor.map(self._query_single_job, [job.luid for job in unseen]))
+            self.request_count += len(unseen)
+            for job, response in zip(unseen, responses):
+                if response is not None:
+                    changed = job._update_from_job_element(response) or changed
+
+        completed = [job for job in pending if job.is_complete]
+        if changed is True:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff_factor, self.max_interval)
+        if len(completed) > 0:
+            self.log('{} jobs completed, {} still running'.format(len(completed), len(pending) - len(completed)))
+        for job in completed:
+            for callback in job.callbacks:
+                callback(job)
+        return completed
+
+    #
+    # Waiting
+    #
+
+    def _get_jobs(self, job_luids: Optional[Iterable[str]]) -> List[TrackedJob]:
+        with self._lock:
+            if job_luids is None:
+                return list(self.jobs.values())
+            return [self.jobs[job_luid] for job_luid in job_luids]
+
+    # Yields each job as it completes. With a timeout (in seconds), stops when it runs out
+    def as_completed(self, job_luids: Optional[Iterable[str]] = None,
+                     timeout: Optional[float] = None) -> Iterator[TrackedJob]:
+        jobs = self._get_jobs(job_luids)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        yielded = set()
+        while True:
+            for job in jobs:
+                if job.is_complete and job.luid not in yielded:
+                    yielded.add(job.luid)
+                    yield job
+            if len(yielded) == len(jobs):
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            wait_time = self.interval
+            if deadline is not None:
+                wait_time = min(wait_time, max(deadline - time.monotonic(), 0))
+            time.sleep(wait_time)
+            self.poll()
+
+    # Blocks until at least one of the jobs is complete, then returns all of them that are. Returns whatever is
+    # complete (possibly nothing) if the timeout runs out first
+    def wait_any(self, job_luids: Optional[Iterable[str]] = None, timeout: Optional[float] = None) -> List[TrackedJob]:
+        jobs = self._get_jobs(job_luids)
+        for job in self.as_completed([job.luid for job in jobs], timeout=timeout):
+            break
+        return [job for job in jobs if job.is_complete]
+
+    # Blocks until all of the jobs are complete and returns them. Check is_complete if a timeout was given
+    def wait_all(self, job_luids: Optional[Iterable[str]] = None, timeout: Optional[float] = None) -> List[TrackedJob]:
+        jobs = self._get_jobs(job_luids)
+        for job in self.as_completed([job.luid for job in jobs], timeout=timeout):
+            pass
+        return jobs
+
+    # The same as wait_any() and wait_all(), for use in an asyncio event loop. The requests are made in the default
+    # executor, so the loop is never blocked
+    async def wait_any_async(self, job_luids: Optional[Iterable[str]] = None,
+                             timeout: Optional[float] = None) -> List[TrackedJob]:
+        return await self._wait_async(job_luids, timeout, wait_for_all=False)
+
+    async def wait_all_async(self, job_luids: Optional[Iterable[str]] = None,
+                             timeout: Optional[float] = None) -> List[TrackedJob]:
+        return await self._wait_async(job_luids, timeout, wait_for_all=True)
+
+    async def _wait_async(self, job_luids: Optional[Iterable[str]], timeout: Optional[float],
+                          wait_for_all: bool) -> List[TrackedJob]:
+        loop = asyncio.get_running_loop()
+        jobs = self._get_jobs(job_luids)
+        deadline = loop.time() + timeout if timeout is not None else None
+        while True:
+            complete = [job for job in jobs if job.is_complete]
+            if (wait_for_all is True and len(complete) == len(jobs)) or (wait_for_all is False and len(complete) > 0):
+                break
+            if deadline is not None and loop.time() >= deadline:
+                break
+            wait_time = self.interval
+            if deadline is not None:
+                wait_time = min(wait_time, max(deadline - loop.time(), 0))
+            await asyncio.sleep(wait_time)
+            await loop.run_in_executor(None, self.poll)
+        if wait_for_all is True:
+            return jobs
+        return [job for job in jobs if job.is_complete]
@@ -0,0 +1,349 @@
+from typing import Union, Any, Optional, List, Dict, Tuple, Iterable, NamedTuple
+from array import array
+from collections import deque
+import datetime
+import gzip
+import json
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from .metadata_pager import MetadataPager, MetadataSubQuery
+
+
+# One asset in a LineageGraph. node_id is the Metadata API id; luid is the REST API LUID, for the assets that have one
+class LineageNode(NamedTuple):
+    node_type: str
+    node_id: str
+    name: Optional[str]
+    luid: Optional[str]
+
+
+# Impact analysis without a Metadata API query per question. build() reads every database, table, column, published
+# and embedded data source, workbook and sheet in one set of concurrent, cursor-paged queries, and keeps only their
+# names and how they connect. Edges point the way the data flows:
+#   database -> table -> column -> data source -> (embedded data source ->) sheet -> workbook
+# so "which workbooks use this column" is a walk downstream and "where does this sheet's data come from" is a walk
+# upstream, both answered from memory. The edges are held as sorted arrays of node numbers (one set each way)
+# rather than objects, so a server's worth of columns stays small. save() / load() keep it between runs
+class LineageGraph(LoggingMethods):
+    node_types = ('database', 'table', 'column', 'datasource', 'embedded_datasource', 'workbook', 'sheet')
+
+    # key : (node type, query). Each query reads one connection, see MetadataPager
+    lineage_queries = {
+        'databases': ('database', '''query databases($first: Int, $after: String) {
+  databasesConnection(first: $first, after: $after) {
+    nodes { id luid name }
+    pageInfo { hasNextPage endCursor } } }'''),
+        'database_tables': ('table', '''query tables($first: Int, $after: String) {
+  databaseTablesConnection(first: $first, after: $after) {
+    nodes { id luid name database { id } }
+    pageInfo { hasNextPage endCursor } } }'''),
+        'custom_sql_tables': ('table', '''query customSqlTables($first: Int, $after: String) {
+  customSQLTablesConnection(first: $first, after: $after) {
+    nodes { id name database { id } }
+    pageInfo { hasNextPage endCursor } } }'''),
+        'columns': ('column', '''query columns($first: Int, $after: String) {
+  columnsConnection(first: $first, after: $after) {
+    nodes { id name table { id } }
+    pageInfo { hasNextPage endCursor } } }'''),
+        'published_datasources': ('datasource', '''query datasources($first: Int, $after: String) {
+  publishedDatasourcesConnection(first: $first, after: $after) {
+    nodes { id luid name upstreamTables { id } fields { upstreamColumns { id } } }
+    pageInfo { hasNextPage endCursor } } }'''),
+        'embedded_datasources': ('embedded_datasource', '''query embeddedDatasources($first: Int, $after: String) {
+  embeddedDatasourcesConnection(first: $first, after: $after) {
+    nodes { id name workbook { id } upstreamTables { id } upstreamDatasources { id }
+            fields { upstreamColumns { id } } }
+    pageInfo { hasNextPage endCursor } } }'''),
+        'workbooks': ('workbook', '''query workbooks($first: Int, $after: String) {
+  workbooksConnection(first: $first, after: $after) {
+    nodes { id luid name }
+    pageInfo { hasNextPage endCursor } } }'''),
+        'sheets': ('sheet', '''query sheets($first: Int, $after: String) {
+  sheetsConnection(first: $first, after: $after) {
+    nodes { id luid name workbook { id } upstreamDatasources { id } }
+    pageInfo { hasNextPage endCursor } } }''')
+    }
+
+    # Bump if the file layout changes, so that old files are rejected on load rather than misread
+    file_format_version = 1
+
+    def __init__(self, t_rest_api=None, logger_obj: Optional[Logger] = None):
+        self.t_rest_api = t_rest_api
+        self.logger = logger_obj
+        self.build_time: Optional[str] = None
+        self._clear()
+
+    def _clear(self):
+        # Node number : type (index into node_types), id, name, luid
+        self._types = array('b')
+        self._ids: List[str] = []
+        self._names: List[Optional[str]] = []
+        self._luids: List[Optional[str]] = []
+        # node id : node number
+        self._numbers: Dict[str, int] = {}
+        # (node type, name) : [ node numbers ], built on the first find()
+        self._name_index: Optional[Dict[Tuple[str, str], List[int]]] = None
+        # luid : node number, built on the first get_node_by_luid()
+        self._luid_index: Optional[Dict[str, int]] = None
+        # Edges while building, as parallel arrays of (from, to) node numbers
+        self._edge_from = array('l')
+        self._edge_to = array('l')
+        # Compressed adjacency: the neighbours of node n are targets[offsets[n]:offsets[n + 1]]
+        self._downstream_offsets = array('l', [0])
+        self._downstream_targets = array('l')
+        self._upstream_offsets = array('l', [0])
+        self._upstream_targets = array('l')
+
+    #
+    # Building
+    #
+
+    # Node ids seen only in another node's edges (e.g. a table in a database that isn't visible) get a node with no
+    # name, which is filled in if the node itself turns up later
+    def _add_node(self, node_type: str, node_id: str, name: Optional[str] = None, luid: Optional[str] = None) -> int:
+        number = self._numbers.get(node_id)
+        if number is None:
+            number = len(self._ids)
+            self._numbers[node_id] = number
+            self._types.append(self.node_types.index(node_type))
+            self._ids.append(node_id)
+            self._names.append(name)
+            self._luids.append(luid)
+        else:
+            if name is not None:
+                self._names[number] = name
+            if luid is not None:
+                self._luids[number] = luid
+        return number
+
+    def _add_edge(self, from_type: str, from_id: str, to_number: int):
+        self._edge_from.append(self._add_node(from_type, from_id))
+        self._edge_to.append(to_number)
+
+    def _add_edge_to(self, from_number: int, to_type: str, to_id: str):
+        self._edge_from.append(from_number)
+        self._edge_to.append(self._add_node(to_type, to_id))
+
+    def _load_node(self, key: str, node: Dict):
+        node_type = self.lineage_queries[key][0]
+        number = self._add_node(node_type, node['id'], node.get('name'), node.get('luid'))
+        # It may already be there from another node's edges, with a guessed type
+        self._types[number] = self.node_types.index(node_type)
+        if node.get('database') is not None:
+            self._add_edge('database', node['database']['id'], number)
+        if node.get('table') is not None:
+            self._add_edge('table', node['table']['id'], number)
+        for table in node.get('upstreamTables') or []:
+            self._add_edge('table', table['id'], number)
+        for field in node.get('fields') or []:
+            for column in field.get('upstreamColumns') or []:
+                self._add_edge('column', column['id'], number)
+        if node_type == 'embedded_datasource':
+            # Published data sources that the workbook connects to
+            for datasource in node.get('upstreamDatasources') or []:
+                self._add_edge('datasource', datasource['id'], number)
+            if node.get('workbook') is not None:
+                self._add_edge_to(number, 'workbook', node['workbook']['id'])
+        elif node_type == 'sheet':
+            # Published or embedded; the type is corrected when the data source itself is loaded
+            for datasource in node.get('upstreamDatasources') or []:
+                self._add_edge('datasource', datasource['id'], number)
+            if node.get('workbook') is not None:
+                self._add_edge_to(number, 'workbook', node['workbook']['id'])
+
+    # A counting sort on the sources. The edges come in sorted, so each node's neighbours end up sorted as well
+    @staticmethod
+    def _build_adjacency(node_count: int, sources: array, targets: array) -> Tuple[array, array]:
+        counts = [0] * (node_count + 1)
+        for source in sources:
+            counts[source + 1] += 1
+        offsets = array('l', [0])
+        total = 0
+        for count in counts[1:]:
+            total += count
+            offsets.append(total)
+        adjacency = array('l', [0]) * total
+        position = list(offsets[:-1])
+        for source, target in zip(sources, targets):
+            adjacency[position[source]] = target
+            position[source] += 1
+        return offsets, adjacency
+
+    def _finish(self):
+        # Duplicate edges (a data source with several fields from the same column) are dropped
+        edges = sorted(set(zip(self._edge_from, self._edge_to)))
+        sources = array('l', [edge[0] for edge in edges])
+        targets = array('l', [edge[1] for edge in edges])
+        self._downstream_offsets, self._downstream_targets = self._build_adjacency(len(self._ids), sources, targets)
+        self._upstream_offsets, self._upstream_targets = self._build_adjacency(len(self._ids), targets, sources)
+        self._edge_from = array('l')
+        self._edge_to = array('l')
+        self._name_index = None
+        self._luid_index = None
+
+    # Reads the whole graph from the Metadata API. Nodes are added as each page arrives, so only one page per query
+    # is ever held as JSON
+    def build(self, page_size: int = 100, max_workers: int = 4):
+        if self.t_rest_api is None:
+            raise InvalidOptionException('A TableauServerRest object is needed to build the graph')
+        self.start_log_block()
+        self._clear()
+        pager = MetadataPager(self.t_rest_api, page_size=page_size, max_workers=max_workers,
+                              logger_obj=self.logger)
+        sub_queries = [MetadataSubQuery(key, self.lineage_queries[key][1]) for key in self.lineage_queries]
+        for key, node in pager.iterate_many_nodes(sub_queries):
+            self._load_node(key, node)
+        self._finish()
+        self.build_time = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.log('Lineage graph has {} nodes and {} edges, read in {} requests'.format(
+            len(self), self.edge_count, pager.request_count))
+        self.end_log_block()
+
+    #
+    # Lookups and traversals
+    #
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._downstream_targets)
+
+    def _get_node(self, number: int) -> LineageNode:
+        return LineageNode(self.node_types[self._types[number]], self._ids[number], self._names[number],
+                           self._luids[number])
+
+    def _get_number(self, node_id: str) -> int:
+        if node_id not in self._numbers:
+            raise NoMatchFoundException('No node with id {} in the lineage graph'.format(node_id))
+        return self._numbers[node_id]
+
+    def contains(self, node_id: str) -> bool:
+        return node_id in self._numbers
+
+    def get_node(self, node_id: str) -> LineageNode:
+        return self._get_node(self._get_number(node_id))
+
+    # The REST API LUID works for the assets that have one
+    def get_node_by_luid(self, luid: str) -> LineageNode:
+        if self._luid_index is None:
+            self._luid_index = {}
+            for number, node_luid in enumerate(self._luids):
+                if node_luid is not None:
+                    self._luid_index[node_luid] = number
+        if luid not in self._luid_index:
+            raise NoMatchFoundException('No node with LUID {} in the lineage graph'.format(luid))
+        return self._get_node(self._luid_index[luid])
+
+    def find(self, node_type: str, name: str) -> List[LineageNode]:
+        if node_type not in self.node_types:
+            raise InvalidOptionException('node_type must be one of {}'.format(", ".join(self.node_types)))
+        if self._name_index is None:
+            self._name_index = {}
+            for number, node_name in enumerate(self._names):
+                if node_name is not None:
+                    self._name_index.setdefault((self.node_types[self._types[number]], node_name), []).append(number)
+        return [self._get_node(number) for number in self._name_index.get((node_type, name), [])]
+
+    # The id of the only node of the type with the name
+    def query_node_id(self, node_type: str, name: str) -> str:
+        nodes = self.find(node_type, name)
+        if len(nodes) == 0:
+            raise NoMatchFoundException('No {} named {} in the lineage graph'.format(node_type, name))
+        if len(nodes) > 1:
+            raise MultipleMatchesFoundException(len(nodes))
+        return nodes[0].node_id
+
+    # Breadth first, so nodes come back nearest first. max_depth=1 is just the direct neighbours
+    def _walk(self, node_id: str, offsets: array, targets: array, node_types: Optional[Iterable[str]],
+              max_depth: Optional[int]) -> List[LineageNode]:
+        start = self._get_number(node_id)
+        type_codes = None
+        if node_types is not None:
+            type_codes = set([self.node_types.index(node_type) for node_type in node_types])
+        visited = bytearray(len(self._ids))
+        visited[start] = 1
+        queue = deque([(start, 0)])
+        found = []
+        while len(queue) > 0:
+            number, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for neighbour in targets[offsets[number]:offsets[number + 1]]:
+                if visited[neighbour] == 0:
+                    visited[neighbour] = 1
+                    queue.append((neighbour, depth + 1))
+                    if type_codes is None or self._types[neighbour] in type_codes:
+                        found.append(self._get_node(neighbour))
+        return found
+
+    # Everything that uses the node's data, e.g. the data sources, sheets and workbooks built on a table
+    def get_downstream(self, node_id: str, node_types: Optional[Iterable[str]] = None,
+                       max_depth: Optional[int] = None) -> List[LineageNode]:
+        return self._walk(node_id, self._downstream_offsets, self._downstream_targets, node_types, max_depth)
+
+    # Everything the node's data comes from, e.g. the columns, tables and databases behind a sheet
+    def get_upstream(self, node_id: str, node_types: Optional[Iterable[str]] = None,
+                     max_depth: Optional[int] = None) -> List[LineageNode]:
+        return self._walk(node_id, self._upstream_offsets, self._upstream_targets, node_types, max_depth)
+
+    def get_dependent_workbooks(self, node_id: str) -> List[LineageNode]:
+        return self.get_downstream(node_id, node_types=['workbook'])
+
+    #
+    # Persisting to disk
+    #
+
+    # Nodes are written as parallel lists and edges as the compressed adjacency; a filename ending in .gz is gzipped
+    def save(self, filename: str):
+        self.start_log_block()
+        graph = {
+            'file_format_version': self.file_format_version,
+            'build_time': self.build_time,
+            'types': self._types.tolist(),
+            'ids': self._ids,
+            'names': self._names,
+            'luids': self._luids,
+            'downstream_offsets': self._downstream_offsets.tolist(),
+            'downstream_targets': self._downstream_targets.tolist()
+        }
+        if filename.endswith('.gz'):
+            with gzip.open(filename, 'wt', encoding='utf-8') as fh:
+                json.dump(graph, fh, separators=(',', ':'))
+        else:
+            with open(filename, 'w', encoding='utf-8') as fh:
+                json.dump(graph, fh, separators=(',', ':'))
+        self.log('Saved lineage graph of {} nodes to {}'.format(len(self), filename))
+        self.end_log_block()
+
+    @classmethod
+    def load(cls, filename: str, t_rest_api=None, logger_obj: Optional[Logger] = None) -> 'LineageGraph':
+        if filename.endswith('.gz'):
+            with gzip.open(filename, 'rt', encoding='utf-8') as fh:
+                graph = json.load(fh)
+        else:
+            with open(filename, 'r', encoding='utf-8') as fh:
+                graph = json.load(fh)
+        if graph.get('file_format_version') != cls.file_format_version:
+            raise InvalidOptionException('{} was written by a different version of LineageGraph'.format(filename))
+        lineage_graph = cls(t_rest_api=t_rest_api, logger_obj=logger_obj)
+        lineage_graph.build_time = graph['build_time']
+        lineage_graph._types = array('b', graph['types'])
+        lineage_graph._ids = graph['ids']
+        lineage_graph._names = graph['names']
+        lineage_graph._luids = graph['luids']
+        lineage_graph._numbers = dict([(node_id, number) for number, node_id in enumerate(graph['ids'])])
+        # Only the downstream edges are saved; the upstream ones are the same edges reversed
+        offsets = graph['downstream_offsets']
+        targets = array('l', graph['downstream_targets'])
+        sources = array('l')
+        for number in range(len(offsets) - 1):
+            sources.extend([number] * (offsets[number + 1] - offsets[number]))
+        lineage_graph._downstream_offsets = array('l', offsets)
+        lineage_graph._downstream_targets = targets
+        lineage_graph._upstream_offsets, lineage_graph._upstream_targets = cls._build_adjacency(
+            len(graph['ids']), targets, sources)
+        return lineage_graph
@@ -0,0 +1,157 @@
+from typing import Union, Any, Optional, List, Dict, Tuple, Iterable, Iterator, NamedTuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+
+
+# One query for MetadataPager.iterate_many_nodes(). key is handed back with every node, to tell the queries apart.
+# connection_path is where the connection is in the response's data, dotted for nested fields
+# (e.g. 'site.workbooksConnection'); it can be left out when the query has a single top-level field
+class MetadataSubQuery(NamedTuple):
+    key: Any
+    query: str
+    connection_path: Optional[str] = None
+    variables: Optional[Dict] = None
+
+
+# Pages through a Metadata API connection field (databasesConnection, workbooksConnection etc.) with its cursors,
+# yielding the nodes from each page as soon as it comes back, so no single request has to return everything.
+# The query must take $first and $after variables and pass them to the connection, and ask for
+# pageInfo { hasNextPage endCursor }:
+#   query tables($first: Int, $after: String) {
+#     tablesConnection(first: $first, after: $after) { nodes { id name } pageInfo { hasNextPage endCursor } }
+#   }
+# When a page comes back with errors (usually a node limit or a timeout on a big lineage query), it is asked for
+# again with half as many nodes, down to min_page_size, and the rest of that query carries on at the smaller size
+class MetadataPager(LoggingMethods):
+    def __init__(self, t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'], page_size: int = 100,
+                 min_page_size: int = 10, max_workers: int = 4, logger_obj: Optional[Logger] = None):
+        self.t_rest_api = t_rest_api
+        self.logger = logger_obj
+        if page_size < 1 or min_page_size < 1:
+            raise InvalidOptionException('page_size and min_page_size must be at least 1')
+        self.page_size = page_size
+        self.min_page_size = min(min_page_size, page_size)
+        self.max_workers = max_workers
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _check_query(query: str):
+        if query.find('$first') == -1 or query.find('$after') == -1 or query.find('pageInfo') == -1:
+            raise InvalidOptionException('The query must pass $first and $after to the connection field and ask '
+                                         'for pageInfo { hasNextPage endCursor }')
+
+    @staticmethod
+    def _find_connection(data: Dict, connection_path: Optional[str]) -> Dict:
+        if data is None:
+            raise InvalidOptionException('The Metadata API response had no data')
+        if connection_path is None:
+            if len(data) != 1:
+                raise InvalidOptionException('connection_path is needed when the query has more than one field')
+            return list(data.values())[0]
+        connection = data
+        for field in connection_path.split('.'):
+            if not isinstance(connection, dict) or field not in connection:
+                raise InvalidOptionException('No {} found in the Metadata API response'.format(connection_path))
+            connection = connection[field]
+        return connection
+
+    # Connections can be read as nodes { } or edges { node { } }
+    @staticmethod
+    def _get_nodes(connection: Dict) -> List[Dict]:
+        if connection.get('nodes') is not None:
+            return connection['nodes']
+        return [edge['node'] for edge in connection.get('edges', [])]
+
+    # Requests one page. page_size is a one item list so a smaller size found here is kept for the next page.
+    # Returns (nodes, end cursor or None when there are no more pages)
+    def _query_page(self, sub_query: MetadataSubQuery, cursor: Optional[str],
+                    page_size: List[int]) -> Tuple[List[Dict], Optional[str]]:
+        url = self.t_rest_api.build_metadata_url()
+        while True:
+            variables = dict(sub_query.variables) if sub_query.variables is not None else {}
+            variables['first'] = page_size[0]
+            variables['after'] = cursor
+            response = self.t_rest_api.send_add_request_json_in_thread(url, {'query': sub_query.query,
+                                                                            'variables': variables})
+            with self._lock:
+                self.request_count += 1
+            errors = response.get('errors')
+            if errors is None or len(errors) == 0:
+                break
+            messages = "; ".join([error.get('message', '') for error in errors])
+            if page_size[0] <= self.min_page_size:
+                raise MetadataQueryException('Metadata API query failed: {}'.format(messages), errors)
+            page_size[0] = max(page_size[0] // 2, self.min_page_size)
+            self.log('Metadata API errors ({}), trying again {} at a time'.format(messages, page_size[0]))
+
+        connection = self._find_connection(response.get('data'), sub_query.connection_path)
+        page_info = connection.get('pageInfo')
+        if page_info is None:
+            raise InvalidOptionException('The query must ask for pageInfo { hasNextPage endCursor }')
+        if page_info.get('hasNextPage') is True:
+            return self._get_nodes(connection), page_info['endCursor']
+        return self._get_nodes(connection), None
+
+    # Yields every node of the connection, one page at a time
+    def iterate_nodes(self, query: str, connection_path: Optional[str] = None,
+                      variables: Optional[Dict] = None) -> Iterator[Dict]:
+        self._check_query(query)
+        sub_query = MetadataSubQuery(None, query, connection_path, variables)
+        page_size = [self.page_size]
+        cursor = None
+        page_count = 0
+        while True:
+            nodes, cursor = self._query_page(sub_query, cursor, page_size)
+            page_count += 1
+            for node in nodes:
+                yield node
+            if cursor is None:
+                break
+        self.log('Read {} pages of {}'.format(page_count, connection_path if connection_path is not None else
+                                               'the connection'))
+
+    # Pages through independent queries (e.g. databases, tables and workbooks, or the same query for different
+    # projects) at the same time, max_workers requests at once. The pages of any one query still come in order, since
+    # each needs the cursor from the last. Yields (key, node) in whatever order the pages come back
+    def iterate_many_nodes(self, sub_queries: Iterable[MetadataSubQuery]) -> Iterator[Tuple[Any, Dict]]:
+        sub_queries = list(sub_queries)
+        for sub_query in sub_queries:
+            self._check_query(sub_query.query)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # future : (sub query, page size)
+        pending = {}
+        try:
+            for sub_query in sub_queries:
+                page_size = [self.page_size]
+                pending[executor.submit(self._query_page, sub_query, None, page_size)] = (sub_query, page_size)
+            while len(pending) > 0:
+                done, not_done = wait(list(pending.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    sub_query, page_size = pending.pop(future)
+                    nodes, cursor = future.result()
+                    if cursor is not None:
+                        pending[executor.submit(self._query_page, sub_query, cursor, page_size)] = (sub_query,
+                                                                                                    page_size)
+                    for node in nodes:
+                        yield sub_query.key, node
+        finally:
+            # Stopped early, or a query failed
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+        self.log('Read {} queries in {} requests'.format(len(sub_queries), self.request_count))
+
+    # Every node of every query, as { key : [ nodes ] }
+    def query_many_nodes(self, sub_queries: Iterable[MetadataSubQuery]) -> Dict[Any, List[Dict]]:
+        sub_queries = list(sub_queries)
+        results = {}
+        for sub_query in sub_queries:
+            results[sub_query.key] = []
+        for key, node in self.iterate_many_nodes(sub_queries):
+            results[key].append(node)
+        return results
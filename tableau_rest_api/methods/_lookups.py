@@ -9,6 +9,33 @@ class LookupMethods():
     def __getattr__(self, attr):
         return getattr(self.rest_api_base, attr)
 
+    # Content types that have a name : luid cache, mapped to the attribute holding that cache
+    _luid_cache_attributes = {'user': 'username_luid_cache', 'group': 'group_name_luid_cache'}
+
+    # The user and group create / update / delete methods report what they changed here, so that the lookup caches
+    # never hand back a LUID for something that was renamed or deleted. Other content types have no cache
+    def cache_content_change(self, content_type: str, luid: Optional[str] = None, name: Optional[str] = None,
+                             deleted: bool = False):
+        if content_type not in self._luid_cache_attributes:
+            return
+        cache = getattr(self, self._luid_cache_attributes[content_type])
+        # Drop any entry pointing at this LUID (covers renames and deletes), plus any entry already using the name
+        if luid is not None:
+            for cached_name, cached_luid in list(cache.items()):
+                if cached_luid == luid:
+                    del cache[cached_name]
+        if name is not None and name in cache and (deleted is True or cache[name] != luid):
+            del cache[name]
+        if deleted is False and luid is not None and name is not None:
+            cache[name] = luid
+
+    def clear_luid_caches(self):
+        for attribute in self._luid_cache_attributes.values():
+            setattr(self, attribute, {})
+        # Not name : luid caches, but just as specific to the site
+        self._extract_refresh_task_catalog = None
+        self._principal_maps = {}
+
     def query_user_luid(self, username: str) -> str:
         self.start_log_block()
         if username in self.username_luid_cache:
@@ -27,7 +54,8 @@ class LookupMethods():
             return datasource_name
         # This quick filters down to just those with the name
 
-        datasources_with_name = self.query_elements_from_endpoint_with_filter('datasource', datasource_name)
+        datasources_with_name = self.query_elements_from_endpoint_with_filter('datasource', datasource_name,
+                                                                              fields='ownership')
 
         # Throw exception if nothing found
         if len(datasources_with_name) == 0:
@@ -144,7 +172,7 @@ class LookupMethods():
         # Short circuit if LUID is passed in
         if self.is_luid(wb_name):
             return wb_name
-        workbooks_with_name = self.query_elements_from_endpoint_with_filter('workbook', wb_name)
+        workbooks_with_name = self.query_elements_from_endpoint_with_filter('workbook', wb_name, fields='ownership')
         if len(workbooks_with_name) == 0:
             self.end_log_block()
             raise NoMatchFoundException("No workbook found for named {}".format(wb_name))
@@ -19,7 +19,8 @@ class DatasourceMethods():
     def query_datasources(self, project_name_or_luid: Optional[str] = None, all_fields: Optional[bool] = True,
                           updated_at_filter: Optional[UrlFilter] = None, created_at_filter: Optional[UrlFilter] = None,
                           tags_filter: Optional[UrlFilter] = None, datasource_type_filter: Optional[UrlFilter] = None,
-                          sorts: Optional[List[Sort]] = None, fields: Optional[List[str]] = None) -> ET.Element:
+                          sorts: Optional[List[Sort]] = None,
+                          fields: Optional[Union[List[str], str]] = None) -> ET.Element:
 
         self.start_log_block()
         if fields is None:
@@ -48,7 +49,8 @@ class DatasourceMethods():
     def query_datasources_json(self, all_fields: Optional[bool] = True, updated_at_filter: Optional[UrlFilter] = None,
                                created_at_filter: Optional[UrlFilter] = None, tags_filter: Optional[UrlFilter] = None,
                                datasource_type_filter: Optional[UrlFilter] = None, sorts: Optional[List[Sort]] = None,
-                               fields: Optional[List[str]] = None, page_number: Optional[int] = None) -> Dict:
+                               fields: Optional[Union[List[str], str]] = None,
+                               page_number: Optional[int] = None) -> Dict:
 
         self.start_log_block()
         if fields is None:
@@ -65,6 +67,27 @@ class DatasourceMethods():
         self.end_log_block()
         return datasources
 
+    # Returns DatasourceRecord tuples rather than XML
+    def query_datasources_records(self, project_name_or_luid: Optional[str] = None,
+                                  updated_at_filter: Optional[UrlFilter] = None,
+                                  created_at_filter: Optional[UrlFilter] = None,
+                                  tags_filter: Optional[UrlFilter] = None,
+                                  datasource_type_filter: Optional[UrlFilter] = None,
+                                  sorts: Optional[List[Sort]] = None, page_size: Optional[int] = None,
+                                  max_workers: int = 4) -> List[DatasourceRecord]:
+        self.start_log_block()
+        filter_checks = {'updatedAt': updated_at_filter, 'createdAt': created_at_filter, 'tags': tags_filter,
+                         'type': datasource_type_filter}
+        filters = self._check_filter_objects(filter_checks)
+
+        dses = self.query_resource_records('datasources', DatasourceRecord, filters=filters, sorts=sorts,
+                                           page_size=page_size, max_workers=max_workers)
+        if project_name_or_luid is not None:
+            project_luid = self.query_project_luid(project_name_or_luid)
+            dses = [ds for ds in dses if ds.project_luid == project_luid]
+        self.end_log_block()
+        return dses
+
     # Tries to guess name or LUID, hope there is only one
     def query_datasource(self, ds_name_or_luid: str, proj_name_or_luid: Optional[str] = None) -> ET.Element:
         self.start_log_block()
@@ -91,6 +114,8 @@ class DatasourceMethods():
             datasource_luid = self.query_datasource_luid(datasource_name_or_luid, None)
             url = self.build_api_url("datasources/{}".format(datasource_luid))
             self.send_delete_request(url)
+            if self._extract_refresh_task_catalog is not None:
+                self._extract_refresh_task_catalog.remove_tasks_for_datasource(datasource_luid)
         self.end_log_block()
 
     def update_datasource(self, datasource_name_or_luid: str, datasource_project_name_or_luid: Optional[str] = None,
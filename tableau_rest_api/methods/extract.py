@@ -1,4 +1,6 @@
 from .rest_api_base import *
+from typing import Iterable
+from ..refresh_orchestrator import ExtractRefreshOrchestrator, RefreshReport
 
 
 class ExtractMethods():
@@ -21,11 +23,11 @@ class ExtractMethods():
         return extract_task
 
     # From API 2.6. This gives back much more information
-    def get_extract_refresh_tasks_on_schedule(self, schedule_name_or_luid: str) -> ET.Element:
+    def get_extract_refresh_tasks_on_schedule(self, schedule_name_or_luid: str) -> List[ET.Element]:
         self.start_log_block()
         schedule_luid = self.query_schedule_luid(schedule_name_or_luid)
-        tasks = self.get_extract_refresh_tasks()
-        tasks_on_sched = tasks.findall('.//t:schedule[@id="{}"]/..'.format(schedule_luid), self.ns_map)
+        catalog = self.get_extract_refresh_task_catalog()
+        tasks_on_sched = catalog.get_task_elements(catalog.get_tasks_for_schedule(schedule_luid))
         if len(tasks_on_sched) == 0:
             self.end_log_block()
             raise NoMatchFoundException(
@@ -49,35 +51,32 @@ class ExtractMethods():
         self.end_log_block()
         return response.findall('.//t:job', self.ns_map)[0].get("id")
 
-    def run_all_extract_refreshes_for_schedule(self, schedule_name_or_luid: str):
+    # These return the LUIDs of the jobs that were started, which can be handed to a JobTracker
+    def run_all_extract_refreshes_for_schedule(self, schedule_name_or_luid: str) -> List[str]:
         self.start_log_block()
-        extracts = self.query_extract_refresh_tasks_by_schedule(schedule_name_or_luid)
-        for extract in extracts:
-            self.run_extract_refresh_task(extract.get('id'))
+        schedule_luid = self.query_schedule_luid(schedule_name_or_luid)
+        tasks = self.get_extract_refresh_task_catalog().get_tasks_for_schedule(schedule_luid)
+        job_luids = [self.run_extract_refresh_task(task.luid) for task in tasks]
         self.end_log_block()
+        return job_luids
 
-    def run_extract_refresh_for_workbook(self, wb_name_or_luid: str, proj_name_or_luid: Optional[str] = None):
+    def run_extract_refresh_for_workbook(self, wb_name_or_luid: str,
+                                         proj_name_or_luid: Optional[str] = None) -> List[str]:
         self.start_log_block()
-
         wb_luid = self.query_workbook_luid(wb_name_or_luid, proj_name_or_luid)
-        tasks = self.get_extract_refresh_tasks()
-
-        extracts_for_wb = tasks.findall('.//t:extract/workbook[@id="{}"]..'.format(wb_luid), self.ns_map)
-
-        for extract in extracts_for_wb:
-            self.run_extract_refresh_task(extract.get('id'))
+        tasks = self.get_extract_refresh_task_catalog().get_tasks_for_workbook(wb_luid)
+        job_luids = [self.run_extract_refresh_task(task.luid) for task in tasks]
         self.end_log_block()
+        return job_luids
 
-    # Check if this actually works
-    def run_extract_refresh_for_datasource(self, ds_name_or_luid: str, proj_name_or_luid: Optional[str] = None):
+    def run_extract_refresh_for_datasource(self, ds_name_or_luid: str,
+                                           proj_name_or_luid: Optional[str] = None) -> List[str]:
         self.start_log_block()
         ds_luid = self.query_datasource_luid(ds_name_or_luid, proj_name_or_luid)
-        tasks = self.get_extract_refresh_tasks()
-        extracts_for_ds = tasks.findall('.//t:extract/datasource[@id="{}"]..'.format(ds_luid), self.ns_map)
-        # print extracts_for_wb
-        for extract in extracts_for_ds:
-            self.run_extract_refresh_task(extract.get('id'))
+        tasks = self.get_extract_refresh_task_catalog().get_tasks_for_datasource(ds_luid)
+        job_luids = [self.run_extract_refresh_task(task.luid) for task in tasks]
         self.end_log_block()
+        return job_luids
 
     # Checks status of AD sync process or extract
     def query_job(self, job_luid: str) -> ET.Element:
@@ -131,6 +130,25 @@ class ExtractMethods28(ExtractMethods27):
                                            proj_name_or_luid: Optional[str] = None) -> ET.Element:
         return self.update_datasource_now(ds_name_or_luid, proj_name_or_luid)
 
+    # Refreshes all of the workbooks, datasources and schedules (names or LUIDs), max_concurrent at a time, in that
+    # order. Use ExtractRefreshOrchestrator directly to set a priority for each one
+    def refresh_extracts(self, workbooks: Iterable[str] = (), datasources: Iterable[str] = (),
+                         schedules: Iterable[str] = (), max_concurrent: int = 4, max_retries: int = 1,
+                         max_server_jobs: Optional[int] = None, timeout: Optional[float] = None) -> RefreshReport:
+        self.start_log_block()
+        orchestrator = ExtractRefreshOrchestrator(self.rest_api_base, max_concurrent=max_concurrent,
+                                                  max_retries=max_retries, max_server_jobs=max_server_jobs,
+                                                  logger_obj=self.logger)
+        for wb_name_or_luid in workbooks:
+            orchestrator.add_workbook(wb_name_or_luid, priority=10)
+        for ds_name_or_luid in datasources:
+            orchestrator.add_datasource(ds_name_or_luid, priority=20)
+        for schedule_name_or_luid in schedules:
+            orchestrator.add_schedule(schedule_name_or_luid, priority=30)
+        report = orchestrator.run(timeout=timeout)
+        self.end_log_block()
+        return report
+
 
 class ExtractMethods30(ExtractMethods28):
     def __init__(self, rest_api_base: TableauRestApiBase30):
@@ -157,6 +175,27 @@ class ExtractMethods31(ExtractMethods30):
         self.end_log_block()
         return jobs
 
+    # Returns JobRecord tuples rather than XML
+    def query_jobs_records(self, progress_filter: Optional[UrlFilter] = None,
+                           job_type_filter: Optional[UrlFilter] = None,
+                           created_at_filter: Optional[UrlFilter] = None,
+                           started_at_filter: Optional[UrlFilter] = None,
+                           ended_at_filter: Optional[UrlFilter] = None, title_filter: Optional[UrlFilter] = None,
+                           subtitle_filter: Optional[UrlFilter] = None, notes_filter: Optional[UrlFilter] = None,
+                           page_size: Optional[int] = None, max_workers: int = 4) -> List[JobRecord]:
+        self.start_log_block()
+        filter_checks = {'progress': progress_filter, 'jobType': job_type_filter,
+                         'createdAt': created_at_filter, 'title': title_filter,
+                         'notes': notes_filter, 'endedAt': ended_at_filter,
+                         'subtitle': subtitle_filter, 'startedAt': started_at_filter}
+        filters = self._check_filter_objects(filter_checks)
+
+        jobs = self.query_resource_records("jobs", JobRecord, filters=filters, page_size=page_size,
+                                           max_workers=max_workers)
+        self.log('Found {} jobs'.format(str(len(jobs))))
+        self.end_log_block()
+        return jobs
+
     def cancel_job(self, job_luid: str):
         self.start_log_block()
         url = self.build_api_url("jobs/{}".format(job_luid))
@@ -28,7 +28,7 @@ class FlowMethods33():
                                created_at_filter: Optional[UrlFilter] = None,
                                flow_name_filter: Optional[UrlFilter] = None,
                                owner_name_filter: Optional[UrlFilter] = None, sorts: Optional[List[Sort]] = None,
-                               fields: Optional[List[str]] = None) -> ET.Element:
+                               fields: Optional[Union[List[str], str]] = None) -> ET.Element:
         self.start_log_block()
         if fields is None:
             if all_fields is True:
@@ -1,4 +1,5 @@
 from .rest_api_base import *
+from ..group_sync import GroupMembershipSync, GroupSyncResult
 
 class GroupMethods():
     def __init__(self, rest_api_base: TableauRestApiBase):
@@ -7,9 +8,9 @@ class GroupMethods():
     def __getattr__(self, attr):
         return getattr(self.rest_api_base, attr)
 
-    def query_groups(self) -> ET.Element:
+    def query_groups(self, fields: Optional[Union[List[str], str]] = None) -> ET.Element:
         self.start_log_block()
-        groups = self.query_resource("groups")
+        groups = self.query_resource("groups", fields=fields)
         for group in groups:
             # Add to group-name : luid cache
             group_luid = group.get("id")
@@ -20,9 +21,10 @@ class GroupMethods():
 
     # # No basic verb for querying a single group, so run a query_groups
 
-    def query_groups_json(self, page_number: Optional[int]=None) -> Dict:
+    def query_groups_json(self, page_number: Optional[int]=None,
+                          fields: Optional[Union[List[str], str]] = None) -> Dict:
         self.start_log_block()
-        groups = self.query_resource_json("groups", page_number=page_number)
+        groups = self.query_resource_json("groups", fields=fields, page_number=page_number)
         #for group in groups:
         #    # Add to group-name : luid cache
         #    group_luid = group.get(u"id")
@@ -31,6 +33,16 @@ class GroupMethods():
         self.end_log_block()
         return groups
 
+    # Returns GroupRecord tuples rather than XML
+    def query_groups_records(self, page_size: Optional[int] = None, max_workers: int = 4) -> List[GroupRecord]:
+        self.start_log_block()
+        groups = self.query_resource_records("groups", GroupRecord, page_size=page_size, max_workers=max_workers)
+        for group in groups:
+            # Add to group-name : luid cache
+            self.group_name_luid_cache[group.name] = group.luid
+        self.end_log_block()
+        return groups
+
     def query_group(self, group_name_or_luid: str) -> ET.Element:
         self.start_log_block()
         group = self.query_single_element_from_endpoint('group', group_name_or_luid)
@@ -57,8 +69,10 @@ class GroupMethods():
         url = self.build_api_url("groups")
         try:
             new_group = self.send_add_request(url, tsr)
+            new_group_element = new_group.findall('.//t:group', self.ns_map)[0]
+            self.cache_content_change('group', new_group_element.get("id"), new_group_element.get('name'))
             self.end_log_block()
-            return new_group.findall('.//t:group', self.ns_map)[0].get("id")
+            return new_group_element.get("id")
         # If the name already exists, a HTTP 409 throws, so just find and return the existing LUID
         except RecoverableHTTPException as e:
             if e.http_code == 409:
@@ -96,6 +110,7 @@ class GroupMethods():
         if sync_as_background is False:
             self.end_log_block()
             group = response.findall('.//t:group', self.ns_map)
+            self.cache_content_change('group', group[0].get('id'), group[0].get('name'))
             return group[0].get('id')
 
     # Take a single user_luid string or a collection of luid_strings
@@ -104,6 +119,7 @@ class GroupMethods():
         group_luid = self.query_group_luid(group_name_or_luid)
 
         users = self.to_list(username_or_luid_s)
+        result = None
         for user in users:
             user_luid = self.query_user_luid(user)
 
@@ -116,15 +132,16 @@ class GroupMethods():
             try:
                 self.log("Adding username ID {} to group ID {}".format(user_luid, group_luid))
                 result = self.send_add_request(url, tsr)
-                return result
             except RecoverableHTTPException as e:
                 self.log("Recoverable HTTP exception {} with Tableau Error Code {}, skipping".format(str(e.http_code), e.tableau_error_code))
         self.end_log_block()
+        return result
 
-    def query_users_in_group(self, group_name_or_luid: str) -> ET.Element:
+    def query_users_in_group(self, group_name_or_luid: str,
+                             fields: Optional[Union[List[str], str]] = None) -> ET.Element:
         self.start_log_block()
         luid = self.query_group_luid(group_name_or_luid)
-        users = self.query_resource("groups/{}/users".format(luid))
+        users = self.query_resource("groups/{}/users".format(luid), fields=fields)
         self.end_log_block()
         return users
 
@@ -140,6 +157,7 @@ class GroupMethods():
 
         url = self.build_api_url("groups/{}".format(group_luid))
         response = self.send_update_request(url, tsr)
+        self.cache_content_change('group', group_luid, new_group_name)
         self.end_log_block()
         return response
 
@@ -169,6 +187,8 @@ class GroupMethods():
         url = self.build_api_url(
             "groups/{}".format(group_luid) + "?asJob={}".format(str(sync_as_background)).lower())
         response = self.send_update_request(url, tsr)
+        # The sync renames the group to the AD group name, possibly only once the background job finishes
+        self.cache_content_change('group', group_luid)
         # Response is different from immediate to background update. job ID lets you track progress on background
         if sync_as_background is True:
             job = response.findall('.//t:job', self.ns_map)
@@ -176,6 +196,7 @@ class GroupMethods():
             return job[0].get('id')
         if sync_as_background is False:
             group = response.findall('.//t:group', self.ns_map)
+            self.cache_content_change('group', group[0].get('id'), group[0].get('name'))
             self.end_log_block()
             return group[0].get('id')
 
@@ -192,6 +213,7 @@ class GroupMethods():
                 group_luid = self.query_group_luid(group_name_or_luid)
             url = self.build_api_url("groups/{}".format(group_luid))
             self.send_delete_request(url)
+            self.cache_content_change('group', group_luid, deleted=True)
         self.end_log_block()
 
     def remove_users_from_group(self, username_or_luid_s: Union[List[str], str], group_name_or_luid: str):
@@ -201,7 +223,7 @@ class GroupMethods():
             group_luid = group_name_or_luid
         else:
             group_name = group_name_or_luid
-            group_luid = self.query_group_name(group_name_or_luid)
+            group_luid = self.query_group_luid(group_name_or_luid)
         users = self.to_list(username_or_luid_s)
         for user in users:
             username = ""
@@ -215,6 +237,17 @@ class GroupMethods():
             self.send_delete_request(url)
         self.end_log_block()
 
+    # Adds and removes members so that the group has exactly desired_users (usernames or LUIDs), sending only the
+    # differences, concurrently. Use a GroupMembershipSync directly to sync many groups in one job
+    def sync_group_membership(self, group_name_or_luid: str, desired_users: List[str], remove_others: bool = True,
+                              dry_run: bool = False, max_workers: int = 8) -> GroupSyncResult:
+        self.start_log_block()
+        group_sync = GroupMembershipSync(self.rest_api_base, logger_obj=self.logger, max_workers=max_workers)
+        result = group_sync.sync_group_membership(group_name_or_luid, desired_users, remove_others=remove_others,
+                                                  dry_run=dry_run)
+        self.end_log_block()
+        return result
+
 class GroupMethods27(GroupMethods):
     def __init__(self, rest_api_base: TableauRestApiBase27):
         self.rest_api_base = rest_api_base
@@ -223,7 +256,8 @@ class GroupMethods27(GroupMethods):
                      domain_nickname_filter: Optional[UrlFilter] = None, is_local_filter: Optional[UrlFilter] = None,
                      user_count_filter: Optional[UrlFilter] = None,
                      minimum_site_role_filter: Optional[UrlFilter] = None,
-                     sorts: Optional[List[Sort]] = None) -> ET.Element:
+                     sorts: Optional[List[Sort]] = None,
+                     fields: Optional[Union[List[str], str]] = None) -> ET.Element:
 
         filter_checks = {'name': name_filter, 'domainName': domain_name_filter,
                          'domainNickname': domain_nickname_filter, 'isLocal': is_local_filter,
@@ -232,7 +266,7 @@ class GroupMethods27(GroupMethods):
         filters = self._check_filter_objects(filter_checks)
 
         self.start_log_block()
-        groups = self.query_resource("groups", filters=filters, sorts=sorts)
+        groups = self.query_resource("groups", filters=filters, sorts=sorts, fields=fields)
         for group in groups:
             # Add to group-name : luid cache
             group_luid = group.get("id")
@@ -245,7 +279,8 @@ class GroupMethods27(GroupMethods):
                      domain_nickname_filter: Optional[UrlFilter] = None, is_local_filter: Optional[UrlFilter] = None,
                      user_count_filter: Optional[UrlFilter] = None,
                      minimum_site_role_filter: Optional[UrlFilter] = None,
-                     sorts: Optional[List[Sort]] = None, page_number: Optional[int] = None) -> Dict:
+                     sorts: Optional[List[Sort]] = None, page_number: Optional[int] = None,
+                     fields: Optional[Union[List[str], str]] = None) -> Dict:
 
             filter_checks = {'name': name_filter, 'domainName': domain_name_filter,
                              'domainNickname': domain_nickname_filter, 'isLocal': is_local_filter,
@@ -254,7 +289,8 @@ class GroupMethods27(GroupMethods):
             filters = self._check_filter_objects(filter_checks)
 
             self.start_log_block()
-            groups = self.query_resource_json("groups", filters=filters, sorts=sorts, page_number=page_number)
+            groups = self.query_resource_json("groups", filters=filters, sorts=sorts, fields=fields,
+                                              page_number=page_number)
             self.end_log_block()
             return groups
 
@@ -271,6 +307,28 @@ class GroupMethods27(GroupMethods):
         self.end_log_block()
         return group
 
+    def query_groups_records(self, name_filter: Optional[UrlFilter] = None,
+                             domain_name_filter: Optional[UrlFilter] = None,
+                             domain_nickname_filter: Optional[UrlFilter] = None,
+                             is_local_filter: Optional[UrlFilter] = None, user_count_filter: Optional[UrlFilter] = None,
+                             minimum_site_role_filter: Optional[UrlFilter] = None,
+                             sorts: Optional[List[Sort]] = None, page_size: Optional[int] = None,
+                             max_workers: int = 4) -> List[GroupRecord]:
+        filter_checks = {'name': name_filter, 'domainName': domain_name_filter,
+                         'domainNickname': domain_nickname_filter, 'isLocal': is_local_filter,
+                         'userCount': user_count_filter, 'minimumSiteRole': minimum_site_role_filter}
+
+        filters = self._check_filter_objects(filter_checks)
+
+        self.start_log_block()
+        groups = self.query_resource_records("groups", GroupRecord, filters=filters, sorts=sorts,
+                                             page_size=page_size, max_workers=max_workers)
+        for group in groups:
+            # Add to group-name : luid cache
+            self.group_name_luid_cache[group.name] = group.luid
+        self.end_log_block()
+        return groups
+
 
 class GroupMethods28(GroupMethods27):
     def __init__(self, rest_api_base: TableauRestApiBase28):
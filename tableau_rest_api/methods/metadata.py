@@ -1,5 +1,8 @@
 from .rest_api_base import *
+from typing import Iterable, Any
 from ..permissions import DatabasePermissions35, TablePermissions35
+from ..metadata_pager import MetadataPager, MetadataSubQuery
+from ..lineage_graph import LineageGraph
 import json
 
 
@@ -207,15 +210,44 @@ class MetadataMethods35():
     def graphql(self, graphql_query: str) -> Dict:
         self.start_log_block()
         graphql_json = {"query": graphql_query}
-        url = self.rest_api_base.build_api_url("metadata")
+        url = self.rest_api_base.build_metadata_url()
         try:
             response = self.rest_api_base.send_add_request_json(url, graphql_json)
             self.end_log_block()
             return response
         except RecoverableHTTPException as e:
+            self.end_log_block()
             if e.tableau_error_code == '404003':
-                self.end_log_block()
                 raise InvalidOptionException("The metadata API is not turned on for this server at this time")
+            raise
+
+    # For connection fields too big for one response. The query takes $first and $after, see MetadataPager.
+    # Nodes are yielded page by page as they arrive
+    def query_graphql_nodes(self, graphql_query: str, connection_path: Optional[str] = None,
+                            variables: Optional[Dict] = None, page_size: int = 100) -> Iterator[Dict]:
+        self.start_log_block()
+        pager = MetadataPager(self.rest_api_base, page_size=page_size, logger_obj=self.logger)
+        nodes = pager.iterate_nodes(graphql_query, connection_path=connection_path, variables=variables)
+        self.end_log_block()
+        return nodes
+
+    # Pages through several queries at once and returns { key : [ nodes ] }
+    def query_graphql_nodes_concurrently(self, sub_queries: Iterable[MetadataSubQuery], page_size: int = 100,
+                                         max_workers: int = 4) -> Dict[Any, List[Dict]]:
+        self.start_log_block()
+        pager = MetadataPager(self.rest_api_base, page_size=page_size, max_workers=max_workers,
+                              logger_obj=self.logger)
+        results = pager.query_many_nodes(sub_queries)
+        self.end_log_block()
+        return results
+
+    # Reads the lineage of the whole site into memory for impact analysis. See LineageGraph
+    def build_lineage_graph(self, page_size: int = 100, max_workers: int = 4) -> LineageGraph:
+        self.start_log_block()
+        lineage_graph = LineageGraph(self.rest_api_base, logger_obj=self.logger)
+        lineage_graph.build(page_size=page_size, max_workers=max_workers)
+        self.end_log_block()
+        return lineage_graph
 
 
 
@@ -8,15 +8,24 @@ class ProjectMethods():
     def __getattr__(self, attr):
         return getattr(self.rest_api_base, attr)
 
-    def query_projects(self) -> ET.Element:
+    def query_projects(self, fields: Optional[Union[List[str], str]] = None) -> ET.Element:
         self.start_log_block()
-        projects = self.query_resource("projects")
+        projects = self.query_resource("projects", fields=fields)
         self.end_log_block()
         return projects
 
-    def query_projects_json(self, page_number: Optional[int] = None) -> Dict:
+    def query_projects_json(self, page_number: Optional[int] = None,
+                            fields: Optional[Union[List[str], str]] = None) -> Dict:
         self.start_log_block()
-        projects = self.query_resource_json("projects", page_number=page_number)
+        projects = self.query_resource_json("projects", fields=fields, page_number=page_number)
+        self.end_log_block()
+        return projects
+
+    # Returns ProjectRecord tuples rather than XML
+    def query_projects_records(self, page_size: Optional[int] = None, max_workers: int = 4) -> List[ProjectRecord]:
+        self.start_log_block()
+        projects = self.query_resource_records("projects", ProjectRecord, page_size=page_size,
+                                               max_workers=max_workers)
         self.end_log_block()
         return projects
 
@@ -129,7 +138,8 @@ class ProjectMethods27(ProjectMethods):
     def query_projects(self, name_filter: Optional[UrlFilter] = None, owner_name_filter: Optional[UrlFilter] = None,
                        updated_at_filter: Optional[UrlFilter] = None, created_at_filter: Optional[UrlFilter] = None,
                        owner_domain_filter: Optional[UrlFilter] = None, owner_email_filter: Optional[UrlFilter] = None,
-                       sorts: Optional[List[Sort]] = None) -> ET.Element:
+                       sorts: Optional[List[Sort]] = None,
+                       fields: Optional[Union[List[str], str]] = None) -> ET.Element:
         filter_checks = {'name': name_filter, 'ownerName': owner_name_filter,
                          'updatedAt': updated_at_filter, 'createdAt': created_at_filter,
                          'ownerDomain': owner_domain_filter, 'ownerEmail': owner_email_filter}
@@ -137,7 +147,7 @@ class ProjectMethods27(ProjectMethods):
         filters = self._check_filter_objects(filter_checks)
 
         self.start_log_block()
-        projects = self.query_resource("projects", filters=filters, sorts=sorts)
+        projects = self.query_resource("projects", filters=filters, sorts=sorts, fields=fields)
         self.end_log_block()
         return projects
 
@@ -147,7 +157,27 @@ class ProjectMethods27(ProjectMethods):
                             created_at_filter: Optional[UrlFilter] = None,
                             owner_domain_filter: Optional[UrlFilter] = None,
                             owner_email_filter: Optional[UrlFilter] = None, sorts: Optional[List[Sort]] = None,
-                            page_number: Optional[int] = None) -> Dict:
+                            page_number: Optional[int] = None,
+                            fields: Optional[Union[List[str], str]] = None) -> Dict:
+        filter_checks = {'name': name_filter, 'ownerName': owner_name_filter,
+                         'updatedAt': updated_at_filter, 'createdAt': created_at_filter,
+                         'ownerDomain': owner_domain_filter, 'ownerEmail': owner_email_filter}
+
+        filters = self._check_filter_objects(filter_checks)
+
+        self.start_log_block()
+        projects = self.query_resource_json("projects", filters=filters, sorts=sorts, fields=fields,
+                                            page_number=page_number)
+        self.end_log_block()
+        return projects
+
+    def query_projects_records(self, name_filter: Optional[UrlFilter] = None,
+                               owner_name_filter: Optional[UrlFilter] = None,
+                               updated_at_filter: Optional[UrlFilter] = None,
+                               created_at_filter: Optional[UrlFilter] = None,
+                               owner_domain_filter: Optional[UrlFilter] = None,
+                               owner_email_filter: Optional[UrlFilter] = None, sorts: Optional[List[Sort]] = None,
+                               page_size: Optional[int] = None, max_workers: int = 4) -> List[ProjectRecord]:
         filter_checks = {'name': name_filter, 'ownerName': owner_name_filter,
                          'updatedAt': updated_at_filter, 'createdAt': created_at_filter,
                          'ownerDomain': owner_domain_filter, 'ownerEmail': owner_email_filter}
@@ -155,7 +185,8 @@ class ProjectMethods27(ProjectMethods):
         filters = self._check_filter_objects(filter_checks)
 
         self.start_log_block()
-        projects = self.query_resource_json("projects", filters=filters, sorts=sorts, page_number=None)
+        projects = self.query_resource_records("projects", ProjectRecord, filters=filters, sorts=sorts,
+                                               page_size=page_size, max_workers=max_workers)
         self.end_log_block()
         return projects
 
@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 
 import os
-from typing import Union, Optional, List, Dict, Tuple
+from typing import Union, Optional, List, Dict, Tuple, Iterator
 from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+import collections
 import copy
+import math
+import threading
 import xml.etree.ElementTree as ET
 import random
 import re
@@ -18,6 +22,11 @@ from tableau_tools.tableau_rest_api.rest_json_request import RestJsonRequest
 from tableau_tools.tableau_rest_api.published_content import Project, Project28, Project33, Workbook, Datasource, Flow33
 from tableau_tools.tableau_rest_api.url_filter import *
 from tableau_tools.tableau_rest_api.sort import *
+from tableau_tools.tableau_rest_api.fields import *
+from tableau_tools.tableau_rest_api.records import *
+from tableau_tools.tableau_rest_api.extract_task_catalog import ExtractRefreshTaskCatalog
+from tableau_tools.tableau_rest_api.export_cache import ExportCache
+from tableau_tools.tableau_rest_api.principal_map import PrincipalMap
 from ...tableau_rest_xml import TableauRestXml
 
 class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
@@ -49,10 +58,23 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
         # UrlFilter object for factory methods
         self.url_filters = UrlFilter
         self.sorts = Sort
+        self.field_presets = Fields
 
         # Lookup caches to minimize calls
         self.username_luid_cache = {}
         self.group_name_luid_cache = {}
+        # Built on first use by get_extract_refresh_task_catalog()
+        self._extract_refresh_task_catalog = None
+        # (original connection, its site luid, username_map) : PrincipalMap, for get_principal_map()
+        self._principal_maps = {}
+        # Set by enable_export_cache()
+        self.export_cache: Optional[ExportCache] = None
+        self._export_cache_revalidate = False
+        # view luid : workbook luid, for revalidating the export cache
+        self._view_workbook_luids = {}
+
+        # Per-thread RestXmlRequest objects for the concurrent query methods
+        self._thread_local = threading.local()
 
         # For working around SSL issues
         self.verify_ssl_cert = True
@@ -183,10 +205,16 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
                 final_string += "?{}".format(url_parameters)
         return final_string
 
+    # The Metadata API's GraphQL endpoint is the same for every site and API version
+    def build_metadata_url(self) -> str:
+        return "{}/api/metadata/graphql".format(self.server)
+
     @staticmethod
     def build_url_parameter_string(map_dict: Optional[Dict] = None, name_value_tuple_list: Optional[List[Tuple]] = None,
                                    hand_built_portion: Optional[str] = None):
         encoded_list = None
+        if map_dict is not None and len(map_dict) > 0:
+            encoded_list = urlencode(map_dict)
         if name_value_tuple_list is not None:
             if len(name_value_tuple_list) > 0:
                 for v in name_value_tuple_list:
@@ -194,7 +222,9 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
                         raise InvalidOptionException('Each element should have a two-element Tuples (Name, Value)')
                     encoded_list = urlencode(name_value_tuple_list)
 
-        if hand_built_portion is not None and encoded_list is None:
+        if hand_built_portion is None and encoded_list is None:
+            final_string = None
+        elif hand_built_portion is not None and encoded_list is None:
             final_string = hand_built_portion
         elif hand_built_portion is None and encoded_list is not None:
             final_string = encoded_list
@@ -202,6 +232,32 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
             final_string = "{}&{}".format(hand_built_portion, encoded_list)
         return final_string
 
+    # The URL parameters for the view image / pdf / data and workbook pdf downloads. Lists in view_filter_map become
+    # comma-separated values
+    @staticmethod
+    def _build_data_file_parameters(view_filter_map: Optional[Dict] = None, high_resolution: bool = False,
+                                    max_age_minutes: Optional[int] = None, page_type: Optional[str] = None,
+                                    page_orientation: Optional[str] = None) -> Dict[str, str]:
+        url_param_map = {}
+        if view_filter_map is not None:
+            for key in view_filter_map:
+                new_key = "vf_{}".format(key)
+                # Check if this just a string (or a single number or date)
+                if isinstance(view_filter_map[key], (list, tuple, set)):
+                    value = ",".join(map(str, view_filter_map[key]))
+                else:
+                    value = str(view_filter_map[key])
+                url_param_map[new_key] = value
+        if high_resolution is True:
+            url_param_map['resolution'] = "high"
+        if max_age_minutes is not None:
+            url_param_map['maxAge'] = str(max_age_minutes)
+        if page_type is not None:
+            url_param_map['page-type'] = page_type
+        if page_orientation is not None:
+            url_param_map['page-orientation'] = page_orientation
+        return url_param_map
+
     # Check method for filter objects
     @staticmethod
     def _check_filter_objects(filter_checks):
@@ -295,6 +351,8 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
             self.token = credentials_element[0].get("token")
             self.log("Token is " + self.token)
             self._request_obj.token = self.token
+            # A new session, possibly as another user or on another site
+            self.clear_luid_caches()
             self.site_luid = credentials_element[0].findall(".//t:site", self.ns_map)[0].get("id")
             self.user_luid = credentials_element[0].findall(".//t:user", self.ns_map)[0].get("id")
             self.log("Site ID is " + self.site_luid)
@@ -311,8 +369,7 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
         self.token = token
         # Reset caches if you are changing site
         if self.site_luid != site_luid:
-            self.group_name_luid_cache = {}
-            self.username_luid_cache = {}
+            self.clear_luid_caches()
         self.site_luid = site_luid
         self.user_luid = user_luid
         if self._request_obj is None:
@@ -342,13 +399,15 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
 
     def switch_site(self, site_content_url):
         self.start_log_block()
-        url = self.build_api_url("auth/signout", server_level=True)
-        self.log('Switching site via'.format(url))
+        url = self.build_api_url("auth/switchSite", server_level=True)
+        self.log('Switching site via {}'.format(url))
         tsr = ET.Element('tsRequest')
         s = ET.Element('site')
         s.set('contentUrl', site_content_url)
         tsr.append(s)
 
+        self._request_obj.url = url
+        self._request_obj.xml_request = tsr
         self._request_obj.http_verb = 'post'
         self.log('Switch site request XML is\n {}'.format(ET.tostring(tsr)))
 
@@ -360,6 +419,8 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
         self.token = credentials_element[0].get("token")
         self.log("Token is " + self.token)
         self._request_obj.token = self.token
+        # A new session, possibly as another user or on another site
+        self.clear_luid_caches()
         self.site_luid = credentials_element[0].findall(".//t:site", self.ns_map)[0].get("id")
         self.user_luid = credentials_element[0].findall(".//t:user", self.ns_map)[0].get("id")
         self.log("Site ID is " + self.site_luid)
@@ -368,17 +429,13 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
 
         self.end_log_block()
 
-    #
-    # HTTP "verb" methods. These actually communicate with the RestXmlRequest object to place the requests
-    #
-
-    # baseline method for any get request. appends to base url
-    def query_resource(self, url_ending: str, server_level:bool = False, filters: Optional[List[UrlFilter]] = None,
-                       sorts: Optional[List[Sort]] = None, additional_url_ending: Optional[str] = None,
-                       fields: Optional[List[str]] = None) -> ET.Element:
-        self.start_log_block()
-        if self.token == "":
-            raise NotSignedInException('Must use .signin() to create REST API session first')
+    # Adds the filter, sort and fields parameters on to a url_ending, for the query_resource methods.
+    # fields can be a list of field names or the name of a Fields preset
+    @staticmethod
+    def build_query_url_ending(url_ending: str, filters: Optional[List[UrlFilter]] = None,
+                               sorts: Optional[List[Sort]] = None, additional_url_ending: Optional[str] = None,
+                               fields: Optional[Union[List[str], str]] = None) -> str:
+        fields = Fields.resolve(url_ending, fields)
         url_endings = []
         if filters is not None:
             if len(filters) > 0:
@@ -412,6 +469,21 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
                     first = False
                 else:
                     url_ending += "&{}".format(ending)
+        return url_ending
+
+    #
+    # HTTP "verb" methods. These actually communicate with the RestXmlRequest object to place the requests
+    #
+
+    # baseline method for any get request. appends to base url
+    def query_resource(self, url_ending: str, server_level:bool = False, filters: Optional[List[UrlFilter]] = None,
+                       sorts: Optional[List[Sort]] = None, additional_url_ending: Optional[str] = None,
+                       fields: Optional[Union[List[str], str]] = None) -> ET.Element:
+        self.start_log_block()
+        if self.token == "":
+            raise NotSignedInException('Must use .signin() to create REST API session first')
+        url_ending = self.build_query_url_ending(url_ending, filters=filters, sorts=sorts,
+                                                 additional_url_ending=additional_url_ending, fields=fields)
 
         api_call = self.build_api_url(url_ending, server_level)
         self._request_obj.set_response_type('xml')
@@ -423,29 +495,260 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
         self.end_log_block()
         return xml
 
+    # RestXmlRequest holds the state of the call in progress, so it can't be shared between threads. Each thread
+    # gets its own request object (with its own requests.Session) using the same session token
+    def _get_thread_request_obj(self) -> RestXmlRequest:
+        request_obj = getattr(self._thread_local, 'request_obj', None)
+        if request_obj is None or request_obj.token != self.token:
+            request_obj = RestXmlRequest(None, self.token, self.logger, ns_map_url=self.ns_map['t'],
+                                         verify_ssl_cert=self.verify_ssl_cert)
+            request_obj.token = self.token
+            self._thread_local.request_obj = request_obj
+        return request_obj
+
+    def _get_thread_request_json_obj(self) -> RestJsonRequest:
+        request_json_obj = getattr(self._thread_local, 'request_json_obj', None)
+        if request_json_obj is None or request_json_obj.token != self.token:
+            request_json_obj = RestJsonRequest(token=self.token, logger=self.logger,
+                                               verify_ssl_cert=self.verify_ssl_cert)
+            self._thread_local.request_json_obj = request_json_obj
+        return request_json_obj
+
+    # Thread-safe equivalents of query_resource (for unpaginated responses), send_update_request, send_add_request and
+    # send_delete_request, for methods that send many small requests from a pool of threads
+    def query_resource_in_thread(self, url_ending: str, server_level: bool = False) -> ET.Element:
+        if self.token == "":
+            raise NotSignedInException('Must use .signin() to create REST API session first')
+        request_obj = self._get_thread_request_obj()
+        request_obj.set_response_type('xml')
+        request_obj.http_verb = 'get'
+        request_obj.url = self.build_api_url(url_ending, server_level)
+        # Page 0 leaves off the pageNumber parameter
+        response = request_obj.request_single_page(0)
+        request_obj.url = None
+        return response
+
+    def send_update_request_in_thread(self, url: str, request: ET.Element) -> ET.Element:
+        if self.token == "":
+            raise NotSignedInException('Must use .signin() to create REST API session first')
+        request_obj = self._get_thread_request_obj()
+        request_obj.set_response_type('xml')
+        request_obj.url = url
+        request_obj.xml_request = request
+        request_obj.http_verb = 'put'
+        request_obj.request_from_api(0)
+        request_obj.url = None
+        request_obj.xml_request = None
+        return request_obj.get_response()
+
+    def send_add_request_in_thread(self, url: str, request: ET.Element) -> ET.Element:
+        if self.token == "":
+            raise NotSignedInException('Must use .signin() to create REST API session first')
+        request_obj = self._get_thread_request_obj()
+        request_obj.set_response_type('xml')
+        request_obj.url = url
+        request_obj.xml_request = request
+        request_obj.http_verb = 'post'
+        request_obj.request_from_api(0)
+        request_obj.url = None
+        request_obj.xml_request = None
+        return request_obj.get_response()
+
+    # Returns 1, or 0 when there was nothing to delete. Any other RecoverableHTTPException is raised, so that the
+    # caller can tell a refused DELETE from a successful one
+    def send_delete_request_in_thread(self, url: str) -> int:
+        if self.token == "":
+            raise NotSignedInException('Must use .signin() to create REST API session first')
+        request_obj = self._get_thread_request_obj()
+        request_obj.set_response_type('xml')
+        request_obj.url = url
+        request_obj.http_verb = 'delete'
+        try:
+            request_obj.request_from_api(0)
+            request_obj.url = None
+            return 1
+        except RecoverableHTTPException as e:
+            self.log('Non fatal HTTP Exception Response {}, Tableau Code {}'.format(e.http_code, e.tableau_error_code))
+            request_obj.url = None
+            # The error codes come back from the response as strings
+            if str(e.tableau_error_code) in ['404003', '404002']:
+                self.log('Delete action did not find the resource. Consider successful, keep going')
+                return 0
+            raise
+
+    def send_add_request_json_in_thread(self, url: str, request: Dict) -> Dict:
+        if self.token == "":
+            raise NotSignedInException('Must use .signin() to create REST API session first')
+        request_json_obj = self._get_thread_request_json_obj()
+        request_json_obj.http_verb = 'post'
+        request_json_obj.url = url
+        request_json_obj.json_request = request
+        request_json_obj.request_from_api(0)
+        request_json_obj.url = None
+        request_json_obj.json_request = None
+        return request_json_obj.get_response()
+
+    # Streams a binary GET (view images, PDFs, CSV data) in chunks rather than holding the whole response in memory.
+    # Nothing is requested until the first chunk is read
+    def stream_binary_get_request_in_thread(self, url: str, chunk_size: int = 65536) -> Iterator[bytes]:
+        if self.token == "":
+            raise NotSignedInException('Must use .signin() to create REST API session first')
+        request_obj = self._get_thread_request_obj()
+        return request_obj.request_stream(url, chunk_size=chunk_size)
+
+    # Writes the response straight to disk (through a .part file, so a failed download never leaves a partial file
+    # under the real name) and returns the number of bytes written
+    def download_file_in_thread(self, url: str, filename: str, chunk_size: int = 65536) -> int:
+        bytes_written = 0
+        part_filename = "{}.part".format(filename)
+        try:
+            with open(part_filename, 'wb') as part_file:
+                for chunk in self.stream_binary_get_request_in_thread(url, chunk_size=chunk_size):
+                    part_file.write(chunk)
+                    bytes_written += len(chunk)
+            os.replace(part_filename, filename)
+        finally:
+            if os.path.exists(part_filename):
+                os.remove(part_filename)
+        return bytes_written
+
+    # Returns the content element of a single page (the <users> or <workbooks> etc.) and the total page count
+    def _query_single_page(self, url: str, page_number: int) -> Tuple[ET.Element, int]:
+        request_obj = self._get_thread_request_obj()
+        request_obj.set_response_type('xml')
+        request_obj.http_verb = 'get'
+        request_obj.url = url
+        response = request_obj.request_single_page(page_number)
+        request_obj.url = None
+        content_element = None
+        total_pages = 1
+        for e in response:
+            if e.tag.endswith('pagination'):
+                page_size = int(e.get('pageSize'))
+                total_available = int(e.get('totalAvailable'))
+                total_pages = max(int(math.ceil(float(total_available) / float(page_size))), 1)
+            elif content_element is None:
+                content_element = e
+        if content_element is None:
+            content_element = ET.Element('{}empty'.format(self.ns_prefix))
+        return content_element, total_pages
+
+    # Same parameters as query_resource, but hands back each page's content element in page order as it arrives.
+    # After the first page (which gives the total), the remaining pages are requested concurrently, with no more
+    # than max_workers * 2 pages held in memory waiting to be consumed
+    def query_resource_pages(self, url_ending: str, server_level: bool = False,
+                             filters: Optional[List[UrlFilter]] = None, sorts: Optional[List[Sort]] = None,
+                             additional_url_ending: Optional[str] = None,
+                             fields: Optional[Union[List[str], str]] = None, page_size: Optional[int] = None,
+                             max_workers: int = 4) -> Iterator[ET.Element]:
+        if self.token == "":
+            raise NotSignedInException('Must use .signin() to create REST API session first')
+        if page_size is not None:
+            page_size_param = "pageSize={}".format(page_size)
+            if additional_url_ending is None:
+                additional_url_ending = page_size_param
+            else:
+                additional_url_ending = "{}&{}".format(additional_url_ending, page_size_param)
+        url_ending = self.build_query_url_ending(url_ending, filters=filters, sorts=sorts,
+                                                 additional_url_ending=additional_url_ending, fields=fields)
+        url = self.build_api_url(url_ending, server_level)
+
+        first_page, total_pages = self._query_single_page(url, 1)
+        self.log('{} pages available from {}'.format(total_pages, url))
+        yield first_page
+        if total_pages == 1:
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = collections.deque()
+            next_page = 2
+            while next_page <= total_pages or len(pending) > 0:
+                while next_page <= total_pages and len(pending) < max_workers * 2:
+                    pending.append(executor.submit(self._query_single_page, url, next_page))
+                    next_page += 1
+                page, page_count = pending.popleft().result()
+                yield page
+
+    # Equivalent to query_resource, with the pages after the first requested concurrently
+    def query_resource_concurrently(self, url_ending: str, server_level: bool = False,
+                                    filters: Optional[List[UrlFilter]] = None, sorts: Optional[List[Sort]] = None,
+                                    additional_url_ending: Optional[str] = None,
+                                    fields: Optional[Union[List[str], str]] = None, page_size: Optional[int] = None,
+                                    max_workers: int = 4) -> ET.Element:
+        self.start_log_block()
+        combined_xml_obj = None
+        for page in self.query_resource_pages(url_ending, server_level=server_level, filters=filters, sorts=sorts,
+                                              additional_url_ending=additional_url_ending, fields=fields,
+                                              page_size=page_size, max_workers=max_workers):
+            if combined_xml_obj is None:
+                combined_xml_obj = page
+            else:
+                for e in page:
+                    combined_xml_obj.append(e)
+        self.end_log_block()
+        return combined_xml_obj
+
+    # Same listing as query_resource, but each page is converted to records (see records.py) as it arrives and then
+    # thrown away, so the full XML tree never exists in memory. The query_*_records methods are built on this
+    def query_resource_records(self, url_ending: str, record_class, server_level: bool = False,
+                               filters: Optional[List[UrlFilter]] = None, sorts: Optional[List[Sort]] = None,
+                               additional_url_ending: Optional[str] = None,
+                               fields: Optional[Union[List[str], str]] = None, page_size: Optional[int] = None,
+                               max_workers: int = 4) -> List:
+        self.start_log_block()
+        records = []
+        for page in self.query_resource_pages(url_ending, server_level=server_level, filters=filters, sorts=sorts,
+                                              additional_url_ending=additional_url_ending, fields=fields,
+                                              page_size=page_size, max_workers=max_workers):
+            records.extend([record_class.from_element(element) for element in page])
+        self.log('Converted {} elements to {}'.format(len(records), record_class.__name__))
+        self.end_log_block()
+        return records
+
+    # The extract refresh tasks on the site, listed once and shared by every method that needs to find a task.
+    # refresh=True lists them again, for when tasks may have been changed outside of tableau_tools
+    def get_extract_refresh_task_catalog(self, refresh: bool = False) -> ExtractRefreshTaskCatalog:
+        if self._extract_refresh_task_catalog is None:
+            self._extract_refresh_task_catalog = ExtractRefreshTaskCatalog(self, logger_obj=self.logger)
+        elif refresh is True:
+            self._extract_refresh_task_catalog.refresh()
+        return self._extract_refresh_task_catalog
+
+    # The PrincipalMap from orig_t_rest_api's site to this one, built once and shared by every permissions conversion
+    # that doesn't pass its own. There is one per original site and username_map
+    def get_principal_map(self, orig_t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'],
+                          username_map: Optional[Dict[str, str]] = None) -> PrincipalMap:
+        key = (orig_t_rest_api, orig_t_rest_api.site_luid,
+               frozenset(username_map.items()) if username_map is not None else None)
+        if key not in self._principal_maps:
+            self._principal_maps[key] = PrincipalMap(orig_t_rest_api, self, username_map=username_map,
+                                                     logger_obj=self.logger)
+        return self._principal_maps[key]
+
+    # fields (a list or a Fields preset name) overrides all_fields when it is passed
     def query_elements_from_endpoint_with_filter(self, element_name: str, name_or_luid: Optional[str] = None,
-                                                 all_fields: bool = True) -> ET.Element:
+                                                 all_fields: bool = True,
+                                                 fields: Optional[Union[List[str], str]] = None) -> ET.Element:
 
         self.start_log_block()
+        if fields is None and all_fields is True:
+            fields = 'full'
         # A few elements have singular endpoints
         singular_endpoints = ['workbook', 'user', 'datasource', 'site']
         if element_name in singular_endpoints and self.is_luid(name_or_luid):
-            if all_fields is True:
-                element = self.query_resource("{}s/{}?fields=_all_".format(element_name, name_or_luid))
-            else:
-                element = self.query_resource("{}s/{}".format(element_name, name_or_luid))
+            element = self.query_resource("{}s/{}".format(element_name, name_or_luid), fields=fields)
             self.end_log_block()
             return element
         else:
             if self.is_luid(name_or_luid):
-                if all_fields is True:
-                    elements = self.query_resource("{}s?fields=_all_".format(element_name))
-                else:
-                    elements = self.query_resource("{}s".format(element_name))
+                elements = self.query_resource("{}s".format(element_name), fields=fields)
                 luid = name_or_luid
                 elements = elements.findall('.//t:{}[@id="{}"]'.format(element_name, luid), self.ns_map)
             else:
-                elements = self.query_resource("{}s?filter=name:eq:{}&fields=_all_".format(element_name, name_or_luid))
+                # The name search has always brought back all fields
+                if fields is None:
+                    fields = 'full'
+                elements = self.query_resource("{}s".format(element_name),
+                                               filters=[UrlFilter.get_name_filter(name_or_luid)], fields=fields)
         self.end_log_block()
         return elements
 
@@ -490,11 +793,12 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
         pass
 
     def query_single_element_luid_from_endpoint_with_filter(self, element_name: str, name: str) -> str:
-        # Double check which can be optimized with the Fields to only bring back id
-        optimizable_fields = ['user', ]
+        # These endpoints take fields, so only bring back the id and name
+        optimizable_fields = ['user', 'workbook', 'datasource', 'view']
         self.start_log_block()
         if element_name in optimizable_fields:
-            elements = self.query_resource("{}s?filter=name:eq:{}&fields=id".format(element_name, name))
+            elements = self.query_resource("{}s".format(element_name), filters=[UrlFilter.get_name_filter(name)],
+                                           fields='minimal')
         else:
             elements = self.query_resource("{}s?filter=name:eq:{}".format(element_name, name))
         if len(elements) == 1:
@@ -528,43 +832,12 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
     def query_resource_json(self, url_ending: str, server_level: bool = False,
                             filters: Optional[List[UrlFilter]] = None,
                             sorts: Optional[List[Sort]] = None, additional_url_ending: str = None,
-                            fields: Optional[List[str]] = None, page_number: Optional[int] = None) -> Dict:
+                            fields: Optional[Union[List[str], str]] = None, page_number: Optional[int] = None) -> Dict:
         self.start_log_block()
         if self.token == "":
             raise NotSignedInException('Must use .signin() to create REST API session first')
-        url_endings = []
-        if filters is not None:
-            if len(filters) > 0:
-                filters_url = "filter="
-                for f in filters:
-                    filters_url += f.get_filter_string() + ","
-                filters_url = filters_url[:-1]
-                url_endings.append(filters_url)
-        if sorts is not None:
-            if len(sorts) > 0:
-                sorts_url = "sort="
-                for sort in sorts:
-                    sorts_url += sort.get_sort_string() + ","
-                sorts_url = sorts_url[:-1]
-                url_endings.append(sorts_url)
-        if fields is not None:
-            if len(fields) > 0:
-                fields_url = "fields="
-                for field in fields:
-                    fields_url += "{},".format(field)
-                fields_url = fields_url[:-1]
-                url_endings.append(fields_url)
-        if additional_url_ending is not None:
-            url_endings.append(additional_url_ending)
-
-        first = True
-        if len(url_endings) > 0:
-            for ending in url_endings:
-                if first is True:
-                    url_ending += "?{}".format(ending)
-                    first = False
-                else:
-                    url_ending += "&{}".format(ending)
+        url_ending = self.build_query_url_ending(url_ending, filters=filters, sorts=sorts,
+                                                 additional_url_ending=additional_url_ending, fields=fields)
 
         api_call = self.build_api_url(url_ending, server_level)
         if self._request_json_obj is None:
@@ -951,31 +1224,64 @@ class TableauRestApiBase(LookupMethods, LoggingMethods, TableauRestXml):
         self.send_append_request(url=url, content=publish_request, boundary_string=boundary_string)
 
     # Generic implementation of all the CSV/PDF/PNG requests
+    # Goes through the export cache, when there is one (see enable_export_cache())
+    def _get_data_file(self, url_ending: str, url_params_str: Optional[str] = None,
+                       max_age_minutes: Optional[int] = None) -> bytes:
+        if url_params_str is not None:
+            url_ending = "{}?{}".format(url_ending, url_params_str)
+        version = None
+        if self.export_cache is not None:
+            version = self._get_export_version(url_ending)
+            cached = self.export_cache.get_bytes(url_ending, max_age_minutes=max_age_minutes, version=version,
+                                                 site_luid=self.site_luid, user_luid=self.user_luid)
+            if cached is not None:
+                self.log('Export found in cache for {}'.format(url_ending))
+                return cached
+        binary_result = self.send_binary_get_request(self.build_api_url(url_ending))
+        if self.export_cache is not None:
+            self.export_cache.put_bytes(url_ending, binary_result, version=version, site_luid=self.site_luid,
+                                        user_luid=self.user_luid)
+        return binary_result
+
+    # Keeps rendered views (images, PDFs, CSV data) on disk and hands them back for repeat requests made within
+    # max_age_minutes (or default_max_age_minutes). With revalidate=True, the workbook's updatedAt is checked before
+    # each cached file is used (one extra request, much cheaper than a render), so a republished workbook is rendered
+    # again straight away
+    def enable_export_cache(self, cache_directory: str, max_size_mb: float = 1024,
+                            default_max_age_minutes: float = 60, revalidate: bool = False) -> ExportCache:
+        self.export_cache = ExportCache(cache_directory, max_size_mb=max_size_mb,
+                                        default_max_age_minutes=default_max_age_minutes, logger_obj=self.logger)
+        self._export_cache_revalidate = revalidate
+        return self.export_cache
+
+    def disable_export_cache(self):
+        self.export_cache = None
+
+    # The workbook's updatedAt for a views/... or workbooks/... url ending, when revalidating the export cache
+    def _get_export_version(self, url_ending: str) -> Optional[str]:
+        if self._export_cache_revalidate is False:
+            return None
+        content_type, luid = url_ending.split('?')[0].split('/')[0:2]
+        if content_type == 'views':
+            if luid not in self._view_workbook_luids:
+                view = self.query_resource_in_thread("views/{}".format(luid))
+                self._view_workbook_luids[luid] = view.find('.//t:view/t:workbook', self.ns_map).get('id')
+            luid = self._view_workbook_luids[luid]
+        workbook = self.query_resource_in_thread("workbooks/{}".format(luid))
+        return workbook.find('.//t:workbook', self.ns_map).get('updatedAt')
+
     def _query_data_file(self, download_type: str, view_name_or_luid: str, high_resolution: Optional[bool] = None,
                          view_filter_map: Optional[Dict] = None,
                          wb_name_or_luid: Optional[str] = None, proj_name_or_luid: Optional[str] = None) -> bytes:
         self.start_log_block()
         view_luid = self.query_workbook_view_luid(wb_name_or_luid, view_name=view_name_or_luid,
                                                       proj_name_or_luid=proj_name_or_luid)
-        url_param_map = {}
-        if view_filter_map is not None:
-            for key in view_filter_map:
-                new_key = "vf_{}".format(key)
-                # Check if this just a string
-                if isinstance(view_filter_map[key], str):
-                    value = view_filter_map[key]
-                else:
-                    value = ",".join(map(str, view_filter_map[key]))
-                url_param_map[new_key] = value
-
-        if high_resolution is True:
-                url_param_map['resolution'] = "high"
+        url_param_map = self._build_data_file_parameters(view_filter_map, high_resolution=high_resolution)
 
         url_params_str = self.build_url_parameter_string(map_dict=url_param_map)
         try:
 
-            url = self.build_api_url("views/{}/{}".format(view_luid, download_type), url_parameters=url_params_str)
-            binary_result = self.send_binary_get_request(url)
+            binary_result = self._get_data_file("views/{}/{}".format(view_luid, download_type), url_params_str)
 
             self.end_log_block()
             return binary_result
@@ -1135,42 +1441,26 @@ class TableauRestApiBase34(TableauRestApiBase33):
 
     # Generic implementation of all the CSV/PDF/PNG requests
     def _query_data_file(self, download_type: str, view_name_or_luid: Optional[str] = None, high_resolution: bool = False,
-                         view_filter_map=Dict, wb_name_or_luid: Optional[str] = None,
+                         view_filter_map: Optional[Dict] = None, wb_name_or_luid: Optional[str] = None,
                          proj_name_or_luid: Optional[str] = None, max_age_minutes: Optional[int] = None,
                          page_orientation: Optional[str] = None, page_type: Optional[str] = None) -> bytes:
 
         self.start_log_block()
-        url_param_map = {}
-        if view_filter_map is not None:
-            for key in view_filter_map:
-                new_key = "vf_{}".format(key)
-                # Check if this just a string
-                if isinstance(view_filter_map[key], str):
-                    value = view_filter_map[key]
-                else:
-                    value = ",".join(map(str,view_filter_map[key]))
-                url_param_map[new_key] = value
-
-        if high_resolution is True:
-            url_param_map['resolution'] = "high"
-        if page_type is not None:
-            url_param_map['page-type'] = page_type
-        if page_orientation is not None:
-            url_param_map['page-orientation'] = page_orientation
+        url_param_map = self._build_data_file_parameters(view_filter_map, high_resolution=high_resolution,
+                                                         max_age_minutes=max_age_minutes, page_type=page_type,
+                                                         page_orientation=page_orientation)
 
         url_params_str = self.build_url_parameter_string(map_dict=url_param_map)
         try:
             # Workbook PDF request is only like this right now
             if view_name_or_luid is None:
                 wb_luid = self.query_workbook_luid(wb_name=wb_name_or_luid, proj_name_or_luid=proj_name_or_luid)
-                url = self.build_api_url("workbooks/{}/{}".format(wb_luid, download_type),
-                                         url_parameters=url_params_str)
+                url_ending = "workbooks/{}/{}".format(wb_luid, download_type)
             else:
                 view_luid = self.query_workbook_view_luid(wb_name_or_luid, view_name=view_name_or_luid,
                                                           proj_name_or_luid=proj_name_or_luid)
-                url = self.build_api_url("views/{}/{}".format(view_luid, download_type),
-                                         url_parameters=url_params_str)
-            binary_result = self.send_binary_get_request(url)
+                url_ending = "views/{}/{}".format(view_luid, download_type)
+            binary_result = self._get_data_file(url_ending, url_params_str, max_age_minutes=max_age_minutes)
 
             self.end_log_block()
             return binary_result
@@ -1218,6 +1508,20 @@ class TableauRestApiBase36(TableauRestApiBase35):
         # Lookup caches to minimize calls
         self.username_luid_cache = {}
         self.group_name_luid_cache = {}
+        # Built on first use by get_extract_refresh_task_catalog()
+        self._extract_refresh_task_catalog = None
+        # (original connection, its site luid, username_map) : PrincipalMap, for get_principal_map()
+        self._principal_maps = {}
+        # Set by enable_export_cache()
+        self.export_cache: Optional[ExportCache] = None
+        self._export_cache_revalidate = False
+        # view luid : workbook luid, for revalidating the export cache
+        self._view_workbook_luids = {}
+
+        # Per-thread RestXmlRequest objects for the concurrent query methods
+        self._thread_local = threading.local()
+
+        self.field_presets = Fields
 
         # For working around SSL issues
         self.verify_ssl_cert = True
@@ -1281,6 +1585,8 @@ class TableauRestApiBase36(TableauRestApiBase35):
         self.token = credentials_element[0].get("token")
         self.log("Token is " + self.token)
         self._request_obj.token = self.token
+        # A new session, possibly as another user or on another site
+        self.clear_luid_caches()
         self.site_luid = credentials_element[0].findall(".//t:site", self.ns_map)[0].get("id")
         self.user_luid = credentials_element[0].findall(".//t:user", self.ns_map)[0].get("id")
         self.log("Site ID is " + self.site_luid)
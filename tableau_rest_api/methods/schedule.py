@@ -1,4 +1,5 @@
 from .rest_api_base import *
+import copy
 
 
 class ScheduleMethods():
@@ -20,6 +21,13 @@ class ScheduleMethods():
         self.end_log_block()
         return schedules
 
+    # Returns ScheduleRecord tuples rather than XML
+    def query_schedules_records(self, page_size: Optional[int] = None) -> List[ScheduleRecord]:
+        self.start_log_block()
+        schedules = self.query_resource_records("schedules", ScheduleRecord, server_level=True, page_size=page_size)
+        self.end_log_block()
+        return schedules
+
     def query_extract_schedules(self) -> ET.Element:
         self.start_log_block()
         schedules = self.query_schedules()
@@ -286,6 +294,8 @@ class ScheduleMethods():
         schedule_luid = self.query_schedule_luid(schedule_name_or_luid)
         url = self.build_api_url("schedules/{}".format(schedule_luid), server_level=True)
         self.send_delete_request(url)
+        if self._extract_refresh_task_catalog is not None:
+            self._extract_refresh_task_catalog.remove_tasks_for_schedule(schedule_luid)
         self.end_log_block()
 
 
@@ -297,12 +307,29 @@ class ScheduleMethods28(ScheduleMethods27):
     def __init__(self, rest_api_base: TableauRestApiBase28):
         self.rest_api_base = rest_api_base
 
+    # The same tsResponse / task / extractRefresh shape that the PUT returns, for a task that is already in the catalog
+    def _build_task_response(self, extract_refresh: ET.Element) -> ET.Element:
+        ns = self.ns_map['t']
+        tsr = ET.Element('{{{}}}tsResponse'.format(ns))
+        t = ET.SubElement(tsr, '{{{}}}task'.format(ns))
+        t.append(copy.deepcopy(extract_refresh))
+        return tsr
+
+    # If the workbook already has an extract refresh task on the schedule, nothing is sent and that task is returned
+    # in the same tsResponse shape as a new one
     def add_workbook_to_schedule(self, wb_name_or_luid: str, schedule_name_or_luid: str,
                                  proj_name_or_luid: Optional[str] = None) -> ET.Element:
         self.start_log_block()
         wb_luid = self.query_workbook_luid(wb_name_or_luid, proj_name_or_luid)
         schedule_luid = self.query_schedule_luid(schedule_name_or_luid)
 
+        catalog = self.get_extract_refresh_task_catalog()
+        existing = [task for task in catalog.get_tasks_for_workbook(wb_luid) if task.schedule_luid == schedule_luid]
+        if len(existing) > 0:
+            self.log('Workbook {} is already on schedule {}'.format(wb_luid, schedule_luid))
+            self.end_log_block()
+            return self._build_task_response(catalog.get_task_elements(existing)[0])
+
         tsr = ET.Element('tsRequest')
         t = ET.Element('task')
         er = ET.Element('extractRefresh')
@@ -314,6 +341,7 @@ class ScheduleMethods28(ScheduleMethods27):
 
         url = self.build_api_url("schedules/{}/workbooks".format(schedule_luid))
         response = self.send_update_request(url, tsr)
+        catalog.add_task_element(response, schedule_luid)
 
         self.end_log_block()
         return response
@@ -322,9 +350,16 @@ class ScheduleMethods28(ScheduleMethods27):
                                    proj_name_or_luid: Optional[str] = None) -> ET.Element:
         self.start_log_block()
 
-        ds_luid = self.query_workbook_luid(ds_name_or_luid, proj_name_or_luid)
+        ds_luid = self.query_datasource_luid(ds_name_or_luid, proj_name_or_luid)
         schedule_luid = self.query_schedule_luid(schedule_name_or_luid)
 
+        catalog = self.get_extract_refresh_task_catalog()
+        existing = [task for task in catalog.get_tasks_for_datasource(ds_luid) if task.schedule_luid == schedule_luid]
+        if len(existing) > 0:
+            self.log('Datasource {} is already on schedule {}'.format(ds_luid, schedule_luid))
+            self.end_log_block()
+            return self._build_task_response(catalog.get_task_elements(existing)[0])
+
         tsr = ET.Element('tsRequest')
         t = ET.Element('task')
         er = ET.Element('extractRefresh')
@@ -336,6 +371,7 @@ class ScheduleMethods28(ScheduleMethods27):
 
         url = self.build_api_url("schedules/{}/datasources".format(schedule_luid))
         response = self.send_update_request(url, tsr)
+        catalog.add_task_element(response, schedule_luid)
 
         self.end_log_block()
         return response
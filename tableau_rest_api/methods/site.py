@@ -133,6 +133,7 @@ class SiteMethods():
         self.start_log_block()
         url = self.build_api_url("sites/{}".format(self.site_luid), server_level=True)
         self.send_delete_request(url)
+        self.clear_luid_caches()
         self.end_log_block()
 
 class SiteMethods27(SiteMethods):
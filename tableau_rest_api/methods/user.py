@@ -1,4 +1,6 @@
 from .rest_api_base import *
+from typing import Iterable
+from ..user_provisioning import UserProvisioner, ProvisioningRecord, ProvisioningSummary
 
 
 class UserMethods():
@@ -11,13 +13,13 @@ class UserMethods():
     # The reference has this name, so for consistency adding an alias
     def get_users(self, all_fields: bool = True, last_login_filter: Optional[UrlFilter] = None,
                   site_role_filter: Optional[UrlFilter] = None, sorts: Optional[List[Sort]] = None,
-                  fields: Optional[List[str] ] =None) -> ET.Element:
+                  fields: Optional[Union[List[str], str]] = None) -> ET.Element:
         return self.query_users(all_fields=all_fields, last_login_filter=last_login_filter,
                                 site_role_filter=site_role_filter, sorts=sorts, fields=fields)
 
     def query_users(self, all_fields: bool = True, last_login_filter: Optional[UrlFilter] = None,
                     site_role_filter: Optional[UrlFilter] = None, username_filter: Optional[UrlFilter] = None,
-                    sorts: Optional[List[Sort]] = None, fields: Optional[List[str] ] =None) -> ET.Element:
+                    sorts: Optional[List[Sort]] = None, fields: Optional[Union[List[str], str]] = None) -> ET.Element:
         self.start_log_block()
         if fields is None:
             if all_fields is True:
@@ -34,7 +36,7 @@ class UserMethods():
     # The reference has this name, so for consistency adding an alias
     def get_users_json(self, all_fields: bool = True, last_login_filter: Optional[UrlFilter] = None,
                        site_role_filter: Optional[UrlFilter] = None, username_filter: Optional[UrlFilter] = None,
-                       sorts: Optional[List[Sort]] = None, fields: Optional[List[str] ] =None,
+                       sorts: Optional[List[Sort]] = None, fields: Optional[Union[List[str], str]] = None,
                        page_number: Optional[int] = None) -> Dict:
         return  self.query_users_json(all_fields=all_fields, last_login_filter=last_login_filter,
                                      site_role_filter=site_role_filter, username_filter=username_filter, sorts=sorts,
@@ -42,7 +44,7 @@ class UserMethods():
 
     def query_users_json(self, all_fields: bool = True, last_login_filter: Optional[UrlFilter] = None,
                          site_role_filter: Optional[UrlFilter] = None, username_filter: Optional[UrlFilter] = None,
-                         sorts: Optional[List[Sort]] = None, fields: Optional[List[str]] = None,
+                         sorts: Optional[List[Sort]] = None, fields: Optional[Union[List[str], str]] = None,
                          page_number: Optional[int] = None) -> Dict:
 
         self.start_log_block()
@@ -59,6 +61,24 @@ class UserMethods():
         self.end_log_block()
         return users
 
+    # Returns UserRecord tuples rather than XML, which is much lighter on memory for large sites
+    def query_users_records(self, last_login_filter: Optional[UrlFilter] = None,
+                            site_role_filter: Optional[UrlFilter] = None, username_filter: Optional[UrlFilter] = None,
+                            sorts: Optional[List[Sort]] = None, page_size: Optional[int] = None,
+                            max_workers: int = 4) -> List[UserRecord]:
+        self.start_log_block()
+        filter_checks = {'lastLogin': last_login_filter, 'siteRole': site_role_filter, 'name': username_filter}
+        filters = self._check_filter_objects(filter_checks)
+
+        users = self.query_resource_records("users", UserRecord, filters=filters, sorts=sorts, fields=['_all_'],
+                                            page_size=page_size, max_workers=max_workers)
+        for user in users:
+            # Add to username : luid cache
+            self.username_luid_cache[user.name] = user.luid
+        self.log('Found {} users'.format(str(len(users))))
+        self.end_log_block()
+        return users
+
     def query_user(self, username_or_luid: str, all_fields: bool = True) -> ET.Element:
         self.start_log_block()
         user = self.query_single_element_from_endpoint_with_filter("user", username_or_luid, all_fields=all_fields)
@@ -107,7 +127,9 @@ class UserMethods():
         url = self.build_api_url('users')
         try:
             new_user = self.send_add_request(url, tsr)
-            new_user_luid = new_user.findall('.//t:user',  self.ns_map)[0].get("id")
+            new_user_element = new_user.findall('.//t:user',  self.ns_map)[0]
+            new_user_luid = new_user_element.get("id")
+            self.cache_content_change('user', new_user_luid, new_user_element.get('name'))
             self.end_log_block()
             return new_user_luid
         # If already exists, update site role unless overridden.
@@ -194,6 +216,12 @@ class UserMethods():
 
         url = self.build_api_url("users/{}".format(user_luid))
         response = self.send_update_request(url, tsr)
+        # A direct_xml_request can rename the user, so refresh the cache from what the server sent back
+        updated_user = response.findall('.//t:user', self.ns_map)
+        if len(updated_user) == 1 and updated_user[0].get('name') is not None:
+            self.cache_content_change('user', user_luid, updated_user[0].get('name'))
+        else:
+            self.cache_content_change('user', user_luid)
         self.end_log_block()
         return response
 
@@ -206,6 +234,7 @@ class UserMethods():
             url = self.build_api_url("users/{}".format(user_luid))
             self.log('Removing user id {} from site'.format(user_luid))
             self.send_delete_request(url)
+            self.cache_content_change('user', user_luid, deleted=True)
         self.end_log_block()
 
     def unlicense_users(self, username_or_luid_s: Union[List[str], str]):
@@ -216,6 +245,18 @@ class UserMethods():
             self.update_user(username_or_luid=user_luid, site_role="Unlicensed")
         self.end_log_block()
 
+    # Creates, updates and (with unlicense_missing=True) unlicenses users in bulk, concurrently, from
+    # ProvisioningRecords or dicts. See UserProvisioner for the checkpoint file, which lets an interrupted run resume
+    def provision_users(self, records: Iterable[Union[ProvisioningRecord, Dict]],
+                        checkpoint_filename: Optional[str] = None, unlicense_missing: bool = False,
+                        max_workers: int = 8) -> ProvisioningSummary:
+        self.start_log_block()
+        provisioner = UserProvisioner(self.rest_api_base, checkpoint_filename=checkpoint_filename,
+                                      max_workers=max_workers, logger_obj=self.logger)
+        summary = provisioner.provision(records, unlicense_missing=unlicense_missing)
+        self.end_log_block()
+        return summary
+
 class UserMethods27(UserMethods):
     def __init__(self, rest_api_base: TableauRestApiBase27):
         self.rest_api_base = rest_api_base
@@ -1,5 +1,8 @@
 from .rest_api_base import *
+from typing import Iterable
 from ..published_content import Workbook, Workbook28
+from ..view_export import ViewExporter, ExportRequest, ExportResult
+from ..view_data_stream import ViewDataStream
 
 
 class WorkbookMethods():
@@ -21,7 +24,7 @@ class WorkbookMethods():
                         all_fields: bool = True, created_at_filter: Optional[UrlFilter] = None,
                         updated_at_filter: Optional[UrlFilter] = None, owner_name_filter: Optional[UrlFilter] = None,
                         tags_filter: Optional[UrlFilter] = None, sorts: Optional[List[Sort]] = None,
-                        fields: Optional[List[str]] = None) -> ET.Element:
+                        fields: Optional[Union[List[str], str]] = None) -> ET.Element:
         self.start_log_block()
         if fields is None:
             if all_fields is True:
@@ -33,7 +36,7 @@ class WorkbookMethods():
 
         if username_or_luid is not None:
             user_luid = self.query_user_luid(username_or_luid)
-            wbs = self.query_resource("users/{}/workbooks".format(user_luid))
+            wbs = self.query_resource("users/{}/workbooks".format(user_luid), fields=fields)
         else:
             wbs = self.query_resource("workbooks", sorts=sorts, filters=filters, fields=fields)
 
@@ -57,7 +60,8 @@ class WorkbookMethods():
                              updated_at_filter: Optional[UrlFilter] = None,
                              owner_name_filter: Optional[UrlFilter] = None,
                              tags_filter: Optional[UrlFilter] = None, sorts: Optional[List[Sort]] = None,
-                             fields: Optional[List[str]] = None, page_number: Optional[int] = None) -> Dict:
+                             fields: Optional[Union[List[str], str]] = None,
+                             page_number: Optional[int] = None) -> Dict:
         self.start_log_block()
         if fields is None:
             if all_fields is True:
@@ -78,6 +82,34 @@ class WorkbookMethods():
         self.end_log_block()
         return wbs
 
+    # Returns WorkbookRecord tuples rather than XML. The project filter is applied to the records afterwards, as
+    # with query_workbooks
+    def query_workbooks_records(self, username_or_luid: Optional[str] = None,
+                                project_name_or_luid: Optional[str] = None,
+                                created_at_filter: Optional[UrlFilter] = None,
+                                updated_at_filter: Optional[UrlFilter] = None,
+                                owner_name_filter: Optional[UrlFilter] = None,
+                                tags_filter: Optional[UrlFilter] = None, sorts: Optional[List[Sort]] = None,
+                                page_size: Optional[int] = None, max_workers: int = 4) -> List[WorkbookRecord]:
+        self.start_log_block()
+        filter_checks = {'updatedAt': updated_at_filter, 'createdAt': created_at_filter, 'tags': tags_filter,
+                         'ownerName': owner_name_filter}
+        filters = self._check_filter_objects(filter_checks)
+
+        if username_or_luid is not None:
+            user_luid = self.query_user_luid(username_or_luid)
+            wbs = self.query_resource_records("users/{}/workbooks".format(user_luid), WorkbookRecord,
+                                              page_size=page_size, max_workers=max_workers)
+        else:
+            wbs = self.query_resource_records("workbooks", WorkbookRecord, sorts=sorts, filters=filters,
+                                              page_size=page_size, max_workers=max_workers)
+
+        if project_name_or_luid is not None:
+            project_luid = self.query_project_luid(project_name_or_luid)
+            wbs = [wb for wb in wbs if wb.project_luid == project_luid]
+        self.end_log_block()
+        return wbs
+
     # Because a workbook can have the same pretty name in two projects, requires more logic
     def query_workbook(self, wb_name_or_luid: str, proj_name_or_luid: Optional[str] = None,
                        username_or_luid: Optional[str] = None) -> ET.Element:
@@ -207,26 +239,38 @@ class WorkbookMethods():
             raise InvalidOptionException(
                 'This method is for saving response to file. Must include filename_no_extension parameter')
 
+    # For exporting many views (or filter combinations) at once. See ViewExporter for how the manifest works
+    def export_views(self, manifest: Iterable[Union[ExportRequest, Dict]], output_directory: str = '.',
+                     max_workers: int = 4, requests_per_second: Optional[float] = None) -> List[ExportResult]:
+        self.start_log_block()
+        exporter = ViewExporter(self.rest_api_base, output_directory=output_directory, max_workers=max_workers,
+                                requests_per_second=requests_per_second, logger_obj=self.logger)
+        results = exporter.export(manifest)
+        self.end_log_block()
+        return results
 
     def query_workbook_views(self, wb_name_or_luid: str, proj_name_or_luid: Optional[str] = None,
-                             username_or_luid: Optional[str] = None, usage: bool = False) -> ET.Element:
+                             username_or_luid: Optional[str] = None, usage: bool = False,
+                             fields: Optional[Union[List[str], str]] = None) -> ET.Element:
         self.start_log_block()
         if usage not in [True, False]:
             raise InvalidOptionException('Usage can only be set to True or False')
         wb_luid = self.query_workbook_luid(wb_name_or_luid, proj_name_or_luid)
-        vws = self.query_resource("workbooks/{}/views?includeUsageStatistics={}".format(wb_luid, str(usage).lower()))
+        vws = self.query_resource("workbooks/{}/views".format(wb_luid), fields=fields,
+                                  additional_url_ending="includeUsageStatistics={}".format(str(usage).lower()))
         self.end_log_block()
         return vws
 
     def query_workbook_views_json(self, wb_name_or_luid: str, proj_name_or_luid: Optional[str] = None,
                                   username_or_luid: Optional[str] = None, usage: bool = False,
-                                  page_number: Optional[int] = None) -> Dict:
+                                  page_number: Optional[int] = None,
+                                  fields: Optional[Union[List[str], str]] = None) -> Dict:
         self.start_log_block()
         if usage not in [True, False]:
             raise InvalidOptionException('Usage can only be set to True or False')
         wb_luid = self.query_workbook_luid(wb_name_or_luid, proj_name_or_luid)
         url_params = self.rest_api_base.build_url_parameter_string(map_dict={'includeUsageStatistics': str(usage).lower()})
-        vws = self.query_resource_json("workbooks/{}/views".format(wb_luid),
+        vws = self.query_resource_json("workbooks/{}/views".format(wb_luid), fields=fields,
                                        additional_url_ending=url_params, page_number=page_number)
         self.end_log_block()
         return vws
@@ -270,7 +314,7 @@ class WorkbookMethods():
     def query_views(self, all_fields: bool = True, usage: bool = False,
                          created_at_filter: Optional[UrlFilter] = None, updated_at_filter: Optional[UrlFilter] = None,
                          tags_filter: Optional[UrlFilter] = None, sorts: Optional[UrlFilter] = None,
-                         fields: Optional[UrlFilter] = None) -> ET.Element:
+                         fields: Optional[Union[List[str], str]] = None) -> ET.Element:
         self.start_log_block()
 
         if fields is None:
@@ -290,7 +334,7 @@ class WorkbookMethods():
     def query_views_json(self, all_fields: bool = True, usage: bool = False,
                          created_at_filter: Optional[UrlFilter] = None, updated_at_filter: Optional[UrlFilter] = None,
                          tags_filter: Optional[UrlFilter] = None, sorts: Optional[UrlFilter] = None,
-                         fields: Optional[UrlFilter] = None, page_number: Optional[int] = None) -> Dict:
+                         fields: Optional[Union[List[str], str]] = None, page_number: Optional[int] = None) -> Dict:
         self.start_log_block()
 
         if fields is None:
@@ -308,6 +352,23 @@ class WorkbookMethods():
         self.end_log_block()
         return vws
 
+    # Returns ViewRecord tuples rather than XML. total_view_count is only filled in when usage=True
+    def query_views_records(self, usage: bool = False, created_at_filter: Optional[UrlFilter] = None,
+                            updated_at_filter: Optional[UrlFilter] = None, tags_filter: Optional[UrlFilter] = None,
+                            sorts: Optional[List[Sort]] = None, page_size: Optional[int] = None,
+                            max_workers: int = 4) -> List[ViewRecord]:
+        self.start_log_block()
+        if usage not in [True, False]:
+            raise InvalidOptionException('Usage can only be set to True or False')
+        filter_checks = {'updatedAt': updated_at_filter, 'createdAt': created_at_filter, 'tags': tags_filter}
+        filters = self._check_filter_objects(filter_checks)
+
+        vws = self.query_resource_records("views", ViewRecord, filters=filters, sorts=sorts,
+                                          additional_url_ending="includeUsageStatistics={}".format(str(usage).lower()),
+                                          page_size=page_size, max_workers=max_workers)
+        self.end_log_block()
+        return vws
+
     def query_view(self, vw_name_or_luid: str) -> ET.Element:
         self.start_log_block()
         vw = self.query_single_element_from_endpoint_with_filter('view', vw_name_or_luid)
@@ -322,6 +383,8 @@ class WorkbookMethods():
             wb_luid = self.query_workbook_luid(wb)
             url = self.build_api_url("workbooks/{}".format(wb_luid))
             self.send_delete_request(url)
+            if self._extract_refresh_task_catalog is not None:
+                self._extract_refresh_task_catalog.remove_tasks_for_workbook(wb_luid)
         self.end_log_block()
 
     # Do not include file extension, added automatically. Without filename, only returns the response
@@ -590,6 +653,20 @@ class WorkbookMethods28(WorkbookMethods27):
         self.end_log_block()
         return csv
 
+    # For views with too much data to hold in memory at once. Nothing is requested until one of the ViewDataStream's
+    # iterate_ methods is read, e.g.
+    #   for row in t.workbooks.stream_view_data('Sales', 'Orders').iterate_rows():
+    def stream_view_data(self, wb_name_or_luid: Optional[str] = None, view_name_or_luid: Optional[str] = None,
+                         proj_name_or_luid: Optional[str] = None, view_filter_map: Optional[Dict] = None,
+                         max_age_minutes: Optional[int] = None, chunk_size: int = 65536) -> ViewDataStream:
+        self.start_log_block()
+        view_luid = self.query_workbook_view_luid(wb_name_or_luid, view_name=view_name_or_luid,
+                                                  proj_name_or_luid=proj_name_or_luid)
+        stream = ViewDataStream(self.rest_api_base, view_luid, view_filter_map=view_filter_map,
+                                max_age_minutes=max_age_minutes, chunk_size=chunk_size, logger_obj=self.logger)
+        self.end_log_block()
+        return stream
+
     def save_view_data_as_csv(self, wb_name_or_luid: Optional[str] = None, view_name_or_luid: Optional[str] = None,
                               filename_no_extension: Optional[str] = None, proj_name_or_luid: Optional[str] = None,
                               view_filter_map: Optional[Dict] = None) -> str:
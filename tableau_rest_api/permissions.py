@@ -1,11 +1,40 @@
-from typing import Union, Any, Optional, List, Dict
+from typing import Union, Any, Optional, List, Dict, Tuple
+import hashlib
 
 from tableau_tools.logging_methods import LoggingMethods
 from tableau_tools.tableau_exceptions import *
 import xml.etree.ElementTree as ET
 
-# Represents the Permissions from any given user or group. Equivalent to GranteeCapabilities in the API
+
+# What Permissions.capabilities returns. It is built from the masks on every call, so a change to it could never
+# reach the Permissions object; it raises instead of quietly doing nothing. Copies are ordinary dicts
+class CapabilitiesDict(dict):
+    def _read_only(self, *args, **kwargs):
+        raise InvalidOptionException('The capabilities dict is read-only, use set_capability() to change a '
+                                     'Permissions object')
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    __ior__ = _read_only
+    clear = _read_only
+    pop = _read_only
+    popitem = _read_only
+    setdefault = _read_only
+    update = _read_only
+
+    def copy(self) -> Dict[str, Optional[str]]:
+        return dict(self)
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self), )
+
+
+# Represents the Permissions from any given user or group. Equivalent to GranteeCapabilities in the API.
+# The capabilities are held as a pair of bitmasks (Allowed and Denied), and the capability tables and role definitions
+# are all on the class, so that very large numbers of these (a whole server audit) stay small
 class Permissions(LoggingMethods):
+    __slots__ = ('content_type', 'obj_type', '_luid', '_allow', '_deny', 'logger')
+
     capabilities_2_1 = {
         "project": ("Read", "Write", 'ProjectLeader'),
         "workbook": (
@@ -152,124 +181,95 @@ class Permissions(LoggingMethods):
 
     }
 
-    def __init__(self, group_or_user: str, luid: str, content_type: Optional[str] = None):
-        if group_or_user not in ['group', 'user']:
-            raise InvalidOptionException('group_or_user must be "group" or "user"')
-        self.content_type = content_type
-        self.obj_type = group_or_user
-        self._luid = luid
-        # Get total set of capabilities, set to None by default
-        self.capabilities = {}
-        self.__allowable_modes = ['Allow', 'Deny', None]
-        self.role_set = {
-            'Publisher': {
-                'all': 'Allow',
-                'Connect': None,
-                'Download': None,
-                'Move': None,
-                'Delete': None,
-                'Set Permissions': None,
-                'Project Leader': None,
-             },
-            'Interactor': {
-                'all': True,
-                'Connect': None,
-                'Download': None,
-                'Move': None,
-                'Delete': None,
-                'Set Permissions': None,
-                'Project Leader': None,
-                'Save': None
-            },
-            'Viewer': {
-                'View': 'Allow',
-                'Export Image': 'Allow',
-                'View Summary Data': 'Allow',
-                'View Comments': 'Allow',
-                'Add Comment': 'Allow'
-            },
-            'Editor': {
-                'all': True,
-                'Connect': None,
-                'Project Leader': None
-            },
-            'Data Source Connector': {
-                'all': None,
-                'Connect': None,
-                'Project Leader': None
-            },
-            'Data Source Editor': {
-                'all': None,
-                'View': 'Allow',
-                'Connect': 'Allow',
-                'Save': 'Allow',
-                'Download': 'Allow',
-                'Delete': 'Allow',
-                'Set Permissions': 'Allow'
-            },
-            'Project Leader': {
-                'all': None,
-                'Project Leader': 'Allow'
-            }
+    # Everything below here is shared by every instance. Only the grantee and the two bitmasks are stored per object
+
+    role_set = {
+        'Publisher': {
+            'all': 'Allow',
+            'Connect': None,
+            'Download': None,
+            'Move': None,
+            'Delete': None,
+            'Set Permissions': None,
+            'Project Leader': None,
+         },
+        'Interactor': {
+            'all': True,
+            'Connect': None,
+            'Download': None,
+            'Move': None,
+            'Delete': None,
+            'Set Permissions': None,
+            'Project Leader': None,
+            'Save': None
+        },
+        'Viewer': {
+            'View': 'Allow',
+            'Export Image': 'Allow',
+            'View Summary Data': 'Allow',
+            'View Comments': 'Allow',
+            'Add Comment': 'Allow'
+        },
+        'Editor': {
+            'all': True,
+            'Connect': None,
+            'Project Leader': None
+        },
+        'Data Source Connector': {
+            'all': None,
+            'Connect': None,
+            'Project Leader': None
+        },
+        'Data Source Editor': {
+            'all': None,
+            'View': 'Allow',
+            'Connect': 'Allow',
+            'Save': 'Allow',
+            'Download': 'Allow',
+            'Delete': 'Allow',
+            'Set Permissions': 'Allow'
+        },
+        'Project Leader': {
+            'all': None,
+            'Project Leader': 'Allow'
         }
+    }
 
+    site_roles = (
+        'Interactor',
+        'Publisher',
+        'SiteAdministrator',
+        'Unlicensed',
+        'UnlicensedWithPublish',   # This was sunset at some point
+        'Viewer',
+        'ViewerWithPublish',
+        'ServerAdministrator',
+        'ReadOnly',
+        'Explorer',
+        'ExplorerCanPublish',
+        'SiteAdministratorExplorer',
+        'Creator',
+        'SiteAdministratorCreator'
+    )
+
+    server_content_roles_2_1 = {
+            "project": (
+                'Viewer',
+                'Publisher',
+                'Project Leader'
+            ),
+            "workbook": (
+                'Viewer',
+                'Interactor',
+                'Editor'
+            ),
+            "datasource": (
+                'Editor',
+                'Connector'
+            )
+        }
 
-
-        self.site_roles = (
-            'Interactor',
-            'Publisher',
-            'SiteAdministrator',
-            'Unlicensed',
-            'UnlicensedWithPublish',   # This was sunset at some point
-            'Viewer',
-            'ViewerWithPublish',
-            'ServerAdministrator',
-            'ReadOnly',
-            'Explorer',
-            'ExplorerCanPublish',
-            'SiteAdministratorExplorer',
-            'Creator',
-            'SiteAdministratorCreator'
-        )
-
-        server_content_roles_2_1 = {
-                "project": (
-                    'Viewer',
-                    'Publisher',
-                    'Project Leader'
-                ),
-                "workbook": (
-                    'Viewer',
-                    'Interactor',
-                    'Editor'
-                ),
-                "datasource": (
-                    'Editor',
-                    'Connector'
-                )
-            }
-
-        server_content_roles_3_3 = {
-                "project": (
-                    'Viewer',
-                    'Publisher',
-                    'Project Leader'
-                ),
-                "workbook": (
-                    'Viewer',
-                    'Interactor',
-                    'Editor'
-                ),
-                "datasource": (
-                    'Editor',
-                    'Connector'
-                ),
-                "flow" : (
-
-                )
-            }
-
-        server_content_roles_3_5 = {
+    server_content_roles_3_3 = {
             "project": (
                 'Viewer',
                 'Publisher',
@@ -284,52 +284,239 @@ class Permissions(LoggingMethods):
                 'Editor',
                 'Connector'
             ),
-            "flow": (
+            "flow" : (
 
-            ),
-            "database": (),
-            "table" : ()
+            )
         }
 
-        self.server_content_roles = {
-            "2.6": server_content_roles_2_1,
-            "2.7": server_content_roles_2_1,
-            "2.8": server_content_roles_2_1,
-            '3.0': server_content_roles_2_1,
-            '3.1': server_content_roles_2_1,
-            '3.2': server_content_roles_2_1,
-            '3.3': server_content_roles_3_3,
-            '3.4': server_content_roles_3_3,
-            '3.5': server_content_roles_3_5,
-            '3.6': server_content_roles_3_5
-        }
+    server_content_roles_3_5 = {
+        "project": (
+            'Viewer',
+            'Publisher',
+            'Project Leader'
+        ),
+        "workbook": (
+            'Viewer',
+            'Interactor',
+            'Editor'
+        ),
+        "datasource": (
+            'Editor',
+            'Connector'
+        ),
+        "flow": (
 
-        self.server_to_rest_capability_map = {
-            'Add Comment': 'AddComment',
-            'Move': 'ChangeHierarchy',
-            'Set Permissions': 'ChangePermissions',
-            'Connect': 'Connect',
-            'Delete': 'Delete',
-            'View Summary Data': 'ExportData',
-            'Download Summary Data': 'ExportData',
-            'Export Image': 'ExportImage',
-            'Download Image/PDF': 'ExportImage',
-            'Download': 'ExportXml',
-            'Download Workbook/Save As': 'ExportXml',
-            'Filter': 'Filter',
-            'Project Leader': 'ProjectLeader',
-            'View': 'Read',
-            'Share Customized': 'ShareView',
-            'View Comments': 'ViewComments',
-            'View Underlying Data': 'ViewUnderlyingData',
-            'Download Full Data' : 'ViewUnderlyingData',
-            'Web Edit': 'WebAuthoring',
-            'Save': 'Write',
-            'Inherited Project Leader': 'InheritedProjectLeader',
-            'all': 'all'  # special command to do everything
-        }
+        ),
+        "database": (),
+        "table" : ()
+    }
+
+    server_content_roles = {
+        "2.6": server_content_roles_2_1,
+        "2.7": server_content_roles_2_1,
+        "2.8": server_content_roles_2_1,
+        '3.0': server_content_roles_2_1,
+        '3.1': server_content_roles_2_1,
+        '3.2': server_content_roles_2_1,
+        '3.3': server_content_roles_3_3,
+        '3.4': server_content_roles_3_3,
+        '3.5': server_content_roles_3_5,
+        '3.6': server_content_roles_3_5
+    }
+
+    server_to_rest_capability_map = {
+        'Add Comment': 'AddComment',
+        'Move': 'ChangeHierarchy',
+        'Set Permissions': 'ChangePermissions',
+        'Connect': 'Connect',
+        'Delete': 'Delete',
+        'View Summary Data': 'ExportData',
+        'Download Summary Data': 'ExportData',
+        'Export Image': 'ExportImage',
+        'Download Image/PDF': 'ExportImage',
+        'Download': 'ExportXml',
+        'Download Workbook/Save As': 'ExportXml',
+        'Filter': 'Filter',
+        'Project Leader': 'ProjectLeader',
+        'View': 'Read',
+        'Share Customized': 'ShareView',
+        'View Comments': 'ViewComments',
+        'View Underlying Data': 'ViewUnderlyingData',
+        'Download Full Data' : 'ViewUnderlyingData',
+        'Web Edit': 'WebAuthoring',
+        'Save': 'Write',
+        'Inherited Project Leader': 'InheritedProjectLeader',
+        'all': 'all'  # special command to do everything
+    }
+
+    # One bit per REST API capability. The same bit is used for a capability on every object type and API version,
+    # so masks from different Permissions objects can always be compared directly
+    capability_names = ('AddComment', 'ChangeHierarchy', 'ChangePermissions', 'Connect', 'Delete', 'ExportData',
+                        'ExportImage', 'ExportXml', 'Filter', 'ProjectLeader', 'Read', 'ShareView', 'ViewComments',
+                        'ViewUnderlyingData', 'WebAuthoring', 'Write', 'InheritedProjectLeader')
+    capability_bits = {name: 1 << i for i, name in enumerate(capability_names)}
+    # InheritedProjectLeader can be read from the server but never set
+    read_only_mask = capability_bits['InheritedProjectLeader']
+
+    # The capabilities an instance starts out with (all unspecified). Set by each subclass
+    default_capabilities = ()
+
+    # Filled in the first time each class is used: { class : mask of default_capabilities } and
+    # { class : { role : (allow mask, deny mask) } }
+    _default_masks = {}
+    _role_masks = {}
+
+    def __init__(self, group_or_user: str, luid: str, content_type: Optional[str] = None):
+        if group_or_user not in ['group', 'user']:
+            raise InvalidOptionException('group_or_user must be "group" or "user"')
+        self.content_type = content_type
+        self.obj_type = group_or_user
+        self._luid = luid
+        self._allow = 0
+        self._deny = 0
+        self.logger = None
+
+    #
+    # Masks
+    #
+
+    @classmethod
+    def get_capabilities_mask(cls, capability_names: List[str]) -> int:
+        mask = 0
+        for cap in capability_names:
+            mask |= cls.capability_bits[cap]
+        return mask
+
+    @classmethod
+    def get_capability_names_from_mask(cls, mask: int) -> List[str]:
+        return [name for name in cls.capability_names if mask & cls.capability_bits[name]]
+
+    @classmethod
+    def _get_default_mask(cls) -> int:
+        if cls not in Permissions._default_masks:
+            Permissions._default_masks[cls] = cls.get_capabilities_mask(cls.default_capabilities)
+        return Permissions._default_masks[cls]
+
+    # The masks for a role are worked out once per class, by applying the role to a blank object exactly as
+    # set_capabilities_to_match_role() used to apply it to each one
+    @classmethod
+    def get_role_masks(cls, role: str) -> Tuple[int, int]:
+        if role not in cls.role_set:
+            raise InvalidOptionException('{} is not a recognized role'.format(role))
+        if cls not in Permissions._role_masks:
+            Permissions._role_masks[cls] = {}
+        role_masks = Permissions._role_masks[cls]
+        if role not in role_masks:
+            settable_mask = cls._get_default_mask() & ~cls.read_only_mask
+            allow = 0
+            deny = 0
+            role_capabilities = cls.role_set[role]
+            if role_capabilities.get('all') == 'Allow':
+                allow = settable_mask
+            elif role_capabilities.get('all') == 'Deny':
+                deny = settable_mask
+            for cap in role_capabilities:
+                if cap == 'all':
+                    continue
+                bit = cls.capability_bits[cls._get_rest_capability_name(cap)]
+                allow &= ~bit
+                deny &= ~bit
+                if role_capabilities[cap] == 'Allow':
+                    allow |= bit
+                elif role_capabilities[cap] == 'Deny':
+                    deny |= bit
+            role_masks[role] = (allow, deny)
+        return role_masks[role]
+
+    @property
+    def allow_mask(self) -> int:
+        return self._allow
+
+    @property
+    def deny_mask(self) -> int:
+        return self._deny
 
+    # Any capability that is either Allowed or Denied
+    @property
+    def set_mask(self) -> int:
+        return self._allow | self._deny
+
+    def set_masks(self, allow_mask: int, deny_mask: int):
+        if allow_mask & deny_mask:
+            raise InvalidOptionException('A capability cannot be both Allow and Deny: {}'.format(
+                ", ".join(self.get_capability_names_from_mask(allow_mask & deny_mask))))
+        self._allow = allow_mask
+        self._deny = deny_mask
+
+    def has_same_capabilities(self, other: 'Permissions') -> bool:
+        return self._allow == other._allow and self._deny == other._deny
+
+    # The capabilities to remove from, and the capabilities to send to, an object that currently has
+    # current_perms_obj, to end up with the capabilities of this one. A capability whose mode changes is in both
+    # (the old mode has to be deleted before the new one can be added). Read-only capabilities are left out
+    def diff_capabilities(self, current_perms_obj: Optional['Permissions']) -> Tuple[int, int, int, int]:
+        cur_allow = current_perms_obj._allow if current_perms_obj is not None else 0
+        cur_deny = current_perms_obj._deny if current_perms_obj is not None else 0
+        settable = ~self.read_only_mask
+        delete_allow = cur_allow & ~self._allow & settable
+        delete_deny = cur_deny & ~self._deny & settable
+        add_allow = self._allow & ~cur_allow & settable
+        add_deny = self._deny & ~cur_deny & settable
+        return delete_allow, delete_deny, add_allow, add_deny
+
+    #
+    # Capabilities by name
+    #
+
+    # REST API capability name for either naming, or an exception
+    @classmethod
+    def _get_rest_capability_name(cls, capability_name: str) -> str:
+        if capability_name in cls.capability_bits:
+            return capability_name
+        if capability_name in cls.server_to_rest_capability_map:
+            return cls.server_to_rest_capability_map[capability_name]
+        raise InvalidOptionException('"{}" is not a capability in REST API or Server'.format(capability_name))
+
+    def _set_capability_bit(self, capability_name: str, mode: Optional[str]):
+        if mode not in ['Allow', 'Deny', None]:
+            raise InvalidOptionException('Capability mode can only be "Allow",  "Deny" (case-sensitive) or None')
+        bit = self.capability_bits[capability_name]
+        self._allow &= ~bit
+        self._deny &= ~bit
+        if mode == 'Allow':
+            self._allow |= bit
+        elif mode == 'Deny':
+            self._deny |= bit
+
+    # Read-only dict of { capability : 'Allow' / 'Deny' / None }, built on request from the masks. It has every one
+    # of the class's capabilities (None if unspecified) plus anything else that has been set, as the old per-object
+    # dict did. Changing it raises; use set_capability() or assign a whole dict to .capabilities
+    @property
+    def capabilities(self) -> CapabilitiesDict:
+        caps_mask = self._get_default_mask() | self._allow | self._deny
+        capabilities = {}
+        for cap in self.default_capabilities:
+            capabilities[cap] = self.get_capability(cap)
+        for cap in self.get_capability_names_from_mask(caps_mask & ~self._get_default_mask()):
+            capabilities[cap] = self.get_capability(cap)
+        return CapabilitiesDict(capabilities)
+
+    @capabilities.setter
+    def capabilities(self, capabilities_dict: Dict[str, Optional[str]]):
+        self._allow = 0
+        self._deny = 0
+        for cap in capabilities_dict:
+            if cap == 'all':
+                continue
+            self._set_capability_bit(self._get_rest_capability_name(cap), capabilities_dict[cap])
 
+    def get_capability(self, capability_name: str) -> Optional[str]:
+        bit = self.capability_bits[self._get_rest_capability_name(capability_name)]
+        if self._allow & bit:
+            return 'Allow'
+        elif self._deny & bit:
+            return 'Deny'
+        return None
 
     def convert_server_permission_name_to_rest_permission(self, permission_name: str) -> str:
         if permission_name in self.server_to_rest_capability_map:
@@ -365,18 +552,21 @@ class Permissions(LoggingMethods):
 
     # Just use the direct "to_allow" and "to_deny" methods
     def set_capability(self, capability_name: str, mode: str):
-        if capability_name not in list(self.server_to_rest_capability_map.values()):
-            # If it's the Tableau UI naming, translate it over
-            if capability_name in self.server_to_rest_capability_map:
-                # InheritedProjectLeader (2.8+) is Read-Only
-                if capability_name == 'InheritedProjectLeader':
-                    self.log('InheritedProjectLeader permission is read-only, skipping')
-                    return
-                if capability_name != 'all':
-                    capability_name = self.server_to_rest_capability_map[capability_name]
+        capability_name = self._get_rest_capability_name(capability_name)
+        # 'all' sets every capability of the object type at once
+        if capability_name == 'all':
+            if mode == 'Allow':
+                self.set_all_to_allow()
+            elif mode == 'Deny':
+                self.set_all_to_deny()
             else:
-                raise InvalidOptionException('"{}" is not a capability in REST API or Server'.format(capability_name))
-        self.capabilities[capability_name] = mode
+                self.set_all_to_unspecified()
+            return
+        # InheritedProjectLeader (2.8+) is Read-Only
+        if capability_name == 'InheritedProjectLeader':
+            self.log('InheritedProjectLeader permission is read-only, skipping')
+            return
+        self._set_capability_bit(capability_name, mode)
 
     def set_capability_to_allow(self, capability_name: str):
         self.set_capability(capability_name=capability_name, mode="Allow")
@@ -385,239 +575,271 @@ class Permissions(LoggingMethods):
         self.set_capability(capability_name=capability_name, mode="Deny")
 
     def set_capability_to_unspecified(self, capability_name: str):
-        if capability_name not in self.capabilities:
-            # If it's the Tableau UI naming, translate it over
-            if capability_name in self.server_to_rest_capability_map:
-                if capability_name == 'InheritedProjectLeader':
-                    self.log('InheritedProjectLeader permission is read-only, skipping')
-                    return
-                if capability_name != 'all':
-                    capability_name = self.server_to_rest_capability_map[capability_name]
-            else:
-                raise InvalidOptionException('"{}" is not a capability in REST API or Server'.format(capability_name))
-        self.capabilities[capability_name] = None
+        self.set_capability(capability_name=capability_name, mode=None)
 
     # This exists specifically to allow the setting of read-only permissions
     def _set_capability_from_published_content(self, capability_name: str, mode: str):
-        if capability_name not in list(self.server_to_rest_capability_map.values()):
-            # If it's the Tableau UI naming, translate it over
-            if capability_name in self.server_to_rest_capability_map:
-                if capability_name != 'all':
-                    capability_name = self.server_to_rest_capability_map[capability_name]
-            else:
-                raise InvalidOptionException('"{}" is not a capability in REST API or Server'.format(capability_name))
-        self.capabilities[capability_name] = mode
+        capability_name = self._get_rest_capability_name(capability_name)
+        if capability_name == 'all':
+            return
+        self._set_capability_bit(capability_name, mode)
 
-    def get_capabilities_dict(self) -> Dict:
+    def get_capabilities_dict(self) -> CapabilitiesDict:
         return self.capabilities
 
+    # (grantee type, luid, capability, mode) for every capability that is set. InheritedProjectLeader is left out
+    # because it can't be set, only read
+    def get_fingerprint_items(self) -> List[Tuple[str, str, str, str]]:
+        items = []
+        for cap in self.get_capability_names_from_mask(self._allow & ~self.read_only_mask):
+            items.append((self.group_or_user, self.luid, cap, 'Allow'))
+        for cap in self.get_capability_names_from_mask(self._deny & ~self.read_only_mask):
+            items.append((self.group_or_user, self.luid, cap, 'Deny'))
+        return items
+
     def get_content_type(self) -> str:
 
         return self.content_type
 
+    # These leave InheritedProjectLeader as it is
     def set_all_to_deny(self):
-        for cap in self.capabilities:
-            if cap != 'all':
-                self.capabilities[cap] = 'Deny'
+        settable_mask = self._get_default_mask() & ~self.read_only_mask
+        self._allow &= ~settable_mask
+        self._deny |= settable_mask
 
     def set_all_to_allow(self):
-        for cap in self.capabilities:
-            if cap == 'InheritedProjectLeader':
-                continue
-            if cap != 'all':
-                self.capabilities[cap] = 'Allow'
+        settable_mask = self._get_default_mask() & ~self.read_only_mask
+        self._deny &= ~settable_mask
+        self._allow |= settable_mask
 
     def set_all_to_unspecified(self):
-        for cap in self.capabilities:
-            if cap == 'InheritedProjectLeader':
-                continue
-            if cap != 'all':
-                self.capabilities[cap] = None
+        self._allow &= self.read_only_mask
+        self._deny &= self.read_only_mask
 
     def set_capabilities_to_match_role(self, role: str):
-        if role not in self.role_set:
-            raise InvalidOptionException('{} is not a recognized role'.format(role))
-
-        # Clear any previously set capabilities
-        self.set_all_to_unspecified()
-
-        role_capabilities = self.role_set[role]
-        self.log_debug("Setting to role {} with capabilities {}".format(role, str(role_capabilities)))
-        if "all" in role_capabilities:
-            if role_capabilities["all"] == 'Allow':
-                self.log_debug("Setting all capabilities to Allow")
-                self.set_all_to_allow()
-            elif role_capabilities["all"] == 'Deny':
-                self.log_debug("Setting all capabilities to Deny")
-                self.set_all_to_deny()
-        for cap in role_capabilities:
-            # Skip the all command, we handled it at the beginning
-            if cap == 'all':
-                continue
-            elif role_capabilities[cap] is not None:
-                self.set_capability(cap, role_capabilities[cap])
-            elif role_capabilities[cap] is None:
-                self.set_capability_to_unspecified(cap)
+        role_allow, role_deny = self.get_role_masks(role)
+        self.log_debug("Setting to role {} with capabilities {}".format(role, str(self.role_set[role])))
+        # Any read-only capability stays as it is
+        self._allow = role_allow | (self._allow & self.read_only_mask)
+        self._deny = role_deny | (self._deny & self.read_only_mask)
+
+    # True if the capabilities that can be set are exactly those of the role
+    def matches_role(self, role: str) -> bool:
+        role_allow, role_deny = self.get_role_masks(role)
+        return (self._allow & ~self.read_only_mask) == role_allow and (self._deny & ~self.read_only_mask) == role_deny
+
+    # The first role the capabilities match exactly, or None
+    def get_matching_role(self) -> Optional[str]:
+        for role in self.role_set:
+            if self.matches_role(role):
+                return role
+        return None
 
 class WorkbookPermissions(Permissions):
+    __slots__ = ()
+    default_capabilities = Permissions.available_capabilities[u'2.6'][u'workbook']
+    role_set = {
+                u"Viewer": {
+                    u'all': None,
+                    u'View': u'Allow',
+                    u'Export Image': u'Allow',
+                    u'View Summary Data': u'Allow',
+                    u'View Comments': u'Allow',
+                    u'Add Comment': u'Allow'
+                },
+                u"Interactor": {
+                    u'all': u'Allow',
+                    u'Download': None,
+                    u'Move': None,
+                    u'Delete': None,
+                    u'Set Permissions': None,
+                    u'Save': None
+                },
+                u"Editor": {
+                    u'all': u'Allow'
+                }
+            }
+
     def __init__(self, group_or_user, group_or_user_luid):
         Permissions.__init__(self, group_or_user, group_or_user_luid, u'workbook')
-        for cap in self.available_capabilities[u'2.6'][u'workbook']:
-            if cap != u'all':
-                self.capabilities[cap] = None
-        self.role_set = {
-                    u"Viewer": {
-                        u'all': None,
-                        u'View': u'Allow',
-                        u'Export Image': u'Allow',
-                        u'View Summary Data': u'Allow',
-                        u'View Comments': u'Allow',
-                        u'Add Comment': u'Allow'
-                    },
-                    u"Interactor": {
-                        u'all': u'Allow',
-                        u'Download': None,
-                        u'Move': None,
-                        u'Delete': None,
-                        u'Set Permissions': None,
-                        u'Save': None
-                    },
-                    u"Editor": {
-                        u'all': u'Allow'
-                    }
-                }
 
 class WorkbookPermissions28(Permissions):
+    __slots__ = ()
+    default_capabilities = Permissions.available_capabilities['2.8']['workbook']
+    role_set = {
+                "Viewer": {
+                    'all': None,
+                    'View': 'Allow',
+                    'Export Image': 'Allow',
+                    'View Summary Data': 'Allow',
+                    'View Comments': 'Allow',
+                    'Add Comment': 'Allow'
+                },
+                "Interactor": {
+                    'all': 'Allow',
+                    'Download': None,
+                    'Move': None,
+                    'Delete': None,
+                    'Set Permissions': None,
+                    'Save': None
+                },
+                "Editor": {
+                    'all': 'Allow'
+                }
+            }
+
     def __init__(self, group_or_user: str, group_or_user_luid: str):
         Permissions.__init__(self, group_or_user, group_or_user_luid, 'workbook')
-        for cap in self.available_capabilities['2.8']['workbook']:
-            if cap != 'all':
-                self.capabilities[cap] = None
-        self.role_set = {
-                    "Viewer": {
-                        'all': None,
-                        'View': 'Allow',
-                        'Export Image': 'Allow',
-                        'View Summary Data': 'Allow',
-                        'View Comments': 'Allow',
-                        'Add Comment': 'Allow'
-                    },
-                    "Interactor": {
-                        'all': 'Allow',
-                        'Download': None,
-                        'Move': None,
-                        'Delete': None,
-                        'Set Permissions': None,
-                        'Save': None
-                    },
-                    "Editor": {
-                        'all': 'Allow'
-                    }
-                }
 
 class ProjectPermissions(Permissions):
+    __slots__ = ()
+    default_capabilities = Permissions.available_capabilities[u'2.6'][u'project']
+    role_set = {
+        u"Viewer": {
+            u'all': None,
+            u"View": u"Allow"
+        },
+        u"Publisher": {
+            u'all': None,
+            u"View": u"Allow",
+            u"Save": u"Allow"
+        },
+        u"Project Leader": {
+            u'all': None,
+            u"Project Leader": u"Allow"
+        }
+    }
+
     def __init__(self, group_or_user, group_or_user_luid):
         Permissions.__init__(self, group_or_user, group_or_user_luid, u'project')
-        for cap in self.available_capabilities[u'2.6'][u'project']:
-            if cap != u'all':
-                self.capabilities[cap] = None
-        self.role_set = {
-            u"Viewer": {
-                u'all': None,
-                u"View": u"Allow"
-            },
-            u"Publisher": {
-                u'all': None,
-                u"View": u"Allow",
-                u"Save": u"Allow"
-            },
-            u"Project Leader": {
-                u'all': None,
-                u"Project Leader": u"Allow"
-            }
-        }
 
 
 class ProjectPermissions28(Permissions):
+    __slots__ = ()
+    default_capabilities = Permissions.available_capabilities['2.8']['project']
+    role_set = {
+        "Viewer": {
+            'all': None,
+            "View": "Allow"
+        },
+        "Publisher": {
+            'all': None,
+            "View": "Allow",
+            "Save": "Allow"
+        },
+        "Project Leader": {
+            'all': None,
+            "Project Leader": "Allow"
+        }
+    }
+
     def __init__(self, group_or_user: str, group_or_user_luid: str):
         Permissions.__init__(self, group_or_user, group_or_user_luid, 'project')
-        for cap in self.available_capabilities['2.8']['project']:
-            if cap != 'all':
-                self.capabilities[cap] = None
-        self.role_set = {
-            "Viewer": {
-                'all': None,
-                "View": "Allow"
-            },
-            "Publisher": {
-                'all': None,
-                "View": "Allow",
-                "Save": "Allow"
-            },
-            "Project Leader": {
-                'all': None,
-                "Project Leader": "Allow"
-            }
-        }
 
 class DatasourcePermissions(Permissions):
+    __slots__ = ()
+    default_capabilities = Permissions.available_capabilities[u'2.6'][u'datasource']
+    role_set = {
+        u"Connector": {
+            u'all': None,
+            u'View': u'Allow',
+            u'Connect': u'Allow'
+        },
+        u"Editor": {
+            u'all': u'Allow'
+        }
+    }
+
     def __init__(self, group_or_user, group_or_user_luid):
         Permissions.__init__(self, group_or_user, group_or_user_luid, u'datasource')
-        for cap in self.available_capabilities[u'2.6'][u'datasource']:
-            if cap != u'all':
-                self.capabilities[cap] = None
-        self.role_set = {
-            u"Connector": {
-                u'all': None,
-                u'View': u'Allow',
-                u'Connect': u'Allow'
-            },
-            u"Editor": {
-                u'all': u'Allow'
-            }
-        }
 
 class DatasourcePermissions28(Permissions):
+    __slots__ = ()
+    default_capabilities = Permissions.available_capabilities['2.8']['datasource']
+    role_set = {
+        "Connector": {
+            'all': None,
+            'View': 'Allow',
+            'Connect': 'Allow'
+        },
+        "Editor": {
+            'all': 'Allow'
+        }
+    }
+
     def __init__(self, group_or_user: str, group_or_user_luid: str):
         Permissions.__init__(self, group_or_user, group_or_user_luid, 'datasource')
-        for cap in self.available_capabilities['2.8']['datasource']:
-            if cap != 'all':
-                self.capabilities[cap] = None
-        self.role_set = {
-            "Connector": {
-                'all': None,
-                'View': 'Allow',
-                'Connect': 'Allow'
-            },
-            "Editor": {
-                'all': 'Allow'
-            }
-        }
 
 
 class FlowPermissions33(Permissions):
+    __slots__ = ()
+    default_capabilities = Permissions.available_capabilities['3.3']['flow']
+    # Unclear that there are any defined roles for Prep Conductor flows
+    role_set = {}
+
     def __init__(self, group_or_user: str, group_or_user_luid: str):
         Permissions.__init__(self, group_or_user, group_or_user_luid, 'flow')
-        for cap in self.available_capabilities['3.3']['flow']:
-            if cap != 'all':
-                self.capabilities[cap] = None
-        # Unclear that there are any defined roles for Prep Conductor flows
-        self.role_set = {}
 
+# The capabilities for 'databases' and 'tables' aren't in available_capabilities, so these start out empty and take
+# whatever is set or read from the server
 class DatabasePermissions35(Permissions):
+    __slots__ = ()
+    default_capabilities = Permissions.available_capabilities['3.5'].get('database', ())
+    # No idea what roles might exist for 'databases' or 'tables'
+    role_set = {}
+
     def __init__(self, group_or_user: str, group_or_user_luid: str):
         Permissions.__init__(self, group_or_user, group_or_user_luid, 'database')
-        for cap in self.available_capabilities['3.5']['database']:
-            if cap != 'all':
-                self.capabilities[cap] = None
-        # No idea what roles might exist for 'databases' or 'tables'
-        self.role_set = {}
 
 class TablePermissions35(Permissions):
+    __slots__ = ()
+    default_capabilities = Permissions.available_capabilities['3.5'].get('table', ())
+    # No idea what roles might exist for 'databases' or 'tables'
+    role_set = {}
+
     def __init__(self, group_or_user: str, group_or_user_luid: str):
         Permissions.__init__(self, group_or_user, group_or_user_luid, 'table')
-        for cap in self.available_capabilities['3.5']['table']:
-            if cap != 'all':
-                self.capabilities[cap] = None
-        # No idea what roles might exist for 'databases' or 'tables'
-        self.role_set = {}
\ No newline at end of file
+
+# A canonical, hashable summary of a list of Permissions: the sorted (grantee type, luid, capability, mode) of every
+# capability that is set. Two lists with equal fingerprints set exactly the same permissions, in whatever order they
+# were built. The hash is worked out once, so comparisons and dict / set lookups are cheap
+class PermissionsFingerprint:
+    __slots__ = ('items', '_hash', '_digest')
+
+    def __init__(self, items: Tuple[Tuple[str, str, str, str], ...]):
+        self.items = items
+        self._hash = hash(items)
+        self._digest = None
+
+    @staticmethod
+    def from_permissions_obj_list(permissions_obj_list: List[Permissions]) -> 'PermissionsFingerprint':
+        items = []
+        for perms_obj in permissions_obj_list:
+            items.extend(perms_obj.get_fingerprint_items())
+        # Sorting the set also collapses the same grantee appearing twice with the same capabilities
+        return PermissionsFingerprint(tuple(sorted(set(items))))
+
+    # hash() changes between Python processes, so use this when fingerprints are saved and compared in a later run
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            canonical = "\n".join(["\t".join(item) for item in self.items])
+            self._digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+        return self._digest
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PermissionsFingerprint):
+            return False
+        return self._hash == other._hash and self.items == other.items
+
+    def __ne__(self, other) -> bool:
+        return not self.__eq__(other)
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __repr__(self) -> str:
+        return 'PermissionsFingerprint({} capabilities, {})'.format(len(self.items), self.digest[:12])
@@ -0,0 +1,299 @@
+from typing import Union, Any, Optional, List, Dict, Tuple, Iterator, Callable, NamedTuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import csv
+import json
+import time
+import xml.etree.ElementTree as ET
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from tableau_tools.tableau_rest_xml import TableauRestXml
+from .records import *
+
+
+# Passed to the progress_callback of PermissionsAudit every progress_interval objects, and once more at the end
+class AuditProgress(NamedTuple):
+    objects_done: int
+    objects_total: int
+    rows: int
+    failures: int
+    elapsed_seconds: float
+    objects_per_second: float
+    rows_per_second: float
+
+
+# One permissions request to make: the content it belongs to and where to send it
+class _AuditTarget(NamedTuple):
+    site_index: int
+    content_type: str
+    content_luid: str
+    content_name: str
+    project_luid: Optional[str]
+    url_ending: str
+
+
+# Everything needed to name the grantees and projects of one site, from a single set of listings
+class _AuditSite:
+    def __init__(self, t_rest_api):
+        self.t_rest_api = t_rest_api
+        self.site_content_url = t_rest_api.site_content_url if t_rest_api.site_content_url is not None else ''
+        # luid : name
+        self.user_names: Dict[str, str] = {}
+        self.group_names: Dict[str, str] = {}
+        self.project_names: Dict[str, str] = {}
+        # project luid : contentPermissions
+        self.project_content_permissions: Dict[str, str] = {}
+        self.targets: List[_AuditTarget] = []
+
+
+# Audits the permissions of every project (and its default permissions), workbook, data source and flow on one or
+# more sites. Each site is listed once up front (users, groups and the content, the sites in parallel), so grantee and
+# project names come from memory rather than a lookup per grantee. Then the permissions requests for all of the sites
+# go through one pool of threads, and each response is turned into rows as soon as it arrives. Rows are yielded (or
+# written) as they are produced, so the whole audit is never held in memory
+class PermissionsAudit(LoggingMethods):
+    # content_type : (listing endpoint, record class, permissions url part)
+    content_type_definitions = {
+        'project': ('projects', ProjectRecord, 'projects'),
+        'workbook': ('workbooks', WorkbookRecord, 'workbooks'),
+        'datasource': ('datasources', DatasourceRecord, 'datasources'),
+        'flow': ('flows', FlowRecord, 'flows')
+    }
+
+    # The default permissions requested for each project, row content_type : url part. default_flow needs API 3.3
+    default_permissions_definitions = {
+        'default_workbook': 'workbooks',
+        'default_datasource': 'datasources',
+        'default_flow': 'flows'
+    }
+
+    # One row per capability per grantee per object
+    columns = ['site_content_url', 'content_type', 'content_luid', 'content_name', 'project_luid', 'project_name',
+               'project_content_permissions', 'grantee_type', 'grantee_luid', 'grantee_name', 'capability', 'mode']
+
+    def __init__(self, t_rest_api_connections: List[Union['TableauRestApiConnection', 'TableauServerRest']],
+                 content_types: Optional[List[str]] = None, include_defaults: bool = True,
+                 max_workers: int = 8, page_size: int = 1000, logger_obj: Optional[Logger] = None,
+                 progress_callback: Optional[Callable[[AuditProgress], Any]] = None, progress_interval: int = 500):
+        if content_types is None:
+            content_types = list(self.content_type_definitions.keys())
+        for content_type in content_types:
+            if content_type not in self.content_type_definitions:
+                raise InvalidOptionException("content_types can only include {}".format(
+                    ", ".join(self.content_type_definitions.keys())))
+        # Each connection must already be signed in to its site
+        self.t_rest_api_connections = t_rest_api_connections
+        self.content_types = content_types
+        self.include_defaults = include_defaults
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.logger = logger_obj
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.sites: List[_AuditSite] = []
+        # (content_type, content_luid, site_content_url, http_code) for anything that couldn't be read, e.g. content
+        # deleted between the listing and its permissions request
+        self.failures: List[Tuple[str, str, str, int]] = []
+        self.objects_done = 0
+        self.rows = 0
+        self._start_time: Optional[float] = None
+
+    #
+    # Prefetching
+    #
+
+    @staticmethod
+    def _supports_flows(t_rest_api) -> bool:
+        # Flows arrived in API 3.3
+        return tuple([int(p) for p in t_rest_api.api_version.split('.')]) >= (3, 3)
+
+    def _list(self, t_rest_api, endpoint: str, record_class) -> List:
+        fields = ['_all_'] if endpoint == 'users' else None
+        return t_rest_api.query_resource_records(endpoint, record_class, fields=fields, page_size=self.page_size,
+                                                 max_workers=2)
+
+    def _prefetch_site(self, site_index: int, t_rest_api) -> _AuditSite:
+        site = _AuditSite(t_rest_api)
+        for user in self._list(t_rest_api, 'users', UserRecord):
+            site.user_names[user.luid] = user.name
+        for group in self._list(t_rest_api, 'groups', GroupRecord):
+            site.group_names[group.luid] = group.name
+
+        # Projects are always listed, for the project names of the other content
+        for project in self._list(t_rest_api, 'projects', ProjectRecord):
+            site.project_names[project.luid] = project.name
+            site.project_content_permissions[project.luid] = project.content_permissions
+            if 'project' in self.content_types:
+                site.targets.append(_AuditTarget(site_index, 'project', project.luid, project.name, project.luid,
+                                                 "projects/{}/permissions".format(project.luid)))
+                if self.include_defaults is True:
+                    for content_type in self.default_permissions_definitions:
+                        if content_type == 'default_flow' and self._supports_flows(t_rest_api) is False:
+                            continue
+                        site.targets.append(_AuditTarget(site_index, content_type, project.luid, project.name,
+                                                         project.luid, "projects/{}/default-permissions/{}".format(
+                                                             project.luid,
+                                                             self.default_permissions_definitions[content_type])))
+
+        for content_type in self.content_types:
+            if content_type == 'project':
+                continue
+            if content_type == 'flow' and self._supports_flows(t_rest_api) is False:
+                self.log('API version {} has no flows, skipping them for site {}'.format(t_rest_api.api_version,
+                                                                                         site.site_content_url))
+                continue
+            endpoint, record_class, url_part = self.content_type_definitions[content_type]
+            for record in self._list(t_rest_api, endpoint, record_class):
+                site.targets.append(_AuditTarget(site_index, content_type, record.luid, record.name,
+                                                 record.project_luid,
+                                                 "{}/{}/permissions".format(url_part, record.luid)))
+        self.log('Site {}: {} users, {} groups, {} permissions requests to make'.format(
+            site.site_content_url, len(site.user_names), len(site.group_names), len(site.targets)))
+        return site
+
+    # Lists all of the sites at the same time
+    def prefetch(self):
+        self.start_log_block()
+        site_workers = max(min(self.max_workers, len(self.t_rest_api_connections)), 1)
+        with ThreadPoolExecutor(max_workers=site_workers) as executor:
+            futures = [executor.submit(self._prefetch_site, site_index, t_rest_api)
+                       for site_index, t_rest_api in enumerate(self.t_rest_api_connections)]
+            self.sites = [future.result() for future in futures]
+        self.end_log_block()
+
+    @property
+    def objects_total(self) -> int:
+        return sum([len(site.targets) for site in self.sites])
+
+    #
+    # Permissions requests
+    #
+
+    def _fetch_permissions(self, target: _AuditTarget) -> Optional[ET.Element]:
+        t_rest_api = self.sites[target.site_index].t_rest_api
+        try:
+            return t_rest_api.query_resource_in_thread(target.url_ending)
+        except RecoverableHTTPException as e:
+            self.failures.append((target.content_type, target.content_luid,
+                                  self.sites[target.site_index].site_content_url, e.http_code))
+            self.log('Could not read permissions of {} {}, HTTP {}'.format(target.content_type, target.content_luid,
+                                                                           e.http_code))
+            return None
+
+    def _rows_from_response(self, target: _AuditTarget, response: Optional[ET.Element]) -> List[Dict]:
+        if response is None:
+            return []
+        site = self.sites[target.site_index]
+        rows = []
+        for grantee_capabilities in response.iterfind('.//t:granteeCapabilities', TableauRestXml.ns_map):
+            grantee_type = None
+            grantee_luid = None
+            capabilities = []
+            for element in grantee_capabilities:
+                tag = element.tag.split('}')[-1]
+                if tag in ['user', 'group']:
+                    grantee_type = tag
+                    grantee_luid = element.get('id')
+                elif tag == 'capabilities':
+                    capabilities = [(cap.get('name'), cap.get('mode')) for cap in element]
+            if grantee_type == 'user':
+                grantee_name = site.user_names.get(grantee_luid)
+            else:
+                grantee_name = site.group_names.get(grantee_luid)
+            for capability, mode in capabilities:
+                rows.append({'site_content_url': site.site_content_url, 'content_type': target.content_type,
+                             'content_luid': target.content_luid, 'content_name': target.content_name,
+                             'project_luid': target.project_luid,
+                             'project_name': site.project_names.get(target.project_luid),
+                             'project_content_permissions': site.project_content_permissions.get(target.project_luid),
+                             'grantee_type': grantee_type, 'grantee_luid': grantee_luid, 'grantee_name': grantee_name,
+                             'capability': capability, 'mode': mode})
+        return rows
+
+    # Alternates between the sites, so they share the pool rather than being audited one after another
+    def _interleave_targets(self) -> Iterator[_AuditTarget]:
+        site_targets = [iter(site.targets) for site in self.sites]
+        while len(site_targets) > 0:
+            for targets in list(site_targets):
+                target = next(targets, None)
+                if target is None:
+                    site_targets.remove(targets)
+                else:
+                    yield target
+
+    def get_progress(self) -> AuditProgress:
+        elapsed = time.time() - self._start_time if self._start_time is not None else 0.0
+        if elapsed > 0:
+            objects_per_second = self.objects_done / elapsed
+            rows_per_second = self.rows / elapsed
+        else:
+            objects_per_second = 0.0
+            rows_per_second = 0.0
+        return AuditProgress(self.objects_done, self.objects_total, self.rows, len(self.failures), elapsed,
+                             objects_per_second, rows_per_second)
+
+    def _report_progress(self):
+        progress = self.get_progress()
+        self.log('{} of {} objects, {} rows, {} failures, {:.1f} objects/s'.format(
+            progress.objects_done, progress.objects_total, progress.rows, progress.failures,
+            progress.objects_per_second))
+        if self.progress_callback is not None:
+            self.progress_callback(progress)
+
+    # Yields a dict per row (see columns) in the order the responses come back. Only about max_workers * 2 requests
+    # are ever outstanding, so responses don't pile up if the rows are consumed slowly
+    def iterate_rows(self) -> Iterator[Dict]:
+        self.start_log_block()
+        self._start_time = time.time()
+        if len(self.sites) == 0:
+            self.prefetch()
+        self.objects_done = 0
+        self.rows = 0
+        self.failures = []
+        self.log('Auditing {} objects on {} sites'.format(self.objects_total, len(self.sites)))
+
+        targets = self._interleave_targets()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            target = next(targets, None)
+            while target is not None or len(pending) > 0:
+                while target is not None and len(pending) < self.max_workers * 2:
+                    pending[executor.submit(self._fetch_permissions, target)] = target
+                    target = next(targets, None)
+                done, not_done = wait(pending.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    rows = self._rows_from_response(pending.pop(future), future.result())
+                    self.objects_done += 1
+                    self.rows += len(rows)
+                    for row in rows:
+                        yield row
+                    if self.objects_done % self.progress_interval == 0:
+                        self._report_progress()
+        self._report_progress()
+        self.end_log_block()
+
+    #
+    # Output
+    #
+
+    def write_csv(self, filename: str) -> AuditProgress:
+        self.start_log_block()
+        with open(filename, 'w', newline='', encoding='utf-8') as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=self.columns)
+            writer.writeheader()
+            for row in self.iterate_rows():
+                writer.writerow(row)
+        self.end_log_block()
+        return self.get_progress()
+
+    # Newline-delimited JSON, one object per line
+    def write_ndjson(self, filename: str) -> AuditProgress:
+        self.start_log_block()
+        with open(filename, 'w', encoding='utf-8') as output_file:
+            for row in self.iterate_rows():
+                output_file.write(json.dumps(row))
+                output_file.write("\n")
+        self.end_log_block()
+        return self.get_progress()
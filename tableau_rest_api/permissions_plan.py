@@ -0,0 +1,102 @@
+from typing import Union, Any, Optional, List, Dict, Tuple
+
+
+# The changes needed to take one permissionable object from its current permissions to the desired ones. Built by
+# PublishedContent.plan_permissions() without making any calls, so it can be inspected (dry run) before being applied
+#   deletions : [ (group_or_user, luid, capability, mode) ], one DELETE call each
+#   additions : { (group_or_user, luid) : { capability : mode } }, all sent together in one PUT
+#   failed    : [ (method, group_or_user, luid, capability, mode, http_code) ] for what the server refused once the
+#               plan was applied. A PUT that was not sent because a DELETE failed is listed with http_code None
+class PermissionsPlan:
+    def __init__(self, obj_type: str, luid: str, default: bool = False):
+        self.obj_type = obj_type
+        self.luid = luid
+        self.default = default
+        self.deletions: List[Tuple[str, str, str, str]] = []
+        self.additions: Dict[Tuple[str, str], Dict[str, str]] = {}
+        # Grantees whose capabilities already match exactly
+        self.unchanged: List[Tuple[str, str]] = []
+        self.failed: List[Tuple[str, str, str, str, str, Optional[int]]] = []
+
+    def add_deletion(self, group_or_user: str, luid: str, capability: str, mode: str):
+        self.deletions.append((group_or_user, luid, capability, mode))
+
+    def add_addition(self, group_or_user: str, luid: str, capability: str, mode: str):
+        grantee = (group_or_user, luid)
+        if grantee not in self.additions:
+            self.additions[grantee] = {}
+        self.additions[grantee][capability] = mode
+
+    def add_failed_deletion(self, group_or_user: str, luid: str, capability: str, mode: str, http_code: int):
+        self.failed.append(('DELETE', group_or_user, luid, capability, mode, http_code))
+
+    def add_failed_additions(self, http_code: Optional[int]):
+        for group_or_user, luid in self.additions:
+            for capability, mode in self.additions[(group_or_user, luid)].items():
+                self.failed.append(('PUT', group_or_user, luid, capability, mode, http_code))
+
+    @property
+    def call_count(self) -> int:
+        return len(self.deletions) + (1 if len(self.additions) > 0 else 0)
+
+    @property
+    def succeeded(self) -> bool:
+        return len(self.failed) == 0
+
+    def is_empty(self) -> bool:
+        return self.call_count == 0
+
+    # One line per call, for logging or printing a dry run
+    def describe(self) -> List[str]:
+        if self.default is True:
+            target = 'default {} permissions of project {}'.format(self.obj_type, self.luid)
+        else:
+            target = '{} {}'.format(self.obj_type, self.luid)
+        lines = ['{} call(s) for {}'.format(self.call_count, target)]
+        for group_or_user, luid, capability, mode in self.deletions:
+            lines.append('DELETE {} {} {} {}'.format(group_or_user, luid, capability, mode))
+        for group_or_user, luid in self.additions:
+            caps = self.additions[(group_or_user, luid)]
+            lines.append('PUT {} {} {}'.format(group_or_user, luid,
+                                               ", ".join(['{}:{}'.format(cap, caps[cap]) for cap in caps])))
+        for method, group_or_user, luid, capability, mode, http_code in self.failed:
+            lines.append('FAILED {} {} {} {} {}: {}'.format(method, group_or_user, luid, capability, mode,
+                                                           'not sent' if http_code is None else
+                                                           'HTTP {}'.format(http_code)))
+        return lines
+
+    def __str__(self):
+        return "\n".join(self.describe())
+
+
+# What Project28.propagate_permissions() did to each object in its scope. Objects are identified by
+# (obj_type, luid, default), where default=True is a project's default permissions for that content type
+#   changed   : [ PermissionsPlan ] that were sent (or with a dry run, would have been)
+#   unchanged : [ (obj_type, luid, default) ] already matching the template
+#   skipped   : [ (obj_type, luid, default) ] content in a locked project, which takes the project's defaults instead
+#   failed    : [ (obj_type, luid, default, http_code, error) ], http_code is None for errors that aren't an HTTP
+#               response, such as a lost session
+class PropagationReport:
+    def __init__(self, dry_run: bool = False):
+        self.dry_run = dry_run
+        self.changed: List[PermissionsPlan] = []
+        self.unchanged: List[Tuple[str, str, bool]] = []
+        self.skipped: List[Tuple[str, str, bool]] = []
+        self.failed: List[Tuple[str, str, bool, Optional[int], str]] = []
+        self.elapsed_seconds = 0.0
+
+    @property
+    def call_count(self) -> int:
+        return sum([plan.call_count for plan in self.changed])
+
+    def describe(self) -> List[str]:
+        lines = ['{} changed{}, {} unchanged, {} skipped (locked), {} failed, {} calls, {:.1f} seconds'.format(
+            len(self.changed), ' (dry run)' if self.dry_run else '', len(self.unchanged), len(self.skipped),
+            len(self.failed), self.call_count, self.elapsed_seconds)]
+        for obj_type, luid, default, http_code, error in self.failed:
+            lines.append('FAILED {}{} {}: {}'.format('default ' if default else '', obj_type, luid,
+                                                    error if http_code is None else 'HTTP {}'.format(http_code)))
+        return lines
+
+    def __str__(self):
+        return "\n".join(self.describe())
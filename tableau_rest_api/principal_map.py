@@ -0,0 +1,144 @@
+from typing import Union, Any, Optional, List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import threading
+import xml.etree.ElementTree as ET
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from .records import *
+
+
+# Translates user and group LUIDs from one site (orig) to another (dest), matching users by username and groups by
+# name, within the same domain. A principal whose domain has no one of that name on the destination is matched by name
+# alone, but only if just one user or group has that name there. Both sites' users and groups are listed once, all four listings at the same time, the first time the map is
+# used; every lookup after that is a dict lookup. Build one per replication job and pass it to each of the
+# replicate_permissions() calls, so each principal is resolved once however many items are replicated
+class PrincipalMap(LoggingMethods):
+    def __init__(self, orig_t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'],
+                 dest_t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'],
+                 username_map: Optional[Dict[str, str]] = None, group_name_map: Optional[Dict[str, str]] = None,
+                 logger_obj: Optional[Logger] = None, page_size: int = 1000):
+        self.orig_t_rest_api = orig_t_rest_api
+        self.dest_t_rest_api = dest_t_rest_api
+        # { orig username : dest username }. When it is given, users who aren't in it are not mapped (and dropped)
+        self.username_map = username_map
+        # { orig group name : dest group name }. Groups not in it keep their name
+        self.group_name_map = group_name_map
+        self.logger = logger_obj
+        self.page_size = page_size
+        # ('user' / 'group', orig luid) : dest luid, or None if there is no match on the destination
+        self._luid_map: Dict[Tuple[str, str], Optional[str]] = {}
+        # ('user' / 'group', orig luid) : orig name, for logging what was dropped
+        self._orig_names: Dict[Tuple[str, str], str] = {}
+        self._built = False
+        self._lock = threading.Lock()
+
+    # Same site on the same server, so every LUID maps to itself
+    @property
+    def is_same_site(self) -> bool:
+        return self.orig_t_rest_api.site_content_url == self.dest_t_rest_api.site_content_url \
+            and self.orig_t_rest_api.server == self.dest_t_rest_api.server
+
+    def _list(self, t_rest_api, endpoint: str, record_class) -> List:
+        fields = ['_all_'] if endpoint == 'users' else None
+        return t_rest_api.query_resource_records(endpoint, record_class, fields=fields, page_size=self.page_size,
+                                                 max_workers=2)
+
+    def build(self):
+        with self._lock:
+            if self._built is True:
+                return
+            self.start_log_block()
+            if self.is_same_site is False:
+                with ThreadPoolExecutor(max_workers=4) as executor:
+                    orig_users = executor.submit(self._list, self.orig_t_rest_api, 'users', UserRecord)
+                    orig_groups = executor.submit(self._list, self.orig_t_rest_api, 'groups', GroupRecord)
+                    dest_users = executor.submit(self._list, self.dest_t_rest_api, 'users', UserRecord)
+                    dest_groups = executor.submit(self._list, self.dest_t_rest_api, 'groups', GroupRecord)
+                    self._map_principals('user', orig_users.result(), dest_users.result(), self.username_map, True)
+                    self._map_principals('group', orig_groups.result(), dest_groups.result(), self.group_name_map,
+                                         False)
+                unmapped = len([k for k in self._luid_map if self._luid_map[k] is None])
+                self.log('Mapped {} principals, {} have no match on the destination site'.format(
+                    len(self._luid_map) - unmapped, unmapped))
+            self._built = True
+            self.end_log_block()
+
+    def _map_principals(self, group_or_user: str, orig_records: List, dest_records: List,
+                        name_map: Optional[Dict[str, str]], name_map_required: bool):
+        # (domain name, name) : dest luid. Two users (or groups) can share a name if their domains differ
+        dest_luids = {}
+        # name : [ dest luids ], for when the domain names differ between the sites
+        dest_luids_by_name = {}
+        for record in dest_records:
+            dest_luids[(record.domain_name, record.name)] = record.luid
+            dest_luids_by_name.setdefault(record.name, []).append(record.luid)
+        for record in orig_records:
+            self._orig_names[(group_or_user, record.luid)] = record.name
+            if name_map is not None and record.name in name_map:
+                dest_name = name_map[record.name]
+            elif name_map is not None and name_map_required is True:
+                dest_name = None
+            else:
+                dest_name = record.name
+            if (record.domain_name, dest_name) in dest_luids:
+                dest_luid = dest_luids[(record.domain_name, dest_name)]
+            elif len(dest_luids_by_name.get(dest_name, [])) == 1:
+                dest_luid = dest_luids_by_name[dest_name][0]
+            else:
+                dest_luid = None
+            self._luid_map[(group_or_user, record.luid)] = dest_luid
+
+    def get_dest_luid(self, group_or_user: str, orig_luid: str) -> Optional[str]:
+        if group_or_user not in ['group', 'user']:
+            raise InvalidOptionException('group_or_user must be "group" or "user"')
+        self.build()
+        if self.is_same_site:
+            return orig_luid
+        return self._luid_map.get((group_or_user, orig_luid))
+
+    # The principals on the original site that have nothing to map to: [ (group_or_user, orig luid, orig name) ]
+    def get_unmapped(self) -> List[Tuple[str, str, str]]:
+        self.build()
+        return [(k[0], k[1], self._orig_names.get(k)) for k in self._luid_map if self._luid_map[k] is None]
+
+    def _log_dropped(self, group_or_user: str, orig_luid: str):
+        self.log("No match on the destination site for {} {} ({}), dropping from list".format(
+            group_or_user, orig_luid, self._orig_names.get((group_or_user, orig_luid))))
+
+    # Copies of the Permissions objects with the destination LUIDs. Anyone with no match is left out
+    def convert_permissions_obj_list(self, permissions_obj_list: List['Permissions']) -> List['Permissions']:
+        self.build()
+        if self.is_same_site:
+            return permissions_obj_list
+        final_perms_obj_list = []
+        for perms_obj in permissions_obj_list:
+            n_luid = self.get_dest_luid(perms_obj.group_or_user, perms_obj.luid)
+            if n_luid is None:
+                self._log_dropped(perms_obj.group_or_user, perms_obj.luid)
+                continue
+            new_perms_obj = copy.deepcopy(perms_obj)
+            new_perms_obj.luid = n_luid
+            final_perms_obj_list.append(new_perms_obj)
+        return final_perms_obj_list
+
+    # Changes the LUIDs of a permissions tsRequest in place, removing the granteeCapabilities of anyone with no match
+    def convert_permissions_xml(self, permissions_xml_request: ET.Element) -> ET.Element:
+        self.build()
+        if self.is_same_site:
+            return permissions_xml_request
+        for permissions_element in permissions_xml_request:
+            for grantee_capabilities in list(permissions_element):
+                for grantee in grantee_capabilities:
+                    if grantee.tag not in ['group', 'user']:
+                        continue
+                    orig_luid = grantee.get('id')
+                    n_luid = self.get_dest_luid(grantee.tag, orig_luid)
+                    if n_luid is None:
+                        self._log_dropped(grantee.tag, orig_luid)
+                        permissions_element.remove(grantee_capabilities)
+                    else:
+                        grantee.set('id', n_luid)
+        return permissions_xml_request
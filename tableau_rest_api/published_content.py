@@ -1,7 +1,12 @@
 
 from .permissions import *
+from .permissions_plan import *
+from .principal_map import *
+from .records import *
 import copy
-from typing import Union, Any, Optional, List, Dict, TYPE_CHECKING
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Any, Optional, List, Dict, Tuple, TYPE_CHECKING
 
 from ..tableau_rest_xml import TableauRestXml
 
@@ -24,10 +29,12 @@ class PublishedContent(LoggingMethods):
         self.t_rest_api: Union[TableauRestApiConnection, TableauServerRest] = tableau_rest_api_obj
         self.obj_type = obj_type
         self.default = default
-        self.obj_perms_xml = None
-        self.current_perms_obj_list: Optional[List[Permissions]] = None
+        # The permissions are only requested the first time they are used (or by prefetch_permissions())
+        self._permissions_loaded = False
+        self._obj_perms_xml: Optional[ET.Element] = None
+        self._current_perms_obj_list: Optional[List[Permissions]] = None
+        self._permissions_fingerprint: Optional[PermissionsFingerprint] = None
         self.__permissionable_objects = self.permissionable_objects
-        self.get_permissions_from_server()
         #self.log('Creating a Published Project Object from this XML:')
         #self.log_xml_response(content_xml_obj)
         self.api_version = tableau_rest_api_obj.api_version
@@ -47,6 +54,46 @@ class PublishedContent(LoggingMethods):
     def luid(self, name_or_luid):
         self._luid = name_or_luid
 
+    @property
+    def permissions_loaded(self) -> bool:
+        return self._permissions_loaded
+
+    @property
+    def obj_perms_xml(self) -> Optional[ET.Element]:
+        if self._permissions_loaded is False:
+            self.get_permissions_from_server()
+        return self._obj_perms_xml
+
+    @obj_perms_xml.setter
+    def obj_perms_xml(self, obj_perms_xml: Optional[ET.Element]):
+        self._obj_perms_xml = obj_perms_xml
+
+    # The fingerprint is reset whenever the list is replaced (which everything in this class does, rather than
+    # changing the Permissions objects in place)
+    @property
+    def current_perms_obj_list(self) -> Optional[List['Permissions']]:
+        if self._permissions_loaded is False:
+            self.get_permissions_from_server()
+        return self._current_perms_obj_list
+
+    @current_perms_obj_list.setter
+    def current_perms_obj_list(self, perms_obj_list: Optional[List['Permissions']]):
+        self._current_perms_obj_list = perms_obj_list
+        self._permissions_loaded = True
+        self._permissions_fingerprint = None
+
+    def get_permissions_fingerprint(self) -> PermissionsFingerprint:
+        if self._permissions_fingerprint is None:
+            self._permissions_fingerprint = PermissionsFingerprint.from_permissions_obj_list(
+                self.current_perms_obj_list)
+        return self._permissions_fingerprint
+
+    # True when the object already has exactly these permissions (and nothing else)
+    def permissions_match(self, permissions: Union[List['Permissions'], PermissionsFingerprint]) -> bool:
+        if not isinstance(permissions, PermissionsFingerprint):
+            permissions = PermissionsFingerprint.from_permissions_obj_list(permissions)
+        return self.get_permissions_fingerprint() == permissions
+
     def get_object_type(self):
         return self.obj_type
 
@@ -66,11 +113,12 @@ class PublishedContent(LoggingMethods):
             luid = self.t_rest_api.query_user_luid(username_or_luid)
         else:
             raise InvalidOptionException('Please pass in one of group_name_or_luid or username_or_luid')
+        group_or_user = 'group' if group_name_or_luid is not None else 'user'
         # This is just for compatibility
         if permissions_class_override is not None:
-            perms_obj = permissions_class_override(group_or_user='group', group_or_user_luid=luid)
+            perms_obj = permissions_class_override(group_or_user=group_or_user, group_or_user_luid=luid)
         else:
-            perms_obj = self.permissions_object_class(group_or_user='group', group_or_user_luid=luid)
+            perms_obj = self.permissions_object_class(group_or_user=group_or_user, group_or_user_luid=luid)
         perms_obj.enable_logging(self.logger)
         if role is not None:
             perms_obj.set_capabilities_to_match_role(role)
@@ -123,133 +171,47 @@ class PublishedContent(LoggingMethods):
 
 
 
-    # Runs through the gcap object list, and tries to do a conversion all principals to matching LUIDs on current site
-    # Use case is replicating settings from one site to another
-    # Orig_site must be TableauRestApiConnection
-    # Not Finished
-    def convert_permissions_obj_list_from_orig_site_to_current_site(self, permissions_obj_list: List['Permissions'],
-                                                                    orig_site: Union['TableauRestApiConnection', 'TableauServerRest']) -> List['Permissions']:
-        """
-        :type permissions_obj_list: list[Permissions]
-        :type orig_site: TableauRestApiConnection
-        :rtype: list[Permissions]
-        """
-        # If the site is the same, skip the whole thing and just return the original
-        if self.t_rest_api.site_content_url == orig_site.site_content_url \
-                and self.t_rest_api.server == orig_site.server:
-            return permissions_obj_list
-
-        new_perms_obj_list = copy.deepcopy(permissions_obj_list)
-        final_perms_obj_list = []
-        # Make this more efficient -- should only look up those users it needs to. Question on algorithm for speed
-
-        for perms_obj in new_perms_obj_list:
-            orig_luid = perms_obj.luid
-            if perms_obj.group_or_user == 'group':
-                # Find the name that matches the LUID
-                try:
-                    orig_name = orig_site.query_group_name(orig_luid)
-                    self.log('Found orig luid {} for name {}'.format(orig_luid, orig_name ))
-                    n_luid = self.t_rest_api.query_group_luid(orig_name)
-                    self.log('Found new luid {} for name {}'.format(n_luid, orig_name ))
-                except StopIteration:
-                    self.log("No matching name for luid {} found on the original site, dropping from list".format(
-                        orig_luid))
-
-            elif perms_obj.group_or_user == 'user':
-                # Find the name that matches the LUID
-                try:
-                    # Individual searches here. Efficient in versions with lookup
-                    orig_user = orig_site.query_user(orig_luid)
-                    orig_username = orig_user.get('name')
-                    n_luid = self.t_rest_api.query_user_luid(orig_username)
-                except NoMatchFoundException:
-                    self.log("No matching name for luid {} found on the original site, dropping from list".format(
-                        orig_luid))
-            perms_obj.luid = n_luid
-            final_perms_obj_list.append(copy.deepcopy(perms_obj))
-        return final_perms_obj_list
-
-    # Runs through the gcap object list, and tries to do a conversion all principals to matching LUIDs on current site
-    # Use case is replicating settings from one site to another
-    # Orig_site must be TableauRestApiConnection
-    # Not Finished
-    def convert_permissions_xml_object_from_orig_site_to_current_site(self, permissions_xml_request, orig_site,
-                                                                      username_map=None):
-        """
-        :type permissions_xml_request: ET.Element
-        :type orig_site: TableauRestApiConnection
-        :type username_map: dict[unicode, unicode]
-        :rtype: ET.Element
-        """
-        # If the site is the same, skip the whole thing and just return the original
-        if self.t_rest_api.site_content_url == orig_site.site_content_url \
-                and self.t_rest_api.server == orig_site.server:
-            return permissions_xml_request
+    # The PrincipalMap passed in for the whole job, or else the one the connection keeps for orig_site, so that
+    # repeated calls don't list both sites' users and groups again
+    def _get_principal_map(self, orig_site: Union['TableauRestApiConnection', 'TableauServerRest'],
+                           username_map: Optional[Dict[str, str]] = None,
+                           principal_map: Optional[PrincipalMap] = None) -> PrincipalMap:
+        if principal_map is not None:
+            return principal_map
+        return self.t_rest_api.get_principal_map(orig_site, username_map=username_map)
 
-        # new_perms_obj_list = permissions_xml_request
-        final_perms_obj_list = []
-        # Make this more efficient -- should only look up those users it needs to. Question on algorithm for speed
-
-        # Must loop two levels deep
-        for permissions_element in permissions_xml_request:
-            for grantee_capabilities in permissions_element:
-                # Handle groups first
-                for group in grantee_capabilities.iter('group'):
-
-                    orig_luid = group.get('id')
-                    # Find the name that matches the LUID
-                    try:
-                        orig_name = orig_site.query_group_name(orig_luid)
-                        self.log('Found orig luid {} for name {}'.format(orig_luid, orig_name ))
-                        n_luid = self.t_rest_api.query_group_luid(orig_name)
-                        self.log('Found new luid {} for name {}'.format(n_luid, orig_name ))
-                        # Update the attribute for the new site
-                        group.set('id', n_luid)
-                    except StopIteration:
-                        self.log("No matching name for luid {} found on the original site, dropping from list".format(
-                            orig_luid))
-                        # Here, do we remove a group that doesn't exist on the new site? Or just raise that exception?
-                        # Going with remove for now, to make things more smooth
-                        permissions_element.remove(grantee_capabilities)
-
-                # This works if you anticipate that users will have the same name. Should add an optional dictionary for
-                # translating
-                for user in grantee_capabilities.iter('user'):
-                    orig_luid = user.get('id')
-                    # Find the name that matches the LUID
-                    try:
-                        # Individual searches here. Efficient in versions with lookup
-                        orig_user = orig_site.query_user(orig_luid)
-                        orig_username = orig_user.get('name')
-                        final_username = orig_username
-                        if username_map is not None:
-                            if orig_username in username_map:
-                                final_username = username_map[orig_username]
-                            else:
-                                self.log("No matching name in the username_map found for original_name '{}' found , dropping from list".format(
-                                        orig_username))
-                                permissions_element.remove(grantee_capabilities)
-                        else:
-                            final_username = orig_username
-                        n_luid = self.t_rest_api.query_user_luid(final_username)
-                        user.set('id', n_luid)
-                    except NoMatchFoundException:
-                        self.log("No matching name for luid {} found on the original site, dropping from list".format(
-                            orig_luid))
-                        permissions_element.remove(grantee_capabilities)
-        return permissions_xml_request
-
-
-    def replicate_permissions(self, orig_content):
+    # Runs through the gcap object list, and converts all principals to the matching LUIDs on the current site
+    # Use case is replicating settings from one site to another. Principals with no match are dropped
+    def convert_permissions_obj_list_from_orig_site_to_current_site(self, permissions_obj_list: List['Permissions'],
+                                                                    orig_site: Union['TableauRestApiConnection', 'TableauServerRest'],
+                                                                    principal_map: Optional[PrincipalMap] = None) -> List['Permissions']:
+        principal_map = self._get_principal_map(orig_site, principal_map=principal_map)
+        return principal_map.convert_permissions_obj_list(permissions_obj_list)
+
+    # Same for a permissions tsRequest, which is changed in place. username_map is { orig username : new username }
+    # and any user not in it is dropped. It only applies when there is no principal_map (which has its own)
+    def convert_permissions_xml_object_from_orig_site_to_current_site(self, permissions_xml_request: ET.Element,
+                                                                      orig_site: Union['TableauRestApiConnection', 'TableauServerRest'],
+                                                                      username_map: Optional[Dict[str, str]] = None,
+                                                                      principal_map: Optional[PrincipalMap] = None) -> ET.Element:
+        principal_map = self._get_principal_map(orig_site, username_map=username_map, principal_map=principal_map)
+        return principal_map.convert_permissions_xml(permissions_xml_request)
+
+    # Rather than clearing everything and setting it again, only the differences are sent (replace=True removes
+    # grantees that aren't on the original). Nothing is sent at all if the permissions already match
+    def replicate_permissions(self, orig_content, max_workers: int = 4, principal_map: Optional[PrincipalMap] = None):
         self.start_log_block()
-        self.clear_all_permissions()
+        self.get_permissions_from_server()
 
         # Self Permissions
         o_perms_obj_list = orig_content.current_perms_obj_list
-        n_perms_obj_list = self.convert_permissions_obj_list_from_orig_site_to_current_site(o_perms_obj_list,
-                                                                                            orig_content.t_rest_api)
-        self.set_permissions_by_permissions_obj_list(n_perms_obj_list)
+        n_perms_obj_list = self.convert_permissions_obj_list_from_orig_site_to_current_site(
+            o_perms_obj_list, orig_content.t_rest_api, principal_map=principal_map)
+        if self.permissions_match(n_perms_obj_list):
+            self.log('Permissions already match the original, skipping')
+        else:
+            self.apply_permissions_plan(self.plan_permissions(n_perms_obj_list, replace=True),
+                                        max_workers=max_workers)
         self.end_log_block()
 
     @staticmethod
@@ -266,7 +228,8 @@ class PublishedContent(LoggingMethods):
                 p.remove(proj_element)
         return tsr
 
-    def replicate_permissions_direct_xml(self, orig_content, username_map=None):
+    def replicate_permissions_direct_xml(self, orig_content, username_map=None, max_workers: int = 4,
+                                         principal_map: Optional[PrincipalMap] = None):
         """
         :type orig_content: PublishedContent
         :type username_map: dict[unicode, unicode]
@@ -274,7 +237,7 @@ class PublishedContent(LoggingMethods):
         """
         self.start_log_block()
 
-        self.clear_all_permissions()
+        self.clear_all_permissions(max_workers=max_workers)
 
         # This is for the project Permissions. Handle defaults down below
 
@@ -284,7 +247,8 @@ class PublishedContent(LoggingMethods):
 
         # Now convert over all groups and users
         self.convert_permissions_xml_object_from_orig_site_to_current_site(perms_tsr, orig_content.t_rest_api,
-                                                                           username_map=username_map)
+                                                                           username_map=username_map,
+                                                                           principal_map=principal_map)
         self.set_permissions_by_permissions_direct_xml(perms_tsr)
         self.end_log_block()
 
@@ -302,34 +266,11 @@ class PublishedContent(LoggingMethods):
         return (x > y) - (x < y)
 
     # Determine if capabilities are already set identically (or identically enough) to skip
-    def are_capabilities_obj_lists_identical(self, new_obj_list: List['Permissions'],
+    @staticmethod
+    def are_capabilities_obj_lists_identical(new_obj_list: List['Permissions'],
                                              dest_obj_list: List['Permissions']) -> bool:
-        # Grab the LUIDs of each, determine if they match in the first place
-
-        # Create a dict with the LUID as the keys for sorting and comparison
-        new_obj_dict = {}
-        for obj in new_obj_list:
-            new_obj_dict[obj.luid] = obj
-
-        dest_obj_dict = {}
-        for obj in dest_obj_list:
-            dest_obj_dict[obj.luid] = obj
-            # If lengths don't match, they must differ
-            if len(new_obj_dict) != len(dest_obj_dict):
-                return False
-            else:
-                # If LUIDs don't match, they must differ
-                new_obj_luids = list(new_obj_dict.keys())
-                dest_obj_luids = list(dest_obj_dict.keys())
-                new_obj_luids.sort()
-                dest_obj_luids.sort()
-                if self._cmp(new_obj_luids, dest_obj_luids) != 0:
-                    return False
-                for luid in new_obj_luids:
-                    new_obj = new_obj_dict.get(luid)
-                    dest_obj = dest_obj_dict.get(luid)
-                    return self.are_capabilities_obj_dicts_identical(new_obj.get_capabilities_dict(),
-                                                                     dest_obj.get_capabilities_dict())
+        return PermissionsFingerprint.from_permissions_obj_list(new_obj_list) == \
+            PermissionsFingerprint.from_permissions_obj_list(dest_obj_list)
 
     @staticmethod
     def are_capabilities_obj_dicts_identical(new_obj_dict: Dict, dest_obj_dict: Dict) -> bool:
@@ -406,9 +347,36 @@ class PublishedContent(LoggingMethods):
                 self.obj_perms_xml = self.t_rest_api.query_resource(
                     "projects/{}/default-permissions/{}s".format(self.luid, self.obj_type))
         self.log('Converting XML into Permissions Objects for object type: {}'.format(self.obj_type))
-        self.current_perms_obj_list = self.convert_capabilities_xml_into_obj_list(self.obj_perms_xml)
+        self.current_perms_obj_list = self.convert_capabilities_xml_into_obj_list(self._obj_perms_xml)
         self.end_log_block()
-        return self.current_perms_obj_list
+        return self._current_perms_obj_list
+
+    # get_permissions_from_server() for use from a worker thread
+    def _get_permissions_from_server_in_thread(self) -> List['Permissions']:
+        obj_perms_xml = self.t_rest_api.query_resource_in_thread(self._get_permissions_url_ending())
+        return self.get_permissions_from_server(obj_perms_xml)
+
+    # Loads the permissions of every object that doesn't have them yet, all at once, so that looping over the objects
+    # afterwards makes no further requests. A Project brings its default permissions objects along too
+    @staticmethod
+    def prefetch_permissions(content_objects: List['PublishedContent'], include_defaults: bool = True,
+                             max_workers: int = 4):
+        to_load = []
+        for content in content_objects:
+            to_load.append(content)
+            if include_defaults is True and isinstance(content, Project):
+                to_load.extend(content.get_default_permissions_objects())
+        to_load = [content for content in to_load if content.permissions_loaded is False]
+        PublishedContent.refresh_permissions_concurrently(to_load, max_workers=max_workers)
+
+    # Requests the current permissions of many objects (including default permissions objects) at once
+    @staticmethod
+    def refresh_permissions_concurrently(content_objects: List['PublishedContent'], max_workers: int = 4):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(content._get_permissions_from_server_in_thread)
+                       for content in content_objects]
+            for future in futures:
+                future.result()
 
     def get_permissions_xml(self) -> ET.Element:
         return self.obj_perms_xml
@@ -425,7 +393,8 @@ class PublishedContent(LoggingMethods):
         if self.default is True:
             url = self.t_rest_api.build_api_url(
                 "projects/{}/default-permissions/{}s".format(self.luid, self.obj_type))
-        new_perms_xml = self.t_rest_api.send_update_request(url, direct_xml_request)
+        # Thread-safe, so that Project can send the defaults at the same time
+        new_perms_xml = self.t_rest_api.send_update_request_in_thread(url, direct_xml_request)
 
         # Update the internal representation from the newly returned permissions XML
         self.get_permissions_from_server(new_perms_xml)
@@ -434,74 +403,210 @@ class PublishedContent(LoggingMethods):
 
     # Shorter, cleaner code. Use in the future
     def set_permissions(self, permissions: Optional[List['Permissions']] = None,
-                        direct_xml_request: Optional[ET.Element] = None):
+                        direct_xml_request: Optional[ET.Element] = None,
+                        dry_run: bool = False, max_workers: int = 4) -> Optional[PermissionsPlan]:
         if permissions is not None and direct_xml_request is not None:
             raise InvalidOptionException('Please only send one of the two arguments at a time')
         if permissions is not None:
-            self.set_permissions_by_permissions_obj_list(new_permissions_obj_list=permissions)
+            return self.set_permissions_by_permissions_obj_list(new_permissions_obj_list=permissions,
+                                                                dry_run=dry_run, max_workers=max_workers)
         elif direct_xml_request is not None:
             self.set_permissions_by_permissions_direct_xml(direct_xml_request=direct_xml_request)
         else:
             raise InvalidOptionException('Please send in at least one argument')
 
-    def set_permissions_by_permissions_obj_list(self, new_permissions_obj_list):
-        """
-        :type new_permissions_obj_list: list[Permissions]
-        """
+    def _get_permissions_url_ending(self) -> str:
+        if self.default is True:
+            return "projects/{}/default-permissions/{}s".format(self.luid, self.obj_type)
+        else:
+            return "{}s/{}/permissions".format(self.obj_type, self.luid)
+
+    def _get_delete_permission_url(self, group_or_user: str, grantee_luid: str, capability: str, mode: str) -> str:
+        return self.t_rest_api.build_api_url("{}/{}s/{}/{}/{}".format(self._get_permissions_url_ending(),
+                                                                      group_or_user, grantee_luid, capability, mode))
+
+    # Works out the fewest calls to get from the current permissions to the new ones: a DELETE only for a capability
+    # whose mode actually changes (or is being unset), and a single PUT with every addition for every grantee.
+    # Grantees that are not in new_permissions_obj_list are left alone. Nothing is sent to the server
+    # With replace=True, any grantee that currently has permissions but is not in the new list has them all removed,
+    # so the object ends up with exactly the new list
+    def plan_permissions(self, new_permissions_obj_list: List['Permissions'], replace: bool = False) -> PermissionsPlan:
+        plan = PermissionsPlan(self.obj_type, self.luid, self.default)
+        current = {}
+        for cur_obj in self.current_perms_obj_list:
+            current[(cur_obj.group_or_user, cur_obj.luid)] = cur_obj
+
+        if replace is True:
+            new_grantees = set([(new_obj.group_or_user, new_obj.luid) for new_obj in new_permissions_obj_list])
+            for grantee in current:
+                if grantee in new_grantees:
+                    continue
+                for group_or_user, grantee_luid, cap, mode in current[grantee].get_fingerprint_items():
+                    plan.add_deletion(group_or_user, grantee_luid, cap, mode)
+
+        # The comparison is done on the Allow / Deny bitmasks, so only the capabilities that differ are looked at
+        for new_permissions_obj in new_permissions_obj_list:
+            grantee = (new_permissions_obj.group_or_user, new_permissions_obj.luid)
+            delete_allow, delete_deny, add_allow, add_deny = new_permissions_obj.diff_capabilities(
+                current.get(grantee))
+            if delete_allow | delete_deny | add_allow | add_deny == 0:
+                plan.unchanged.append(grantee)
+                continue
+            for cap in Permissions.get_capability_names_from_mask(delete_allow):
+                plan.add_deletion(grantee[0], grantee[1], cap, 'Allow')
+            for cap in Permissions.get_capability_names_from_mask(delete_deny):
+                plan.add_deletion(grantee[0], grantee[1], cap, 'Deny')
+            for cap in Permissions.get_capability_names_from_mask(add_allow):
+                plan.add_addition(grantee[0], grantee[1], cap, 'Allow')
+            for cap in Permissions.get_capability_names_from_mask(add_deny):
+                plan.add_addition(grantee[0], grantee[1], cap, 'Deny')
+        self.log('Permissions plan: {} calls, {} grantees unchanged'.format(plan.call_count, len(plan.unchanged)))
+        return plan
+
+    def _build_add_permissions_request_from_plan(self, plan: PermissionsPlan) -> ET.Element:
+        tsr = ET.Element('tsRequest')
+        p = ET.Element('permissions')
+        for group_or_user, grantee_luid in plan.additions:
+            c = self.build_capabilities_xml_from_dict(plan.additions[(group_or_user, grantee_luid)], self.obj_type)
+            gcap = ET.Element('granteeCapabilities')
+            t = ET.Element(group_or_user)
+            t.set('id', grantee_luid)
+            gcap.append(t)
+            gcap.append(c)
+            p.append(gcap)
+        tsr.append(p)
+        return tsr
+
+    # Keeps current_perms_obj_list in step with what the plan did, rather than requesting it all again. Anything in
+    # plan.failed didn't happen on the server, so it isn't applied
+    def _apply_plan_to_current_permissions(self, plan: PermissionsPlan):
+        current = {}
+        for cur_obj in self.current_perms_obj_list:
+            current[(cur_obj.group_or_user, cur_obj.luid)] = cur_obj
+        failed_deletions = set([f[1:5] for f in plan.failed if f[0] == 'DELETE'])
+        for group_or_user, grantee_luid, cap, mode in plan.deletions:
+            if (group_or_user, grantee_luid, cap, mode) in failed_deletions:
+                continue
+            if (group_or_user, grantee_luid) in current:
+                current[(group_or_user, grantee_luid)]._set_capability_from_published_content(cap, None)
+        additions_failed = len([f for f in plan.failed if f[0] == 'PUT']) > 0
+        for grantee in plan.additions:
+            if additions_failed:
+                break
+            if grantee not in current:
+                current[grantee] = self.permissions_object_class(grantee[0], grantee[1])
+            for cap in plan.additions[grantee]:
+                current[grantee]._set_capability_from_published_content(cap, plan.additions[grantee][cap])
+        # Anyone left with nothing set no longer appears in the permissions on the server
+        final_perms_obj_list = []
+        for perms_obj in current.values():
+            if perms_obj.set_mask != 0:
+                final_perms_obj_list.append(perms_obj)
+        self.current_perms_obj_list = final_perms_obj_list
+
+    def _send_permissions_plan_deletion(self, plan: PermissionsPlan, group_or_user: str, grantee_luid: str,
+                                        cap: str, mode: str):
+        url = self._get_delete_permission_url(group_or_user, grantee_luid, cap, mode)
+        try:
+            self.t_rest_api.send_delete_request_in_thread(url)
+        except RecoverableHTTPException as e:
+            self.log('DELETE of {} {} {} {} failed, HTTP {}'.format(group_or_user, grantee_luid, cap, mode,
+                                                                    e.http_code))
+            plan.add_failed_deletion(group_or_user, grantee_luid, cap, mode, e.http_code)
+
+    # The server refuses the whole PUT if any capability in it still has the opposite mode set, so it isn't sent at
+    # all once one of the plan's DELETEs has failed
+    def _send_permissions_plan_additions(self, plan: PermissionsPlan):
+        if len(plan.failed) > 0:
+            plan.add_failed_additions(None)
+            return
+        tsr = self._build_add_permissions_request_from_plan(plan)
+        url = self.t_rest_api.build_api_url(self._get_permissions_url_ending())
+        try:
+            self.t_rest_api.send_update_request_in_thread(url, tsr)
+        except RecoverableHTTPException as e:
+            self.log('PUT of {} permissions for {} failed, HTTP {}'.format(self.obj_type, self.luid, e.http_code))
+            plan.add_failed_additions(e.http_code)
+
+    # Carries out the plans for any number of objects through one pool of max_workers threads. All of the DELETEs,
+    # for every object, go first and in parallel, then the PUTs (one per object) in parallel. The server only needs
+    # an object's deletes to be done before its PUT, because it refuses to add a mode for a capability that has the
+    # opposite mode set. Calls the server refuses are collected in each plan's failed list rather than raised
+    @staticmethod
+    def apply_permissions_plans(content_plans: List[Tuple['PublishedContent', PermissionsPlan]],
+                                max_workers: int = 4):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            deletes = []
+            for content, plan in content_plans:
+                for group_or_user, grantee_luid, cap, mode in plan.deletions:
+                    deletes.append(executor.submit(content._send_permissions_plan_deletion, plan, group_or_user,
+                                                   grantee_luid, cap, mode))
+            for future in deletes:
+                future.result()
+
+            adds = []
+            for content, plan in content_plans:
+                if len(plan.additions) > 0:
+                    adds.append(executor.submit(content._send_permissions_plan_additions, plan))
+            for future in adds:
+                future.result()
+
+        for content, plan in content_plans:
+            content._apply_plan_to_current_permissions(plan)
+
+    def apply_permissions_plan(self, plan: PermissionsPlan, max_workers: int = 4):
         self.start_log_block()
+        self.apply_permissions_plans([(self, plan)], max_workers=max_workers)
+        self.end_log_block()
 
+    # Reads the current permissions and brings them in line with new_permissions_obj_list, all from one worker thread:
+    # the DELETEs one after another, then the PUT. Returns the plan that was (or with dry_run=True, would be) sent
+    def _sync_permissions_in_thread(self, new_permissions_obj_list: List['Permissions'], replace: bool = False,
+                                    dry_run: bool = False) -> PermissionsPlan:
+        self._get_permissions_from_server_in_thread()
+        if self.permissions_match(new_permissions_obj_list):
+            return PermissionsPlan(self.obj_type, self.luid, self.default)
+        plan = self.plan_permissions(new_permissions_obj_list, replace=replace)
+        if dry_run is False and plan.is_empty() is False:
+            for group_or_user, grantee_luid, cap, mode in plan.deletions:
+                self._send_permissions_plan_deletion(plan, group_or_user, grantee_luid, cap, mode)
+            if len(plan.additions) > 0:
+                self._send_permissions_plan_additions(plan)
+            self._apply_plan_to_current_permissions(plan)
+        return plan
+
+    # Returns the plan that was (or with dry_run=True, would be) carried out. plan.call_count is the number of calls
+    def set_permissions_by_permissions_obj_list(self, new_permissions_obj_list: List['Permissions'],
+                                                dry_run: bool = False, max_workers: int = 4) -> PermissionsPlan:
+        self.start_log_block()
         self.log("Permissions object list has {} items:".format(len(new_permissions_obj_list)))
-        for new_permissions_obj in new_permissions_obj_list:
-            for cur_obj in self.current_perms_obj_list:
-                # Check if there are any existing capabilities on the object
-                if cur_obj.luid == new_permissions_obj.luid:
-                    # Find if anything is set already, add to deletion queue
-                    need_to_change = self.are_capabilities_obj_dicts_identical(
-                        cur_obj.get_capabilities_dict(), new_permissions_obj.get_capabilities_dict()
-                    )
-                    self.log("Existing permissions found for luid {}. Are there differences? {}".format(cur_obj.luid,
-                                                                                                         str(need_to_change)))
-                    # Delete all existing permissions
-                    if need_to_change is True:
-                        self.log("Removing existing permissions for luid {}".format(cur_obj.luid))
-                        self.delete_permissions_by_permissions_obj_list([cur_obj, ])
-
-                    if need_to_change is False:
-                        self.log('No changes necessary, skipping update for quicker performance')
-                        # self.end_log_block()
-                        continue
-            # Check if all capabilities are set to Unspecified, and ignore
-            specified_cap_count = 0
-            caps = new_permissions_obj.get_capabilities_dict()
-            self.log("New permissions to be set:")
-            self.log(str(caps))
-            for cap in caps:
-                if caps[cap] is not None:
-                    specified_cap_count += 1
-            if specified_cap_count > 0:
-                self.log("Adding permissions")
-                tsr = self._build_add_permissions_request(new_permissions_obj)
-                url = None
-                if self.default is False:
-                    url = self.t_rest_api.build_api_url("{}s/{}/permissions".format(self.obj_type, self.luid))
-                if self.default is True:
-                    url = self.t_rest_api.build_api_url(
-                        "projects/{}/default-permissions/{}s".format(self.luid, self.obj_type))
-                new_perms_xml = self.t_rest_api.send_update_request(url, tsr)
-
-                # Update the internal representation from the newly returned permissions XML
-                self.get_permissions_from_server(new_perms_xml)
-            else:
-                self.get_permissions_from_server()
+        # Identical to what is already there, nothing to plan
+        if self.are_capabilities_obj_lists_identical(new_permissions_obj_list, self.current_perms_obj_list):
+            self.log('No changes necessary, skipping update for quicker performance')
+            self.end_log_block()
+            return PermissionsPlan(self.obj_type, self.luid, self.default)
+        plan = self.plan_permissions(new_permissions_obj_list)
+        if dry_run is True:
+            self.log('Dry run, no changes made:')
+            for line in plan.describe():
+                self.log(line)
+        elif plan.is_empty():
+            self.log('No changes necessary, skipping update for quicker performance')
+        else:
+            self.apply_permissions_plan(plan, max_workers=max_workers)
         self.end_log_block()
+        return plan
 
     # Cleaner code for the future
-    def delete_permissions(self, permissions: List['Permissions']):
-        self.delete_permissions_by_permissions_obj_list(permissions_obj_list=permissions)
+    def delete_permissions(self, permissions: List['Permissions'], max_workers: int = 4):
+        self.delete_permissions_by_permissions_obj_list(permissions_obj_list=permissions, max_workers=max_workers)
 
-    # Legacy longer way to call
-    def delete_permissions_by_permissions_obj_list(self, permissions_obj_list: List['Permissions']):
+    # Legacy longer way to call. The DELETEs are sent in parallel. Returns the plan, with any refused DELETEs in
+    # plan.failed
+    def delete_permissions_by_permissions_obj_list(self, permissions_obj_list: List['Permissions'],
+                                                   max_workers: int = 4) -> PermissionsPlan:
         self.start_log_block()
+        plan = PermissionsPlan(self.obj_type, self.luid, self.default)
         for permissions_obj in permissions_obj_list:
             obj_luid = permissions_obj.luid
             group_or_user = permissions_obj.group_or_user
@@ -513,33 +618,38 @@ class PublishedContent(LoggingMethods):
             self.log('Deleting for object LUID {}'.format(self.luid))
             permissions_dict = permissions_obj.get_capabilities_dict()
             for cap in permissions_dict:
-                if self.default is True:
-                    api_url_start = "projects/{}/default-permissions/{}s/{}s/{}/{}/".format(self.luid, self.obj_type,
-                                                                                             group_or_user,
-                                                                                             obj_luid, cap)
-                else:
-                    api_url_start = "{}s/{}/permissions/{}s/{}/{}/".format(self.obj_type, self.luid, group_or_user,
-                                                                            obj_luid, cap)
-
-                if permissions_dict.get(cap) == 'Allow':
-                    # Delete Allow
-                    url = self.t_rest_api.build_api_url(api_url_start + 'Allow')
-                    self.t_rest_api.send_delete_request(url)
-                elif permissions_dict.get(cap) == 'Deny':
-                    # Delete Deny
-                    url = self.t_rest_api.build_api_url(api_url_start + 'Deny')
-                    self.t_rest_api.send_delete_request(url)
+                if permissions_dict.get(cap) in ['Allow', 'Deny']:
+                    plan.add_deletion(group_or_user, obj_luid, cap, permissions_dict.get(cap))
                 else:
                     self.log('{} set to none, no action'.format(cap))
+        self.apply_permissions_plans([(self, plan)], max_workers=max_workers)
         self.end_log_block()
-
-    def clear_all_permissions(self):
+        return plan
+
+    # A plan that removes every capability that is currently set. InheritedProjectLeader is read-only and stays
+    def plan_clear_all_permissions(self) -> PermissionsPlan:
+        plan = PermissionsPlan(self.obj_type, self.luid, self.default)
+        for cur_obj in self.current_perms_obj_list:
+            for group_or_user, grantee_luid, cap, mode in cur_obj.get_fingerprint_items():
+                plan.add_deletion(group_or_user, grantee_luid, cap, mode)
+        return plan
+
+    # Fetches the current permissions of all the objects, then sends every DELETE, all concurrently. Returns the
+    # plans, in the same order as content_objects
+    @staticmethod
+    def clear_permissions_concurrently(content_objects: List['PublishedContent'],
+                                       max_workers: int = 4) -> List[PermissionsPlan]:
+        PublishedContent.refresh_permissions_concurrently(content_objects, max_workers=max_workers)
+        content_plans = [(content, content.plan_clear_all_permissions()) for content in content_objects]
+        PublishedContent.apply_permissions_plans(content_plans, max_workers=max_workers)
+        return [plan for content, plan in content_plans]
+
+    # Returns the plans that were carried out, with any refused DELETEs in plan.failed
+    def clear_all_permissions(self, max_workers: int = 4) -> List[PermissionsPlan]:
         self.start_log_block()
-        self.get_permissions_from_server()
-        self.log('Current permissions object list')
-        self.log(str(self.current_perms_obj_list))
-        self.delete_permissions(permissions=self.current_perms_obj_list)
+        plans = self.clear_permissions_concurrently([self, ], max_workers=max_workers)
         self.end_log_block()
+        return plans
 
 class Workbook(PublishedContent):
     def __init__(self, luid, tableau_rest_api_obj, default=False, logger_obj=None,
@@ -735,6 +845,21 @@ class Flow33(PublishedContent):
         return self._get_permissions_object(group_name_or_luid=group_name_or_luid, username_or_luid=username_or_luid,
                                             role=role)
 
+    @staticmethod
+    def convert_capabilities_xml_into_obj_list(xml_obj: ET.Element) -> List['FlowPermissions33']:
+        obj_list = []
+        for gcaps in xml_obj.findall('.//t:granteeCapabilities', TableauRestXml.ns_map):
+            for tags in gcaps:
+                if tags.tag == '{}group'.format(TableauRestXml.ns_prefix):
+                    perms_obj = FlowPermissions33('group', tags.get('id'))
+                elif tags.tag == '{}user'.format(TableauRestXml.ns_prefix):
+                    perms_obj = FlowPermissions33('user', tags.get('id'))
+                elif tags.tag == '{}capabilities'.format(TableauRestXml.ns_prefix):
+                    for caps in tags:
+                        perms_obj.set_capability(caps.get('name'), caps.get('mode'))
+            obj_list.append(perms_obj)
+        return obj_list
+
 class Database35(PublishedContent):
     def __init__(self, luid, tableau_rest_api_obj, default=False, logger_obj=None,
                  content_xml_obj=None):
@@ -774,11 +899,9 @@ class Project(PublishedContent):
         self.log_xml_response(content_xml_obj)
         self.log('Project object has this XML: ')
         self.log_xml_response(self.xml_obj)
-        # projects in 9.2 have child workbook and datasource permissions
-        self._workbook_defaults = Workbook(self.luid, self.t_rest_api,
-                                           default=True, logger_obj=logger_obj)
-        self._datasource_defaults = Datasource(self.luid, self.t_rest_api,
-                                               default=True, logger_obj=logger_obj)
+        # projects in 9.2 have child workbook and datasource permissions. They are built when first used
+        self._workbook_defaults: Optional[Workbook] = None
+        self._datasource_defaults: Optional[Datasource] = None
 
         self.__available_capabilities = Permissions.available_capabilities[self.api_version]["project"]
         self.permissions_locked = None
@@ -837,66 +960,59 @@ class Project(PublishedContent):
             #self.end_log_block()
             return obj_list
 
-    def replicate_permissions(self, orig_content: 'Project'):
+    # The project, workbook defaults and datasource defaults are refreshed together and then updated together. Any of
+    # the three that already match the original are skipped
+    def replicate_permissions(self, orig_content: 'Project', max_workers: int = 4,
+                              principal_map: Optional[PrincipalMap] = None):
         self.start_log_block()
-
-        self.clear_all_permissions()
-
-        # Self Permissions
-        o_perms_obj_list = orig_content.current_perms_obj_list
-        n_perms_obj_list = self.convert_permissions_obj_list_from_orig_site_to_current_site(o_perms_obj_list,
-                                                                                            orig_content.t_rest_api)
-        self.set_permissions_by_permissions_obj_list(n_perms_obj_list)
-
-        # Workbook Defaults
-        o_perms_obj_list = orig_content.workbook_defaults.current_perms_obj_list
-        n_perms_obj_list = self.workbook_defaults.convert_permissions_obj_list_from_orig_site_to_current_site(
-            o_perms_obj_list, orig_content.t_rest_api)
-        self.workbook_defaults.set_permissions_by_permissions_obj_list(n_perms_obj_list)
-
-        # Datasource Defaults
-        o_perms_obj_list = orig_content.datasource_defaults.current_perms_obj_list
-        n_perms_obj_list = self.datasource_defaults.convert_permissions_obj_list_from_orig_site_to_current_site(
-            o_perms_obj_list, orig_content.t_rest_api)
-        self.datasource_defaults.set_permissions_by_permissions_obj_list(n_perms_obj_list)
+        # One map for all three
+        principal_map = self._get_principal_map(orig_content.t_rest_api, principal_map=principal_map)
+
+        content_pairs = [(self, orig_content),
+                         (self.workbook_defaults, orig_content.workbook_defaults),
+                         (self.datasource_defaults, orig_content.datasource_defaults)]
+        self.refresh_permissions_concurrently([dest_content for dest_content, orig in content_pairs],
+                                              max_workers=max_workers)
+        content_plans = []
+        for dest_content, orig in content_pairs:
+            n_perms_obj_list = dest_content.convert_permissions_obj_list_from_orig_site_to_current_site(
+                orig.current_perms_obj_list, orig_content.t_rest_api, principal_map=principal_map)
+            if dest_content.permissions_match(n_perms_obj_list):
+                self.log('{} permissions already match the original, skipping'.format(dest_content.obj_type))
+                continue
+            content_plans.append((dest_content, dest_content.plan_permissions(n_perms_obj_list, replace=True)))
+        self.apply_permissions_plans(content_plans, max_workers=max_workers)
 
         self.end_log_block()
 
-    def replicate_permissions_direct_xml(self, orig_content: 'Project', username_map: Optional[Dict] = None):
+    def replicate_permissions_direct_xml(self, orig_content: 'Project', username_map: Optional[Dict] = None,
+                                         max_workers: int = 4, principal_map: Optional[PrincipalMap] = None):
         self.start_log_block()
-
-        self.clear_all_permissions()
-
-        # This is for the project Permissions. Handle defaults down below
-
-        perms_tsr = self.t_rest_api.build_request_from_response(orig_content.obj_perms_xml)
-        # Remove the project tag from the original response
-        perms_tsr = self._fix_permissions_request_for_replication(perms_tsr)
-
-        # Now convert over all groups and users
-        self.convert_permissions_xml_object_from_orig_site_to_current_site(perms_tsr, orig_content.t_rest_api,
-                                                                           username_map=username_map)
-        self.set_permissions_by_permissions_direct_xml(perms_tsr)
-
-        # Workbook Defaults
-        perms_tsr = self.t_rest_api.build_request_from_response(orig_content.workbook_defaults.obj_perms_xml)
-        # Remove the project tag from the original response
-        perms_tsr = self._fix_permissions_request_for_replication(perms_tsr)
-
-        # Now convert over all groups and users
-        self.convert_permissions_xml_object_from_orig_site_to_current_site(perms_tsr, orig_content.t_rest_api,
-                                                                           username_map=username_map)
-        self.workbook_defaults.set_permissions_by_permissions_direct_xml(perms_tsr)
-
-        # Datasource Defaults
-        perms_tsr = self.t_rest_api.build_request_from_response(orig_content.datasource_defaults.obj_perms_xml)
-        # Remove the project tag from the original response
-        perms_tsr = self._fix_permissions_request_for_replication(perms_tsr)
-
-        # Now convert over all groups and users
-        self.convert_permissions_xml_object_from_orig_site_to_current_site(perms_tsr, orig_content.t_rest_api,
-                                                                           username_map=username_map)
-        self.datasource_defaults.set_permissions_by_permissions_direct_xml(perms_tsr)
+        principal_map = self._get_principal_map(orig_content.t_rest_api, username_map=username_map,
+                                                principal_map=principal_map)
+
+        self.clear_all_permissions(max_workers=max_workers)
+
+        # The project Permissions, then the Workbook and Datasource Defaults. The names are converted here, and the
+        # three requests are sent together at the end
+        content_requests = []
+        for dest_content, orig in [(self, orig_content),
+                                   (self.workbook_defaults, orig_content.workbook_defaults),
+                                   (self.datasource_defaults, orig_content.datasource_defaults)]:
+            perms_tsr = self.t_rest_api.build_request_from_response(orig.obj_perms_xml)
+            # Remove the project tag from the original response
+            perms_tsr = self._fix_permissions_request_for_replication(perms_tsr)
+
+            # Now convert over all groups and users
+            self.convert_permissions_xml_object_from_orig_site_to_current_site(perms_tsr, orig_content.t_rest_api,
+                                                                               principal_map=principal_map)
+            content_requests.append((dest_content, perms_tsr))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(dest_content.set_permissions_by_permissions_direct_xml, perms_tsr)
+                       for dest_content, perms_tsr in content_requests]
+            for future in futures:
+                future.result()
 
         self.end_log_block()
 
@@ -933,25 +1049,33 @@ class Project(PublishedContent):
 
     @property
     def workbook_defaults(self) -> Workbook:
+        if self._workbook_defaults is None:
+            self._workbook_defaults = Workbook(self.luid, self.t_rest_api, default=True, logger_obj=self.logger)
         return self._workbook_defaults
 
     @property
     def datasource_defaults(self) -> Datasource:
+        if self._datasource_defaults is None:
+            self._datasource_defaults = Datasource(self.luid, self.t_rest_api, default=True, logger_obj=self.logger)
         return self._datasource_defaults
 
-    def clear_all_permissions(self, clear_defaults: bool = True):
+    def get_default_permissions_objects(self) -> List[PublishedContent]:
+        return [self.workbook_defaults, self.datasource_defaults]
+
+    # The project and its defaults are all cleared at the same time. Returns the plans, the project's first
+    def clear_all_permissions(self, clear_defaults: bool = True, max_workers: int = 4) -> List[PermissionsPlan]:
         self.start_log_block()
-        self.get_permissions_from_server()
-        self.delete_permissions_by_permissions_obj_list(self.current_perms_obj_list)
+        content_objects = [self, ]
         if clear_defaults is True:
-            self.workbook_defaults.clear_all_permissions()
-            self.datasource_defaults.clear_all_permissions()
+            content_objects.extend([self.workbook_defaults, self.datasource_defaults])
+        plans = self.clear_permissions_concurrently(content_objects, max_workers=max_workers)
         self.end_log_block()
+        return plans
 
     def are_permissions_locked(self) -> bool:
         proj = self.xml_obj
         locked_permissions = proj.get('contentPermissions')
-        mapping = {'ManagedByOwner' : False, 'LockedToProject': True}
+        mapping = {'ManagedByOwner' : False, 'LockedToProject': True, 'LockedToProjectWithoutNested': True}
         return mapping[locked_permissions]
 
     def lock_permissions(self) -> 'Project':
@@ -1062,10 +1186,13 @@ class Project28(Project):
     def parent_project_luid(self) -> str:
         return self._parent_project_luid
 
-    def query_child_projects(self) -> ET.Element:
+    # Pass projects_xml (from query_projects()) to reuse one listing when walking down several levels
+    def query_child_projects(self, projects_xml: Optional[ET.Element] = None) -> ET.Element:
         self.start_log_block()
+        if projects_xml is not None:
+            projects = projects_xml
         # This allows type checking without importing the class
-        if (type(self.t_rest_api).__name__.find('TableauRestApiConnection') != -1):
+        elif (type(self.t_rest_api).__name__.find('TableauRestApiConnection') != -1):
             projects = self.t_rest_api.query_projects()
         else:
             projects = self.t_rest_api.projects.query_projects()
@@ -1102,6 +1229,149 @@ class Project28(Project):
             self.end_log_block()
             return self
 
+    # The content that a permissions template can cover besides the projects themselves:
+    # content_type : (listing endpoint, record class, content class)
+    propagation_content_definitions = {
+        'workbook': ('workbooks', WorkbookRecord, Workbook28),
+        'datasource': ('datasources', DatasourceRecord, Datasource28),
+        'flow': ('flows', FlowRecord, Flow33)
+    }
+
+    # This project, then every project below it, walked with query_child_projects() over a single project listing
+    def _get_projects_in_scope(self, scope: str) -> List['Project28']:
+        if scope == 'project':
+            return [self, ]
+        if scope != 'tree':
+            raise InvalidOptionException('scope must be "project" or "tree"')
+        projects_xml = self.t_rest_api.query_resource("projects")
+        projects = [self, ]
+        seen = set([self.luid, ])
+        i = 0
+        while i < len(projects):
+            parent = projects[i]
+            for project_xml in parent.query_child_projects(projects_xml=projects_xml):
+                if project_xml.get('id') in seen:
+                    continue
+                seen.add(project_xml.get('id'))
+                projects.append(self.__class__(project_xml.get('id'), self.t_rest_api, logger_obj=self.logger,
+                                               content_xml_obj=project_xml, parent_project_luid=parent.luid))
+            i += 1
+        return projects
+
+    # Applies a permissions template to every object in scope: 'project' is just this project, 'tree' is this project
+    # and all of the projects below it. template is { target : [ Permissions ] }, where the target is 'project',
+    # 'workbook', 'datasource', 'flow', or 'default_workbook', 'default_datasource', 'default_flow' for the projects'
+    # default permissions. Each object's current permissions are compared with its template by fingerprint, and only
+    # the differences are sent, with at most max_workers objects being read or updated at once. Grantees not in the
+    # template are left alone unless replace=True. Content in a locked project can't have its own permissions, so it
+    # is skipped (set the defaults instead)
+    def propagate_permissions(self, template: Dict[str, List['Permissions']], scope: str = 'tree',
+                              replace: bool = False, dry_run: bool = False, max_workers: int = 8,
+                              page_size: int = 1000) -> PropagationReport:
+        self.start_log_block()
+        start_time = time.time()
+        for target in template:
+            content_type = target.replace('default_', '')
+            if target != 'project' and content_type not in self.propagation_content_definitions:
+                raise InvalidOptionException('"{}" is not a permissions template target'.format(target))
+            # Flows, and so their defaults, only exist from API 3.3 (Project33)
+            if target != 'project' and not hasattr(self, '{}_defaults'.format(content_type)):
+                if target.startswith('default_'):
+                    raise InvalidOptionException('{} default permissions need a later API version'.format(
+                        content_type))
+                raise InvalidOptionException('{} permissions need a later API version'.format(content_type))
+            for perms_obj in template[target]:
+                if perms_obj.get_content_type() != content_type:
+                    raise InvalidOptionException('The {} template has a {} Permissions object'.format(
+                        target, perms_obj.get_content_type()))
+
+        report = PropagationReport(dry_run=dry_run)
+        projects = self._get_projects_in_scope(scope)
+
+        # Projects below a LockedToProject project take everything from it; LockedToProjectWithoutNested only locks
+        # that project's own content
+        locks_nested = set()
+        nested_locked = set()
+        content_locked = set()
+        for project in projects:
+            content_permissions = project.xml_obj.get('contentPermissions') if project.xml_obj is not None else None
+            if project.luid != self.luid and (project.parent_project_luid in locks_nested or
+                                              project.parent_project_luid in nested_locked):
+                nested_locked.add(project.luid)
+            if content_permissions == 'LockedToProject':
+                locks_nested.add(project.luid)
+            if content_permissions in ['LockedToProject', 'LockedToProjectWithoutNested'] or \
+                    project.luid in nested_locked:
+                content_locked.add(project.luid)
+
+        targets = []
+        for project in projects:
+            nested = project.luid in nested_locked
+            for target in template:
+                if target == 'project':
+                    if nested:
+                        report.skipped.append(('project', project.luid, False))
+                    else:
+                        targets.append((project, template[target]))
+                elif target.startswith('default_'):
+                    default_obj = getattr(project, '{}_defaults'.format(target.replace('default_', '')))
+                    if nested:
+                        report.skipped.append((default_obj.obj_type, project.luid, True))
+                    else:
+                        targets.append((default_obj, template[target]))
+
+        scope_luids = set([project.luid for project in projects])
+        for content_type in self.propagation_content_definitions:
+            if content_type not in template:
+                continue
+            endpoint, record_class, content_class = self.propagation_content_definitions[content_type]
+            for record in self.t_rest_api.query_resource_records(endpoint, record_class, page_size=page_size,
+                                                                 max_workers=2):
+                if record.project_luid not in scope_luids:
+                    continue
+                if record.project_luid in content_locked:
+                    report.skipped.append((content_type, record.luid, False))
+                    continue
+                targets.append((content_class(record.luid, self.t_rest_api, logger_obj=self.logger),
+                                template[content_type]))
+        self.log('Propagating permissions to {} objects in {} projects, {} skipped as locked'.format(
+            len(targets), len(projects), len(report.skipped)))
+
+        # Any error on one object is recorded against it, and the rest carry on, so the report always covers every
+        # object in scope
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [(content, executor.submit(content._sync_permissions_in_thread, permissions, replace, dry_run))
+                       for content, permissions in targets]
+            for content, future in futures:
+                try:
+                    plan = future.result()
+                except RecoverableHTTPException as e:
+                    report.failed.append((content.obj_type, content.luid, content.default, e.http_code,
+                                          'HTTP {}'.format(e.http_code)))
+                    self.log('Could not set permissions on {} {}, HTTP {}'.format(content.obj_type, content.luid,
+                                                                                  e.http_code))
+                    continue
+                except Exception as e:
+                    report.failed.append((content.obj_type, content.luid, content.default, None, repr(e)))
+                    self.log('Could not set permissions on {} {}: {}'.format(content.obj_type, content.luid,
+                                                                             repr(e)))
+                    continue
+                if plan.succeeded is False:
+                    http_code = [f[5] for f in plan.failed if f[5] is not None][0]
+                    report.failed.append((content.obj_type, content.luid, content.default, http_code,
+                                          'HTTP {}'.format(http_code)))
+                    self.log('Could not set all permissions on {} {}, HTTP {}'.format(content.obj_type, content.luid,
+                                                                                      http_code))
+                elif plan.is_empty():
+                    report.unchanged.append((content.obj_type, content.luid, content.default))
+                else:
+                    report.changed.append(plan)
+        report.elapsed_seconds = time.time() - start_time
+        for line in report.describe():
+            self.log(line)
+        self.end_log_block()
+        return report
+
     @staticmethod
     def convert_capabilities_xml_into_obj_list(xml_obj: ET.Element) -> List['ProjectPermissions']:
         # self.start_log_block()
@@ -1169,7 +1439,16 @@ class Project33(Project28):
                  parent_project_luid:str = None):
         Project28.__init__(self, luid=luid, tableau_rest_api_obj=tableau_rest_api_obj, logger_obj=logger_obj,
                            content_xml_obj=content_xml_obj, parent_project_luid=parent_project_luid)
-        self.flow_defaults = Flow33(self.luid, self.t_rest_api, default=True, logger_obj=logger_obj)
+        self._flow_defaults: Optional[Flow33] = None
+
+    @property
+    def flow_defaults(self) -> 'Flow33':
+        if self._flow_defaults is None:
+            self._flow_defaults = Flow33(self.luid, self.t_rest_api, default=True, logger_obj=self.logger)
+        return self._flow_defaults
+
+    def get_default_permissions_objects(self) -> List[PublishedContent]:
+        return [self.workbook_defaults, self.datasource_defaults, self.flow_defaults]
 
     def lock_permissions(self) -> 'Project33':
         self.start_log_block()
@@ -0,0 +1,192 @@
+from typing import Optional, NamedTuple
+import xml.etree.ElementTree as ET
+
+from ..tableau_rest_xml import TableauRestXml
+
+# Compact, read-only records for the main object types on a site. These flatten the nested project / owner / workbook
+# references down to LUIDs, so a large listing can be held in memory without keeping the whole XML tree around.
+# They are tuples underneath, which also makes them trivial to write out to JSON and read back
+
+
+# Helper for the attributes on the nested elements (<project id="..."/> inside a <workbook> etc.)
+def _child_attribute(element: ET.Element, child_tag: str, attribute: str) -> Optional[str]:
+    child = element.find('t:{}'.format(child_tag), TableauRestXml.ns_map)
+    if child is None:
+        return None
+    return child.get(attribute)
+
+
+class UserRecord(NamedTuple):
+    luid: str
+    name: str
+    full_name: Optional[str]
+    email: Optional[str]
+    site_role: Optional[str]
+    auth_setting: Optional[str]
+    last_login: Optional[str]
+    domain_name: Optional[str]
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'UserRecord':
+        return cls(element.get('id'), element.get('name'), element.get('fullName'), element.get('email'),
+                   element.get('siteRole'), element.get('authSetting'), element.get('lastLogin'),
+                   _child_attribute(element, 'domain', 'name'))
+
+
+class GroupRecord(NamedTuple):
+    luid: str
+    name: str
+    domain_name: Optional[str]
+    minimum_site_role: Optional[str]
+    user_count: Optional[int]
+    updated_at: Optional[str]
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'GroupRecord':
+        user_count = element.get('userCount')
+        return cls(element.get('id'), element.get('name'), _child_attribute(element, 'domain', 'name'),
+                   _child_attribute(element, 'import', 'siteRole'),
+                   int(user_count) if user_count is not None else None, element.get('updatedAt'))
+
+
+class ProjectRecord(NamedTuple):
+    luid: str
+    name: str
+    description: Optional[str]
+    parent_project_luid: Optional[str]
+    owner_luid: Optional[str]
+    content_permissions: Optional[str]
+    created_at: Optional[str]
+    updated_at: Optional[str]
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'ProjectRecord':
+        return cls(element.get('id'), element.get('name'), element.get('description'),
+                   element.get('parentProjectId'), _child_attribute(element, 'owner', 'id'),
+                   element.get('contentPermissions'), element.get('createdAt'), element.get('updatedAt'))
+
+
+class WorkbookRecord(NamedTuple):
+    luid: str
+    name: str
+    content_url: Optional[str]
+    project_luid: Optional[str]
+    owner_luid: Optional[str]
+    show_tabs: Optional[str]
+    size: Optional[str]
+    created_at: Optional[str]
+    updated_at: Optional[str]
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'WorkbookRecord':
+        return cls(element.get('id'), element.get('name'), element.get('contentUrl'),
+                   _child_attribute(element, 'project', 'id'), _child_attribute(element, 'owner', 'id'),
+                   element.get('showTabs'), element.get('size'), element.get('createdAt'), element.get('updatedAt'))
+
+
+class ViewRecord(NamedTuple):
+    luid: str
+    name: str
+    content_url: Optional[str]
+    workbook_luid: Optional[str]
+    project_luid: Optional[str]
+    owner_luid: Optional[str]
+    total_view_count: Optional[str]
+    created_at: Optional[str]
+    updated_at: Optional[str]
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'ViewRecord':
+        return cls(element.get('id'), element.get('name'), element.get('contentUrl'),
+                   _child_attribute(element, 'workbook', 'id'), _child_attribute(element, 'project', 'id'),
+                   _child_attribute(element, 'owner', 'id'), _child_attribute(element, 'usage', 'totalViewCount'),
+                   element.get('createdAt'), element.get('updatedAt'))
+
+
+class DatasourceRecord(NamedTuple):
+    luid: str
+    name: str
+    content_url: Optional[str]
+    datasource_type: Optional[str]
+    project_luid: Optional[str]
+    owner_luid: Optional[str]
+    is_certified: Optional[str]
+    created_at: Optional[str]
+    updated_at: Optional[str]
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'DatasourceRecord':
+        return cls(element.get('id'), element.get('name'), element.get('contentUrl'), element.get('type'),
+                   _child_attribute(element, 'project', 'id'), _child_attribute(element, 'owner', 'id'),
+                   element.get('isCertified'), element.get('createdAt'), element.get('updatedAt'))
+
+
+class FlowRecord(NamedTuple):
+    luid: str
+    name: str
+    project_luid: Optional[str]
+    owner_luid: Optional[str]
+    created_at: Optional[str]
+    updated_at: Optional[str]
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'FlowRecord':
+        return cls(element.get('id'), element.get('name'), _child_attribute(element, 'project', 'id'),
+                   _child_attribute(element, 'owner', 'id'), element.get('createdAt'), element.get('updatedAt'))
+
+
+# From the <backgroundJob> elements of the jobs listing
+class JobRecord(NamedTuple):
+    luid: str
+    job_type: Optional[str]
+    status: Optional[str]
+    progress: Optional[str]
+    priority: Optional[str]
+    title: Optional[str]
+    subtitle: Optional[str]
+    created_at: Optional[str]
+    started_at: Optional[str]
+    ended_at: Optional[str]
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'JobRecord':
+        return cls(element.get('id'), element.get('jobType'), element.get('status'), element.get('progress'),
+                   element.get('priority'), element.get('title'), element.get('subtitle'), element.get('createdAt'),
+                   element.get('startedAt'), element.get('endedAt'))
+
+
+class ScheduleRecord(NamedTuple):
+    luid: str
+    name: str
+    schedule_type: Optional[str]
+    state: Optional[str]
+    priority: Optional[str]
+    frequency: Optional[str]
+    execution_order: Optional[str]
+    next_run_at: Optional[str]
+    created_at: Optional[str]
+    updated_at: Optional[str]
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'ScheduleRecord':
+        return cls(element.get('id'), element.get('name'), element.get('type'), element.get('state'),
+                   element.get('priority'), element.get('frequency'), element.get('executionOrder'),
+                   element.get('nextRunAt'), element.get('createdAt'), element.get('updatedAt'))
+
+
+# From the <extractRefresh> elements of the extract refresh tasks listing. Only one of workbook_luid / datasource_luid
+# is set
+class ExtractRefreshTaskRecord(NamedTuple):
+    luid: str
+    priority: Optional[str]
+    refresh_type: Optional[str]
+    consecutive_failed_count: Optional[str]
+    schedule_luid: Optional[str]
+    workbook_luid: Optional[str]
+    datasource_luid: Optional[str]
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'ExtractRefreshTaskRecord':
+        return cls(element.get('id'), element.get('priority'), element.get('type'),
+                   element.get('consecutiveFailedCount'), _child_attribute(element, 'schedule', 'id'),
+                   _child_attribute(element, 'workbook', 'id'), _child_attribute(element, 'datasource', 'id'))
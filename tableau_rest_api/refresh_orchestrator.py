@@ -0,0 +1,279 @@
+from typing import Union, Any, Optional, List, Dict, Tuple, Iterable
+import heapq
+import time
+import xml.etree.ElementTree as ET
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from tableau_tools.tableau_rest_xml import TableauRestXml
+from .records import *
+from .url_filter import UrlFilter
+from .job_tracker import JobTracker, TrackedJob
+
+
+# One extract to refresh. content_type is 'workbook' or 'datasource'. When it came from a schedule, task_luid is the
+# extract refresh task that gets run, otherwise the content is refreshed directly
+#   status : 'Queued', 'Running', 'Success', 'Failed' or 'Cancelled'
+#   jobs   : every attempt, in order
+#   launch_errors : HTTP codes from attempts that couldn't even be started
+class RefreshTarget:
+    def __init__(self, content_type: str, content_luid: str, priority: int = 50, label: Optional[str] = None,
+                 task_luid: Optional[str] = None):
+        self.content_type = content_type
+        self.content_luid = content_luid
+        self.priority = priority
+        self.label = label if label is not None else '{} {}'.format(content_type, content_luid)
+        self.task_luid = task_luid
+        self.status = 'Queued'
+        self.jobs: List[TrackedJob] = []
+        self.launch_errors: List[int] = []
+        self._launched_at: Optional[float] = None
+        # Seconds from launching to finishing, as seen from here, for when the job has no start and end times
+        self.wall_seconds: Optional[float] = None
+
+    @property
+    def attempts(self) -> int:
+        return len(self.jobs) + len(self.launch_errors)
+
+    # How long the successful (or last) run took on the backgrounder
+    @property
+    def duration_seconds(self) -> Optional[float]:
+        if len(self.jobs) == 0:
+            return None
+        duration = self.jobs[-1].duration_seconds
+        return duration if duration is not None else self.wall_seconds
+
+    def __repr__(self):
+        return 'RefreshTarget({}, {}, attempts={})'.format(self.label, self.status, self.attempts)
+
+
+# What an ExtractRefreshOrchestrator run did, with duration statistics for the successful refreshes
+class RefreshReport:
+    def __init__(self, targets: List[RefreshTarget], elapsed_seconds: float, request_count: int,
+                 peak_running: int):
+        self.targets = targets
+        self.elapsed_seconds = elapsed_seconds
+        self.request_count = request_count
+        self.peak_running = peak_running
+
+    def get_targets(self, status: str) -> List[RefreshTarget]:
+        return [target for target in self.targets if target.status == status]
+
+    @property
+    def succeeded(self) -> List[RefreshTarget]:
+        return self.get_targets('Success')
+
+    @property
+    def failed(self) -> List[RefreshTarget]:
+        return [target for target in self.targets if target.status in ('Failed', 'Cancelled')]
+
+    # { 'count', 'total', 'mean', 'median', 'p90', 'max' } in seconds, over the successful refreshes
+    def get_duration_stats(self) -> Dict[str, float]:
+        durations = sorted([target.duration_seconds for target in self.succeeded
+                            if target.duration_seconds is not None])
+        if len(durations) == 0:
+            return {'count': 0}
+        return {'count': len(durations), 'total': sum(durations), 'mean': sum(durations) / len(durations),
+                'median': durations[len(durations) // 2], 'p90': durations[int(len(durations) * 0.9)],
+                'max': durations[-1]}
+
+    def describe(self) -> List[str]:
+        stats = self.get_duration_stats()
+        lines = ['{} refreshes: {} succeeded, {} failed, {} not finished in {:.0f}s ({} requests, at most {} '
+                 'running at once)'.format(len(self.targets), len(self.succeeded), len(self.failed),
+                                           len(self.targets) - len(self.succeeded) - len(self.failed),
+                                           self.elapsed_seconds, self.request_count, self.peak_running)]
+        if stats['count'] > 0:
+            lines.append('Durations: mean {:.1f}s, median {:.1f}s, p90 {:.1f}s, max {:.1f}s'.format(
+                stats['mean'], stats['median'], stats['p90'], stats['max']))
+        for target in sorted(self.targets, key=lambda t: (t.priority, t.label)):
+            duration = target.duration_seconds
+            lines.append('{} {}: {} attempts{}'.format(
+                target.status.upper(), target.label, target.attempts,
+                ', {:.1f}s'.format(duration) if duration is not None else ''))
+        return lines
+
+    def __str__(self):
+        return "\n".join(self.describe())
+
+
+# Runs extract refreshes for workbooks, datasources and whole schedules without starting them all at once.
+# Targets wait in a queue ordered by priority (lower numbers first, the same as Schedule priorities) and only
+# max_concurrent of them are running at any time. With max_server_jobs set (API 3.1+), nothing new is started while
+# the site already has that many background jobs in progress, whoever started them. Jobs are watched with one
+# JobTracker, so a round of polling is usually one request, and a failed refresh is put back in the queue up to
+# max_retries times
+class ExtractRefreshOrchestrator(LoggingMethods):
+    def __init__(self, t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'],
+                 max_concurrent: int = 4, max_retries: int = 1, max_server_jobs: Optional[int] = None,
+                 logger_obj: Optional[Logger] = None, min_interval: float = 5.0, max_interval: float = 60.0):
+        self.t_rest_api = t_rest_api
+        self.logger = logger_obj
+        if max_concurrent < 1:
+            raise InvalidOptionException('max_concurrent must be at least 1')
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        if max_server_jobs is not None and tuple([int(p) for p in t_rest_api.api_version.split('.')]) < (3, 1):
+            raise InvalidOptionException('max_server_jobs needs the jobs listing from API 3.1')
+        self.max_server_jobs = max_server_jobs
+        self.tracker = JobTracker(t_rest_api, logger_obj=logger_obj, min_interval=min_interval,
+                                  max_interval=max_interval)
+        # (content type, content luid) : RefreshTarget
+        self.targets: Dict[Tuple[str, str], RefreshTarget] = {}
+        # (schedule luid, priority)
+        self._schedules: List[Tuple[str, int]] = []
+        self._request_count = 0
+
+    #
+    # Adding targets
+    #
+
+    def _add_target(self, target: RefreshTarget) -> RefreshTarget:
+        key = (target.content_type, target.content_luid)
+        # The same extract reached twice (directly and through a schedule) is only refreshed once, at the better priority
+        if key in self.targets:
+            existing = self.targets[key]
+            existing.priority = min(existing.priority, target.priority)
+            return existing
+        self.targets[key] = target
+        return target
+
+    def add_workbook(self, wb_name_or_luid: str, proj_name_or_luid: Optional[str] = None, priority: int = 50,
+                     label: Optional[str] = None) -> RefreshTarget:
+        wb_luid = self.t_rest_api.query_workbook_luid(wb_name_or_luid, proj_name_or_luid)
+        if label is None and not TableauRestXml.is_luid(wb_name_or_luid):
+            label = wb_name_or_luid
+        return self._add_target(RefreshTarget('workbook', wb_luid, priority, label))
+
+    def add_datasource(self, ds_name_or_luid: str, proj_name_or_luid: Optional[str] = None, priority: int = 50,
+                       label: Optional[str] = None) -> RefreshTarget:
+        ds_luid = self.t_rest_api.query_datasource_luid(ds_name_or_luid, proj_name_or_luid)
+        if label is None and not TableauRestXml.is_luid(ds_name_or_luid):
+            label = ds_name_or_luid
+        return self._add_target(RefreshTarget('datasource', ds_luid, priority, label))
+
+    # Every extract refresh task on the schedule becomes a target when run() starts
+    def add_schedule(self, schedule_name_or_luid: str, priority: int = 50):
+        schedule_luid = self.t_rest_api.query_schedule_luid(schedule_name_or_luid)
+        self._schedules.append((schedule_luid, priority))
+
+    def _expand_schedules(self):
+        if len(self._schedules) == 0:
+            return
+        catalog = self.t_rest_api.get_extract_refresh_task_catalog()
+        for schedule_luid, priority in self._schedules:
+            tasks = catalog.get_tasks_for_schedule(schedule_luid)
+            for task in tasks:
+                if task.workbook_luid is not None:
+                    self._add_target(RefreshTarget('workbook', task.workbook_luid, priority, task_luid=task.luid))
+                elif task.datasource_luid is not None:
+                    self._add_target(RefreshTarget('datasource', task.datasource_luid, priority,
+                                                   task_luid=task.luid))
+            self.log('{} extract refresh tasks on schedule {}'.format(len(tasks), schedule_luid))
+        self._schedules = []
+
+    #
+    # Running
+    #
+
+    def _launch(self, target: RefreshTarget) -> TrackedJob:
+        if target.task_luid is not None:
+            url = self.t_rest_api.build_api_url('tasks/extractRefreshes/{}/runNow'.format(target.task_luid))
+        else:
+            url = self.t_rest_api.build_api_url('{}s/{}/refresh'.format(target.content_type, target.content_luid))
+        response = self.t_rest_api.send_add_request_in_thread(url, ET.Element('tsRequest'))
+        self._request_count += 1
+        return self.tracker.register(response, label=target.label)
+
+    # Background jobs in progress on the site, from anyone
+    def _count_server_jobs(self) -> int:
+        records = self.t_rest_api.query_resource_records('jobs', JobRecord,
+                                                         filters=[UrlFilter('progress', 'lt', ['100'])])
+        self._request_count += 1
+        return len([record for record in records if record.status in (None, 'Pending', 'InProgress')])
+
+    def _get_free_slots(self, running: int) -> int:
+        slots = self.max_concurrent - running
+        if slots > 0 and self.max_server_jobs is not None:
+            slots = min(slots, self.max_server_jobs - self._count_server_jobs())
+        return slots
+
+    # Runs everything added so far, returning when all of it has finished or timeout (in seconds) runs out
+    def run(self, timeout: Optional[float] = None) -> RefreshReport:
+        self.start_log_block()
+        start_time = time.monotonic()
+        deadline = start_time + timeout if timeout is not None else None
+        self._expand_schedules()
+        start_requests = self.tracker.request_count
+
+        queue = []
+        sequence = 0
+        for target in self.targets.values():
+            if target.status == 'Queued':
+                heapq.heappush(queue, (target.priority, sequence, target))
+                sequence += 1
+        self.log('Refreshing {} extracts, {} at a time'.format(len(queue), self.max_concurrent))
+
+        # job luid : RefreshTarget
+        running: Dict[str, RefreshTarget] = {}
+        # Targets that couldn't be started, which go back in the queue after the next wait rather than straight away,
+        # so the launch isn't tried again in a tight loop (and with nothing running, the waits back off)
+        retry_later: List[RefreshTarget] = []
+        peak_running = 0
+        while len(queue) > 0 or len(running) > 0 or len(retry_later) > 0:
+            if len(queue) > 0:
+                slots = self._get_free_slots(len(running))
+                while slots > 0 and len(queue) > 0:
+                    priority, seq, target = heapq.heappop(queue)
+                    try:
+                        job = self._launch(target)
+                    except RecoverableHTTPException as e:
+                        # e.g. 409 when a refresh of the same extract is already queued by someone else
+                        self.log('Could not start {}, HTTP {}'.format(target.label, e.http_code))
+                        target.launch_errors.append(e.http_code)
+                        if target.attempts <= self.max_retries:
+                            retry_later.append(target)
+                        else:
+                            target.status = 'Failed'
+                        continue
+                    target.status = 'Running'
+                    target.jobs.append(job)
+                    target._launched_at = time.monotonic()
+                    running[job.luid] = target
+                    slots -= 1
+                peak_running = max(peak_running, len(running))
+
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if len(running) == 0:
+                # Waiting for the backgrounders to free up (or to retry a launch)
+                time.sleep(self.tracker.interval if remaining is None else min(self.tracker.interval, remaining))
+                self.tracker.interval = min(self.tracker.interval * self.tracker.backoff_factor,
+                                            self.tracker.max_interval)
+            else:
+                for job in self.tracker.wait_any(list(running.keys()), timeout=remaining):
+                    target = running.pop(job.luid)
+                    target.wall_seconds = time.monotonic() - target._launched_at
+                    if job.status == 'Failed' and target.attempts <= self.max_retries:
+                        self.log('{} failed, retrying'.format(target.label))
+                        target.status = 'Queued'
+                        heapq.heappush(queue, (target.priority, sequence, target))
+                        sequence += 1
+                    else:
+                        target.status = job.status
+                        self.log('{} finished: {}'.format(target.label, job.status))
+
+            for target in retry_later:
+                heapq.heappush(queue, (target.priority, sequence, target))
+                sequence += 1
+            retry_later = []
+
+        report = RefreshReport(list(self.targets.values()), time.monotonic() - start_time,
+                               self._request_count + self.tracker.request_count - start_requests, peak_running)
+        self._request_count = 0
+        for line in report.describe():
+            self.log(line)
+        self.end_log_block()
+        return report
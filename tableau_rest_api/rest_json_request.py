@@ -151,9 +151,11 @@ class RestJsonRequest(LoggingMethods):
         if self.json_request is not None:
             # Double check just in case someone sends through JSON as a string
             if (isinstance(self.json_request, str)):
-                encoded_request = json.loads(self.json_request)
+                json_object = json.loads(self.json_request)
             else:
-                encoded_request = self.json_request
+                json_object = self.json_request
+            # Serialized here; requests would form-encode a dict passed as data
+            encoded_request = json.dumps(json_object).encode('utf-8')
             self.log("Request JSON: {}".format(self.json_request))
         if self.__publish_content is not None:
             encoded_request = self.__publish_content
@@ -7,7 +7,7 @@ import math
 import copy
 import requests
 import sys
-from typing import Union, Any, Optional, List, Dict, Tuple
+from typing import Union, Any, Optional, List, Dict, Tuple, Iterator
 
 from ..logging_methods import LoggingMethods
 from ..tableau_exceptions import *
@@ -253,6 +253,34 @@ class RestXmlRequest(LoggingMethods):
         if self.__response_type == 'xml':
             self.log_xml_response(format(unicode_raw_response))
 
+    # Requests just the one page and returns the whole tsResponse, so the caller can read the pagination element
+    # and decide how to get the rest (used for the concurrent page fetching)
+    def request_single_page(self, page_number: int = 1) -> ET.Element:
+        self.__make_request(page_number)
+        utf8_parser = ET.XMLParser(encoding='UTF-8')
+        xml = ET.parse(BytesIO(self.__raw_response), parser=utf8_parser)
+        self.__xml_object = xml.getroot()
+        return self.__xml_object
+
+    # GETs url and yields the body in chunks as it arrives, for downloads too large to hold in memory. The connection
+    # is released when the generator is exhausted or closed. Errors are raised on the first read, as in __make_request
+    def request_stream(self, url: str, chunk_size: int = 65536) -> Iterator[bytes]:
+        self.http_verb = 'get'
+        self.__last_url_request = url
+        self.log_uri(verb='GET', uri=url)
+        response = self.session.get(url, verify=self.__verify_ssl_cert, stream=True)
+        try:
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                self._handle_http_error(e.response, e)
+            self.__last_response_content_type = response.headers.get('Content-Type')
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            response.close()
+
     # This has always brought back ALL listings from long paginated lists
     # But really should support three behaviors:
     # Single Page, All, and a "turbo search" mechanism for large lists of workbooks or data sources
@@ -0,0 +1,433 @@
+from typing import Union, Any, Optional, List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import gzip
+import json
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from .records import *
+from .url_filter import UrlFilter
+
+
+# An in-memory picture of a Site: users, groups (and who is in them), projects, workbooks, views and data sources.
+# It is built with a handful of concurrent paginated listings rather than the hundreds of lookup calls that scripts
+# usually end up making, and then answers the lookup and traversal questions locally. save() / load() let a later
+# run start from the file rather than the server
+class SiteSnapshot(LoggingMethods):
+    # content_type : (record class, endpoint, fields, additional_url_ending)
+    content_type_definitions = {
+        'user': (UserRecord, 'users', ['_all_'], None),
+        # userCount only comes back with _all_, and is what refresh() uses to spot membership changes
+        'group': (GroupRecord, 'groups', ['_all_'], None),
+        'project': (ProjectRecord, 'projects', None, None),
+        'workbook': (WorkbookRecord, 'workbooks', None, None),
+        'view': (ViewRecord, 'views', None, 'includeUsageStatistics=true'),
+        'datasource': (DatasourceRecord, 'datasources', None, None)
+    }
+
+    # The secondary indexes on each content type, index name : record attribute
+    index_definitions = {
+        'user': {'name': 'name'},
+        'group': {'name': 'name'},
+        'project': {'name': 'name', 'parent_project': 'parent_project_luid', 'owner': 'owner_luid'},
+        'workbook': {'name': 'name', 'project': 'project_luid', 'owner': 'owner_luid'},
+        'view': {'name': 'name', 'workbook': 'workbook_luid', 'project': 'project_luid', 'owner': 'owner_luid'},
+        'datasource': {'name': 'name', 'project': 'project_luid', 'owner': 'owner_luid'}
+    }
+
+    # Content types that the REST API can filter on updatedAt, so refresh() only has to request what has changed
+    # (new content has updatedAt equal to createdAt, so this picks up creations as well). Users and groups have no
+    # such filter and are listed again in full. So are views: their usage counts change without touching updatedAt
+    incremental_content_types = ('project', 'workbook', 'datasource')
+
+    # Bump if the record layouts change, so that old files are rejected on load rather than misread
+    file_format_version = 3
+
+    def __init__(self, t_rest_api=None, logger_obj: Optional[Logger] = None):
+        self.t_rest_api = t_rest_api
+        self.logger = logger_obj
+        self.site_luid: Optional[str] = None
+        self.site_content_url: Optional[str] = None
+        self.snapshot_time: Optional[str] = None
+        # content_type : latest updatedAt seen, the starting point for the next refresh()
+        self.high_water_marks: Dict[str, str] = {}
+        # The content types that were requested when the snapshot was built
+        self.content_types: List[str] = []
+        self._records: Dict[str, Dict[str, Tuple]] = {}
+        self._indexes: Dict[str, Dict[str, Dict[str, List[str]]]] = {}
+        # group luid : [ user luids ]
+        self.group_members: Dict[str, List[str]] = {}
+        # user luid : [ group luids ]
+        self.user_groups: Dict[str, List[str]] = {}
+        for content_type in self.content_type_definitions:
+            self._records[content_type] = {}
+            self._build_indexes(content_type)
+
+    #
+    # Building from the server
+    #
+
+    def _fetch_listing(self, content_type: str, page_size: int, page_workers: int,
+                       filters: Optional[List[UrlFilter]] = None) -> List[Tuple]:
+        record_class, endpoint, fields, additional_url_ending = self.content_type_definitions[content_type]
+        records = self.t_rest_api.query_resource_records(endpoint, record_class, filters=filters, fields=fields,
+                                                         additional_url_ending=additional_url_ending,
+                                                         page_size=page_size, max_workers=page_workers)
+        self.log('Snapshot retrieved {} {}s'.format(len(records), content_type))
+        return records
+
+    # Just the LUIDs of everything that currently exists, which is all that is needed to spot deletions
+    def _fetch_luids(self, content_type: str, page_size: int, page_workers: int) -> List[str]:
+        endpoint = self.content_type_definitions[content_type][1]
+        luids = []
+        for page in self.t_rest_api.query_resource_pages(endpoint, fields=['id'], page_size=page_size,
+                                                         max_workers=page_workers):
+            for element in page:
+                luids.append(element.get('id'))
+        return luids
+
+    def _fetch_group_member_luids(self, group_luid: str, page_size: int) -> List[str]:
+        member_luids = []
+        for page in self.t_rest_api.query_resource_pages("groups/{}/users".format(group_luid), fields=['id'],
+                                                         page_size=page_size, max_workers=1):
+            for element in page:
+                member_luids.append(element.get('id'))
+        return member_luids
+
+    # Lists every content type at once (max_workers listings in flight), and within each listing fetches pages
+    # concurrently (page_workers). Group membership requires one listing per group, which also run concurrently
+    def build(self, content_types: Optional[List[str]] = None, include_group_memberships: bool = True,
+              max_workers: int = 6, page_workers: int = 2, page_size: int = 1000):
+        self.start_log_block()
+        if self.t_rest_api is None:
+            raise InvalidOptionException('SiteSnapshot needs a signed in REST API object to build from the server')
+        if content_types is None:
+            content_types = list(self.content_type_definitions.keys())
+        for content_type in content_types:
+            if content_type not in self.content_type_definitions:
+                raise InvalidOptionException("'{}' is not a content type held in a SiteSnapshot".format(content_type))
+
+        self.site_luid = self.t_rest_api.site_luid
+        self.site_content_url = self.t_rest_api.site_content_url
+        self.content_types = content_types
+        self.high_water_marks = {}
+        self.snapshot_time = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            listings = {}
+            for content_type in content_types:
+                listings[content_type] = executor.submit(self._fetch_listing, content_type, page_size, page_workers)
+            for content_type in listings:
+                self._load_records(content_type, listings[content_type].result())
+                self._update_high_water_mark(content_type, self._records[content_type].values())
+
+            if include_group_memberships is True and 'group' in content_types:
+                self._refresh_group_members(executor, page_size)
+        self.end_log_block()
+
+    # With previous_groups (the group records from before a refresh), membership is only listed again for groups
+    # that are new or whose updatedAt or user count changed; the rest keep the members already held
+    def _refresh_group_members(self, executor: ThreadPoolExecutor, page_size: int,
+                               previous_groups: Optional[Dict[str, GroupRecord]] = None):
+        memberships = {}
+        group_members = {}
+        for group_luid, group in self._records['group'].items():
+            if previous_groups is not None and group_luid in self.group_members and \
+                    self._group_membership_unchanged(previous_groups.get(group_luid), group):
+                group_members[group_luid] = self.group_members[group_luid]
+            else:
+                memberships[group_luid] = executor.submit(self._fetch_group_member_luids, group_luid, page_size)
+        for group_luid in memberships:
+            group_members[group_luid] = memberships[group_luid].result()
+        self.log('Listed the members of {} of {} groups'.format(len(memberships), len(group_members)))
+        self._load_group_members(group_members)
+
+    # A group with neither an updatedAt nor a count has nothing to compare, so it is always listed again
+    @staticmethod
+    def _group_membership_unchanged(previous: Optional[GroupRecord], current: GroupRecord) -> bool:
+        if previous is None or (current.user_count is None and current.updated_at is None):
+            return False
+        return previous.user_count == current.user_count and previous.updated_at == current.updated_at
+
+    # The timestamps all come back in the same ISO 8601 format from the server, so they compare correctly as
+    # strings. Using the server's own timestamps avoids any problem with the local clock being off. A content type
+    # with nothing in it yet gets no mark, and is just listed in full (which is cheap) on the next refresh
+    def _update_high_water_mark(self, content_type: str, records):
+        if content_type not in self.incremental_content_types:
+            return
+        for record in records:
+            if record.updated_at is None:
+                continue
+            if content_type not in self.high_water_marks or record.updated_at > self.high_water_marks[content_type]:
+                self.high_water_marks[content_type] = record.updated_at
+
+    # Brings the snapshot up to date without listing everything again. For the incremental content types, only
+    # content updated (or created) since the high-water mark is requested, plus an id-only listing to find what was
+    # deleted. Users, groups and views are re-listed, but only new or changed groups have their members listed again.
+    # Returns { content_type : {'added': n, 'updated': n, 'removed': n} }
+    def refresh(self, content_types: Optional[List[str]] = None, include_group_memberships: bool = True,
+                max_workers: int = 6, page_workers: int = 2, page_size: int = 1000) -> Dict[str, Dict[str, int]]:
+        self.start_log_block()
+        if self.t_rest_api is None:
+            raise InvalidOptionException('SiteSnapshot needs a signed in REST API object to refresh from the server')
+        if self.site_luid is not None and self.t_rest_api.site_luid != self.site_luid:
+            raise InvalidOptionException('The REST API object is signed in to a different site than the snapshot')
+        if content_types is None:
+            content_types = self.content_types
+        self.snapshot_time = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        changes = {}
+        previous_groups = dict(self._records['group'])
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            changed_listings = {}
+            luid_listings = {}
+            for content_type in content_types:
+                if content_type in self.incremental_content_types and content_type in self.high_water_marks:
+                    updated_filter = UrlFilter.get_updated_at_filter('gte', self.high_water_marks[content_type])
+                    changed_listings[content_type] = executor.submit(self._fetch_listing, content_type, page_size,
+                                                                     page_workers, [updated_filter])
+                    luid_listings[content_type] = executor.submit(self._fetch_luids, content_type, page_size,
+                                                                  page_workers)
+                else:
+                    changed_listings[content_type] = executor.submit(self._fetch_listing, content_type, page_size,
+                                                                     page_workers)
+
+            for content_type in content_types:
+                changed_records = changed_listings[content_type].result()
+                if content_type in luid_listings:
+                    current_luids = set(luid_listings[content_type].result())
+                else:
+                    # A full listing is its own reconciliation
+                    current_luids = set([r.luid for r in changed_records])
+                changes[content_type] = self._apply_changes(content_type, changed_records, current_luids)
+                self._update_high_water_mark(content_type, changed_records)
+                self.log('Refreshed {}s: {}'.format(content_type, changes[content_type]))
+
+            if include_group_memberships is True and 'group' in content_types:
+                self._refresh_group_members(executor, page_size, previous_groups)
+        self.end_log_block()
+        return changes
+
+    def _apply_changes(self, content_type: str, changed_records: List[Tuple],
+                       current_luids: set) -> Dict[str, int]:
+        records = self._records[content_type]
+        added = 0
+        updated = 0
+        for record in changed_records:
+            if record.luid not in records:
+                added += 1
+            elif records[record.luid] != record:
+                updated += 1
+            records[record.luid] = record
+        removed_luids = [luid for luid in records if luid not in current_luids]
+        for luid in removed_luids:
+            del records[luid]
+        self._build_indexes(content_type)
+        return {'added': added, 'updated': updated, 'removed': len(removed_luids)}
+
+    def _load_records(self, content_type: str, records: List[Tuple]):
+        self._records[content_type] = {}
+        for record in records:
+            self._records[content_type][record.luid] = record
+        self._build_indexes(content_type)
+
+    def _build_indexes(self, content_type: str):
+        self._indexes[content_type] = {}
+        for index_name, attribute in self.index_definitions[content_type].items():
+            index = {}
+            for record in self._records[content_type].values():
+                key = getattr(record, attribute)
+                if key is None:
+                    continue
+                if key in index:
+                    index[key].append(record.luid)
+                else:
+                    index[key] = [record.luid]
+            self._indexes[content_type][index_name] = index
+
+    def _load_group_members(self, group_members: Dict[str, List[str]]):
+        self.group_members = group_members
+        self.user_groups = {}
+        for group_luid in group_members:
+            for user_luid in group_members[group_luid]:
+                if user_luid in self.user_groups:
+                    self.user_groups[user_luid].append(group_luid)
+                else:
+                    self.user_groups[user_luid] = [group_luid]
+
+    #
+    # Generic access
+    #
+
+    def get(self, content_type: str, luid: str) -> Tuple:
+        try:
+            return self._records[content_type][luid]
+        except KeyError:
+            raise NoMatchFoundException('No {} found in snapshot with luid {}'.format(content_type, luid))
+
+    def get_all(self, content_type: str) -> List[Tuple]:
+        return list(self._records[content_type].values())
+
+    def find(self, content_type: str, index_name: str, key: str) -> List[Tuple]:
+        if index_name not in self.index_definitions[content_type]:
+            raise InvalidOptionException("'{}' is not an index on {} records".format(index_name, content_type))
+        luids = self._indexes[content_type][index_name].get(key, [])
+        return [self._records[content_type][luid] for luid in luids]
+
+    def contains(self, content_type: str, luid: str) -> bool:
+        return luid in self._records[content_type]
+
+    # Names are only unique within a project (or a parent project), so these narrow down the same way the
+    # lookup methods on the REST API object do, and raise the same exceptions
+    def _narrow_to_single_luid(self, content_type: str, name: str, container_index: Optional[str] = None,
+                               container_luid: Optional[str] = None) -> str:
+        if self.contains(content_type, name):
+            return name
+        matches = self.find(content_type, 'name', name)
+        if container_luid is not None:
+            attribute = self.index_definitions[content_type][container_index]
+            matches = [m for m in matches if getattr(m, attribute) == container_luid]
+        if len(matches) == 0:
+            raise NoMatchFoundException('No {} found in snapshot with name {}'.format(content_type, name))
+        elif len(matches) > 1:
+            raise MultipleMatchesFoundException(
+                'More than one {} found in snapshot by name {}'.format(content_type, name))
+        return matches[0].luid
+
+    def query_user_luid(self, username: str) -> str:
+        return self._narrow_to_single_luid('user', username)
+
+    def query_group_luid(self, group_name: str) -> str:
+        return self._narrow_to_single_luid('group', group_name)
+
+    def query_project_luid(self, project_name: str, parent_project_name_or_luid: Optional[str] = None) -> str:
+        parent_luid = None
+        if parent_project_name_or_luid is not None:
+            parent_luid = self.query_project_luid(parent_project_name_or_luid)
+        return self._narrow_to_single_luid('project', project_name, 'parent_project', parent_luid)
+
+    def query_workbook_luid(self, wb_name: str, project_name_or_luid: Optional[str] = None) -> str:
+        project_luid = None
+        if project_name_or_luid is not None:
+            project_luid = self.query_project_luid(project_name_or_luid)
+        return self._narrow_to_single_luid('workbook', wb_name, 'project', project_luid)
+
+    def query_datasource_luid(self, datasource_name: str, project_name_or_luid: Optional[str] = None) -> str:
+        project_luid = None
+        if project_name_or_luid is not None:
+            project_luid = self.query_project_luid(project_name_or_luid)
+        return self._narrow_to_single_luid('datasource', datasource_name, 'project', project_luid)
+
+    #
+    # Traversals
+    #
+
+    def get_child_projects(self, project_name_or_luid: str, recursive: bool = False) -> List[ProjectRecord]:
+        project_luid = self.query_project_luid(project_name_or_luid)
+        children = self.find('project', 'parent_project', project_luid)
+        if recursive is True:
+            descendants = []
+            for child in children:
+                descendants.append(child)
+                descendants.extend(self.get_child_projects(child.luid, recursive=True))
+            return descendants
+        return children
+
+    # Top-level project first, ending with the project itself
+    def get_project_path(self, project_name_or_luid: str) -> List[ProjectRecord]:
+        project = self.get('project', self.query_project_luid(project_name_or_luid))
+        path = [project]
+        seen = {project.luid}
+        while project.parent_project_luid is not None and project.parent_project_luid not in seen:
+            project = self.get('project', project.parent_project_luid)
+            seen.add(project.luid)
+            path.insert(0, project)
+        return path
+
+    def get_content_in_project(self, project_name_or_luid: str, content_type: str,
+                               include_child_projects: bool = False) -> List[Tuple]:
+        if 'project' not in self.index_definitions[content_type]:
+            raise InvalidOptionException('{} records are not organized by project'.format(content_type))
+        project_luids = [self.query_project_luid(project_name_or_luid)]
+        if include_child_projects is True:
+            project_luids.extend([p.luid for p in self.get_child_projects(project_luids[0], recursive=True)])
+        content = []
+        for project_luid in project_luids:
+            content.extend(self.find(content_type, 'project', project_luid))
+        return content
+
+    # Returns { content_type : [ records ] } for everything owned by the user
+    def get_content_owned_by(self, username_or_luid: str,
+                             content_types: Optional[List[str]] = None) -> Dict[str, List[Tuple]]:
+        user_luid = self.query_user_luid(username_or_luid)
+        if content_types is None:
+            content_types = [c for c in self.index_definitions if 'owner' in self.index_definitions[c]]
+        owned = {}
+        for content_type in content_types:
+            owned[content_type] = self.find(content_type, 'owner', user_luid)
+        return owned
+
+    def get_workbook_views(self, wb_name_or_luid: str, project_name_or_luid: Optional[str] = None) -> List[ViewRecord]:
+        return self.find('view', 'workbook', self.query_workbook_luid(wb_name_or_luid, project_name_or_luid))
+
+    def get_users_in_group(self, group_name_or_luid: str) -> List[UserRecord]:
+        group_luid = self.query_group_luid(group_name_or_luid)
+        return [self._records['user'][luid] for luid in self.group_members.get(group_luid, [])
+                if luid in self._records['user']]
+
+    def get_groups_for_user(self, username_or_luid: str) -> List[GroupRecord]:
+        user_luid = self.query_user_luid(username_or_luid)
+        return [self._records['group'][luid] for luid in self.user_groups.get(user_luid, [])
+                if luid in self._records['group']]
+
+    #
+    # Persisting to disk
+    #
+
+    # Records are written as plain lists in field order; a filename ending in .gz is gzipped
+    def save(self, filename: str):
+        self.start_log_block()
+        snapshot = {
+            'file_format_version': self.file_format_version,
+            'site_luid': self.site_luid,
+            'site_content_url': self.site_content_url,
+            'snapshot_time': self.snapshot_time,
+            'content_types': self.content_types,
+            'high_water_marks': self.high_water_marks,
+            'records': {},
+            'group_members': self.group_members
+        }
+        for content_type in self._records:
+            snapshot['records'][content_type] = [list(r) for r in self._records[content_type].values()]
+        if filename.endswith('.gz'):
+            with gzip.open(filename, 'wt', encoding='utf-8') as fh:
+                json.dump(snapshot, fh, separators=(',', ':'))
+        else:
+            with open(filename, 'w', encoding='utf-8') as fh:
+                json.dump(snapshot, fh, separators=(',', ':'))
+        self.log('Saved snapshot of site {} to {}'.format(self.site_content_url, filename))
+        self.end_log_block()
+
+    @classmethod
+    def load(cls, filename: str, t_rest_api=None, logger_obj: Optional[Logger] = None) -> 'SiteSnapshot':
+        if filename.endswith('.gz'):
+            with gzip.open(filename, 'rt', encoding='utf-8') as fh:
+                snapshot = json.load(fh)
+        else:
+            with open(filename, 'r', encoding='utf-8') as fh:
+                snapshot = json.load(fh)
+        if snapshot.get('file_format_version') != cls.file_format_version:
+            raise InvalidOptionException('{} was written by a different version of SiteSnapshot'.format(filename))
+        site_snapshot = cls(t_rest_api=t_rest_api, logger_obj=logger_obj)
+        site_snapshot.site_luid = snapshot['site_luid']
+        site_snapshot.site_content_url = snapshot['site_content_url']
+        site_snapshot.snapshot_time = snapshot['snapshot_time']
+        site_snapshot.content_types = snapshot['content_types']
+        site_snapshot.high_water_marks = snapshot['high_water_marks']
+        for content_type in snapshot['records']:
+            record_class = cls.content_type_definitions[content_type][0]
+            site_snapshot._load_records(content_type, [record_class(*r) for r in snapshot['records'][content_type]])
+        site_snapshot._load_group_members(snapshot['group_members'])
+        return site_snapshot
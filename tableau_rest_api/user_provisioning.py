@@ -0,0 +1,363 @@
+from typing import Union, Any, Optional, List, Dict, Tuple, Iterable, Iterator, NamedTuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import json
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from .records import *
+from .url_filter import UrlFilter
+
+
+# One user as they should be on the site. Anything left as None is not changed on an existing user; a new user with
+# no site_role is added as Unlicensed
+class ProvisioningRecord(NamedTuple):
+    name: str
+    full_name: Optional[str] = None
+    email: Optional[str] = None
+    site_role: Optional[str] = None
+    auth_setting: Optional[str] = None
+    groups: Tuple[str, ...] = ()
+    password: Optional[str] = None
+
+    # From a dict with the same keys, such as a csv.DictReader row. groups can be a list or a ';' separated string
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'ProvisioningRecord':
+        groups = d.get('groups')
+        if groups is None:
+            groups = ()
+        elif isinstance(groups, str):
+            groups = tuple([g.strip() for g in groups.split(';') if g.strip() != ''])
+        else:
+            groups = tuple(groups)
+        return cls(d['name'], d.get('full_name') or None, d.get('email') or None,
+                   d.get('site_role') or None, d.get('auth_setting') or None, groups,
+                   d.get('password') or None)
+
+
+# The outcome of one record, as written to the checkpoint file. status is 'created', 'updated', 'unchanged',
+# 'unlicensed' or 'failed'
+class ProvisioningResult(NamedTuple):
+    name: str
+    status: str
+    luid: Optional[str] = None
+    http_code: Optional[int] = None
+    error: Optional[str] = None
+
+
+# Counts of what a UserProvisioner run did
+class ProvisioningSummary(NamedTuple):
+    created: int
+    updated: int
+    unchanged: int
+    unlicensed: int
+    failed: int
+    resumed: int
+    elapsed_seconds: float
+    records_per_second: float
+
+
+# Creates, updates and (optionally) unlicenses users in bulk. The site's users and groups are listed once up front,
+# so each record is compared in memory and only needs calls for what is actually different: nothing for an unchanged
+# user, one PUT for a changed one, a POST (plus a PUT if it has a full name, email or password) for a new one, and a
+# POST per group they are missing from. Records are read from any iterable as they are needed, with at most
+# max_workers * 2 in flight, so the input can be a generator over a large file.
+# Each result is appended to checkpoint_filename as soon as it is known. Running again with the same file skips every
+# record that already succeeded, so an interrupted run carries on where it stopped
+class UserProvisioner(LoggingMethods):
+    # Site roles that unlicense_missing never touches
+    protected_site_roles = ('ServerAdministrator', 'SiteAdministrator', 'SiteAdministratorExplorer',
+                            'SiteAdministratorCreator')
+    # Record outcomes that a later run can skip
+    completed_statuses = ('created', 'updated', 'unchanged')
+
+    def __init__(self, t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'],
+                 checkpoint_filename: Optional[str] = None, max_workers: int = 8, page_size: int = 1000,
+                 logger_obj: Optional[Logger] = None, progress_interval: int = 500):
+        self.t_rest_api = t_rest_api
+        self.checkpoint_filename = checkpoint_filename
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.logger = logger_obj
+        self.progress_interval = progress_interval
+        # username : UserRecord, kept up to date as users are created and changed
+        self.users: Dict[str, UserRecord] = {}
+        # group name : luid
+        self.group_luids: Dict[str, str] = {}
+        # group luid : set of member luids, listed the first time a record mentions the group
+        self._group_members: Dict[str, set] = {}
+        self._group_locks: Dict[str, threading.Lock] = {}
+        # username : ProvisioningResult, from the checkpoint file and this run
+        self.results: Dict[str, ProvisioningResult] = {}
+        self._resumed = 0
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._checkpoint_file = None
+        self._prefetched = False
+
+    #
+    # Prefetching and checkpoints
+    #
+
+    def prefetch(self):
+        if self._prefetched is True:
+            return
+        self.start_log_block()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            users = executor.submit(self.t_rest_api.query_resource_records, 'users', UserRecord, fields=['_all_'],
+                                    page_size=self.page_size, max_workers=2)
+            groups = executor.submit(self.t_rest_api.query_resource_records, 'groups', GroupRecord,
+                                     page_size=self.page_size, max_workers=2)
+            for user in users.result():
+                self.users[user.name] = user
+            for group in groups.result():
+                self.group_luids[group.name] = group.luid
+                self._group_locks[group.luid] = threading.Lock()
+        self.log('Listed {} users and {} groups'.format(len(self.users), len(self.group_luids)))
+        self._prefetched = True
+        self.end_log_block()
+
+    # Everything that has already succeeded. Later lines win, so a record that failed and then succeeded is done.
+    # Only the outcomes of records count: a user unlicensed by unlicense_missing was not in the records
+    def load_checkpoint(self) -> Dict[str, ProvisioningResult]:
+        completed = {}
+        if self.checkpoint_filename is None or not os.path.exists(self.checkpoint_filename):
+            return completed
+        with open(self.checkpoint_filename, 'r', encoding='utf-8') as checkpoint_file:
+            for line in checkpoint_file:
+                line = line.strip()
+                if line == '':
+                    continue
+                try:
+                    result = ProvisioningResult(**json.loads(line))
+                except ValueError:
+                    # A line cut short when the previous run was killed
+                    continue
+                if result.status in self.completed_statuses:
+                    completed[result.name] = result
+                else:
+                    completed.pop(result.name, None)
+        return completed
+
+    def _record_result(self, result: ProvisioningResult):
+        with self._checkpoint_lock:
+            self.results[result.name] = result
+            if self._checkpoint_file is not None:
+                self._checkpoint_file.write(json.dumps(result._asdict()))
+                self._checkpoint_file.write("\n")
+                # Flushed every line, so that nothing that was done is lost if the run is killed
+                self._checkpoint_file.flush()
+
+    #
+    # Per record work, each run from a worker thread
+    #
+
+    def _build_user_request(self, attributes: Dict[str, Optional[str]]) -> ET.Element:
+        tsr = ET.Element("tsRequest")
+        u = ET.Element("user")
+        for attribute in attributes:
+            if attributes[attribute] is not None:
+                u.set(attribute, attributes[attribute])
+        tsr.append(u)
+        return tsr
+
+    def _find_user(self, username: str) -> Optional[UserRecord]:
+        users = self.t_rest_api.query_resource_records('users', UserRecord,
+                                                       filters=[UrlFilter.get_name_filter(username)],
+                                                       fields=['_all_'], max_workers=1)
+        return users[0] if len(users) > 0 else None
+
+    def _create_user(self, record: ProvisioningRecord) -> Tuple[Optional[UserRecord], str]:
+        site_role = record.site_role if record.site_role is not None else 'Unlicensed'
+        tsr = self._build_user_request({'name': record.name, 'siteRole': site_role,
+                                        'authSetting': record.auth_setting})
+        try:
+            response = self.t_rest_api.send_add_request_in_thread(self.t_rest_api.build_api_url('users'), tsr)
+        except RecoverableHTTPException as e:
+            # Created since the listing was made (or by another run); treat it as an existing user
+            if e.http_code == 409:
+                user = self._find_user(record.name)
+                if user is not None:
+                    return user, 'updated'
+            raise
+        luid = response.findall('.//t:user', self.t_rest_api.ns_map)[0].get('id')
+        user = UserRecord(luid, record.name, None, None, site_role, record.auth_setting, None, None)
+        self.t_rest_api.cache_content_change('user', luid, record.name)
+        return user, 'created'
+
+    def _update_user(self, user: UserRecord, record: ProvisioningRecord, force_details: bool = False) -> UserRecord:
+        changes = {}
+        if record.full_name is not None and (force_details or record.full_name != user.full_name):
+            changes['fullName'] = record.full_name
+        if record.email is not None and (force_details or record.email != user.email):
+            changes['email'] = record.email
+        if record.site_role is not None and record.site_role != user.site_role:
+            changes['siteRole'] = record.site_role
+        if record.auth_setting is not None and record.auth_setting != user.auth_setting:
+            changes['authSetting'] = record.auth_setting
+        # A password can't be compared, so it is only sent when creating
+        if force_details is True and record.password is not None:
+            changes['password'] = record.password
+        if len(changes) == 0:
+            return user
+        url = self.t_rest_api.build_api_url("users/{}".format(user.luid))
+        self.t_rest_api.send_update_request_in_thread(url, self._build_user_request(changes))
+        return user._replace(full_name=changes.get('fullName', user.full_name),
+                             email=changes.get('email', user.email),
+                             site_role=changes.get('siteRole', user.site_role),
+                             auth_setting=changes.get('authSetting', user.auth_setting))
+
+    def _get_group_members(self, group_luid: str) -> set:
+        with self._group_locks[group_luid]:
+            if group_luid not in self._group_members:
+                members = set()
+                for page in self.t_rest_api.query_resource_pages("groups/{}/users".format(group_luid),
+                                                                 fields=['id'], page_size=self.page_size,
+                                                                 max_workers=1):
+                    for element in page:
+                        members.add(element.get('id'))
+                self._group_members[group_luid] = members
+            return self._group_members[group_luid]
+
+    # Returns the number of groups the user was added to
+    def _add_to_groups(self, user_luid: str, group_names: Iterable[str]) -> int:
+        added = 0
+        for group_name in group_names:
+            if group_name == 'All Users':
+                continue
+            if group_name not in self.group_luids:
+                raise NoMatchFoundException('No group found with name {}'.format(group_name))
+            group_luid = self.group_luids[group_name]
+            members = self._get_group_members(group_luid)
+            if user_luid in members:
+                continue
+            url = self.t_rest_api.build_api_url("groups/{}/users".format(group_luid))
+            try:
+                self.t_rest_api.send_add_request_in_thread(url, self._build_user_request({'id': user_luid}))
+            except RecoverableHTTPException as e:
+                if e.http_code != 409:
+                    raise
+            with self._lock:
+                members.add(user_luid)
+            added += 1
+        return added
+
+    def _provision_record(self, record: ProvisioningRecord) -> ProvisioningResult:
+        try:
+            if record.site_role is not None and record.site_role not in self.t_rest_api.site_roles:
+                raise InvalidOptionException("{} is not a valid site role in Tableau Server".format(record.site_role))
+            with self._lock:
+                user = self.users.get(record.name)
+            if user is None:
+                user, status = self._create_user(record)
+                # The add request only takes the name, site role and auth setting
+                new_user = self._update_user(user, record, force_details=(status == 'created'))
+            else:
+                status = 'unchanged'
+                new_user = self._update_user(user, record)
+            if new_user is not user and status == 'unchanged':
+                status = 'updated'
+            with self._lock:
+                self.users[record.name] = new_user
+            if self._add_to_groups(new_user.luid, record.groups) > 0 and status == 'unchanged':
+                status = 'updated'
+            return ProvisioningResult(record.name, status, new_user.luid)
+        except RecoverableHTTPException as e:
+            return ProvisioningResult(record.name, 'failed', http_code=e.http_code,
+                                      error='Tableau error code {}'.format(e.tableau_error_code))
+        except (InvalidOptionException, NoMatchFoundException) as e:
+            return ProvisioningResult(record.name, 'failed', error=e.msg)
+
+    def _unlicense_user(self, user: UserRecord) -> ProvisioningResult:
+        try:
+            url = self.t_rest_api.build_api_url("users/{}".format(user.luid))
+            self.t_rest_api.send_update_request_in_thread(url, self._build_user_request({'siteRole': 'Unlicensed'}))
+            with self._lock:
+                self.users[user.name] = user._replace(site_role='Unlicensed')
+            return ProvisioningResult(user.name, 'unlicensed', user.luid)
+        except RecoverableHTTPException as e:
+            return ProvisioningResult(user.name, 'failed', user.luid, e.http_code,
+                                      'Tableau error code {}'.format(e.tableau_error_code))
+
+    #
+    # Running
+    #
+
+    def _run_pool(self, executor: ThreadPoolExecutor, function, items: Iterator) -> int:
+        done_count = 0
+        pending = set()
+        item = next(items, None)
+        while item is not None or len(pending) > 0:
+            while item is not None and len(pending) < self.max_workers * 2:
+                pending.add(executor.submit(function, item))
+                item = next(items, None)
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._record_result(future.result())
+                done_count += 1
+                if done_count % self.progress_interval == 0:
+                    self.log('{} records done'.format(done_count))
+        return done_count
+
+    # records can be ProvisioningRecords or dicts (see ProvisioningRecord.from_dict). With unlicense_missing=True,
+    # every user on the site who isn't in the records (or the checkpoint), other than administrators and guest, is
+    # set to Unlicensed once all of the records are done
+    def provision(self, records: Iterable[Union[ProvisioningRecord, Dict]],
+                  unlicense_missing: bool = False) -> ProvisioningSummary:
+        self.start_log_block()
+        start_time = time.time()
+        self.prefetch()
+        self.results = {}
+        completed = self.load_checkpoint()
+        self._resumed = 0
+        seen_names = set(completed.keys())
+        if len(completed) > 0:
+            self.log('Checkpoint has {} records already done, skipping them'.format(len(completed)))
+
+        def records_to_do():
+            for record in records:
+                if not isinstance(record, ProvisioningRecord):
+                    record = ProvisioningRecord.from_dict(record)
+                seen_names.add(record.name)
+                if record.name in completed:
+                    self._resumed += 1
+                    continue
+                yield record
+
+        if self.checkpoint_filename is not None:
+            self._checkpoint_file = open(self.checkpoint_filename, 'a', encoding='utf-8')
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                count = self._run_pool(executor, self._provision_record, records_to_do())
+                if unlicense_missing is True:
+                    to_unlicense = [user for user in list(self.users.values()) if user.name not in seen_names and
+                                    user.name != 'guest' and user.site_role != 'Unlicensed' and
+                                    user.site_role not in self.protected_site_roles]
+                    self.log('Unlicensing {} users who are not in the records'.format(len(to_unlicense)))
+                    count += self._run_pool(executor, self._unlicense_user, iter(to_unlicense))
+        finally:
+            if self._checkpoint_file is not None:
+                self._checkpoint_file.close()
+                self._checkpoint_file = None
+
+        summary = self.get_summary(time.time() - start_time, count)
+        self.log('{} created, {} updated, {} unchanged, {} unlicensed, {} failed, {} done in an earlier run'.format(
+            summary.created, summary.updated, summary.unchanged, summary.unlicensed, summary.failed, summary.resumed))
+        self.end_log_block()
+        return summary
+
+    def get_summary(self, elapsed_seconds: float = 0.0, count: Optional[int] = None) -> ProvisioningSummary:
+        statuses = [result.status for result in self.results.values()]
+        if count is None:
+            count = len(statuses)
+        return ProvisioningSummary(statuses.count('created'), statuses.count('updated'), statuses.count('unchanged'),
+                                   statuses.count('unlicensed'), statuses.count('failed'), self._resumed,
+                                   elapsed_seconds, count / elapsed_seconds if elapsed_seconds > 0 else 0.0)
+
+    # The records that failed in this run, to fix and send again
+    def get_failures(self) -> List[ProvisioningResult]:
+        return [result for result in self.results.values() if result.status == 'failed']
@@ -0,0 +1,168 @@
+from typing import Union, Any, Optional, List, Dict, Iterator, Iterable
+import codecs
+import csv
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+
+# pyarrow is optional, only needed for iterate_arrow_batches()
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+# Reads the CSV data of a view straight from the response as it downloads, so a view with millions of rows never
+# has to be held in memory as one bytes object (which is what query_view_data() returns). The response is decoded
+# and parsed one chunk at a time, and rows come out as lists, dicts or batches of typed columns.
+# Each iterate_ method makes its own request, so a stream can be read more than once. If the export cache is
+# enabled and already has this view's data, it is read from the cached file instead
+class ViewDataStream(LoggingMethods):
+    # Column types for iterate_column_batches() and iterate_arrow_batches(): 'str', 'int', 'float' and 'bool'.
+    # Empty values become None
+    column_types = ('str', 'int', 'float', 'bool')
+
+    def __init__(self, t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'], view_luid: str,
+                 view_filter_map: Optional[Dict] = None, max_age_minutes: Optional[int] = None,
+                 chunk_size: int = 65536, logger_obj: Optional[Logger] = None):
+        self.t_rest_api = t_rest_api
+        self.logger = logger_obj
+        self.view_luid = view_luid
+        self.chunk_size = chunk_size
+        self.max_age_minutes = max_age_minutes
+        url_param_map = t_rest_api._build_data_file_parameters(view_filter_map, max_age_minutes=max_age_minutes)
+        url_params_str = t_rest_api.build_url_parameter_string(map_dict=url_param_map)
+        self.url_ending = "views/{}/data".format(view_luid)
+        if url_params_str is not None:
+            self.url_ending = "{}?{}".format(self.url_ending, url_params_str)
+        # The header row, once a stream has been started
+        self.columns: Optional[List[str]] = None
+
+    def _iterate_chunks(self) -> Iterator[bytes]:
+        export_cache = getattr(self.t_rest_api, 'export_cache', None)
+        if export_cache is not None:
+            cached_filename = export_cache.get_filename(self.url_ending, max_age_minutes=self.max_age_minutes,
+                                                        version=self.t_rest_api._get_export_version(self.url_ending),
+                                                        site_luid=self.t_rest_api.site_luid,
+                                                        user_luid=self.t_rest_api.user_luid)
+            if cached_filename is not None:
+                self.log('View data found in cache for {}'.format(self.url_ending))
+                with open(cached_filename, 'rb') as cached_file:
+                    chunk = cached_file.read(self.chunk_size)
+                    while chunk:
+                        yield chunk
+                        chunk = cached_file.read(self.chunk_size)
+                return
+        url = self.t_rest_api.build_api_url(self.url_ending)
+        for chunk in self.t_rest_api.stream_binary_get_request_in_thread(url, chunk_size=self.chunk_size):
+            yield chunk
+
+    # Chunks can end in the middle of a line or of a multi-byte character, so the text is decoded incrementally and
+    # only complete lines (with their line endings, so quoted values spanning lines still parse) are handed on
+    @staticmethod
+    def _iterate_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+        # Server sends UTF-8, sometimes with a byte order mark
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        remainder = ''
+        for chunk in chunks:
+            lines = (remainder + decoder.decode(chunk)).split('\n')
+            remainder = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        remainder += decoder.decode(b'', final=True)
+        if remainder != '':
+            yield remainder
+
+    # Yields each row as a list of strings, after setting columns from the header row
+    def iterate_rows(self) -> Iterator[List[str]]:
+        reader = csv.reader(self._iterate_lines(self._iterate_chunks()))
+        for header in reader:
+            self.columns = header
+            break
+        else:
+            # Nothing came back at all
+            self.columns = []
+            return
+        row_count = 0
+        for row in reader:
+            row_count += 1
+            yield row
+        self.log('Streamed {} rows of view {}'.format(row_count, self.view_luid))
+
+    # Yields each row as { column name : value }
+    def iterate_dicts(self) -> Iterator[Dict[str, str]]:
+        for row in self.iterate_rows():
+            yield dict(zip(self.columns, row))
+
+    def _check_column_types(self, column_types: Optional[Dict[str, str]]):
+        if column_types is None:
+            return
+        for column_name in column_types:
+            if column_types[column_name] not in self.column_types:
+                raise InvalidOptionException('Column type for {} must be one of {}'.format(
+                    column_name, ", ".join(self.column_types)))
+
+    # Numbers in view data can have thousands separators (1,234.5)
+    @staticmethod
+    def _convert_values(values: List[str], column_type: str) -> List[Any]:
+        if column_type == 'int':
+            return [None if v == '' else int(v.replace(',', '')) for v in values]
+        elif column_type == 'float':
+            return [None if v == '' else float(v.replace(',', '')) for v in values]
+        elif column_type == 'bool':
+            return [None if v == '' else v.lower() == 'true' for v in values]
+        else:
+            return [None if v == '' else v for v in values]
+
+    # Yields { column name : [ values ] } for every batch_size rows. Columns not named in column_types stay strings
+    def iterate_column_batches(self, batch_size: int = 10000,
+                               column_types: Optional[Dict[str, str]] = None) -> Iterator[Dict[str, List[Any]]]:
+        if batch_size < 1:
+            raise InvalidOptionException('batch_size must be at least 1')
+        self._check_column_types(column_types)
+        if column_types is None:
+            column_types = {}
+        rows = []
+        for row in self.iterate_rows():
+            rows.append(row)
+            if len(rows) == batch_size:
+                yield self._build_column_batch(rows, column_types)
+                rows = []
+        if len(rows) > 0:
+            yield self._build_column_batch(rows, column_types)
+
+    def _build_column_batch(self, rows: List[List[str]], column_types: Dict[str, str]) -> Dict[str, List[Any]]:
+        batch = {}
+        for i, column_name in enumerate(self.columns):
+            # Short rows are padded out rather than shifting the columns
+            values = [row[i] if i < len(row) else '' for row in rows]
+            batch[column_name] = self._convert_values(values, column_types.get(column_name, 'str'))
+        return batch
+
+    @staticmethod
+    def _arrow_type(column_type: str):
+        if column_type == 'int':
+            return pyarrow.int64()
+        elif column_type == 'float':
+            return pyarrow.float64()
+        elif column_type == 'bool':
+            return pyarrow.bool_()
+        else:
+            return pyarrow.string()
+
+    # The same batches as pyarrow RecordBatches, which can be written out or collected with
+    # pyarrow.Table.from_batches() as they arrive
+    def iterate_arrow_batches(self, batch_size: int = 10000, column_types: Optional[Dict[str, str]] = None):
+        if pyarrow is None:
+            raise ImportError('pyarrow must be installed to use iterate_arrow_batches()')
+        if column_types is None:
+            column_types = {}
+        schema = None
+        for batch in self.iterate_column_batches(batch_size=batch_size, column_types=column_types):
+            if schema is None:
+                schema = pyarrow.schema([(column_name, self._arrow_type(column_types.get(column_name, 'str')))
+                                         for column_name in self.columns])
+            arrays = [pyarrow.array(batch[column_name], type=field.type)
+                      for column_name, field in zip(self.columns, schema)]
+            yield pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
@@ -0,0 +1,266 @@
+from typing import Union, Any, Optional, List, Dict, Tuple, Iterable, NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import hashlib
+import itertools
+import os
+import shutil
+import threading
+import time
+
+from tableau_tools.logging_methods import LoggingMethods
+from tableau_tools.logger import Logger
+from tableau_tools.tableau_exceptions import *
+from tableau_tools.tableau_rest_xml import TableauRestXml
+from .records import *
+
+
+# One line of an export manifest. export_type is 'png', 'pdf' or 'csv'. Leave view_name_or_luid out with 'pdf' to
+# export the whole workbook. Without a filename, one is made up in the ViewExporter's output directory
+class ExportRequest(NamedTuple):
+    view_name_or_luid: Optional[str] = None
+    wb_name_or_luid: Optional[str] = None
+    proj_name_or_luid: Optional[str] = None
+    export_type: str = 'png'
+    view_filter_map: Optional[Dict] = None
+    high_resolution: bool = False
+    max_age_minutes: Optional[int] = None
+    page_type: Optional[str] = None
+    page_orientation: Optional[str] = None
+    filename: Optional[str] = None
+
+    # For manifests read from JSON. Keys are the field names above
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'ExportRequest':
+        unknown = set(d.keys()) - set(cls._fields)
+        if len(unknown) > 0:
+            raise InvalidOptionException('Unknown export request keys: {}'.format(", ".join(sorted(unknown))))
+        return cls(**d)
+
+
+#   status : 'Exported', 'Cached' (copied from the export cache), 'Duplicate' (same request as an earlier line,
+#            copied from its file) or 'Failed'
+class ExportResult(NamedTuple):
+    request: ExportRequest
+    filename: Optional[str]
+    status: str
+    bytes_written: int = 0
+    seconds: float = 0.0
+    http_code: Optional[int] = None
+    error: Optional[str] = None
+
+
+# Exports view images, PDFs and CSV data (and workbook PDFs) for a whole manifest at once. Every workbook and view
+# named in the manifest is looked up once, up front, and lines that would produce exactly the same request are only
+# downloaded once. The downloads run max_workers at a time, no more than requests_per_second (if set) are started,
+# and each one is streamed straight to its file instead of being held in memory
+class ViewExporter(LoggingMethods):
+    export_types = {'png': 'image', 'pdf': 'pdf', 'csv': 'data'}
+    page_types = ['A3', 'A4', 'A5', 'B5', 'Executive', 'Folio', 'Ledger', 'Legal', 'Letter', 'Note', 'Quarto',
+                  'Tabloid']
+
+    def __init__(self, t_rest_api: Union['TableauRestApiConnection', 'TableauServerRest'], output_directory: str = '.',
+                 max_workers: int = 4, requests_per_second: Optional[float] = None,
+                 logger_obj: Optional[Logger] = None, chunk_size: int = 65536):
+        self.t_rest_api = t_rest_api
+        self.logger = logger_obj
+        self.output_directory = output_directory
+        self.max_workers = max_workers
+        self.requests_per_second = requests_per_second
+        self.chunk_size = chunk_size
+        # (wb name or luid, proj name or luid) : workbook luid
+        self._workbook_luids: Dict[Tuple[Optional[str], Optional[str]], str] = {}
+        # workbook luid : { view name or contentUrl : view luid }
+        self._workbook_views: Dict[str, Dict[str, str]] = {}
+        # view name : [ view luids ] across the site, only listed if a view is given without its workbook
+        self._site_views: Optional[Dict[str, List[str]]] = None
+        self._rate_lock = threading.Lock()
+        self._next_request_time = 0.0
+
+    # Every combination of the values, e.g. {'Region': ['East', 'West'], 'Year': [2019, 2020]} gives four filter maps
+    @staticmethod
+    def get_filter_permutations(filter_values: Dict[str, Iterable]) -> List[Dict]:
+        fields = list(filter_values.keys())
+        return [dict(zip(fields, values)) for values in itertools.product(*[filter_values[f] for f in fields])]
+
+    # One ExportRequest for each view and each filter map (or each permutation of filter_values)
+    @staticmethod
+    def build_manifest(view_names_or_luids: Iterable[str], filter_values: Optional[Dict[str, Iterable]] = None,
+                       wb_name_or_luid: Optional[str] = None, proj_name_or_luid: Optional[str] = None,
+                       export_type: str = 'png', **options) -> List[ExportRequest]:
+        filter_maps = [None]
+        if filter_values is not None:
+            filter_maps = ViewExporter.get_filter_permutations(filter_values)
+        return [ExportRequest(view_name_or_luid=view, wb_name_or_luid=wb_name_or_luid,
+                              proj_name_or_luid=proj_name_or_luid, export_type=export_type,
+                              view_filter_map=filter_map, **options)
+                for view in view_names_or_luids for filter_map in filter_maps]
+
+    #
+    # Resolving LUIDs
+    #
+
+    def _get_workbook_luid(self, wb_name_or_luid: str, proj_name_or_luid: Optional[str]) -> str:
+        key = (wb_name_or_luid, proj_name_or_luid)
+        if key not in self._workbook_luids:
+            self._workbook_luids[key] = self.t_rest_api.query_workbook_luid(wb_name_or_luid, proj_name_or_luid)
+        return self._workbook_luids[key]
+
+    def _get_view_luid(self, request: ExportRequest) -> str:
+        view = request.view_name_or_luid
+        if TableauRestXml.is_luid(view):
+            return view
+        if request.wb_name_or_luid is not None:
+            wb_luid = self._get_workbook_luid(request.wb_name_or_luid, request.proj_name_or_luid)
+            if wb_luid not in self._workbook_views:
+                views = {}
+                response = self.t_rest_api.query_resource("workbooks/{}/views".format(wb_luid))
+                for v in response.findall('.//t:view', TableauRestXml.ns_map):
+                    views[v.get('name')] = v.get('id')
+                    views[v.get('contentUrl')] = v.get('id')
+                self._workbook_views[wb_luid] = views
+            if view not in self._workbook_views[wb_luid]:
+                raise NoMatchFoundException('No view found with name {} in workbook {}'.format(
+                    view, request.wb_name_or_luid))
+            return self._workbook_views[wb_luid][view]
+        if self._site_views is None:
+            self._site_views = {}
+            for record in self.t_rest_api.query_resource_records('views', ViewRecord, fields=['id', 'name']):
+                self._site_views.setdefault(record.name, []).append(record.luid)
+        luids = self._site_views.get(view, [])
+        if len(luids) == 0:
+            raise NoMatchFoundException('No view found with name {}'.format(view))
+        if len(luids) > 1:
+            # Include the workbook in the request to tell them apart
+            raise MultipleMatchesFoundException(len(luids))
+        return luids[0]
+
+    # Returns the URL ending with its parameters in a fixed order, so identical requests give identical strings
+    def _get_request_url(self, request: ExportRequest) -> str:
+        if request.export_type not in self.export_types:
+            raise InvalidOptionException("export_type must be one of 'png', 'pdf' or 'csv'")
+        if request.page_type is not None and request.page_type not in self.page_types:
+            raise InvalidOptionException('page_type can only be one of: {}'.format(", ".join(self.page_types)))
+        if request.page_orientation not in (None, 'Portrait', 'Landscape'):
+            raise InvalidOptionException('page_orientation can only be "Portrait" or "Landscape"')
+        if request.view_name_or_luid is None:
+            if request.export_type != 'pdf' or request.wb_name_or_luid is None:
+                raise InvalidOptionException('Only a pdf can be exported for a whole workbook')
+            url_ending = "workbooks/{}/pdf".format(self._get_workbook_luid(request.wb_name_or_luid,
+                                                                          request.proj_name_or_luid))
+        else:
+            url_ending = "views/{}/{}".format(self._get_view_luid(request), self.export_types[request.export_type])
+        params = self.t_rest_api._build_data_file_parameters(
+            request.view_filter_map, high_resolution=request.high_resolution,
+            max_age_minutes=request.max_age_minutes, page_type=request.page_type,
+            page_orientation=request.page_orientation)
+        if len(params) > 0:
+            url_ending += "?{}".format(urlencode(sorted(params.items())))
+        return url_ending
+
+    def _get_filename(self, request: ExportRequest, url_ending: str) -> str:
+        if request.filename is not None:
+            filename = request.filename
+            if not filename.lower().endswith('.{}'.format(request.export_type)):
+                filename += '.{}'.format(request.export_type)
+            return filename
+        # <view or workbook luid>_<hash of the parameters>.<type>
+        content_luid = url_ending.split('/')[1].split('?')[0]
+        params_hash = hashlib.sha1(url_ending.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.output_directory, "{}_{}.{}".format(content_luid, params_hash, request.export_type))
+
+    #
+    # Exporting
+    #
+
+    def _wait_for_rate_limit(self):
+        if self.requests_per_second is None:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            wait_time = self._next_request_time - now
+            self._next_request_time = max(now, self._next_request_time) + 1.0 / self.requests_per_second
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    # Copied from the connection's export cache when it has a fresh enough copy (see enable_export_cache())
+    def _download(self, request: ExportRequest, url_ending: str, filename: str) -> ExportResult:
+        start_time = time.time()
+        cache = self.t_rest_api.export_cache
+        version = None
+        try:
+            if cache is not None:
+                version = self.t_rest_api._get_export_version(url_ending)
+                cached_filename = cache.get_filename(url_ending, max_age_minutes=request.max_age_minutes,
+                                                     version=version, site_luid=self.t_rest_api.site_luid,
+                                                     user_luid=self.t_rest_api.user_luid)
+                if cached_filename is not None:
+                    shutil.copyfile(cached_filename, filename)
+                    return ExportResult(request, filename, 'Cached', os.path.getsize(filename),
+                                        time.time() - start_time)
+            self._wait_for_rate_limit()
+            bytes_written = self.t_rest_api.download_file_in_thread(self.t_rest_api.build_api_url(url_ending),
+                                                                    filename, chunk_size=self.chunk_size)
+            if cache is not None:
+                cache.put_file(url_ending, filename, version=version, site_luid=self.t_rest_api.site_luid,
+                               user_luid=self.t_rest_api.user_luid)
+        except RecoverableHTTPException as e:
+            return ExportResult(request, None, 'Failed', seconds=time.time() - start_time, http_code=e.http_code,
+                                error='Tableau error code {}'.format(e.tableau_error_code))
+        except IOError as e:
+            return ExportResult(request, None, 'Failed', seconds=time.time() - start_time, error=str(e))
+        return ExportResult(request, filename, 'Exported', bytes_written, time.time() - start_time)
+
+    # requests can be ExportRequests or dicts with the same keys. Returns an ExportResult for every line, in order
+    def export(self, requests: Iterable[Union[ExportRequest, Dict]]) -> List[ExportResult]:
+        self.start_log_block()
+        start_time = time.time()
+        requests = [r if isinstance(r, ExportRequest) else ExportRequest.from_dict(r) for r in requests]
+        if any(r.max_age_minutes is not None for r in requests) and \
+                tuple([int(p) for p in self.t_rest_api.api_version.split('.')]) < (3, 4):
+            raise InvalidOptionException('max_age_minutes needs API 3.4 or later')
+        if not os.path.isdir(self.output_directory):
+            os.makedirs(self.output_directory)
+
+        results: List[Optional[ExportResult]] = [None] * len(requests)
+        # url ending : index of the first line asking for it
+        first_lines: Dict[str, int] = {}
+        # (line index, url ending, filename)
+        downloads = []
+        duplicates = []
+        for i, request in enumerate(requests):
+            try:
+                url_ending = self._get_request_url(request)
+            except (NoMatchFoundException, MultipleMatchesFoundException, InvalidOptionException) as e:
+                results[i] = ExportResult(request, None, 'Failed', error=e.msg)
+                continue
+            filename = self._get_filename(request, url_ending)
+            if url_ending in first_lines:
+                duplicates.append((i, first_lines[url_ending], filename))
+            else:
+                first_lines[url_ending] = i
+                downloads.append((i, url_ending, filename))
+        self.log('{} exports to run, {} duplicates, {} could not be resolved'.format(
+            len(downloads), len(duplicates), len([r for r in results if r is not None])))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [(i, executor.submit(self._download, requests[i], url_ending, filename))
+                       for i, url_ending, filename in downloads]
+            for i, future in futures:
+                results[i] = future.result()
+
+        for i, first_line, filename in duplicates:
+            original = results[first_line]
+            if original.status not in ('Exported', 'Cached'):
+                results[i] = original._replace(request=requests[i])
+                continue
+            if os.path.abspath(filename) != os.path.abspath(original.filename):
+                shutil.copyfile(original.filename, filename)
+            results[i] = ExportResult(requests[i], filename, 'Duplicate', original.bytes_written)
+
+        failed = [r for r in results if r.status == 'Failed']
+        cached = [r for r in results if r.status == 'Cached']
+        self.log('Exported {} files in {:.1f}s ({} from the cache), {} failed'.format(
+            len(results) - len(failed), time.time() - start_time, len(cached), len(failed)))
+        self.end_log_block()
+        return results
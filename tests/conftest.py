@@ -0,0 +1,16 @@
+import importlib.util
+import os
+import sys
+
+# The repository directory is the tableau_tools package itself, so when it hasn't been installed (or checked out
+# under the name tableau_tools) it is registered under that name for the tests
+if 'tableau_tools' not in sys.modules:
+    try:
+        import tableau_tools
+    except ImportError:
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        spec = importlib.util.spec_from_file_location('tableau_tools', os.path.join(package_dir, '__init__.py'),
+                                                      submodule_search_locations=[package_dir])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['tableau_tools'] = module
+        spec.loader.exec_module(module)
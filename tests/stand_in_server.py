@@ -0,0 +1,265 @@
+import re
+import uuid
+import xml.etree.ElementTree as ET
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+
+NS = 'http://tableau.com/api'
+
+
+def tag(name):
+    return '{{{}}}{}'.format(NS, name)
+
+
+# A small in-memory Tableau Server, answering the REST API calls that tableau_tools makes for plain collections
+# (users, groups, projects, workbooks, views, server-level schedules), extract refresh tasks, permissions, view and
+# workbook downloads, sign-in and site switching.
+# install() routes every requests.Session.send through it
+class StandInServer:
+    def __init__(self, page_size=3):
+        self.page_size = page_size
+        # site luid : { collection name : { luid : { attribute : value } } }
+        self.sites = {}
+        # site content url : site luid
+        self.site_luids = {}
+        self.schedules = {}
+        # token : site luid
+        self.tokens = {}
+        self.user_luid = str(uuid.uuid4())
+        # (site luid, permissions path) : { (grantee type, grantee luid) : { capability : mode } }
+        self.permissions = {}
+        # (method, path within the site) : (http status, tableau error code) for requests to refuse
+        self.refuse = {}
+        # (site luid, path within the site) : the bytes to send back, e.g. for 'views/{luid}/image'
+        self.files = {}
+        # (path within the site, parsed query) of every download
+        self.downloads = []
+        # (method, path) of every request
+        self.log = []
+
+    def install(self, monkeypatch):
+        server = self
+
+        def send(session, request, **kwargs):
+            return server.handle(request)
+        monkeypatch.setattr(requests.Session, 'send', send)
+
+    def add_site(self, content_url):
+        site_luid = str(uuid.uuid4())
+        self.sites[site_luid] = {'users': {}, 'groups': {}, 'projects': {}, 'workbooks': {}, 'views': {}, 'tasks': {}}
+        self.site_luids[content_url] = site_luid
+        return site_luid
+
+    def add(self, site_luid, collection, **attributes):
+        luid = str(uuid.uuid4())
+        attributes['id'] = luid
+        if site_luid is None:
+            self.schedules[luid] = attributes
+        else:
+            self.sites[site_luid][collection][luid] = attributes
+        return luid
+
+    def names(self, site_luid, collection):
+        return {a['name']: luid for luid, a in self.sites[site_luid][collection].items()}
+
+    # Already read, so iter_content() and close() work without a raw stream behind them
+    @staticmethod
+    def _response(request, status, body):
+        response = requests.Response()
+        response.status_code = status
+        response.headers['Content-Type'] = 'application/xml'
+        response._content = ET.tostring(body, encoding='utf-8') if body is not None else b''
+        response._content_consumed = True
+        response.request = request
+        response.url = request.url
+        return response
+
+    @staticmethod
+    def _file_response(request, content):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/octet-stream'
+        response._content = content
+        response._content_consumed = True
+        response.request = request
+        response.url = request.url
+        return response
+
+    def _error(self, request, status, code):
+        tsr = ET.Element(tag('tsResponse'))
+        e = ET.SubElement(tsr, tag('error'), code=code)
+        ET.SubElement(e, tag('summary')).text = 'Error'
+        ET.SubElement(e, tag('detail')).text = 'Stand-in error {}'.format(code)
+        return self._response(request, status, tsr)
+
+    @staticmethod
+    def _element(name, attributes):
+        e = ET.Element(tag(name))
+        for key, value in attributes.items():
+            if key == 'children':
+                for child_name, child_id in value:
+                    ET.SubElement(e, tag(child_name), id=child_id)
+            else:
+                e.set(key, value)
+        return e
+
+    def _credentials(self, request, content_url):
+        if content_url not in self.site_luids:
+            return self._error(request, 401, '401001')
+        token = str(uuid.uuid4())
+        self.tokens[token] = self.site_luids[content_url]
+        tsr = ET.Element(tag('tsResponse'))
+        c = ET.SubElement(tsr, tag('credentials'), token=token)
+        ET.SubElement(c, tag('site'), id=self.site_luids[content_url], contentUrl=content_url)
+        ET.SubElement(c, tag('user'), id=self.user_luid)
+        return self._response(request, 200, tsr)
+
+    def _list(self, request, collection_name, items, query):
+        items = list(items)
+        for f in query.get('filter', []):
+            for condition in f.split(','):
+                field, operator, value = condition.split(':', 2)
+                items = [i for i in items if i.get(field) == value]
+        page_number = int(query.get('pageNumber', ['1'])[0])
+        page = items[(page_number - 1) * self.page_size: page_number * self.page_size]
+        tsr = ET.Element(tag('tsResponse'))
+        ET.SubElement(tsr, tag('pagination'), pageNumber=str(page_number), pageSize=str(self.page_size),
+                      totalAvailable=str(len(items)))
+        listing = ET.SubElement(tsr, tag(collection_name))
+        for item in page:
+            listing.append(self._element(collection_name[:-1], item))
+        return self._response(request, 200, tsr)
+
+    def _permissions(self, request, site_luid, path, method, body):
+        m = re.match(r'^(.*/(?:permissions|default-permissions/[a-z]+))(?:/(user|group)s/([^/]+)/([^/]+)/([^/]+))?$',
+                     path)
+        grants = self.permissions.setdefault((site_luid, m.group(1)), {})
+        if method == 'DELETE':
+            grantee = (m.group(2), m.group(3))
+            if grants.get(grantee, {}).get(m.group(4)) != m.group(5):
+                return self._error(request, 404, '404000')
+            del grants[grantee][m.group(4)]
+            if len(grants[grantee]) == 0:
+                del grants[grantee]
+            return self._response(request, 204, None)
+        if method == 'PUT':
+            additions = {}
+            for gcap in body.findall('.//granteeCapabilities'):
+                grantee_element = gcap.find('user') if gcap.find('user') is not None else gcap.find('group')
+                grantee = (grantee_element.tag, grantee_element.get('id'))
+                for cap in gcap.findall('.//capability'):
+                    # Like the real server, a mode can't be added over the opposite one
+                    if grants.get(grantee, {}).get(cap.get('name'), cap.get('mode')) != cap.get('mode'):
+                        return self._error(request, 409, '409004')
+                    additions.setdefault(grantee, {})[cap.get('name')] = cap.get('mode')
+            for grantee in additions:
+                grants.setdefault(grantee, {}).update(additions[grantee])
+        tsr = ET.Element(tag('tsResponse'))
+        p = ET.SubElement(tsr, tag('permissions'))
+        for (grantee_type, grantee_luid), caps in grants.items():
+            gcap = ET.SubElement(p, tag('granteeCapabilities'))
+            ET.SubElement(gcap, tag(grantee_type), id=grantee_luid)
+            c = ET.SubElement(gcap, tag('capabilities'))
+            for name, mode in caps.items():
+                ET.SubElement(c, tag('capability'), name=name, mode=mode)
+        return self._response(request, 200, tsr)
+
+    def _single(self, request, name, attributes, status=200):
+        tsr = ET.Element(tag('tsResponse'))
+        tsr.append(self._element(name, attributes))
+        return self._response(request, status, tsr)
+
+    # Like the real server, deleting a workbook or schedule deletes its extract refresh tasks
+    @staticmethod
+    def _delete_tasks(site, child_name, luid):
+        for task_luid, task in list(site['tasks'].items()):
+            if (child_name, luid) in task['children']:
+                del site['tasks'][task_luid]
+
+    def handle(self, request):
+        parts = urlsplit(request.url)
+        query = parse_qs(parts.query)
+        path = re.sub(r'^/api/[0-9.]+/', '', parts.path).rstrip('/')
+        method = request.method.upper()
+        self.log.append((method, path))
+        body = ET.fromstring(request.body) if request.body else None
+
+        if path == 'auth/signin':
+            site = body.find('.//site')
+            return self._credentials(request, site.get('contentUrl', ''))
+        token = request.headers.get('X-tableau-auth')
+        if token not in self.tokens:
+            return self._error(request, 401, '401002')
+        if path == 'auth/switchSite':
+            return self._credentials(request, body.find('.//site').get('contentUrl'))
+        if path == 'schedules':
+            return self._list(request, 'schedules', self.schedules.values(), query)
+        m = re.match(r'^schedules/([^/]+)$', path)
+        if m is not None and method == 'DELETE':
+            del self.schedules[m.group(1)]
+            for site in self.sites.values():
+                self._delete_tasks(site, 'schedule', m.group(1))
+            return self._response(request, 204, None)
+
+        m = re.match(r'^sites/([^/]+)/(.*)$', path)
+        if m is None or m.group(1) != self.tokens[token]:
+            return self._error(request, 403, '403000')
+        site_luid = m.group(1)
+        site = self.sites[site_luid]
+        path = m.group(2)
+        if (method, path) in self.refuse:
+            return self._error(request, *self.refuse[(method, path)])
+        if '/permissions' in path or '/default-permissions/' in path:
+            return self._permissions(request, site_luid, path, method, body)
+
+        if path == 'tasks/extractRefreshes':
+            tsr = ET.Element(tag('tsResponse'))
+            tasks = ET.SubElement(tsr, tag('tasks'))
+            for task in site['tasks'].values():
+                ET.SubElement(tasks, tag('task')).append(self._element('extractRefresh', task))
+            return self._response(request, 200, tsr)
+        if method == 'GET' and (site_luid, path) in self.files:
+            self.downloads.append((path, query))
+            return self._file_response(request, self.files[(site_luid, path)])
+        m = re.match(r'^workbooks/([^/]+)/views$', path)
+        if m is not None:
+            views = [v for v in site['views'].values() if ('workbook', m.group(1)) in v.get('children', [])]
+            return self._list(request, 'views', views, query)
+        m = re.match(r'^schedules/([^/]+)/(workbooks|datasources)$', path)
+        if m is not None and method == 'PUT':
+            content_luid = body.find('.//{}'.format(m.group(2)[:-1])).get('id')
+            task = {'id': str(uuid.uuid4()), 'priority': '50', 'type': 'RefreshExtractTask',
+                    'children': [('schedule', m.group(1)), (m.group(2)[:-1], content_luid)]}
+            site['tasks'][task['id']] = task
+            tsr = ET.Element(tag('tsResponse'))
+            ET.SubElement(tsr, tag('task')).append(self._element('extractRefresh', task))
+            return self._response(request, 200, tsr)
+
+        m = re.match(r'^(users|groups|projects|workbooks|views)(?:/([^/]+))?$', path)
+        if m is None:
+            return self._error(request, 404, '404000')
+        collection_name, luid = m.group(1), m.group(2)
+        collection = site[collection_name]
+        name = collection_name[:-1]
+        if luid is None:
+            if method == 'GET':
+                return self._list(request, collection_name, collection.values(), query)
+            attributes = dict(body.find('.//{}'.format(name)).attrib)
+            if attributes['name'] in [a['name'] for a in collection.values()]:
+                return self._error(request, 409, '409000')
+            attributes['id'] = str(uuid.uuid4())
+            collection[attributes['id']] = attributes
+            return self._single(request, name, attributes, 201)
+        if luid not in collection:
+            return self._error(request, 404, '404002')
+        if method == 'GET':
+            return self._single(request, name, collection[luid])
+        if method == 'PUT':
+            collection[luid].update(body.find('.//{}'.format(name)).attrib)
+            return self._single(request, name, collection[luid])
+        if method == 'DELETE':
+            del collection[luid]
+            self._delete_tasks(site, name, luid)
+            return self._response(request, 204, None)
+        return self._error(request, 405, '405000')
@@ -0,0 +1,118 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from tableau_tools.tableau_exceptions import InvalidOptionException
+from tableau_tools.tableau_rest_api.columnar import ColumnarListing
+from tableau_tools.tableau_rest_xml import TableauRestXml
+
+NS = TableauRestXml.ns_map['t']
+
+
+def element(element_name, children=(), **attributes):
+    e = ET.Element('{{{}}}{}'.format(NS, element_name), **attributes)
+    for child_name, child_attributes in children:
+        ET.SubElement(e, '{{{}}}{}'.format(NS, child_name), **child_attributes)
+    return e
+
+
+# Hands back the given pages of the listing, and what it was asked for
+class StubRestApi:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def query_resource_pages(self, url_ending, **kwargs):
+        self.requests.append((url_ending, kwargs))
+        for page in self.pages:
+            listing = ET.Element('{{{}}}{}'.format(NS, url_ending))
+            listing.extend(page)
+            yield listing
+
+
+# Two pages: every value is present on the first, and the second is missing the size, showTabs, updatedAt and owner
+WORKBOOK_PAGES = [
+    [element('workbook', [('project', {'id': 'p1', 'name': 'Sales'}), ('owner', {'id': 'u1'})], id='w1', name='One',
+             contentUrl='One', showTabs='true', size='12', createdAt='2020-01-01T10:00:00Z',
+             updatedAt='2020-02-01T10:00:00Z'),
+     element('workbook', [('project', {'id': 'p1', 'name': 'Sales'}), ('owner', {'id': 'u2'})], id='w2', name='Two',
+             contentUrl='Two', showTabs='false', size='3', createdAt='2020-01-02T10:00:00Z',
+             updatedAt='2020-02-02T10:00:00Z')],
+    [element('workbook', [('project', {'id': 'p2', 'name': 'Ops'})], id='w3', name='Three', contentUrl='Three',
+             createdAt='2020-01-03T10:00:00Z')],
+]
+
+
+def test_numpy_arrays_mask_missing_values():
+    numpy = pytest.importorskip('numpy')
+    arrays = ColumnarListing(StubRestApi(WORKBOOK_PAGES)).query_numpy_arrays('workbook')
+
+    assert [column_name for column_name, child, attribute, column_type in
+            ColumnarListing.column_definitions['workbook']] == list(arrays.keys())
+    assert list(arrays['luid']) == ['w1', 'w2', 'w3']
+    assert list(arrays['project_name']) == ['Sales', 'Sales', 'Ops']
+    assert list(arrays['owner_luid']) == ['u1', 'u2', None]
+
+    # Only the second page has missing values, so the first page's plain array is concatenated with a masked one
+    size = arrays['size']
+    assert isinstance(size, numpy.ma.MaskedArray)
+    assert size.dtype == numpy.int64
+    assert list(size.mask) == [False, False, True]
+    assert size.sum() == 15
+    show_tabs = arrays['show_tabs']
+    assert isinstance(show_tabs, numpy.ma.MaskedArray) and show_tabs.dtype == numpy.bool_
+    assert show_tabs.tolist() == [True, False, None]
+
+    assert arrays['created_at'].dtype == numpy.dtype('datetime64[s]')
+    assert arrays['created_at'][2] == numpy.datetime64('2020-01-03T10:00:00')
+    assert numpy.isnat(arrays['updated_at'][2]) and not numpy.isnat(arrays['updated_at'][0])
+
+
+def test_numpy_arrays_are_plain_when_nothing_is_missing():
+    numpy = pytest.importorskip('numpy')
+    arrays = ColumnarListing(StubRestApi(WORKBOOK_PAGES[:1])).query_numpy_arrays('workbook')
+    assert not isinstance(arrays['size'], numpy.ma.MaskedArray)
+    assert arrays['size'].tolist() == [12, 3]
+
+
+def test_arrow_table_has_nulls_for_missing_values():
+    pyarrow = pytest.importorskip('pyarrow')
+    t = StubRestApi(WORKBOOK_PAGES)
+    listing = ColumnarListing(t)
+    table = listing.query_arrow_table('workbook', page_size=2)
+
+    assert table.schema == listing.get_arrow_schema('workbook')
+    assert table.num_rows == 3
+    # One record batch per page
+    assert [batch.num_rows for batch in table.to_batches()] == [2, 1]
+    assert table.column('size').to_pylist() == [12, 3, None]
+    assert table.column('show_tabs').to_pylist() == [True, False, None]
+    assert table.column('owner_luid').to_pylist() == ['u1', 'u2', None]
+    assert table.column('size').null_count == 1
+    assert table.schema.field('updated_at').type == pyarrow.timestamp('s', tz='UTC')
+    updated_at = table.column('updated_at').to_pylist()
+    assert updated_at[2] is None
+    assert updated_at[0].isoformat() == '2020-02-01T10:00:00+00:00'
+    assert t.requests[0][1]['page_size'] == 2
+
+
+def test_view_usage_and_user_fields_are_requested():
+    pytest.importorskip('pyarrow')
+    t = StubRestApi([[element('view', [('usage', {'totalViewCount': '41'})], id='v1', name='Map'),
+                      element('view', id='v2', name='Table')]])
+    table = ColumnarListing(t).query_arrow_table('view', usage=True)
+    assert table.column('total_view_count').to_pylist() == [41, None]
+    assert t.requests[0][0] == 'views'
+    assert t.requests[0][1]['additional_url_ending'] == 'includeUsageStatistics=true'
+
+    t = StubRestApi([[element('user', [('domain', {'name': 'local'})], id='u1', name='ann', siteRole='Viewer')]])
+    table = ColumnarListing(t).query_arrow_table('user')
+    assert t.requests[0][1]['fields'] == ['_all_']
+    assert table.column('domain_name').to_pylist() == ['local']
+    assert table.column('last_login').to_pylist() == [None]
+
+
+def test_unknown_content_type():
+    pytest.importorskip('numpy')
+    with pytest.raises(InvalidOptionException):
+        ColumnarListing(StubRestApi([])).query_numpy_arrays('flow')
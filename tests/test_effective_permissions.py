@@ -0,0 +1,143 @@
+import random
+
+import pytest
+
+from tableau_tools.tableau_rest_api.effective_permissions import EffectivePermissions
+from tableau_tools.tableau_rest_api.permissions import Permissions
+
+
+def caps(effective, user_luid, content_type, content_luid):
+    return set(effective.get_effective_capabilities(user_luid, content_type, content_luid))
+
+
+# Two groups (g1, g2), users in one or both, and a workbook in an unlocked project
+@pytest.fixture
+def effective():
+    effective = EffectivePermissions('3.6')
+    for user_luid in ('u1', 'u2', 'u3'):
+        effective.add_user(user_luid, 'Creator')
+    effective.add_group_members('g1', ['u1', 'u2', 'u3'])
+    effective.add_group_members('g2', ['u3'])
+    effective.add_project('p1', content_permissions='ManagedByOwner')
+    effective.add_content('workbook', 'w1', 'p1', owner_luid='owner')
+    effective.add_grant('workbook', 'w1', 'group', 'g1', 'Read', 'Allow')
+    effective.add_grant('workbook', 'w1', 'group', 'g1', 'Filter', 'Allow')
+    return effective
+
+
+def test_user_deny_wins_over_group_allow(effective):
+    effective.add_grant('workbook', 'w1', 'user', 'u1', 'Read', 'Deny')
+    assert caps(effective, 'u1', 'workbook', 'w1') == {'Filter'}
+    assert caps(effective, 'u2', 'workbook', 'w1') == {'Read', 'Filter'}
+
+
+def test_group_deny_wins_over_group_allow_but_not_user_allow(effective):
+    effective.add_grant('workbook', 'w1', 'group', 'g2', 'Read', 'Deny')
+    assert caps(effective, 'u3', 'workbook', 'w1') == {'Filter'}
+    effective.add_grant('workbook', 'w1', 'user', 'u3', 'Read', 'Allow')
+    assert caps(effective, 'u3', 'workbook', 'w1') == {'Read', 'Filter'}
+
+
+@pytest.mark.parametrize('lock, child_uses', [('LockedToProject', 'parent defaults'),
+                                              ('LockedToProjectWithoutNested', 'own permissions')])
+def test_locking_modes(lock, child_uses):
+    effective = EffectivePermissions('3.6')
+    effective.add_user('u1', 'Creator')
+    effective.add_group_members('g1', ['u1'])
+    effective.add_project('parent', content_permissions=lock)
+    effective.add_project('child', parent_project_luid='parent', content_permissions='ManagedByOwner')
+    effective.add_content('workbook', 'in_parent', 'parent')
+    effective.add_content('workbook', 'in_child', 'child')
+    effective.add_grant('default_workbook', 'parent', 'group', 'g1', 'Read', 'Allow')
+    effective.add_grant('default_workbook', 'child', 'group', 'g1', 'ExportImage', 'Allow')
+    for workbook_luid in ('in_parent', 'in_child'):
+        effective.add_grant('workbook', workbook_luid, 'group', 'g1', 'Filter', 'Allow')
+
+    # Content directly in a locked project always takes its defaults
+    assert caps(effective, 'u1', 'workbook', 'in_parent') == {'Read'}
+    assert effective.get_locking_project('child') == ('parent' if child_uses == 'parent defaults' else None)
+    if child_uses == 'parent defaults':
+        assert caps(effective, 'u1', 'workbook', 'in_child') == {'Read'}
+    else:
+        assert caps(effective, 'u1', 'workbook', 'in_child') == {'Filter'}
+
+
+def test_project_leader_is_inherited_from_a_parent_project(effective):
+    effective.add_project('child', parent_project_luid='p1', content_permissions='ManagedByOwner')
+    effective.add_content('workbook', 'w2', 'child')
+    effective.add_grant('project', 'p1', 'group', 'g2', 'ProjectLeader', 'Allow')
+    full = Permissions.get_capability_names_from_mask(effective.full_masks['workbook'])
+
+    assert caps(effective, 'u3', 'workbook', 'w2') == set(full)
+    assert caps(effective, 'u1', 'workbook', 'w2') == set()
+    # A user's own Deny of ProjectLeader beats the group's Allow
+    effective.add_grant('project', 'p1', 'user', 'u3', 'ProjectLeader', 'Deny')
+    assert caps(effective, 'u3', 'workbook', 'w2') == set()
+
+
+def test_owner_and_admin_get_everything_within_their_site_role(effective):
+    full = set(Permissions.get_capability_names_from_mask(effective.full_masks['workbook']))
+    effective.add_user('owner', 'Creator')
+    effective.add_user('admin', 'SiteAdministratorCreator')
+    assert caps(effective, 'owner', 'workbook', 'w1') == full
+    assert caps(effective, 'admin', 'workbook', 'w1') == full
+    effective.add_user('owner', 'Viewer')
+    assert caps(effective, 'owner', 'workbook', 'w1') == set(
+        EffectivePermissions.site_role_maximum_capabilities['Viewer'])
+
+
+def test_site_roles_cap_what_is_allowed(effective):
+    for capability in ('Write', 'Delete', 'ChangePermissions', 'WebAuthoring', 'ExportXml'):
+        effective.add_grant('workbook', 'w1', 'group', 'g1', capability, 'Allow')
+    effective.add_user('u1', 'Viewer')
+    effective.add_user('u2', 'Explorer')
+
+    assert effective.who_can('Read', 'workbook', 'w1') == {'u1', 'u2', 'u3'}
+    assert effective.who_can('Web Edit', 'workbook', 'w1') == {'u2', 'u3'}
+    assert effective.who_can('Write', 'workbook', 'w1') == {'u3'}
+    assert effective.who_can('Delete', 'workbook', 'w1') == {'u3'}
+    assert effective.who_can('ChangePermissions', 'workbook', 'w1') == {'u3'}
+
+
+# get_item_masks works per combination of groups and site role and caches by group grants; it has to agree with
+# working out each user on their own
+@pytest.mark.parametrize('seed', range(10))
+def test_item_masks_agree_with_per_user_masks(seed):
+    rng = random.Random(seed)
+    effective = EffectivePermissions('3.6')
+    users = ['u{}'.format(i) for i in range(15)]
+    groups = ['g{}'.format(i) for i in range(4)]
+    for user_luid in users:
+        effective.add_user(user_luid, rng.choice(['Creator', 'Explorer', 'Viewer', 'Unlicensed',
+                                                  'SiteAdministratorCreator']))
+    for group_luid in groups:
+        effective.add_group_members(group_luid, rng.sample(users, rng.randint(0, 8)))
+    projects = []
+    for i in range(6):
+        parent = rng.choice(projects) if projects and rng.random() < 0.7 else None
+        effective.add_project('p{}'.format(i), parent_project_luid=parent, owner_luid=rng.choice(users),
+                              content_permissions=rng.choice(['ManagedByOwner', 'ManagedByOwner', 'LockedToProject',
+                                                              'LockedToProjectWithoutNested']))
+        projects.append('p{}'.format(i))
+    workbooks = ['w{}'.format(i) for i in range(12)]
+    for workbook_luid in workbooks:
+        effective.add_content('workbook', workbook_luid, rng.choice(projects), owner_luid=rng.choice(users + [None]))
+    targets = [('workbook', w) for w in workbooks] + [('default_workbook', p) for p in projects] + \
+              [('project', p) for p in projects]
+    workbook_caps = Permissions.available_capabilities['3.6']['workbook']
+    for i in range(60):
+        permissions_type, luid = rng.choice(targets)
+        capability = rng.choice(['Read', 'Write'] + ['ProjectLeader'] * 2) if permissions_type == 'project' \
+            else rng.choice(workbook_caps)
+        if rng.random() < 0.3:
+            effective.add_grant(permissions_type, luid, 'user', rng.choice(users), capability,
+                                rng.choice(['Allow', 'Deny']))
+        else:
+            effective.add_grant(permissions_type, luid, 'group', rng.choice(groups), capability,
+                                rng.choice(['Allow', 'Allow', 'Deny']))
+
+    for content_type, luids in (('workbook', workbooks), ('project', projects)):
+        for luid in luids:
+            item_masks = effective.get_item_masks(content_type, luid)
+            for user_luid in users:
+                assert item_masks.get(user_luid, 0) == effective.get_effective_mask(user_luid, content_type, luid)
@@ -0,0 +1,37 @@
+from tableau_tools import TableauServerRest35
+from tableau_tools.tableau_rest_api.export_cache import ExportCache
+
+
+def test_entries_are_kept_apart_by_site_and_user(tmp_path):
+    cache = ExportCache(str(tmp_path))
+    cache.put_bytes('views/v1/image?vf_Region=East', b'site1 user1', site_luid='site1', user_luid='user1')
+
+    assert cache.get_bytes('views/v1/image?vf_Region=East', site_luid='site1', user_luid='user1') == b'site1 user1'
+    assert cache.get_bytes('views/v1/image?vf_Region=East', site_luid='site1', user_luid='user2') is None
+    assert cache.get_bytes('views/v1/image?vf_Region=East', site_luid='site2', user_luid='user1') is None
+    assert cache.get_bytes('views/v1/image?vf_Region=East') is None
+    # maxAge and the order of the parameters still don't matter
+    assert cache.get_bytes('views/v1/image?maxAge=5&vf_Region=East', site_luid='site1',
+                           user_luid='user1') == b'site1 user1'
+
+
+def test_connection_downloads_again_for_another_user(tmp_path):
+    t = TableauServerRest35('http://server', 'admin', 'password')
+    t.token = 'token'
+    t.site_luid = 'site1'
+    t.user_luid = 'user1'
+    downloads = []
+
+    def send_binary_get_request(url):
+        downloads.append(url)
+        return 'render {} for {}'.format(len(downloads), t.user_luid).encode('utf-8')
+    t.send_binary_get_request = send_binary_get_request
+    t.enable_export_cache(str(tmp_path))
+
+    assert t._get_data_file('views/v1/image') == b'render 1 for user1'
+    assert t._get_data_file('views/v1/image') == b'render 1 for user1'
+    t.user_luid = 'user2'
+    assert t._get_data_file('views/v1/image') == b'render 2 for user2'
+    t.user_luid = 'user1'
+    assert t._get_data_file('views/v1/image') == b'render 1 for user1'
+    assert len(downloads) == 2
@@ -0,0 +1,90 @@
+import pytest
+
+from tableau_tools import TableauServerRest35
+from stand_in_server import StandInServer, tag
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = StandInServer()
+    server.install(monkeypatch)
+    server.add_site('')
+    server.add_site('other')
+    server.add(None, 'schedules', name='Nightly', type='Extract')
+    return server
+
+
+def signed_in(server):
+    t = TableauServerRest35('http://server', 'admin', 'password')
+    t.signin()
+    return t
+
+
+def test_existing_task_comes_back_in_the_same_shape_as_a_new_one(server):
+    t = signed_in(server)
+    wb_luid = server.add(t.site_luid, 'workbooks', name='Sales')
+
+    added = t.schedules.add_workbook_to_schedule(wb_luid, 'Nightly')
+    puts = len([r for r in server.log if r[0] == 'PUT'])
+    again = t.schedules.add_workbook_to_schedule(wb_luid, 'Nightly')
+
+    assert len([r for r in server.log if r[0] == 'PUT']) == puts
+    for response in (added, again):
+        assert response.tag == tag('tsResponse')
+        extract_refresh = response.find('t:task/t:extractRefresh', t.ns_map)
+        assert extract_refresh.find('t:workbook', t.ns_map).get('id') == wb_luid
+    assert again.find('.//t:extractRefresh', t.ns_map).get('id') == \
+        added.find('.//t:extractRefresh', t.ns_map).get('id')
+
+
+def test_switch_site_and_signin_reset_the_task_catalog_and_luid_caches(server):
+    t = signed_in(server)
+    first_site = t.site_luid
+    t.get_extract_refresh_task_catalog()
+    t.username_luid_cache['someone'] = 'luid'
+    t.group_name_luid_cache['somegroup'] = 'luid'
+
+    t.switch_site('other')
+    assert t.site_luid == server.site_luids['other']
+    assert t.site_luid != first_site
+    assert ('POST', 'auth/switchSite') in server.log
+    assert t._extract_refresh_task_catalog is None
+    assert t.username_luid_cache == {} and t.group_name_luid_cache == {}
+
+    # A sign-in to the same site is still a new session
+    t.get_extract_refresh_task_catalog()
+    t.username_luid_cache['someone'] = 'luid'
+    t.signin()
+    assert t._extract_refresh_task_catalog is None
+    assert t.username_luid_cache == {}
+
+
+def test_catalog_lists_tasks_of_the_current_site(server):
+    t = signed_in(server)
+    wb_luid = server.add(t.site_luid, 'workbooks', name='Sales')
+    t.schedules.add_workbook_to_schedule(wb_luid, 'Nightly')
+    assert len(t.get_extract_refresh_task_catalog()) == 1
+
+    t.switch_site('other')
+    assert len(t.get_extract_refresh_task_catalog()) == 0
+
+
+def test_deleting_a_workbook_or_schedule_drops_its_tasks_from_the_catalog(server):
+    t = signed_in(server)
+    wb_luid = server.add(t.site_luid, 'workbooks', name='Sales')
+    first = t.schedules.add_workbook_to_schedule(wb_luid, 'Nightly')
+    first_id = first.find('.//t:extractRefresh', t.ns_map).get('id')
+
+    t.workbooks.delete_workbooks(wb_luid)
+    assert t.get_extract_refresh_task_catalog().get_tasks_for_workbook(wb_luid) == []
+    # A workbook published again under the same LUID gets a new task rather than the deleted one
+    server.sites[t.site_luid]['workbooks'][wb_luid] = {'id': wb_luid, 'name': 'Sales'}
+    second = t.schedules.add_workbook_to_schedule(wb_luid, 'Nightly')
+    second_id = second.find('.//t:extractRefresh', t.ns_map).get('id')
+    assert second_id != first_id
+    assert list(server.sites[t.site_luid]['tasks']) == [second_id]
+
+    schedule_luid = list(server.schedules)[0]
+    t.schedules.delete_schedule('Nightly')
+    assert t.get_extract_refresh_task_catalog().get_tasks_for_schedule(schedule_luid) == []
+    assert len(t.get_extract_refresh_task_catalog()) == 0
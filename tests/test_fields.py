@@ -0,0 +1,45 @@
+import pytest
+
+from tableau_tools.tableau_exceptions import InvalidOptionException
+from tableau_tools.tableau_rest_api.fields import Fields
+from tableau_tools.tableau_rest_api.methods.rest_api_base import TableauRestApiBase
+
+LUID = '1a2b3c4d-0000-1111-2222-333344445555'
+
+
+@pytest.mark.parametrize('url_ending, content_type', [
+    ('users', 'user'),
+    ('groups/{}/users?pageSize=100'.format(LUID), 'user'),
+    ('workbooks/{}/views'.format(LUID), 'view'),
+    ('workbooks/{}'.format(LUID), 'workbook'),
+    ('/workbooks/{}/'.format(LUID), 'workbook'),
+    ('schedules', 'schedule'),
+])
+def test_content_type_comes_from_the_resource_segment(url_ending, content_type):
+    assert Fields.content_type_from_url_ending(url_ending) == content_type
+
+
+@pytest.mark.parametrize('url_ending, preset', [
+    ('workbooks/{}'.format(LUID), 'usage'),
+    ('workbooks', 'usage'),
+    ('groups/{}/users'.format(LUID), 'ownership'),
+    ('schedules', 'ownership'),
+    ('schedules', 'usage'),
+])
+def test_presets_without_the_content_type_leave_fields_off(url_ending, preset):
+    assert Fields.resolve(url_ending, preset) is None
+    assert 'fields=' not in TableauRestApiBase.build_query_url_ending(url_ending, fields=preset)
+
+
+def test_presets_for_a_single_resource():
+    assert Fields.resolve('workbooks/{}'.format(LUID), 'ownership') == Fields.presets['ownership']['workbook']
+    assert Fields.resolve('groups/{}/users'.format(LUID), 'usage') == Fields.presets['usage']['user']
+    assert Fields.resolve('schedules', 'minimal') == ['id', 'name']
+    assert TableauRestApiBase.build_query_url_ending('workbooks/{}'.format(LUID), fields='full') == \
+        'workbooks/{}?fields=_all_'.format(LUID)
+
+
+def test_unknown_preset_is_still_an_error():
+    with pytest.raises(InvalidOptionException):
+        Fields.resolve('workbooks', 'everything')
+    assert Fields.resolve('workbooks', ['id']) == ['id']
@@ -0,0 +1,63 @@
+import uuid
+import xml.etree.ElementTree as ET
+
+from tableau_tools.tableau_exceptions import RecoverableHTTPException
+from tableau_tools.tableau_rest_api.group_sync import GroupMembershipSync
+from tableau_tools.tableau_rest_api.records import UserRecord, GroupRecord
+
+USERS = {name: str(uuid.uuid4()) for name in ('ann', 'ben', 'cat', 'dan')}
+GROUP_LUID = str(uuid.uuid4())
+
+
+# Answers the calls GroupMembershipSync makes. Deletes for the users in failing_removes and adds for failing_adds
+# raise a 403, and deletes for users who aren't members return 0, the way send_delete_request_in_thread does
+class StubRestApi:
+    def __init__(self, members, failing_removes=(), failing_adds=()):
+        self.members = set(members)
+        self.failing_removes = set(failing_removes)
+        self.failing_adds = set(failing_adds)
+
+    def query_resource_records(self, url_ending, record_class, **kwargs):
+        if url_ending == 'users':
+            return [UserRecord(luid, name, None, None, 'Viewer', None, None, None) for name, luid in USERS.items()]
+        return [GroupRecord(GROUP_LUID, 'Sales', None, None, None, None)]
+
+    def query_resource_pages(self, url_ending, **kwargs):
+        yield [ET.Element('user', id=luid) for luid in self.members]
+
+    def build_api_url(self, url_ending):
+        return 'http://server/api/3.5/sites/s/{}'.format(url_ending)
+
+    def send_add_request_in_thread(self, url, request):
+        user_luid = request.find('user').get('id')
+        if user_luid in self.failing_adds:
+            raise RecoverableHTTPException(403, '403011', user_luid)
+        self.members.add(user_luid)
+
+    def send_delete_request_in_thread(self, url):
+        user_luid = url.split('/')[-1]
+        if user_luid in self.failing_removes:
+            raise RecoverableHTTPException(403, '403011', user_luid)
+        if user_luid not in self.members:
+            return 0
+        self.members.remove(user_luid)
+        return 1
+
+
+def test_failed_removes_and_adds_are_reported_as_failed():
+    stub = StubRestApi([USERS['ann'], USERS['ben'], USERS['cat']], failing_removes=[USERS['ben']],
+                       failing_adds=[USERS['dan']])
+    result = GroupMembershipSync(stub, max_workers=2).sync_group_membership('Sales', ['ann', 'dan'])
+
+    assert result.removed == [USERS['cat']]
+    assert result.added == []
+    assert sorted(result.failed) == sorted([(USERS['ben'], 'remove', 403), (USERS['dan'], 'add', 403)])
+    assert stub.members == {USERS['ann'], USERS['ben']}
+    assert 'FAILED remove {}: HTTP 403'.format(USERS['ben']) in result.describe()
+
+
+def test_successful_sync():
+    stub = StubRestApi([USERS['ann'], USERS['ben']])
+    result = GroupMembershipSync(stub, max_workers=2).sync_group_membership('Sales', ['ann', 'cat'])
+    assert (result.added, result.removed, result.unchanged, result.failed) == ([USERS['cat']], [USERS['ben']], 1, [])
+    assert stub.members == {USERS['ann'], USERS['cat']}
@@ -0,0 +1,191 @@
+import asyncio
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from tableau_tools.tableau_rest_api import job_tracker
+from tableau_tools.tableau_rest_api.job_tracker import JobTracker
+from tableau_tools.tableau_rest_api.records import JobRecord
+from tableau_tools.tableau_rest_xml import TableauRestXml
+
+NS = TableauRestXml.ns_map['t']
+
+
+# Answers the jobs listing from listed and jobs/{id} from single, both set by the test between polls
+class StubRestApi:
+    def __init__(self, api_version='3.5'):
+        self.api_version = api_version
+        # job luid : JobRecord
+        self.listed = {}
+        # job luid : attributes of the <job> element
+        self.single = {}
+        self.listing_filters = []
+        self.single_requests = []
+
+    def list_job(self, luid, status, progress='0', created_at='2020-01-01T00:00:00Z'):
+        self.listed[luid] = JobRecord(luid, 'RefreshExtract', status, progress, None, None, None, created_at, None, None)
+
+    def query_resource_records(self, url_ending, record_class, filters=None, **kwargs):
+        assert url_ending == 'jobs'
+        self.listing_filters.append([f.get_filter_string() for f in filters])
+        return list(self.listed.values())
+
+    def query_resource_in_thread(self, url_ending):
+        job_luid = url_ending.split('/')[1]
+        self.single_requests.append(job_luid)
+        tsr = ET.Element('{{{}}}tsResponse'.format(NS))
+        ET.SubElement(tsr, '{{{}}}job'.format(NS), id=job_luid, **self.single.get(job_luid, {}))
+        return tsr
+
+
+# Stands in for the time module, so waits take no time and the timeouts are exact
+class FakeClock:
+    def __init__(self, on_sleep=None):
+        self.now = 0.0
+        self.sleeps = []
+        self.on_sleep = on_sleep
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        if self.on_sleep is not None:
+            self.on_sleep(self.now)
+
+
+@pytest.mark.parametrize('finish_code, status', [('0', 'Success'), ('1', 'Failed'), ('2', 'Cancelled'),
+                                                 ('9', 'Failed')])
+def test_finish_codes_become_statuses(finish_code, status):
+    t = StubRestApi(api_version='3.0')
+    tracker = JobTracker(t)
+    job = tracker.register('j1')
+
+    t.single['j1'] = {'startedAt': '2020-01-01T00:00:00Z'}
+    assert tracker.poll() == []
+    assert job.status == 'InProgress'
+
+    # A finishCode without completedAt isn't finished yet
+    t.single['j1'] = {'startedAt': '2020-01-01T00:00:00Z', 'finishCode': finish_code}
+    assert tracker.poll() == []
+    t.single['j1']['completedAt'] = '2020-01-01T00:01:30Z'
+    assert tracker.poll() == [job]
+    assert job.status == status
+    assert job.succeeded is (status == 'Success')
+    assert job.duration_seconds == 90
+    # Before API 3.1 there is no listing
+    assert t.listing_filters == []
+
+
+def test_jobs_missing_from_the_listing_are_requested_on_their_own():
+    t = StubRestApi()
+    tracker = JobTracker(t)
+    listed = ET.Element('{{{}}}job'.format(NS), id='listed', createdAt='2020-01-02T00:00:00Z')
+    tracker.register(listed)
+    tracker.register('unlisted')
+    tracker.register('done', label='already finished')
+    t.list_job('listed', 'InProgress')
+    t.list_job('done', 'Success')
+    t.single['unlisted'] = {'finishCode': '0', 'completedAt': '2020-01-02T00:00:00Z'}
+
+    completed = tracker.poll()
+
+    assert sorted(job.luid for job in completed) == ['done', 'unlisted']
+    assert t.single_requests == ['unlisted']
+    assert tracker.request_count == 2
+    # One listing from the earliest creation time being tracked
+    assert t.listing_filters == [['createdAt:gte:2020-01-02T00:00:00Z']]
+    assert tracker.jobs['listed'].status == 'InProgress'
+    assert tracker.get_pending() == [tracker.jobs['listed']]
+
+    # Finished jobs are left out of the next poll
+    t.single_requests = []
+    tracker.poll()
+    assert t.single_requests == []
+
+
+def test_interval_backs_off_until_a_job_changes():
+    t = StubRestApi()
+    tracker = JobTracker(t, min_interval=2.0, max_interval=5.0, backoff_factor=1.5)
+    tracker.register('j1')
+    t.list_job('j1', 'InProgress', progress='10')
+
+    tracker.poll()
+    assert tracker.interval == 2.0
+    tracker.poll()
+    assert tracker.interval == 3.0
+    tracker.poll()
+    assert tracker.interval == 4.5
+    tracker.poll()
+    assert tracker.interval == 5.0
+
+    t.list_job('j1', 'InProgress', progress='50')
+    tracker.poll()
+    assert tracker.interval == 2.0
+
+
+def test_callbacks_are_called_once():
+    t = StubRestApi()
+    tracker = JobTracker(t)
+    called = []
+    tracker.register('j1', callback=called.append)
+    t.list_job('j1', 'InProgress')
+    tracker.poll()
+    assert called == []
+
+    t.list_job('j1', 'Success')
+    tracker.poll()
+    tracker.poll()
+    assert called == [tracker.jobs['j1']]
+
+    # A callback added once the job is finished is called straight away, and only then
+    late = []
+    tracker.register('j1', callback=late.append)
+    tracker.poll()
+    assert late == [tracker.jobs['j1']]
+    assert called == [tracker.jobs['j1']]
+
+
+def test_wait_any_returns_once_one_job_finishes(monkeypatch):
+    t = StubRestApi()
+    clock = FakeClock(on_sleep=lambda now: t.list_job('j2', 'Success') if now >= 4 else None)
+    monkeypatch.setattr(job_tracker, 'time', clock)
+    tracker = JobTracker(t, min_interval=2.0, backoff_factor=1.0)
+    tracker.register_many(['j1', 'j2'])
+    t.list_job('j1', 'InProgress')
+    t.list_job('j2', 'InProgress')
+
+    assert tracker.wait_any(timeout=60) == [tracker.jobs['j2']]
+    assert clock.now == 4.0
+
+
+def test_wait_all_and_wait_any_stop_at_the_timeout(monkeypatch):
+    t = StubRestApi()
+    clock = FakeClock(on_sleep=lambda now: t.list_job('j1', 'Success') if now >= 4 else None)
+    monkeypatch.setattr(job_tracker, 'time', clock)
+    tracker = JobTracker(t, min_interval=3.0, backoff_factor=1.0)
+    tracker.register_many(['j1', 'j2'])
+    t.list_job('j1', 'InProgress')
+    t.list_job('j2', 'InProgress')
+
+    jobs = tracker.wait_all(timeout=10)
+    assert [(job.luid, job.is_complete) for job in jobs] == [('j1', True), ('j2', False)]
+    # Waits of 3, 3 and 3, then whatever is left of the timeout
+    assert clock.sleeps == [3.0, 3.0, 3.0, 1.0]
+    assert clock.now == 10.0
+
+    assert tracker.wait_any(['j2'], timeout=5) == []
+    assert clock.now == 15.0
+
+
+def test_async_waits_stop_at_the_timeout():
+    t = StubRestApi()
+    tracker = JobTracker(t, min_interval=0.01, backoff_factor=1.0)
+    tracker.register_many(['j1', 'j2'])
+    t.list_job('j1', 'Success')
+    t.list_job('j2', 'InProgress')
+
+    assert asyncio.run(tracker.wait_any_async(timeout=1)) == [tracker.jobs['j1']]
+    jobs = asyncio.run(tracker.wait_all_async(timeout=0.05))
+    assert [(job.luid, job.is_complete) for job in jobs] == [('j1', True), ('j2', False)]
@@ -0,0 +1,97 @@
+import os
+
+from tableau_tools.tableau_rest_api import lineage_graph
+from tableau_tools.tableau_rest_api.lineage_graph import LineageGraph
+
+NODES = {
+    'databases': [{'id': 'db1', 'luid': 'db1-luid', 'name': 'warehouse'}],
+    'database_tables': [{'id': 'orders', 'luid': 'orders-luid', 'name': 'ORDERS', 'database': {'id': 'db1'}},
+                        {'id': 'stores', 'luid': 'stores-luid', 'name': 'STORES', 'database': {'id': 'db1'}}],
+    'custom_sql_tables': [],
+    'columns': [{'id': 'orders.amount', 'name': 'AMOUNT', 'table': {'id': 'orders'}},
+                {'id': 'orders.notes', 'name': 'NOTES', 'table': {'id': 'orders'}},
+                {'id': 'stores.region', 'name': 'REGION', 'table': {'id': 'stores'}}],
+    'published_datasources': [{'id': 'pds', 'luid': 'pds-luid', 'name': 'Orders', 'upstreamTables': [{'id': 'orders'}],
+                               'fields': [{'upstreamColumns': [{'id': 'orders.amount'}]},
+                                          {'upstreamColumns': [{'id': 'orders.amount'}]}]}],
+    'embedded_datasources': [{'id': 'eds1', 'name': 'Orders', 'workbook': {'id': 'wb1'}, 'upstreamTables': [],
+                              'upstreamDatasources': [{'id': 'pds'}], 'fields': []},
+                             {'id': 'eds2', 'name': 'Stores', 'workbook': {'id': 'wb2'},
+                              'upstreamTables': [{'id': 'stores'}], 'upstreamDatasources': [],
+                              'fields': [{'upstreamColumns': [{'id': 'stores.region'}]}]}],
+    'workbooks': [{'id': 'wb1', 'luid': 'wb1-luid', 'name': 'Sales'}, {'id': 'wb2', 'luid': 'wb2-luid', 'name': 'Ops'}],
+    # The sheet arrives before its embedded data source would have, so its type has to be corrected later
+    'sheets': [{'id': 'sh1', 'luid': None, 'name': 'Overview', 'workbook': {'id': 'wb1'},
+                'upstreamDatasources': [{'id': 'eds1'}]}]
+}
+
+
+# Stands in for MetadataPager, handing back the nodes for each lineage query
+class StubPager:
+    def __init__(self, t_rest_api, page_size=100, max_workers=4, logger_obj=None):
+        self.request_count = 0
+        self.keys = []
+
+    def iterate_many_nodes(self, sub_queries):
+        sub_queries = sorted(sub_queries, key=lambda q: q.key != 'sheets')
+        for sub_query in sub_queries:
+            self.keys.append(sub_query.key)
+            self.request_count += 1
+            for node in NODES[sub_query.key]:
+                yield sub_query.key, node
+
+
+def build_graph(monkeypatch):
+    monkeypatch.setattr(lineage_graph, 'MetadataPager', StubPager)
+    graph = LineageGraph(t_rest_api=object())
+    graph.build()
+    return graph
+
+
+def ids(nodes):
+    return sorted([node.node_id for node in nodes])
+
+
+def test_build_loads_every_node(monkeypatch):
+    graph = build_graph(monkeypatch)
+    assert len(graph) == 12
+    assert graph.get_node('eds1').node_type == 'embedded_datasource'
+    assert graph.get_node('pds').luid == 'pds-luid'
+    assert graph.get_node_by_luid('wb2-luid').name == 'Ops'
+    assert graph.query_node_id('table', 'ORDERS') == 'orders'
+    # The two fields on the same column make one edge
+    assert ids(graph.get_downstream('orders.amount', max_depth=1)) == ['pds']
+
+
+def test_downstream_edges(monkeypatch):
+    graph = build_graph(monkeypatch)
+    assert ids(graph.get_downstream('db1', max_depth=1)) == ['orders', 'stores']
+    assert ids(graph.get_downstream('orders', max_depth=1)) == ['orders.amount', 'orders.notes', 'pds']
+    assert ids(graph.get_downstream('pds', max_depth=1)) == ['eds1']
+    assert ids(graph.get_downstream('eds1', max_depth=1)) == ['sh1', 'wb1']
+    assert ids(graph.get_downstream('sh1')) == ['wb1']
+    assert ids(graph.get_dependent_workbooks('orders.amount')) == ['wb1']
+    assert ids(graph.get_dependent_workbooks('stores.region')) == ['wb2']
+    assert graph.get_dependent_workbooks('orders.notes') == []
+
+
+def test_upstream_edges(monkeypatch):
+    graph = build_graph(monkeypatch)
+    assert ids(graph.get_upstream('sh1', max_depth=1)) == ['eds1']
+    assert ids(graph.get_upstream('sh1', node_types=['table', 'database'])) == ['db1', 'orders']
+    assert ids(graph.get_upstream('wb2')) == ['db1', 'eds2', 'stores', 'stores.region']
+    # Nearest first
+    assert [node.node_id for node in graph.get_upstream('pds')][0:2] in (['orders', 'orders.amount'],
+                                                                         ['orders.amount', 'orders'])
+
+
+def test_save_and_load(monkeypatch, tmp_path):
+    graph = build_graph(monkeypatch)
+    for filename in ('lineage.json', 'lineage.json.gz'):
+        path = os.path.join(str(tmp_path), filename)
+        graph.save(path)
+        loaded = LineageGraph.load(path)
+        assert len(loaded) == len(graph) and loaded.edge_count == graph.edge_count
+        for node_id in ('db1', 'orders.amount', 'sh1', 'wb2'):
+            assert loaded.get_downstream(node_id) == graph.get_downstream(node_id)
+            assert loaded.get_upstream(node_id) == graph.get_upstream(node_id)
@@ -0,0 +1,162 @@
+import random
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from tableau_tools import TableauServerRest35
+from tableau_tools.tableau_exceptions import NoMatchFoundException, AlreadyExistsException
+from stand_in_server import StandInServer
+
+USERNAMES = ['user{}'.format(i) for i in range(6)]
+GROUP_NAMES = ['group{}'.format(i) for i in range(5)]
+
+
+# Random creates, renames, deletes, site switches and sign-ins through tableau_tools, with every lookup checked
+# against the stand-in server, and the whole of both caches checked after every step. A stale cache entry shows up
+# as a LUID for something renamed, deleted or on the other site
+class CacheHarness:
+    def __init__(self, server, seed):
+        self.server = server
+        self.random = random.Random(seed)
+        self.t = TableauServerRest35('http://server', 'admin', 'password')
+        self.t.signin()
+
+    def users(self):
+        return self.server.names(self.t.site_luid, 'users')
+
+    def groups(self):
+        return self.server.names(self.t.site_luid, 'groups')
+
+    def new_name(self, names, existing):
+        free = [name for name in names if name not in existing]
+        return self.random.choice(free) if len(free) > 0 else None
+
+    def add_user(self):
+        name = self.random.choice(USERNAMES)
+        try:
+            luid = self.t.users.add_user_by_username(name, site_role='Viewer')
+            assert self.users()[name] == luid
+        except AlreadyExistsException as e:
+            assert self.users()[name] == e.existing_luid
+
+    def rename_user(self):
+        users = self.users()
+        new_name = self.new_name(USERNAMES, users)
+        if len(users) == 0 or new_name is None:
+            return
+        tsr = ET.Element('tsRequest')
+        ET.SubElement(tsr, 'user', name=new_name)
+        self.t.users.update_user(self.random.choice(sorted(users)), direct_xml_request=tsr)
+
+    def remove_user(self):
+        users = self.users()
+        if len(users) > 0:
+            self.t.users.remove_users_from_site(self.random.choice(sorted(users)))
+
+    def create_group(self):
+        name = self.new_name(GROUP_NAMES, self.groups())
+        if name is not None:
+            luid = self.t.groups.create_group(name)
+            assert self.groups()[name] == luid
+
+    def rename_group(self):
+        groups = self.groups()
+        new_name = self.new_name(GROUP_NAMES, groups)
+        if len(groups) > 0 and new_name is not None:
+            self.t.groups.update_group(self.random.choice(sorted(groups)), new_name)
+
+    def delete_group(self):
+        groups = self.groups()
+        if len(groups) > 0:
+            self.t.groups.delete_groups(self.random.choice(sorted(groups)))
+
+    def switch_site(self):
+        self.t.switch_site(self.random.choice(['', 'other']))
+
+    def signin(self):
+        self.t.signin()
+
+    def look_up_user(self):
+        name = self.random.choice(USERNAMES)
+        if name in self.users():
+            assert self.t.query_user_luid(name) == self.users()[name]
+        else:
+            with pytest.raises(NoMatchFoundException):
+                self.t.query_user_luid(name)
+
+    def look_up_username(self):
+        users = self.users()
+        if len(users) > 0:
+            name = self.random.choice(sorted(users))
+            assert self.t.users.query_username(users[name]) == name
+
+    def look_up_group(self):
+        name = self.random.choice(GROUP_NAMES)
+        if name in self.groups():
+            assert self.t.query_group_luid(name) == self.groups()[name]
+        else:
+            with pytest.raises(NoMatchFoundException):
+                self.t.query_group_luid(name)
+
+    def look_up_group_name(self):
+        groups = self.groups()
+        if len(groups) > 0:
+            name = self.random.choice(sorted(groups))
+            assert self.t.query_group_name(groups[name]) == name
+
+    def list_users(self):
+        assert sorted(user.name for user in self.t.users.query_users_records()) == sorted(self.users())
+
+    def list_groups(self):
+        assert sorted(group.name for group in self.t.groups.query_groups_records()) == sorted(self.groups())
+
+    def check_caches(self):
+        assert self.server.tokens[self.t.token] == self.t.site_luid
+        for name, luid in self.t.username_luid_cache.items():
+            assert self.users().get(name) == luid
+        for name, luid in self.t.group_name_luid_cache.items():
+            assert self.groups().get(name) == luid
+
+    def run(self, steps):
+        operations = [self.add_user, self.rename_user, self.remove_user, self.create_group, self.rename_group,
+                      self.delete_group, self.switch_site, self.signin, self.look_up_user, self.look_up_username,
+                      self.look_up_group, self.look_up_group_name, self.list_users, self.list_groups]
+        # Lookups and listings are what fill the caches, so they come up more often
+        weights = [3, 2, 2, 3, 2, 2, 1, 1, 4, 2, 4, 2, 1, 1]
+        for operation in self.random.choices(operations, weights=weights, k=steps):
+            operation()
+            self.check_caches()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_luid_caches_stay_consistent_with_the_server(monkeypatch, seed):
+    server = StandInServer(page_size=3)
+    server.install(monkeypatch)
+    for content_url in ('', 'other'):
+        site_luid = server.add_site(content_url)
+        # The same names on both sites, with different LUIDs
+        for name in USERNAMES[:3]:
+            server.add(site_luid, 'users', name=name, siteRole='Viewer')
+        for name in GROUP_NAMES[:2]:
+            server.add(site_luid, 'groups', name=name)
+    CacheHarness(server, seed).run(150)
+
+
+def test_listing_users_or_groups_fills_the_luid_caches(monkeypatch):
+    server = StandInServer(page_size=3)
+    server.install(monkeypatch)
+    site_luid = server.add_site('')
+    for name in USERNAMES:
+        server.add(site_luid, 'users', name=name, siteRole='Viewer')
+    for name in GROUP_NAMES:
+        server.add(site_luid, 'groups', name=name)
+    t = TableauServerRest35('http://server', 'admin', 'password')
+    t.signin()
+
+    t.users.query_users_records()
+    t.groups.query_groups_records()
+    requests = len(server.log)
+    assert [t.query_user_luid(name) for name in USERNAMES] == [server.names(site_luid, 'users')[n] for n in USERNAMES]
+    assert [t.query_group_luid(name) for name in GROUP_NAMES] == \
+        [server.names(site_luid, 'groups')[n] for n in GROUP_NAMES]
+    assert len(server.log) == requests
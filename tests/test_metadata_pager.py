@@ -0,0 +1,73 @@
+import json
+
+from tableau_tools import TableauServerRest36
+from tableau_tools.tableau_rest_api import MetadataPager, MetadataSubQuery
+from tableau_tools.tableau_rest_api.rest_json_request import RestJsonRequest
+
+from test_rest_json_request import CapturingAdapter
+
+QUERY = '''query tables($first: Int, $after: String) {
+  tablesConnection(first: $first, after: $after) { nodes { id } pageInfo { hasNextPage endCursor } } }'''
+
+
+# Answers each page from the cursor in the request body
+class PagingAdapter(CapturingAdapter):
+    def __init__(self, node_count):
+        super().__init__(None)
+        self.node_count = node_count
+
+    def send(self, request, **kwargs):
+        variables = json.loads(request.body)['variables']
+        start = int(variables['after'] or 0)
+        end = min(start + variables['first'], self.node_count)
+        self.response_body = {'data': {'tablesConnection': {
+            'nodes': [{'id': 't{}'.format(i)} for i in range(start, end)],
+            'pageInfo': {'hasNextPage': end < self.node_count, 'endCursor': str(end)}}}}
+        return super().send(request, **kwargs)
+
+
+def make_connection(adapter):
+    t = TableauServerRest36('http://server', 'user', 'password')
+    base = t.rest_api_base
+    base.token = 'token'
+    base.site_luid = 'site'
+
+    # Every pool thread gets its own request object, all going to the same adapter
+    def get_thread_request_json_obj():
+        request_json_obj = RestJsonRequest(token='token')
+        request_json_obj.session.mount('http://', adapter)
+        return request_json_obj
+    base._get_thread_request_json_obj = get_thread_request_json_obj
+    return t
+
+
+def test_pages_are_sent_as_graphql_json():
+    adapter = PagingAdapter(12)
+    t = make_connection(adapter)
+    nodes = list(t.metadata.query_graphql_nodes(QUERY, page_size=5))
+
+    assert [node['id'] for node in nodes] == ['t{}'.format(i) for i in range(12)]
+    assert len(adapter.requests) == 3
+    for sent in adapter.requests:
+        assert sent.url == 'http://server/api/metadata/graphql'
+        assert sent.headers['Content-Type'] == 'application/json'
+    bodies = [json.loads(sent.body) for sent in adapter.requests]
+    assert bodies[0]['query'] == QUERY
+    assert [body['variables'] for body in bodies] == [{'first': 5, 'after': None}, {'first': 5, 'after': '5'},
+                                                      {'first': 5, 'after': '10'}]
+
+
+def test_extra_variables_are_kept():
+    adapter = PagingAdapter(3)
+    t = make_connection(adapter)
+    pager = MetadataPager(t.rest_api_base, page_size=10)
+    list(pager.iterate_nodes(QUERY, variables={'projectName': 'Finance'}))
+    assert json.loads(adapter.requests[0].body)['variables'] == {'projectName': 'Finance', 'first': 10,
+                                                                 'after': None}
+
+
+def test_many_queries_are_paged_through():
+    t = make_connection(PagingAdapter(7))
+    pager = MetadataPager(t.rest_api_base, page_size=3, max_workers=2)
+    results = pager.query_many_nodes([MetadataSubQuery('a', QUERY), MetadataSubQuery('b', QUERY)])
+    assert len(results['a']) == 7 and len(results['b']) == 7
@@ -0,0 +1,119 @@
+import copy
+import random
+
+import pytest
+
+from tableau_tools.tableau_exceptions import InvalidOptionException
+from tableau_tools.tableau_rest_api.permissions import *
+
+# The Allow capabilities for each role, as the dict-based Permissions (before the bitmasks) set them. No role Denies
+# anything, and everything else is None
+WORKBOOK_VIEWER = ['AddComment', 'ExportData', 'ExportImage', 'Read', 'ViewComments']
+WORKBOOK_INTERACTOR = WORKBOOK_VIEWER + ['Filter', 'ShareView', 'ViewUnderlyingData', 'WebAuthoring']
+WORKBOOK_EDITOR = WORKBOOK_INTERACTOR + ['ChangeHierarchy', 'ChangePermissions', 'Delete', 'ExportXml', 'Write']
+BASELINE_ROLES = {
+    WorkbookPermissions: {'Viewer': WORKBOOK_VIEWER, 'Interactor': WORKBOOK_INTERACTOR, 'Editor': WORKBOOK_EDITOR},
+    WorkbookPermissions28: {'Viewer': WORKBOOK_VIEWER, 'Interactor': WORKBOOK_INTERACTOR, 'Editor': WORKBOOK_EDITOR},
+    ProjectPermissions: {'Viewer': ['Read'], 'Publisher': ['Read', 'Write'], 'Project Leader': ['ProjectLeader']},
+    ProjectPermissions28: {'Viewer': ['Read'], 'Publisher': ['Read', 'Write'], 'Project Leader': ['ProjectLeader']},
+    DatasourcePermissions: {'Connector': ['Connect', 'Read'],
+                            'Editor': ['ChangePermissions', 'Connect', 'Delete', 'ExportXml', 'Read', 'Write']},
+    DatasourcePermissions28: {'Connector': ['Connect', 'Read'],
+                              'Editor': ['ChangePermissions', 'Connect', 'Delete', 'ExportXml', 'Read', 'Write']},
+}
+ROLE_CASES = [(cls, role) for cls in BASELINE_ROLES for role in BASELINE_ROLES[cls]]
+
+
+@pytest.mark.parametrize('permissions_class, role', ROLE_CASES)
+def test_role_dicts_match_the_dict_based_permissions(permissions_class, role):
+    perms = permissions_class('group', 'g1')
+    # Start from something else, since setting a role replaces everything
+    perms.set_all_to_deny()
+    perms.set_capabilities_to_match_role(role)
+
+    expected = {cap: 'Allow' if cap in BASELINE_ROLES[permissions_class][role] else None
+                for cap in permissions_class.default_capabilities}
+    assert perms.capabilities == expected
+    assert list(perms.capabilities.keys()) == list(permissions_class.default_capabilities)
+    assert perms.matches_role(role)
+    assert perms.allow_mask == Permissions.get_capabilities_mask(BASELINE_ROLES[permissions_class][role])
+    assert perms.deny_mask == 0
+
+
+@pytest.mark.parametrize('permissions_class', [WorkbookPermissions28, ProjectPermissions28, DatasourcePermissions28,
+                                               FlowPermissions33])
+def test_set_and_get_capability_behave_like_a_dict(permissions_class):
+    rng = random.Random(permissions_class.__name__)
+    perms = permissions_class('user', 'u1')
+    # What the old per-object dict did: start with every capability None, translate Server names, store the mode
+    expected = {cap: None for cap in permissions_class.default_capabilities}
+    server_names = {rest: server for server, rest in Permissions.server_to_rest_capability_map.items()
+                    if rest in expected and server != rest}
+    for i in range(200):
+        # InheritedProjectLeader is read-only (see below)
+        rest_name = rng.choice(sorted([cap for cap in expected if cap != 'InheritedProjectLeader']))
+        mode = rng.choice(['Allow', 'Deny', None])
+        name = server_names[rest_name] if rest_name in server_names and rng.random() < 0.5 else rest_name
+        perms.set_capability(name, mode)
+        expected[rest_name] = mode
+        assert perms.get_capability(name) == mode
+        assert perms.capabilities == expected
+    assert perms.get_capabilities_dict() == expected
+
+
+def test_capability_bits_are_distinct_single_bits():
+    bits = list(Permissions.capability_bits.values())
+    assert len(set(bits)) == len(bits)
+    assert all(bit > 0 and bit & (bit - 1) == 0 for bit in bits)
+    assert Permissions.get_capability_names_from_mask(Permissions.get_capabilities_mask(['Write', 'Read'])) == \
+        [name for name in Permissions.capability_names if name in ('Read', 'Write')]
+
+
+def test_inherited_project_leader_is_read_only():
+    assert Permissions.read_only_mask == Permissions.capability_bits['InheritedProjectLeader']
+    perms = ProjectPermissions28('user', 'u1')
+    perms.set_capability('InheritedProjectLeader', 'Allow')
+    assert perms.get_capability('InheritedProjectLeader') is None
+    # Only what is read from the server sets it, and nothing else touches it afterwards
+    perms._set_capability_from_published_content('InheritedProjectLeader', 'Allow')
+    perms.set_all_to_unspecified()
+    perms.set_capabilities_to_match_role('Publisher')
+    assert perms.get_capability('InheritedProjectLeader') == 'Allow'
+    assert perms.matches_role('Publisher')
+    assert perms.get_fingerprint_items() == [('user', 'u1', 'Read', 'Allow'), ('user', 'u1', 'Write', 'Allow')]
+
+
+def test_diff_capabilities():
+    current = WorkbookPermissions28('user', 'u1')
+    current.set_capability('Read', 'Allow')
+    current.set_capability('Filter', 'Deny')
+    current.set_capability('Write', 'Allow')
+    new = WorkbookPermissions28('user', 'u1')
+    new.set_capability('Read', 'Allow')
+    new.set_capability('Filter', 'Allow')
+    new.set_capability('Delete', 'Deny')
+
+    delete_allow, delete_deny, add_allow, add_deny = new.diff_capabilities(current)
+    assert Permissions.get_capability_names_from_mask(delete_allow) == ['Write']
+    assert Permissions.get_capability_names_from_mask(delete_deny) == ['Filter']
+    assert Permissions.get_capability_names_from_mask(add_allow) == ['Filter']
+    assert Permissions.get_capability_names_from_mask(add_deny) == ['Delete']
+    assert new.diff_capabilities(None) == (0, 0, new.allow_mask, new.deny_mask)
+    assert new.diff_capabilities(new) == (0, 0, 0, 0)
+
+
+def test_capabilities_dict_is_read_only():
+    perms = WorkbookPermissions28('user', 'u1')
+    perms.set_capability('Read', 'Allow')
+    with pytest.raises(InvalidOptionException):
+        perms.capabilities['Filter'] = 'Allow'
+    with pytest.raises(InvalidOptionException):
+        perms.get_capabilities_dict().update({'Filter': 'Allow'})
+    assert perms.get_capability('Filter') is None
+
+    for caps in (dict(perms.capabilities), perms.capabilities.copy(), copy.deepcopy(perms.capabilities)):
+        assert type(caps) is dict
+        caps['Filter'] = 'Allow'
+    # Assigning a whole dict still works
+    perms.capabilities = {'Filter': 'Deny'}
+    assert perms.get_capability('Filter') == 'Deny' and perms.get_capability('Read') is None
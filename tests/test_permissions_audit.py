@@ -0,0 +1,31 @@
+import pytest
+
+from tableau_tools.tableau_rest_api.permissions_audit import PermissionsAudit
+from tableau_tools.tableau_rest_api.records import ProjectRecord
+
+
+# Lists one project and nothing else
+class StubRestApi:
+    site_content_url = 'site'
+
+    def __init__(self, api_version):
+        self.api_version = api_version
+
+    def query_resource_records(self, url_ending, record_class, **kwargs):
+        if url_ending == 'projects':
+            return [ProjectRecord('p1', 'Sales', None, None, None, 'ManagedByOwner', None, None)]
+        return []
+
+
+@pytest.mark.parametrize('api_version, has_default_flow', [('3.2', False), ('3.3', True), ('3.6', True)])
+def test_default_flow_permissions_are_audited_from_api_3_3(api_version, has_default_flow):
+    audit = PermissionsAudit([StubRestApi(api_version)], content_types=['project'])
+    audit.prefetch()
+    url_endings = {target.content_type: target.url_ending for target in audit.sites[0].targets}
+
+    assert url_endings['default_workbook'] == 'projects/p1/default-permissions/workbooks'
+    assert url_endings['default_datasource'] == 'projects/p1/default-permissions/datasources'
+    if has_default_flow:
+        assert url_endings['default_flow'] == 'projects/p1/default-permissions/flows'
+    else:
+        assert 'default_flow' not in url_endings
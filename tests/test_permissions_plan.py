@@ -0,0 +1,173 @@
+import pytest
+
+from tableau_tools import TableauServerRest35
+from tableau_tools.tableau_exceptions import RecoverableHTTPException
+from stand_in_server import StandInServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = StandInServer(page_size=100)
+    server.install(monkeypatch)
+    site_luid = server.add_site('')
+    server.add(site_luid, 'users', name='ann', siteRole='Viewer')
+    server.add(site_luid, 'groups', name='Sales')
+    server.add(site_luid, 'workbooks', name='wb')
+    return server
+
+
+@pytest.fixture
+def t(server):
+    t = TableauServerRest35('http://server', 'admin', 'password', site_content_url='')
+    t.signin()
+    return t
+
+
+def workbook(server, t):
+    wb_luid = server.names(t.site_luid, 'workbooks')['wb']
+    return t.workbooks.get_published_workbook_object(wb_luid)
+
+
+def grants(server, t, wb):
+    return server.permissions.get((t.site_luid, 'workbooks/{}/permissions'.format(wb.luid)), {})
+
+
+def user_perms(wb, capabilities):
+    perms = wb.get_permissions_obj(username_or_luid='ann')
+    for cap, mode in capabilities.items():
+        perms.set_capability(cap, mode)
+    return perms
+
+
+def test_delete_helper_only_treats_not_found_as_done(server, t):
+    url = t.build_api_url('workbooks/missing/permissions/users/u/Read/Allow')
+    path = 'workbooks/missing/permissions/users/u/Read/Allow'
+    server.refuse[('DELETE', path)] = (404, '404002')
+    assert t.send_delete_request_in_thread(url) == 0
+    server.refuse[('DELETE', path)] = (403, '403004')
+    with pytest.raises(RecoverableHTTPException):
+        t.send_delete_request_in_thread(url)
+
+
+def test_refused_delete_is_recorded_and_blocks_the_put(server, t):
+    wb = workbook(server, t)
+    wb.set_permissions([user_perms(wb, {'Read': 'Deny'})])
+    ann = ('user', server.names(t.site_luid, 'users')['ann'])
+    server.refuse[('DELETE', 'workbooks/{}/permissions/users/{}/Read/Deny'.format(wb.luid, ann[1]))] = \
+        (403, '403004')
+
+    puts = len([r for r in server.log if r[0] == 'PUT'])
+    plan = wb.set_permissions([user_perms(wb, {'Read': 'Allow', 'Filter': 'Allow'})])
+
+    assert plan.succeeded is False
+    assert ('DELETE', 'user', ann[1], 'Read', 'Deny', 403) in plan.failed
+    assert ('PUT', 'user', ann[1], 'Filter', 'Allow', None) in plan.failed
+    assert len([r for r in server.log if r[0] == 'PUT']) == puts
+    assert grants(server, t, wb) == {ann: {'Read': 'Deny'}}
+    # The local copy still matches the server
+    assert wb.get_permissions_obj_list()[0].get_capability('Read') == 'Deny'
+    assert wb.get_permissions_obj_list()[0].get_capability('Filter') is None
+    assert any(line.startswith('FAILED DELETE user') for line in plan.describe())
+
+
+def test_refused_deletes_are_collected_when_clearing(server, t):
+    wb = workbook(server, t)
+    wb.set_permissions([user_perms(wb, {'Read': 'Allow', 'Filter': 'Allow'})])
+    ann = ('user', server.names(t.site_luid, 'users')['ann'])
+    server.refuse[('DELETE', 'workbooks/{}/permissions/users/{}/Filter/Allow'.format(wb.luid, ann[1]))] = \
+        (403, '403004')
+
+    plans = wb.clear_all_permissions()
+
+    assert plans[0].failed == [('DELETE', 'user', ann[1], 'Filter', 'Allow', 403)]
+    assert grants(server, t, wb) == {ann: {'Filter': 'Allow'}}
+    assert [(p.luid, p.get_capability('Read'), p.get_capability('Filter'))
+            for p in wb.get_permissions_obj_list()] == [(ann[1], None, 'Allow')]
+
+
+def requests_since(server, start):
+    return [(method, path.split('/permissions')[-1]) for method, path in server.log[start:] if '/permissions' in path
+            and method != 'GET']
+
+
+def matches_server(server, t, wb):
+    fresh = workbook(server, t)
+    fresh.get_permissions_from_server()
+    return wb.permissions_match(fresh.get_permissions_obj_list())
+
+
+def test_mode_flip_deletes_before_the_put(server, t):
+    wb = workbook(server, t)
+    wb.set_permissions([user_perms(wb, {'Read': 'Allow', 'Filter': 'Allow', 'ExportData': 'Deny'})])
+    ann = server.names(t.site_luid, 'users')['ann']
+
+    new_perms = [user_perms(wb, {'Read': 'Deny', 'Filter': 'Allow', 'ExportData': 'Allow', 'ExportImage': 'Allow'})]
+    plan = wb.plan_permissions(new_perms)
+    assert sorted(plan.deletions) == [('user', ann, 'ExportData', 'Deny'), ('user', ann, 'Read', 'Allow')]
+    assert plan.additions == {('user', ann): {'Read': 'Deny', 'ExportData': 'Allow', 'ExportImage': 'Allow'}}
+    assert plan.call_count == 3
+
+    start = len(server.log)
+    wb.apply_permissions_plan(plan)
+    sent = requests_since(server, start)
+    assert sorted(sent[:2]) == [('DELETE', '/users/{}/ExportData/Deny'.format(ann)),
+                                ('DELETE', '/users/{}/Read/Allow'.format(ann))]
+    assert sent[2:] == [('PUT', '')]
+    assert plan.succeeded is True
+    assert grants(server, t, wb) == {('user', ann): {'Read': 'Deny', 'Filter': 'Allow', 'ExportData': 'Allow',
+                                                     'ExportImage': 'Allow'}}
+    assert matches_server(server, t, wb)
+
+
+def test_unsetting_a_capability_is_only_a_delete(server, t):
+    wb = workbook(server, t)
+    wb.set_permissions([user_perms(wb, {'Read': 'Allow', 'Filter': 'Allow'})])
+    ann = server.names(t.site_luid, 'users')['ann']
+
+    start = len(server.log)
+    plan = wb.set_permissions([user_perms(wb, {'Read': 'Allow'})])
+
+    assert plan.deletions == [('user', ann, 'Filter', 'Allow')]
+    assert plan.additions == {}
+    assert requests_since(server, start) == [('DELETE', '/users/{}/Filter/Allow'.format(ann))]
+    assert grants(server, t, wb) == {('user', ann): {'Read': 'Allow'}}
+    assert matches_server(server, t, wb)
+
+
+def test_matching_grantees_are_unchanged(server, t):
+    wb = workbook(server, t)
+    wb.set_permissions([user_perms(wb, {'Read': 'Allow'})])
+    ann = server.names(t.site_luid, 'users')['ann']
+    sales = wb.get_permissions_obj(group_name_or_luid='Sales')
+    sales.set_capability('Read', 'Allow')
+
+    plan = wb.plan_permissions([user_perms(wb, {'Read': 'Allow'}), sales])
+    assert plan.unchanged == [('user', ann)]
+    assert plan.deletions == []
+    assert plan.call_count == 1
+
+    start = len(server.log)
+    assert wb.set_permissions([user_perms(wb, {'Read': 'Allow'})]).is_empty()
+    assert requests_since(server, start) == []
+
+
+def test_replace_removes_grantees_not_in_the_list(server, t):
+    wb = workbook(server, t)
+    sales = wb.get_permissions_obj(group_name_or_luid='Sales')
+    sales.set_capability('Read', 'Allow')
+    wb.set_permissions([user_perms(wb, {'Read': 'Allow', 'Filter': 'Deny'}), sales])
+    ann = server.names(t.site_luid, 'users')['ann']
+    sales_luid = server.names(t.site_luid, 'groups')['Sales']
+
+    # Without replace, ann is left alone
+    assert wb.plan_permissions([sales]).is_empty()
+
+    plan = wb.plan_permissions([sales], replace=True)
+    assert sorted(plan.deletions) == [('user', ann, 'Filter', 'Deny'), ('user', ann, 'Read', 'Allow')]
+    assert plan.unchanged == [('group', sales_luid)]
+    assert plan.call_count == 2
+
+    wb.apply_permissions_plan(plan)
+    assert grants(server, t, wb) == {('group', sales_luid): {'Read': 'Allow'}}
+    assert [(p.group_or_user, p.luid) for p in wb.get_permissions_obj_list()] == [('group', sales_luid)]
+    assert matches_server(server, t, wb)
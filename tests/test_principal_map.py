@@ -0,0 +1,92 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from tableau_tools import TableauServerRest35
+from tableau_tools.tableau_rest_api.principal_map import PrincipalMap
+from tableau_tools.tableau_rest_api.published_content import Workbook
+from tableau_tools.tableau_rest_api.records import UserRecord
+from stand_in_server import StandInServer
+
+USERNAMES = ['ann', 'ben']
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = StandInServer(page_size=100)
+    server.install(monkeypatch)
+    for content_url in ('', 'other'):
+        site_luid = server.add_site(content_url)
+        for name in USERNAMES:
+            server.add(site_luid, 'users', name=name, siteRole='Viewer')
+        server.add(site_luid, 'groups', name='Sales')
+    return server
+
+
+def permissions_request(user_luid):
+    tsr = ET.Element('tsRequest')
+    p = ET.SubElement(tsr, 'permissions')
+    gcap = ET.SubElement(p, 'granteeCapabilities')
+    ET.SubElement(gcap, 'user', id=user_luid)
+    return tsr
+
+
+def listings(server):
+    return len([r for r in server.log if r[0] == 'GET' and r[1].split('/')[-1] in ('users', 'groups')])
+
+
+def test_principal_map_is_built_once_per_site_pair(server):
+    orig = TableauServerRest35('http://server', 'admin', 'password', site_content_url='')
+    orig.signin()
+    dest = TableauServerRest35('http://server', 'admin', 'password', site_content_url='other')
+    dest.signin()
+    orig_users = server.names(orig.site_luid, 'users')
+    dest_users = server.names(dest.site_luid, 'users')
+    workbook = Workbook('wb', dest)
+
+    for name in USERNAMES:
+        converted = workbook.convert_permissions_xml_object_from_orig_site_to_current_site(
+            permissions_request(orig_users[name]), orig)
+        assert converted.find('.//user').get('id') == dest_users[name]
+    # Both sites' users and groups, listed once for both calls
+    assert listings(server) == 4
+    assert dest.get_principal_map(orig) is dest.get_principal_map(orig)
+    assert dest.get_principal_map(orig, username_map={'ann': 'ben'}) is not dest.get_principal_map(orig)
+
+    # A new session starts a new map
+    first_map = dest.get_principal_map(orig)
+    dest.signin()
+    assert dest.get_principal_map(orig) is not first_map
+
+
+# Lists the given users, and no groups
+class StubRestApi:
+    server = 'http://server'
+
+    def __init__(self, site_content_url, users):
+        self.site_content_url = site_content_url
+        self.users = [UserRecord(luid, name, None, None, 'Viewer', None, None, domain_name)
+                      for luid, name, domain_name in users]
+
+    def query_resource_records(self, url_ending, record_class, **kwargs):
+        return self.users if url_ending == 'users' else []
+
+
+def test_users_with_the_same_name_are_matched_within_their_domain():
+    orig = StubRestApi('', [('o1', 'ann', 'local'), ('o2', 'ann', 'CORP'), ('o3', 'ben', 'local'),
+                            ('o4', 'cat', 'OTHER'), ('o5', 'dan', 'local')])
+    dest = StubRestApi('other', [('d1', 'ann', 'CORP'), ('d2', 'ann', 'local'), ('d3', 'ben', 'CORP'),
+                                 ('d4', 'cat', 'local'), ('d5', 'cat', 'CORP')])
+    principal_map = PrincipalMap(orig, dest)
+
+    assert principal_map.get_dest_luid('user', 'o1') == 'd2'
+    assert principal_map.get_dest_luid('user', 'o2') == 'd1'
+    # No ben in local on the destination, but only one ben at all
+    assert principal_map.get_dest_luid('user', 'o3') == 'd3'
+    # Two cats, neither in OTHER, so there is no telling which one it is
+    assert principal_map.get_dest_luid('user', 'o4') is None
+    assert sorted(principal_map.get_unmapped()) == [('user', 'o4', 'cat'), ('user', 'o5', 'dan')]
+
+    # username_map names are looked up the same way
+    renamed = PrincipalMap(orig, dest, username_map={'ann': 'cat', 'ben': 'ann'})
+    assert [renamed.get_dest_luid('user', luid) for luid in ('o1', 'o2', 'o3')] == ['d4', 'd5', 'd2']
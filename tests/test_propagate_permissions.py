@@ -0,0 +1,55 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from tableau_tools import TableauServerRest32, TableauServerRest35
+from tableau_tools.tableau_exceptions import InvalidOptionException
+from tableau_tools.tableau_rest_api.published_content import Project28
+from stand_in_server import StandInServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = StandInServer(page_size=100)
+    server.install(monkeypatch)
+    site_luid = server.add_site('')
+    server.add(site_luid, 'groups', name='Sales')
+    project_luid = server.add(site_luid, 'projects', name='Finance', contentPermissions='ManagedByOwner')
+    for name in ('refused', 'broken', 'fine'):
+        server.add(site_luid, 'workbooks', name=name, children=[('project', project_luid)])
+    return server
+
+
+def project(server, t):
+    project_luid = server.names(t.site_luid, 'projects')['Finance']
+    return Project28(project_luid, t, content_xml_obj=ET.Element('project', id=project_luid,
+                                                                 contentPermissions='ManagedByOwner'))
+
+
+def test_every_failure_is_reported_and_the_rest_carry_on(server):
+    t = TableauServerRest35('http://server', 'admin', 'password', site_content_url='')
+    t.signin()
+    workbooks = server.names(t.site_luid, 'workbooks')
+    server.refuse[('PUT', 'workbooks/{}/permissions'.format(workbooks['refused']))] = (403, '403004')
+    # Not a RecoverableHTTPException
+    server.refuse[('GET', 'workbooks/{}/permissions'.format(workbooks['broken']))] = (500, '500000')
+    proj = project(server, t)
+    viewers = proj.create_workbook_permissions_object_for_group('Sales', role='Viewer')
+
+    report = proj.propagate_permissions({'workbook': [viewers]}, scope='project', max_workers=3)
+
+    failed = {luid: (http_code, error) for obj_type, luid, default, http_code, error in report.failed}
+    assert failed[workbooks['refused']] == (403, 'HTTP 403')
+    assert failed[workbooks['broken']][0] is None
+    assert [plan.luid for plan in report.changed] == [workbooks['fine']]
+    assert (t.site_luid, 'workbooks/{}/permissions'.format(workbooks['fine'])) in server.permissions
+    assert len(report.describe()) == 3
+
+
+@pytest.mark.parametrize('target', ['flow', 'default_flow'])
+def test_flow_targets_need_api_3_3(server, target):
+    t = TableauServerRest32('http://server', 'admin', 'password', site_content_url='')
+    t.signin()
+    proj = project(server, t)
+    with pytest.raises(InvalidOptionException):
+        proj.propagate_permissions({target: []}, scope='project')
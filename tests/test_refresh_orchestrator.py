@@ -0,0 +1,39 @@
+import uuid
+
+from tableau_tools.tableau_exceptions import RecoverableHTTPException
+from tableau_tools.tableau_rest_api import refresh_orchestrator
+from tableau_tools.tableau_rest_api.refresh_orchestrator import ExtractRefreshOrchestrator, RefreshTarget
+
+
+# Every refresh launch is turned down with a 409, as when someone else already has one queued
+class RejectingRestApi:
+    api_version = '3.5'
+
+    def __init__(self, events):
+        self.events = events
+
+    def build_api_url(self, url_ending):
+        return 'http://server/api/3.5/sites/s/{}'.format(url_ending)
+
+    def send_add_request_in_thread(self, url, request):
+        self.events.append('launch')
+        raise RecoverableHTTPException(409, '409093', None)
+
+
+def test_failed_launches_are_retried_after_a_backed_off_wait(monkeypatch):
+    events = []
+    monkeypatch.setattr(refresh_orchestrator.time, 'sleep', lambda seconds: events.append(seconds))
+    t = RejectingRestApi(events)
+    orchestrator = ExtractRefreshOrchestrator(t, max_retries=3, min_interval=1.0, max_interval=60.0)
+    target = orchestrator._add_target(RefreshTarget('workbook', str(uuid.uuid4())))
+    report = orchestrator.run()
+
+    assert events.count('launch') == 4
+    assert target.status == 'Failed'
+    assert target.launch_errors == [409, 409, 409, 409]
+    assert report.failed == [target]
+    # A wait before every retry, each longer than the last
+    launches = [i for i, event in enumerate(events) if event == 'launch']
+    assert all(isinstance(events[i + 1], float) for i in launches[:-1])
+    waits = [event for event in events if event != 'launch']
+    assert waits == sorted(waits) and waits[0] < waits[-1]
@@ -0,0 +1,60 @@
+import json
+
+import requests
+from requests.adapters import BaseAdapter
+
+from tableau_tools.tableau_rest_api.rest_json_request import RestJsonRequest
+
+
+# Captures the prepared request instead of sending it, and answers with a canned JSON body
+class CapturingAdapter(BaseAdapter):
+    def __init__(self, response_body):
+        super().__init__()
+        self.response_body = response_body
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(self.response_body).encode('utf-8')
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def make_request_obj(response_body):
+    request_obj = RestJsonRequest(token='token')
+    adapter = CapturingAdapter(response_body)
+    request_obj.session.mount('http://', adapter)
+    return request_obj, adapter
+
+
+def test_post_sends_json_body():
+    request_obj, adapter = make_request_obj({'data': {}})
+    request_obj.http_verb = 'post'
+    request_obj.url = 'http://server/api/metadata/graphql'
+    request_obj.json_request = {'query': 'query q($first: Int, $after: String) { x }',
+                                'variables': {'first': 100, 'after': None}}
+    request_obj.request_from_api(0)
+
+    sent = adapter.requests[0]
+    assert sent.method == 'POST'
+    assert sent.headers['Content-Type'] == 'application/json'
+    body = json.loads(sent.body)
+    assert body['query'] == 'query q($first: Int, $after: String) { x }'
+    assert body['variables'] == {'first': 100, 'after': None}
+    assert request_obj.get_response() == {'data': {}}
+
+
+def test_put_sends_json_body_from_string():
+    request_obj, adapter = make_request_obj({})
+    request_obj.http_verb = 'put'
+    request_obj.url = 'http://server/api/3.6/sites/s/webhooks/1'
+    request_obj.json_request = '{"webhook": {"name": "hook"}}'
+    request_obj.request_from_api(0)
+    assert json.loads(adapter.requests[0].body) == {'webhook': {'name': 'hook'}}
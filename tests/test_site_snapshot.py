@@ -0,0 +1,82 @@
+import xml.etree.ElementTree as ET
+
+from tableau_tools.tableau_rest_api.site_snapshot import SiteSnapshot
+from tableau_tools.tableau_rest_api.records import GroupRecord, ViewRecord, WorkbookRecord
+
+
+# Serves the groups and their members, workbooks and views from dicts, and records which groups had their members
+# listed and the filters on each listing. Like the server, an updatedAt filter only passes what changed since
+class StubRestApi:
+    site_luid = 'site1'
+    site_content_url = 'site'
+
+    def __init__(self):
+        self.groups = {}
+        self.members = {}
+        self.member_listings = []
+        self.records = {'workbooks': {}, 'views': {}}
+        self.listing_filters = []
+
+    def set_group(self, luid, members, user_count=True):
+        self.members[luid] = members
+        self.groups[luid] = GroupRecord(luid, luid, 'local', None, len(members) if user_count else None, None)
+
+    def query_resource_records(self, url_ending, record_class, filters=None, **kwargs):
+        if url_ending == 'groups':
+            return list(self.groups.values())
+        records = list(self.records.get(url_ending, {}).values())
+        self.listing_filters.append((url_ending, [f.get_filter_string() for f in filters or []]))
+        for f in filters or []:
+            records = [r for r in records if r.updated_at >= f.values[0]]
+        return records
+
+    def query_resource_pages(self, url_ending, **kwargs):
+        if url_ending in self.records:
+            yield [ET.Element(url_ending[:-1], id=luid) for luid in self.records[url_ending]]
+            return
+        group_luid = url_ending.split('/')[1]
+        self.member_listings.append(group_luid)
+        yield [ET.Element('user', id=user_luid) for user_luid in self.members[group_luid]]
+
+
+def test_refresh_lists_members_of_new_and_changed_groups_only():
+    t = StubRestApi()
+    t.set_group('g1', ['u1', 'u2'])
+    t.set_group('g2', ['u1'])
+    t.set_group('g3', ['u3'])
+    t.set_group('no_count', ['u2'], user_count=False)
+    snapshot = SiteSnapshot(t)
+    snapshot.build(content_types=['group'])
+    assert sorted(t.member_listings) == ['g1', 'g2', 'g3', 'no_count']
+
+    t.member_listings = []
+    t.set_group('g2', ['u1', 'u3'])
+    t.set_group('g4', ['u2'])
+    del t.groups['g3']
+    snapshot.refresh()
+
+    assert sorted(t.member_listings) == ['g2', 'g4', 'no_count']
+    assert snapshot.group_members == {'g1': ['u1', 'u2'], 'g2': ['u1', 'u3'], 'g4': ['u2'], 'no_count': ['u2']}
+    assert sorted(snapshot.user_groups['u1']) == ['g1', 'g2']
+    assert snapshot.user_groups['u3'] == ['g2']
+
+
+def test_refresh_lists_views_in_full_for_their_usage_counts():
+    t = StubRestApi()
+    t.records['workbooks']['w1'] = WorkbookRecord('w1', 'Sales', None, None, None, None, None,
+                                                  '2020-01-01T00:00:00Z', '2020-01-01T00:00:00Z')
+    t.records['views']['v1'] = ViewRecord('v1', 'Map', None, 'w1', None, None, '10', '2020-01-01T00:00:00Z',
+                                          '2020-01-01T00:00:00Z')
+    snapshot = SiteSnapshot(t)
+    snapshot.build(content_types=['workbook', 'view'])
+
+    # A view being looked at changes its count but not its updatedAt
+    t.records['views']['v1'] = t.records['views']['v1']._replace(total_view_count='25')
+    t.listing_filters = []
+    changes = snapshot.refresh()
+
+    assert ('views', []) in t.listing_filters
+    assert ('workbooks', ['updatedAt:gte:2020-01-01T00:00:00Z']) in t.listing_filters
+    assert changes['view'] == {'added': 0, 'updated': 1, 'removed': 0}
+    assert snapshot._records['view']['v1'].total_view_count == '25'
+    assert 'view' not in snapshot.high_water_marks
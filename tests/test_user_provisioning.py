@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from tableau_tools import TableauServerRest35
+from tableau_tools.tableau_rest_api.user_provisioning import UserProvisioner, ProvisioningRecord, ProvisioningResult
+from stand_in_server import StandInServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = StandInServer()
+    server.install(monkeypatch)
+    server.add_site('')
+    return server
+
+
+def signed_in(server):
+    t = TableauServerRest35('http://server', 'admin', 'password')
+    t.signin()
+    return t
+
+
+def user_named(server, site_luid, name):
+    return server.sites[site_luid]['users'][server.names(site_luid, 'users')[name]]
+
+
+def test_record_without_site_role_keeps_the_existing_role(server):
+    t = signed_in(server)
+    server.add(t.site_luid, 'users', name='alice', siteRole='Creator')
+    records = [{'name': 'alice', 'email': 'alice@example.com', 'site_role': ''}, {'name': 'bob'}]
+    assert ProvisioningRecord.from_dict(records[0]).site_role is None
+
+    summary = UserProvisioner(t, max_workers=2).provision(records)
+
+    assert (summary.created, summary.updated, summary.failed) == (1, 1, 0)
+    alice = user_named(server, t.site_luid, 'alice')
+    assert alice['siteRole'] == 'Creator'
+    assert alice['email'] == 'alice@example.com'
+    assert user_named(server, t.site_luid, 'bob')['siteRole'] == 'Unlicensed'
+
+
+def test_checkpoint_only_skips_provisioned_records(tmp_path):
+    checkpoint_filename = str(tmp_path / 'provisioning.ndjson')
+    results = [ProvisioningResult('carol', 'created', 'luid1'), ProvisioningResult('dave', 'unlicensed', 'luid2'),
+               ProvisioningResult('erin', 'updated', 'luid3'), ProvisioningResult('erin', 'failed', 'luid3')]
+    with open(checkpoint_filename, 'w', encoding='utf-8') as checkpoint_file:
+        for result in results:
+            checkpoint_file.write(json.dumps(result._asdict()) + "\n")
+
+    completed = UserProvisioner(None, checkpoint_filename=checkpoint_filename).load_checkpoint()
+    assert list(completed.keys()) == ['carol']
@@ -0,0 +1,109 @@
+import codecs
+import csv
+
+import pytest
+
+from tableau_tools import TableauServerRest35
+from tableau_tools.tableau_exceptions import InvalidOptionException
+from tableau_tools.tableau_rest_api.view_data_stream import ViewDataStream
+from stand_in_server import StandInServer
+
+DATA = 'Region,Sales,Orders,Returned,Note\r\n' \
+       'East,"1,234.5",12,True,plain\r\n' \
+       'Wést,,3,false,"two\r\nlines, and a comma"\r\n' \
+       'Nörth,7,,,\r\n' \
+       'South,2.25,"1,000"\r\n'
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = StandInServer(page_size=100)
+    server.install(monkeypatch)
+    server.add_site('')
+    return server
+
+
+@pytest.fixture
+def t(server):
+    t = TableauServerRest35('http://server', 'admin', 'password', site_content_url='')
+    t.signin()
+    return t
+
+
+def view_with_data(server, t, data):
+    view_luid = server.add(t.site_luid, 'views', name='Orders')
+    server.files[(t.site_luid, 'views/{}/data'.format(view_luid))] = data
+    return view_luid
+
+
+def split_at(data, *positions):
+    positions = [0] + list(positions) + [len(data)]
+    return [data[start:end] for start, end in zip(positions, positions[1:])]
+
+
+def test_lines_survive_chunks_ending_inside_a_character():
+    text = 'Name,Symbol\nEuro,€\nCafé,☕\nSmile,😀'
+    data = codecs.BOM_UTF8 + text.encode('utf-8')
+    for position in range(1, len(data)):
+        lines = list(ViewDataStream._iterate_lines(split_at(data, position)))
+        assert ''.join(lines) == text
+        assert all(line.endswith('\n') for line in lines[:-1])
+    lines = list(ViewDataStream._iterate_lines([data[i:i + 1] for i in range(len(data))]))
+    assert lines == ['Name,Symbol\n', 'Euro,€\n', 'Café,☕\n', 'Smile,😀']
+
+
+def test_quoted_newlines_parse_wherever_the_chunks_split():
+    data = DATA.encode('utf-8')
+    expected = list(csv.reader(DATA.splitlines(keepends=True)))
+    for position in range(1, len(data)):
+        for second in (position + 1, position + 7):
+            rows = list(csv.reader(ViewDataStream._iterate_lines(split_at(data, position, min(second, len(data))))))
+            assert rows == expected
+    assert expected[2][4] == 'two\r\nlines, and a comma'
+
+
+def test_column_batches_are_typed_and_short_rows_padded(server, t):
+    view_luid = view_with_data(server, t, DATA.encode('utf-8'))
+    stream = t.workbooks.stream_view_data(view_name_or_luid=view_luid, chunk_size=5)
+    column_types = {'Sales': 'float', 'Orders': 'int', 'Returned': 'bool'}
+    batches = list(stream.iterate_column_batches(batch_size=3, column_types=column_types))
+
+    assert stream.columns == ['Region', 'Sales', 'Orders', 'Returned', 'Note']
+    assert batches == [
+        {'Region': ['East', 'Wést', 'Nörth'], 'Sales': [1234.5, None, 7.0], 'Orders': [12, 3, None],
+         'Returned': [True, False, None], 'Note': ['plain', 'two\r\nlines, and a comma', None]},
+        {'Region': ['South'], 'Sales': [2.25], 'Orders': [1000], 'Returned': [None], 'Note': [None]},
+    ]
+    # Every iterate_ method makes its own request
+    assert [row['Region'] for row in stream.iterate_dicts()] == ['East', 'Wést', 'Nörth', 'South']
+    assert len(server.downloads) == 2
+
+    with pytest.raises(InvalidOptionException):
+        list(stream.iterate_column_batches(column_types={'Sales': 'decimal'}))
+    with pytest.raises(InvalidOptionException):
+        list(stream.iterate_column_batches(batch_size=0))
+
+
+def test_empty_response_has_no_rows(server, t):
+    stream = ViewDataStream(t, view_with_data(server, t, b''))
+    assert list(stream.iterate_rows()) == []
+    assert stream.columns == []
+    assert list(stream.iterate_column_batches()) == []
+
+
+def test_data_in_the_export_cache_is_read_from_the_file(server, t, tmp_path):
+    view_luid = view_with_data(server, t, DATA.encode('utf-8'))
+    cache = t.enable_export_cache(str(tmp_path))
+    stream = t.workbooks.stream_view_data(view_name_or_luid=view_luid, view_filter_map={'Region': 'East'},
+                                          chunk_size=4)
+    assert stream.url_ending == 'views/{}/data?vf_Region=East'.format(view_luid)
+    cache.put_bytes(stream.url_ending, 'Region,Sales\r\nEast,"1,234.5"\r\n'.encode('utf-8'),
+                    site_luid=t.site_luid, user_luid=t.user_luid)
+
+    assert list(stream.iterate_rows()) == [['East', '1,234.5']]
+    assert server.downloads == []
+
+    # Only for the same request, site and user
+    other = t.workbooks.stream_view_data(view_name_or_luid=view_luid, view_filter_map={'Region': 'West'})
+    assert len(list(other.iterate_rows())) == 4
+    assert len(server.downloads) == 1
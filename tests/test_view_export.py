@@ -0,0 +1,134 @@
+import os
+
+import pytest
+
+from tableau_tools import TableauServerRest35
+from tableau_tools.tableau_exceptions import RecoverableHTTPException
+from tableau_tools.tableau_rest_api.methods.rest_api_base import TableauRestApiBase
+from tableau_tools.tableau_rest_api.view_export import ViewExporter, ExportRequest
+from stand_in_server import StandInServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = StandInServer(page_size=100)
+    server.install(monkeypatch)
+    site_luid = server.add_site('')
+    wb_luid = server.add(site_luid, 'workbooks', name='Sales')
+    for view_name in ('Map', 'Table'):
+        view_luid = server.add(site_luid, 'views', name=view_name, contentUrl='Sales/sheets/{}'.format(view_name),
+                               children=[('workbook', wb_luid)])
+        server.files[(site_luid, 'views/{}/image'.format(view_luid))] = view_name.encode('utf-8') * 1000
+    return server
+
+
+@pytest.fixture
+def t(server):
+    t = TableauServerRest35('http://server', 'admin', 'password', site_content_url='')
+    t.signin()
+    return t
+
+
+def view_luid(server, t, name):
+    return server.names(t.site_luid, 'views')[name]
+
+
+def test_build_url_parameter_string_encodes_map_dict():
+    assert TableauRestApiBase.build_url_parameter_string() is None
+    assert TableauRestApiBase.build_url_parameter_string(map_dict={}) is None
+    assert TableauRestApiBase.build_url_parameter_string(map_dict={'vf_Region': 'East,West', 'resolution': 'high'}) \
+        == 'vf_Region=East%2CWest&resolution=high'
+    assert TableauRestApiBase.build_url_parameter_string(map_dict={'a': 'b c'}, hand_built_portion='x=1') == \
+        'x=1&a=b+c'
+
+
+def test_view_downloads_send_the_view_filters(server, t):
+    map_luid = view_luid(server, t, 'Map')
+    image = t.workbooks.query_view_image(map_luid, high_resolution=True,
+                                         view_filter_map={'Region': ['East', 'West'], 'Year': 2020})
+
+    assert image == b'Map' * 1000
+    assert server.downloads == [('views/{}/image'.format(map_luid),
+                                 {'vf_Region': ['East,West'], 'vf_Year': ['2020'], 'resolution': ['high']})]
+
+
+def test_duplicate_requests_are_downloaded_once(server, t, tmp_path):
+    map_luid = view_luid(server, t, 'Map')
+    manifest = [
+        ExportRequest('Map', 'Sales', view_filter_map={'Region': 'East', 'Year': 2020}),
+        # The same request, with the view as a LUID and the filters in another order
+        {'view_name_or_luid': map_luid, 'view_filter_map': {'Year': '2020', 'Region': 'East'},
+         'filename': str(tmp_path / 'copy')},
+        ExportRequest('Sales/sheets/Map', 'Sales', view_filter_map={'Region': 'West'}),
+        ExportRequest('Table', 'Sales'),
+        ExportRequest('Missing', 'Sales'),
+    ]
+    results = t.workbooks.export_views(manifest, output_directory=str(tmp_path / 'out'))
+
+    assert [r.status for r in results] == ['Exported', 'Duplicate', 'Exported', 'Exported', 'Failed']
+    assert sorted(path for path, query in server.downloads) == sorted(
+        ['views/{}/image'.format(map_luid)] * 2 + ['views/{}/image'.format(view_luid(server, t, 'Table'))])
+    # The workbook's views are only listed once for the whole manifest
+    assert len([r for r in server.log if r[1].endswith('/views')]) == 1
+    assert results[1].filename == str(tmp_path / 'copy.png')
+    with open(results[0].filename, 'rb') as first, open(results[1].filename, 'rb') as copy:
+        assert first.read() == copy.read() == b'Map' * 1000
+    assert results[1].bytes_written == results[0].bytes_written == 3000
+    assert len(os.listdir(str(tmp_path / 'out'))) == 3
+
+
+def test_failed_downloads_fail_their_duplicates_too(server, t, tmp_path):
+    map_luid = view_luid(server, t, 'Map')
+    server.refuse[('GET', 'views/{}/image'.format(map_luid))] = (403, '403000')
+    results = ViewExporter(t, output_directory=str(tmp_path)).export([ExportRequest(map_luid),
+                                                                      ExportRequest('Map', 'Sales')])
+
+    assert [(r.status, r.http_code, r.filename) for r in results] == [('Failed', 403, None)] * 2
+    assert results[1].request.wb_name_or_luid == 'Sales'
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_filenames_are_the_content_luid_and_a_hash_of_the_request(server, t, tmp_path):
+    exporter = ViewExporter(t, output_directory=str(tmp_path))
+    map_luid = view_luid(server, t, 'Map')
+    east = ExportRequest(map_luid, view_filter_map={'Region': 'East'})
+    east_url = exporter._get_request_url(east)
+    east_filename = exporter._get_filename(east, east_url)
+
+    directory, name = os.path.split(east_filename)
+    assert directory == str(tmp_path)
+    assert name.startswith('{}_'.format(map_luid)) and name.endswith('.png')
+    assert len(name) == len(map_luid) + 1 + 12 + 4
+    assert exporter._get_filename(east, exporter._get_request_url(east._replace(filename=None))) == east_filename
+    west = east._replace(view_filter_map={'Region': 'West'})
+    assert exporter._get_filename(west, exporter._get_request_url(west)) != east_filename
+    pdf = east._replace(export_type='pdf')
+    assert exporter._get_filename(pdf, exporter._get_request_url(pdf)).endswith('.pdf')
+
+    # A given filename only gets the extension added when it is missing
+    assert exporter._get_filename(east._replace(filename='out/east'), east_url) == 'out/east.png'
+    assert exporter._get_filename(east._replace(filename='out/east.PNG'), east_url) == 'out/east.PNG'
+
+
+def test_download_file_removes_the_part_file_on_failure(server, t, tmp_path, monkeypatch):
+    map_luid = view_luid(server, t, 'Map')
+    url = t.build_api_url('views/{}/image'.format(map_luid))
+    filename = str(tmp_path / 'map.png')
+
+    assert t.download_file_in_thread(url, filename, chunk_size=512) == 3000
+    assert os.listdir(str(tmp_path)) == ['map.png']
+    os.remove(filename)
+
+    server.refuse[('GET', 'views/{}/image'.format(map_luid))] = (404, '404011')
+    with pytest.raises(RecoverableHTTPException):
+        t.download_file_in_thread(url, filename)
+    assert os.listdir(str(tmp_path)) == []
+
+    # The connection drops after some of the file has been written
+    def broken_stream(url, chunk_size=65536):
+        yield b'partial'
+        raise IOError('Connection reset')
+    monkeypatch.setattr(t, 'stream_binary_get_request_in_thread', broken_stream)
+    with pytest.raises(IOError):
+        t.download_file_in_thread(url, filename)
+    assert os.listdir(str(tmp_path)) == []